@@ -0,0 +1,40 @@
+"""Cascade event draft foreign keys
+
+Revision ID: a7c9e1f50049
+Revises: f6b8d0e30048
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1f50049'
+down_revision: Union[str, None] = 'f6b8d0e30048'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (constraint, table, referred table, column, ondelete); names are PostgreSQL's defaults
+FOREIGN_KEYS = [
+    ('event_drafts_conversation_id_fkey', 'event_drafts', 'chat_conversations', 'conversation_id', 'CASCADE'),
+    ('event_drafts_used_for_event_id_fkey', 'event_drafts', 'events', 'used_for_event_id', 'SET NULL'),
+    ('event_draft_versions_conversation_id_fkey', 'event_draft_versions', 'chat_conversations', 'conversation_id', 'CASCADE'),
+]
+
+
+def _recreate(with_ondelete: bool) -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        return  # SQLite can't alter constraints; new databases get them from the models
+    for name, table, referred, column, ondelete in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete if with_ondelete else None)
+
+
+def upgrade() -> None:
+    _recreate(with_ondelete=True)
+
+
+def downgrade() -> None:
+    _recreate(with_ondelete=False)
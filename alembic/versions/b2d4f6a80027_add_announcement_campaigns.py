@@ -0,0 +1,58 @@
+"""Add announcement campaigns
+
+Revision ID: b2d4f6a80027
+Revises: a1c3e5f70026
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a80027'
+down_revision: Union[str, None] = 'a1c3e5f70026'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('announcement_campaigns',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('template_name', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.Enum('running', 'completed', 'failed', name='campaignstatus'), nullable=False),
+        sa.Column('last_user_id', sa.Integer(), nullable=False),
+        sa.Column('queued_count', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_announcement_campaigns_id'), 'announcement_campaigns', ['id'], unique=False)
+    op.create_table('announcement_recipients',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('campaign_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('outbound_email_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['campaign_id'], ['announcement_campaigns.id'], ),
+        sa.ForeignKeyConstraint(['outbound_email_id'], ['outbound_emails.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('campaign_id', 'user_id', name='uq_announcement_recipient')
+    )
+    op.create_index(op.f('ix_announcement_recipients_id'), 'announcement_recipients', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_announcement_recipients_id'), table_name='announcement_recipients')
+    op.drop_table('announcement_recipients')
+    op.drop_index(op.f('ix_announcement_campaigns_id'), table_name='announcement_campaigns')
+    op.drop_table('announcement_campaigns')
+    sa.Enum(name='campaignstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""Add AI job owner and heartbeat
+
+Revision ID: b8d0f2a60050
+Revises: a7c9e1f50049
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d0f2a60050'
+down_revision: Union[str, None] = 'a7c9e1f50049'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ai_jobs', sa.Column('owner', sa.String(length=255), nullable=True))
+    op.add_column('ai_jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ai_jobs', 'heartbeat_at')
+    op.drop_column('ai_jobs', 'owner')
@@ -0,0 +1,48 @@
+"""Add stripe webhook events
+
+Revision ID: c3e5a7b90029
+Revises: b2d4f6a80027
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b90029'
+down_revision: Union[str, None] = 'b2d4f6a80027'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stripe_webhook_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stripe_event_id', sa.String(length=255), nullable=False),
+        sa.Column('event_type', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('stripe_created', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum('pending', 'processed', 'ignored', 'failed', name='webhookeventstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stripe_event_id')
+    )
+    op.create_index(op.f('ix_stripe_webhook_events_id'), 'stripe_webhook_events', ['id'], unique=False)
+    op.create_index('idx_stripe_webhook_events_pending', 'stripe_webhook_events', ['status', 'stripe_created'], unique=False)
+    op.create_index('idx_bookings_stripe_payment_id', 'bookings', ['stripe_payment_id'], unique=False)
+    op.create_index('idx_adult_bookings_stripe_payment_id', 'adult_bookings', ['stripe_payment_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_adult_bookings_stripe_payment_id', table_name='adult_bookings')
+    op.drop_index('idx_bookings_stripe_payment_id', table_name='bookings')
+    op.drop_index('idx_stripe_webhook_events_pending', table_name='stripe_webhook_events')
+    op.drop_index(op.f('ix_stripe_webhook_events_id'), table_name='stripe_webhook_events')
+    op.drop_table('stripe_webhook_events')
+    sa.Enum(name='webhookeventstatus').drop(op.get_bind(), checkfirst=True)
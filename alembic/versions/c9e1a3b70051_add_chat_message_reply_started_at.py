@@ -0,0 +1,26 @@
+"""Add chat message reply_started_at
+
+Revision ID: c9e1a3b70051
+Revises: b8d0f2a60050
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1a3b70051'
+down_revision: Union[str, None] = 'b8d0f2a60050'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_messages', sa.Column('reply_started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chat_messages', 'reply_started_at')
@@ -0,0 +1,28 @@
+"""Add announcement campaign owner and heartbeat
+
+Revision ID: d0f2b4c80052
+Revises: c9e1a3b70051
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0f2b4c80052'
+down_revision: Union[str, None] = 'c9e1a3b70051'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('announcement_campaigns', sa.Column('owner', sa.String(length=255), nullable=True))
+    op.add_column('announcement_campaigns', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('announcement_campaigns', 'heartbeat_at')
+    op.drop_column('announcement_campaigns', 'owner')
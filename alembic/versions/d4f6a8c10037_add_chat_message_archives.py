@@ -0,0 +1,42 @@
+"""Add chat message archives
+
+Revision ID: d4f6a8c10037
+Revises: c3e5a7b90029
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6a8c10037'
+down_revision: Union[str, None] = 'c3e5a7b90029'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_message_archives',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('conversation_id', sa.String(length=36), nullable=False),
+        sa.Column('first_message_id', sa.Integer(), nullable=False),
+        sa.Column('first_created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=False),
+        sa.Column('last_created_at', sa.DateTime(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['chat_conversations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_chat_message_archives_conversation', 'chat_message_archives', ['conversation_id', 'last_created_at', 'last_message_id'], unique=False)
+    op.create_index('idx_chat_messages_conversation_page', 'chat_messages', ['conversation_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_chat_messages_conversation_page', table_name='chat_messages')
+    op.drop_index('idx_chat_message_archives_conversation', table_name='chat_message_archives')
+    op.drop_table('chat_message_archives')
@@ -0,0 +1,49 @@
+"""Add event draft versions
+
+Revision ID: e5a7c9d20038
+Revises: d4f6a8c10037
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d20038'
+down_revision: Union[str, None] = 'd4f6a8c10037'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('event_drafts',
+        sa.Column('conversation_id', sa.String(length=36), nullable=False),
+        sa.Column('current_version', sa.Integer(), nullable=False),
+        sa.Column('event_data', sa.JSON(), nullable=True),
+        sa.Column('source', sa.String(length=100), nullable=True),
+        sa.Column('used_for_event_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['chat_conversations.id'], ),
+        sa.ForeignKeyConstraint(['used_for_event_id'], ['events.id'], ),
+        sa.PrimaryKeyConstraint('conversation_id')
+    )
+    op.create_table('event_draft_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('conversation_id', sa.String(length=36), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=100), nullable=True),
+        sa.Column('changes', sa.JSON(), nullable=False),
+        sa.Column('snapshot', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['chat_conversations.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('conversation_id', 'version', name='uq_event_draft_version')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('event_draft_versions')
+    op.drop_table('event_drafts')
@@ -0,0 +1,45 @@
+"""Add AI jobs
+
+Revision ID: f6b8d0e30048
+Revises: e5a7c9d20038
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e30048'
+down_revision: Union[str, None] = 'e5a7c9d20038'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ai_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('provider', sa.String(length=50), nullable=False),
+        sa.Column('model_key', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.Enum('queued', 'running', 'succeeded', 'failed', 'cancelled', name='aijobstatus'), nullable=False),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('stage', sa.String(length=255), nullable=True),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ai_jobs_status'), 'ai_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ai_jobs_status'), table_name='ai_jobs')
+    op.drop_table('ai_jobs')
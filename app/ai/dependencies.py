@@ -3,7 +3,7 @@ Dependency Injection for AI Module
 Manages service dependencies and provides clean dependency resolution
 """
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 import logging
@@ -255,19 +255,25 @@ def get_ai_logger(component: str) -> logging.Logger:
     return logging.getLogger(f"ai.{component}")
 
 
-# Rate Limiting Dependencies (placeholder for future implementation)
-def check_rate_limit(user: User) -> bool:
-    """Check if user is within rate limits for AI requests"""
-    # Placeholder - will implement proper rate limiting in Phase 3
-    return True
+# Rate Limiting Dependencies
+# Everything under /api/ai is already limited by AIRateLimitMiddleware; these
+# are for AI routes mounted elsewhere, which share the same buckets.
+async def check_rate_limit(user: User, ip: str) -> bool:
+    """Check if user is within rate limits for AI requests (spends a token when it is)"""
+    from app.ai_rate_limiter import ai_rate_limiter
+    return await ai_rate_limiter.check(user.id, ip) is None
 
 
-def apply_rate_limit(user: User = Depends(require_authenticated_user)):
+async def apply_rate_limit(request: Request, user: User = Depends(require_authenticated_user)):
     """Apply rate limiting to AI endpoints"""
-    if not check_rate_limit(user):
+    from app.ai_rate_limiter import ai_rate_limiter
+    refused = await ai_rate_limiter.check(user.id, request.client.host if request.client else "unknown")
+    if refused:
+        detail, retry_after = refused
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded for AI requests"
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
         )
     return user
 
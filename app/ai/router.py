@@ -3,14 +3,23 @@ AI Router - All AI-related FastAPI endpoints
 This router contains all AI functionality extracted from main.py
 """
 
-from fastapi import APIRouter, Depends, Request, HTTPException, status, Form, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, Body, Depends, Request, HTTPException, status, Form, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+import html
 import logging
 
-from app.database import get_db
-from app.models import User
+from app.ai_jobs import ai_job_runner, job_to_dict
+from app.database import SessionLocal, get_db
+from app.models import AIJob, AIJobStatus, User
+from app.inference_scheduler import (
+    ClientDisconnected,
+    InferencePriority,
+    inference_context,
+    inference_scheduler,
+    run_until_disconnected
+)
 from .dependencies import (
     require_authenticated_user,
     require_admin_user,
@@ -98,7 +107,13 @@ async def send_chat_message(
         session_id = validate_session_id(session_id)
         message = validate_chat_message(message)
         
-        return await chat_service.send_chat_message(session_id, message, user, db)
+        with inference_context(user_id=user.id, priority=InferencePriority.INTERACTIVE):
+            return await run_until_disconnected(
+                request, chat_service.send_chat_message(session_id, message, user, db)
+            )
+        
+    except ClientDisconnected:
+        return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
         
     except AISystemError:
         raise
@@ -121,6 +136,25 @@ async def create_event_from_chat(
     """Create an event from AI chat conversation"""
     return await event_service.create_event_from_chat(session_id, user, db)
 
+@ai_router.get("/chat/{session_id}/draft/versions")
+async def get_draft_versions(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_authenticated_user)
+):
+    """Version history of the conversation's event draft"""
+    return await event_service.get_draft_versions(session_id, user, db)
+
+@ai_router.get("/chat/{session_id}/draft/versions/{version}")
+async def get_draft_version(
+    session_id: str,
+    version: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_authenticated_user)
+):
+    """The event draft as it was at one version"""
+    return await event_service.get_draft_version(session_id, version, user, db)
+
 @ai_router.get("/chat/{session_id}/status") 
 async def get_chat_status(
     session_id: str, 
@@ -130,6 +164,18 @@ async def get_chat_status(
     """Get chat session status"""
     return await chat_service.get_chat_status(session_id, user, db)
 
+@ai_router.get("/chat/{session_id}/messages")
+async def get_chat_messages(
+    session_id: str,
+    before: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user: User = Depends(require_authenticated_user)
+):
+    """Page of chat history, newest page first; pass next_cursor back as `before` for older messages"""
+    session_id = validate_session_id(session_id)
+    return await chat_service.get_message_page(session_id, user, db, before=before, limit=limit)
+
 @ai_router.post("/chat/new")
 async def start_new_chat(
     request: Request,
@@ -202,15 +248,131 @@ async def clear_ai_request_queue(
     return await model_service.clear_request_queue(user, db)
 
 
+@ai_router.get("/scheduler/metrics")
+async def get_inference_scheduler_metrics(user: User = Depends(require_admin_user)):
+    """Inference slot usage, queue depth and wait times, plus per-user rate limiting"""
+    from app.ai_rate_limiter import ai_rate_limiter
+    return {**inference_scheduler.get_metrics(), "rate_limits": ai_rate_limiter.get_metrics()}
+
+
+@ai_router.get("/cache/metrics")
+async def get_ai_response_cache_metrics(user: User = Depends(require_admin_user)):
+    """Response cache hit/miss counts, plus tool schema registry reuse and the similar-events index"""
+    from app.ai_providers import ai_manager
+    from app.event_index import event_index
+    from app.tool_schema_registry import tool_schema_registry
+    return {
+        **ai_manager.response_cache.get_metrics(),
+        "tool_schemas": tool_schema_registry.get_metrics(),
+        "similar_events": event_index.get_metrics()
+    }
+
+
+@ai_router.get("/telemetry")
+async def get_ai_telemetry(user: User = Depends(require_admin_user)):
+    """Latency, token, cost and error histograms per provider/model and per tool"""
+    from app.ai_telemetry import ai_telemetry
+    return ai_telemetry.snapshot()
+
+
+@ai_router.post("/cache/clear")
+async def clear_ai_response_cache(user: User = Depends(require_admin_user)):
+    """Drop every cached AI response, in memory and in the persistent store"""
+    from app.ai_providers import ai_manager
+    await ai_manager.response_cache.clear()
+    return {"success": True, "message": "AI response cache cleared"}
+
+
 @ai_router.post("/test-dynamic-connection")
 async def test_dynamic_connection(
     user: User = Depends(require_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    """Test the dynamic connection between AI tools and event creation API"""
+    """Start a background test of the AI tools -> draft -> event API flow"""
     return await model_service.test_dynamic_connection(user, db)
 
 
+# ===== BACKGROUND JOB ENDPOINTS =====
+
+def _visible_job(job_id: str, user: User, db: Session) -> AIJob:
+    """A job its creator or an admin may see"""
+    job = ai_job_runner.get(db, job_id)
+    if not job or (job.created_by != user.id and not user.is_admin):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@ai_router.post("/jobs/model-tests")
+async def submit_model_test_jobs(
+    model_keys: List[str] = Body(..., embed=True),
+    user: User = Depends(require_admin_user)
+):
+    """Batch: one background test job per model"""
+    return {"jobs": model_service.submit_model_tests(model_keys, user)}
+
+
+@ai_router.get("/jobs")
+async def list_ai_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Most recent background jobs, plus what is running and queued per provider"""
+    return {"jobs": ai_job_runner.recent(db, limit), **ai_job_runner.get_metrics()}
+
+
+@ai_router.get("/jobs/{job_id}")
+async def get_ai_job(
+    job_id: str,
+    user: User = Depends(require_authenticated_user),
+    db: Session = Depends(get_db)
+):
+    """Status, progress and (once finished) result of a background job"""
+    return job_to_dict(_visible_job(job_id, user, db))
+
+
+@ai_router.get("/jobs/{job_id}/progress", response_class=HTMLResponse)
+async def ai_job_progress_htmx(
+    job_id: str,
+    user: User = Depends(require_authenticated_user),
+    db: Session = Depends(get_db)
+):
+    """HTMX progress fragment; it polls itself (slowly, jobs take minutes) until the job finishes"""
+    job = _visible_job(job_id, user, db)
+    stage = html.escape(job.stage or "")
+    if job.status in (AIJobStatus.queued, AIJobStatus.running):
+        return f"""
+        <div hx-get="/api/ai/jobs/{job.id}/progress" hx-trigger="every 5s" hx-swap="outerHTML">
+            <div class="progress mb-2">
+                <div class="progress-bar progress-bar-striped progress-bar-animated" style="width: {job.progress}%">{job.progress}%</div>
+            </div>
+            <small class="text-muted">{stage}</small>
+            <button class="btn btn-sm btn-outline-danger ml-2" hx-post="/api/ai/jobs/{job.id}/cancel" hx-swap="none">Cancel</button>
+        </div>
+        """
+    alert = {AIJobStatus.succeeded: "success", AIJobStatus.cancelled: "warning"}.get(job.status, "danger")
+    detail = html.escape(job.error or stage)
+    return f"""
+    <div class="alert alert-{alert}">
+        <strong>{job.kind.replace("_", " ").capitalize()}: {job.status.value}</strong>
+        <small class="d-block">{detail}</small>
+    </div>
+    """
+
+
+@ai_router.post("/jobs/{job_id}/cancel")
+async def cancel_ai_job(
+    job_id: str,
+    user: User = Depends(require_authenticated_user),
+    db: Session = Depends(get_db)
+):
+    """Cancel a queued or running background job"""
+    _visible_job(job_id, user, db)
+    if not ai_job_runner.cancel(job_id):
+        return {"success": False, "message": "Job already finished"}
+    return {"success": True, "message": "Job cancelled"}
+
+
 # ===== MIGRATION ENDPOINTS =====
 
 @ai_router.post("/migrate", response_class=HTMLResponse)
@@ -264,7 +426,7 @@ async def ai_chat_init_htmx(
             </div>
             
             <div class=\"chat-input\">
-                <form hx-post=\"/api/ai/chat/message\" 
+                <form hx-post=\"/api/ai/chat/message/stream\" 
                       hx-target=\"#chatMessages\" 
                       hx-swap=\"beforeend\"
                       hx-on::after-request=\"this.reset(); document.getElementById('messageInput').focus()\">
@@ -322,8 +484,11 @@ async def ai_chat_message_htmx(
         </div>
         """
         
-        # Process the message through the chat service
-        result = await chat_service.process_chat_message(session_id, message, user, db)
+        # Process the message through the chat service; abandoned if the browser goes away
+        with inference_context(user_id=user.id, priority=InferencePriority.INTERACTIVE):
+            result = await run_until_disconnected(
+                request, chat_service.process_chat_message(session_id, message, user, db)
+            )
         
         # Get the AI response and format as HTML
         ai_response = result.get('ai_response', 'I apologize, but I encountered an error processing your message.')
@@ -361,6 +526,8 @@ async def ai_chat_message_htmx(
         
         return response_html
         
+    except ClientDisconnected:
+        return ""
     except Exception as e:
         logger.error(f"Failed to process chat message: {e}")
         return f"""
@@ -371,6 +538,107 @@ async def ai_chat_message_htmx(
         """
 
 
+def _sse(event: str, data: str) -> str:
+    """Format one Server-Sent Events frame; each line of data gets its own data: field"""
+    # split, not splitlines: a token ending in a newline must keep it
+    lines = "".join(f"data: {line}\n" for line in data.replace("\r\n", "\n").replace("\r", "\n").split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+
+def _chat_reply_html(ai_response: str, session_id: str) -> str:
+    """The finished assistant message, plus a trigger that refreshes the event preview"""
+    return f"""
+        <div class="message assistant">
+            <div class="message-avatar">🤖</div>
+            <div class="message-content">{html.escape(ai_response)}</div>
+        </div>
+        <div hx-get="/api/ai/event-preview?session_id={html.escape(session_id)}"
+             hx-target="#event-preview"
+             hx-swap="innerHTML"
+             hx-trigger="load"></div>
+        """
+
+
+@ai_router.post("/chat/message/stream", response_class=HTMLResponse)
+async def ai_chat_message_stream(
+    session_id: str = Form(...),
+    message: str = Form(...),
+    user: User = Depends(require_authenticated_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Streamed version of the chat message endpoint.
+    Saves the message and returns it with an assistant bubble that the htmx SSE
+    extension fills from /chat/stream/{message_id} while the model works.
+    """
+    session_id = validate_session_id(session_id)
+    message = validate_chat_message(message)
+    user_message = chat_service.queue_chat_message(session_id, message, user, db)
+    
+    return f"""
+        <div class="message user">
+            <div class="message-avatar">👤</div>
+            <div class="message-content">{html.escape(message)}</div>
+        </div>
+        <div class="message assistant"
+             hx-ext="sse"
+             sse-connect="/api/ai/chat/stream/{user_message.id}"
+             sse-swap="done"
+             sse-close="done"
+             hx-swap="outerHTML">
+            <div class="message-avatar">🤖</div>
+            <div class="message-content">
+                <span id="chat-reply-{user_message.id}" sse-swap="token" hx-swap="beforeend"></span>
+                <span sse-swap="tool_results" hx-swap="innerHTML"><div class="loading"></div></span>
+            </div>
+        </div>
+        """
+
+
+@ai_router.get("/chat/stream/{message_id}")
+async def ai_chat_stream(
+    message_id: int,
+    user: User = Depends(require_authenticated_user)
+):
+    """
+    Server-Sent Events answering a message queued by /chat/message/stream.
+    Each token event carries only the new text, appended to the bubble; when the
+    agent runs tools the text so far is cleared. The done event carries the
+    finished message, which replaces the streaming bubble and so closes the
+    connection.
+    """
+    # The stream outlives the request's own DB dependency, so it gets its own session
+    db = SessionLocal()
+    try:
+        # Only the owner of the conversation may run a turn on it
+        user_message = chat_service.pending_chat_message(message_id, user, db)
+    except Exception:
+        db.close()
+        raise
+    session_id = user_message.conversation_id
+    
+    async def event_stream():
+        try:
+            with inference_context(user_id=user.id, priority=InferencePriority.INTERACTIVE):
+                async for event in chat_service.stream_chat_message(user_message, user, db):
+                    if event["type"] == "token":
+                        yield _sse("token", html.escape(event["content"]))
+                    elif event["type"] == "tool_results":
+                        # The spinner stays; the text written before the tool calls is dropped
+                        yield _sse("tool_results", f'<div class="loading"></div>'
+                                                   f'<span id="chat-reply-{message_id}" hx-swap-oob="innerHTML"></span>')
+                    elif event["type"] == "done":
+                        yield _sse("done", _chat_reply_html(event["ai_response"], session_id))
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @ai_router.get("/event-preview", response_class=HTMLResponse)  
 async def ai_event_preview_get_htmx(
     request: Request,
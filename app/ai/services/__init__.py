@@ -10,16 +10,19 @@ Services:
 - HealthService: System health and migration
 - ModelService: AI model management  
 - EventService: Event creation from AI
+- ConversationContextService: Bounded chat history with rolling summaries
 """
 
 from .chat_service import ChatService
 from .health_service import HealthService
 from .model_service import ModelService
 from .event_service import EventService
+from .context_service import ConversationContextService
 
 __all__ = [
     "ChatService",
     "HealthService", 
     "ModelService",
-    "EventService"
+    "EventService",
+    "ConversationContextService"
 ]
@@ -4,25 +4,31 @@ AI Chat Service
 This service handles all AI chat conversation functionality, including:
 - Starting new chat sessions
 - Processing chat messages
-- Managing conversation history
+- Managing conversation history (bounded, see context_service)
 - Event creation from chat
 - HTMX chat interface support
 
 Extracted from main.py as part of Phase 2 AI architecture refactoring.
 """
 
+import asyncio
 import logging
+import os
 import traceback
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
 from fastapi import HTTPException, status
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app.models import (
     User, ChatConversation, ChatMessage, AgentSession, AgentStatus
 )
+from app.ai_telemetry import ai_telemetry
+from app.chat_retention import page_messages
+from .context_service import conversation_context
 
 
 class ChatService:
@@ -30,6 +36,9 @@ class ChatService:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # How long a streamed reply may hold its message; a reconnect after that runs it again
+        self.turn_timeout = float(os.getenv("AI_CHAT_TURN_TIMEOUT", "600"))
+        self.reply_poll_interval = 1.0
     
     async def start_chat_session(self, user: User, db: Session) -> Dict[str, Any]:
         """
@@ -66,8 +75,9 @@ class ChatService:
             agent = EventCreationAgent(db=db, user_id=user.id)
             initial_message = "Welcome! How can I help you create an event today?"
             
-            # Check if conversation has messages to determine if it's new
-            if conversation.messages:
+            # Latest page only; older history is fetched with get_message_page
+            history = page_messages(db, conversation.id, limit=10)
+            if history["messages"]:
                  initial_message = "Welcome back! How can I continue helping you with your event?"
 
             return {
@@ -77,7 +87,8 @@ class ChatService:
                 "provider": provider,
                 "model": model,
                 "agent_status": "idle",
-                "conversation_history": [msg.to_dict() for msg in conversation.messages[-10:]]
+                "conversation_history": history["messages"],
+                "history_cursor": history["next_cursor"]
             }
             
         except Exception as e:
@@ -174,6 +185,8 @@ class ChatService:
             result = draft_manager.create_event_from_draft(session_id, user.id)
             
             if result["success"]:
+                ai_telemetry.record_event_created(self._conversation_cost(session_id, db))
+                
                 # Add success message to conversation
                 try:
                     success_message = ChatMessage(
@@ -208,6 +221,15 @@ class ChatService:
                 "message": "Failed to create event. Please try again."
             }
     
+    def _conversation_cost(self, session_id: str, db: Session) -> float:
+        """Model spend recorded on a conversation's replies, in USD"""
+        rows = db.query(ChatMessage.msg_metadata).filter(
+            ChatMessage.conversation_id == session_id,
+            ChatMessage.role == 'assistant',
+            ChatMessage.msg_metadata.isnot(None)
+        ).all()
+        return sum(((metadata or {}).get("metrics") or {}).get("cost_usd", 0.0) for metadata, in rows)
+    
     async def start_new_chat(self, user: User, db: Session) -> Dict[str, Any]:
         """Start a brand new conversation (archive current active one)"""
         if not user:
@@ -245,6 +267,30 @@ class ChatService:
             "model": model
         }
     
+    async def get_message_page(
+        self,
+        session_id: str,
+        user: User,
+        db: Session,
+        before: Optional[str] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """Page backwards through a conversation's history, including archived messages"""
+        if not user:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        
+        conversation = db.query(ChatConversation).filter(
+            ChatConversation.id == session_id,
+            ChatConversation.user_id == user.id
+        ).first()
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        try:
+            return page_messages(db, conversation.id, before=before, limit=limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
     async def get_chat_status(
         self, 
         session_id: str, 
@@ -342,146 +388,318 @@ What event would you like to create?"""
     ) -> Dict[str, Any]:
         """Process a chat message and return AI response for HTMX interface"""
         try:
-            from app.ai_assistant import ai_manager
+            conversation, agent_session, conversation_history = self._begin_chat_turn(session_id, message, db)
+            ai_response = await self._run_chat_agent(message, conversation_history, user, db, session_id)
+            return self._finish_chat_turn(conversation, agent_session, ai_response, db)
             
-            # Get conversation
-            conversation = db.query(ChatConversation).filter(
-                ChatConversation.id == session_id
-            ).first()
-            
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-            
-            # Get agent session
-            agent_session = db.query(AgentSession).filter(
-                AgentSession.conversation_id == session_id
-            ).first()
-            
-            # Save user message
-            user_message = ChatMessage(
-                conversation_id=conversation.id,
-                role='user',
-                content=message
+        except Exception as e:
+            self.logger.error(f"Failed to process chat message: {e}", exc_info=True)
+            return self._chat_error_result(e)
+    
+    def queue_chat_message(self, session_id: str, message: str, user: User, db: Session) -> ChatMessage:
+        """Save a user's message for stream_chat_message to answer; the conversation must be theirs"""
+        conversation = db.query(ChatConversation).filter(
+            ChatConversation.id == session_id,
+            ChatConversation.user_id == user.id
+        ).first()
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        user_message = ChatMessage(conversation_id=conversation.id, role='user', content=message)
+        db.add(user_message)
+        db.commit()
+        return user_message
+    
+    def pending_chat_message(self, message_id: int, user: User, db: Session) -> ChatMessage:
+        """A user message in one of the caller's conversations; 404 for anyone else's"""
+        user_message = db.query(ChatMessage).join(
+            ChatConversation, ChatConversation.id == ChatMessage.conversation_id
+        ).filter(
+            ChatMessage.id == message_id,
+            ChatMessage.role == 'user',
+            ChatConversation.user_id == user.id
+        ).first()
+        if not user_message:
+            raise HTTPException(status_code=404, detail="Message not found")
+        return user_message
+    
+    async def stream_chat_message(
+        self, 
+        user_message: ChatMessage, 
+        user: User, 
+        db: Session
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a queued message as events while the model generates: provider
+        token/tool_call events, tool_results when the agent runs tools, then a final
+        done event carrying the process_chat_message result. The assistant message
+        is persisted once, just before done.
+        
+        The turn claims the message first. A browser that reconnects while the
+        turn runs waits for its reply, and one that reconnects afterwards gets the
+        stored reply, so a message is answered once however often it reconnects.
+        """
+        while True:
+            reply = self._reply_to(user_message, db)
+            if reply:
+                yield {"type": "done", "ai_response": reply.content, "agent_status": "completed"}
+                return
+            if self._claim_reply(user_message, db):
+                break
+            await asyncio.sleep(self.reply_poll_interval)
+        
+        answered = False
+        try:
+            async for event in self._stream_claimed_turn(user_message, user, db):
+                answered = answered or (event["type"] == "done" and event.get("agent_status") == "completed")
+                yield event
+        finally:
+            if not answered:
+                # Nothing stored: let a reconnect run the turn again
+                self._release_reply(user_message, db)
+    
+    def _reply_to(self, user_message: ChatMessage, db: Session) -> Optional[ChatMessage]:
+        db.expire_all()  # another connection may have stored it
+        return db.query(ChatMessage).filter(
+            ChatMessage.conversation_id == user_message.conversation_id,
+            ChatMessage.id > user_message.id,
+            ChatMessage.role == 'assistant'
+        ).order_by(ChatMessage.id).first()
+    
+    def _claim_reply(self, user_message: ChatMessage, db: Session) -> bool:
+        """Mark a reply to this message as running, unless another live turn already has"""
+        now = datetime.utcnow()
+        claimed = db.query(ChatMessage).filter(
+            ChatMessage.id == user_message.id,
+            or_(
+                ChatMessage.reply_started_at.is_(None),
+                ChatMessage.reply_started_at < now - timedelta(seconds=self.turn_timeout)
+            )
+        ).update({ChatMessage.reply_started_at: now}, synchronize_session=False)
+        db.commit()
+        return bool(claimed)
+    
+    def _release_reply(self, user_message: ChatMessage, db: Session):
+        try:
+            db.rollback()
+            db.query(ChatMessage).filter(ChatMessage.id == user_message.id).update(
+                {ChatMessage.reply_started_at: None}, synchronize_session=False
             )
-            db.add(user_message)
             db.commit()
+        except Exception as e:
+            self.logger.warning(f"Could not release chat message {user_message.id}: {e}")
+    
+    async def _stream_claimed_turn(
+        self,
+        user_message: ChatMessage,
+        user: User,
+        db: Session
+    ) -> AsyncIterator[Dict[str, Any]]:
+        session_id = user_message.conversation_id
+        message = user_message.content
+        try:
+            conversation = db.get(ChatConversation, session_id)
+            agent_session, conversation_history = self._load_chat_turn(conversation, user_message, db)
+        except Exception as e:
+            self.logger.error(f"Failed to start streamed chat turn: {e}")
+            yield {"type": "done", **self._chat_error_result(e)}
+            return
+        
+        events: asyncio.Queue = asyncio.Queue()
+        
+        async def run_agent():
+            try:
+                return await self._run_chat_agent(
+                    message, conversation_history, user, db, session_id, emit=events.put
+                )
+            finally:
+                events.put_nowait(None)
+        
+        agent_task = asyncio.create_task(run_agent())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
             
-            # Get AI provider
-            ai_provider = ai_manager.get_current_provider()
+            ai_response = await agent_task
+            yield {"type": "done", **self._finish_chat_turn(conversation, agent_session, ai_response, db)}
             
-            # Get conversation history
-            messages = db.query(ChatMessage).filter(
-                ChatMessage.conversation_id == conversation.id
-            ).order_by(ChatMessage.created_at).all()
-            
-            # Build conversation context
-            conversation_history = []
-            for msg in messages:
-                conversation_history.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
+        except Exception as e:
+            self.logger.error(f"Failed to stream chat message: {e}", exc_info=True)
+            yield {"type": "done", **self._chat_error_result(e)}
+        finally:
+            # Client went away mid-turn: stop generating, the reply is never stored
+            if not agent_task.done():
+                agent_task.cancel()
+    
+    def _begin_chat_turn(self, session_id: str, message: str, db: Session):
+        """Save the user's message and load the conversation history for the model"""
+        # Get conversation
+        conversation = db.query(ChatConversation).filter(
+            ChatConversation.id == session_id
+        ).first()
+        
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        # Save user message
+        user_message = ChatMessage(
+            conversation_id=conversation.id,
+            role='user',
+            content=message
+        )
+        db.add(user_message)
+        db.commit()
+        
+        agent_session, conversation_history = self._load_chat_turn(conversation, user_message, db)
+        return conversation, agent_session, conversation_history
+    
+    def _load_chat_turn(self, conversation: ChatConversation, user_message: ChatMessage, db: Session):
+        """The agent session and the conversation history leading up to a saved user message"""
+        agent_session = db.query(AgentSession).filter(
+            AgentSession.conversation_id == conversation.id
+        ).first()
+        
+        # Recent turns, rolling summary and current draft, sized for the active provider
+        from app.ai_providers import ai_manager
+        from app.event_draft_manager import EventDraftManager
+        model_config = ai_manager.get_current_model_config()
+        conversation_history = conversation_context.build_history(
+            db,
+            conversation,
+            provider=model_config.provider if model_config else None,
+            draft=EventDraftManager(db).get_current_draft(conversation.id),
+            before_id=user_message.id
+        )
+        
+        return agent_session, conversation_history
+    
+    async def _run_chat_agent(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        db: Session,
+        session_id: str,
+        emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Run the event creation agent and normalise its reply"""
+        try:
+            # Use the EventCreationAssistant from ai_assistant.py
+            from app.ai_assistant import EventCreationAssistant
+            assistant = EventCreationAssistant()
             
-            # Process with AI provider
-            try:
-                # Use the EventCreationAssistant from ai_assistant.py
-                from app.ai_assistant import EventCreationAssistant
-                assistant = EventCreationAssistant()
-                
-                self.logger.info(f"Processing message with EventCreationAssistant: {message[:50]}...")
-                
+            self.logger.info(f"Processing message with EventCreationAssistant: {message[:50]}...")
+            
+            # Model calls and tool runs for this turn are stored with the reply
+            with ai_telemetry.turn() as turn:
                 ai_response = await assistant.chat(
                     user_message=message,
-                    conversation_history=conversation_history[:-1],  # Exclude the current message we just added
+                    conversation_history=conversation_history,
                     user_id=user.id,
                     db=db,
-                    session_id=session_id  # Pass session_id for dynamic integration
+                    session_id=session_id,  # Pass session_id for dynamic integration
+                    emit=emit
                 )
-                
-                self.logger.info(f"AI response received: type={ai_response.get('type')}, has_response={bool(ai_response.get('response'))}, has_tool_results={bool(ai_response.get('tool_results'))}")
-                
-                # Extract info if available - Use correct key structure
-                extracted_info = None
-                if ai_response.get("type") == "tool_result" and ai_response.get("tool_results"):
-                    # Look for event creation tools in the results
-                    for tool_result in ai_response["tool_results"]:
-                        # Use "function" key instead of "tool"
-                        if tool_result.get("function") == "create_event_draft":
-                            extracted_info = tool_result.get("result", {})
-                            self.logger.info(f"Extracted event info: {extracted_info}")
-                            break
-                elif ai_response.get("event_preview"):
-                    # Alternative extraction path
-                    extracted_info = ai_response.get("event_preview")
-                    self.logger.info(f"Extracted event preview: {extracted_info}")
-                
-                # Get the response text with better fallback handling
-                response_text = ai_response.get("response", "").strip()
-                
-                # Better handling of empty responses
-                if not response_text:
-                    self.logger.warning("AI returned empty response, using fallback")
-                    response_text = f"I understand you mentioned: '{message}'. Let me help you create an event. Could you tell me more about what type of event you'd like to organize?"
-                
-                # Reformat for consistency with existing code
-                ai_response = {
-                    "response": response_text,
-                    "extracted_info": extracted_info
-                }
-                
-                self.logger.info(f"Final response prepared: {len(response_text)} chars, has_extracted_info={bool(extracted_info)}")
-                
-            except Exception as e:
-                self.logger.error(f"AI processing failed: {e}", exc_info=True)
-                # Fallback to a basic response that acknowledges the user's input
-                ai_response = {
-                    "response": f"I understand you mentioned: '{message}'. Let me help you create an event. Could you tell me more about what type of event you'd like to organize?",
-                    "extracted_info": None
-                }
-            
-            # Save AI response
-            assistant_message = ChatMessage(
-                conversation_id=conversation.id,
-                role='assistant',
-                content=ai_response.get('response', 'I apologize, but I encountered an error processing your message.')
-            )
-            db.add(assistant_message)
             
-            # Update agent session with extracted info
-            if agent_session and ai_response.get('extracted_info'):
-                # Merge with existing memory
-                current_memory = agent_session.memory or {}
-                current_memory.update(ai_response['extracted_info'])
-                agent_session.memory = current_memory
-                self.logger.info(f"Updated agent memory with extracted info")
-            
-            db.commit()
-            
-            # Return the response with tracking info
+            self.logger.info(f"AI response received: type={ai_response.get('type')}, has_response={bool(ai_response.get('response'))}, has_tool_results={bool(ai_response.get('tool_results'))}")
+            
+            # Extract info if available - Use correct key structure
+            extracted_info = None
+            if ai_response.get("type") == "tool_result" and ai_response.get("tool_results"):
+                # Look for event creation tools in the results
+                for tool_result in ai_response["tool_results"]:
+                    # Use "function" key instead of "tool"
+                    if tool_result.get("function") == "create_event_draft":
+                        extracted_info = tool_result.get("result", {})
+                        self.logger.info(f"Extracted event info: {extracted_info}")
+                        break
+            elif ai_response.get("event_preview"):
+                # Alternative extraction path
+                extracted_info = ai_response.get("event_preview")
+                self.logger.info(f"Extracted event preview: {extracted_info}")
+            
+            # Get the response text with better fallback handling
+            response_text = ai_response.get("response", "").strip()
+            
+            # Better handling of empty responses
+            if not response_text:
+                self.logger.warning("AI returned empty response, using fallback")
+                response_text = f"I understand you mentioned: '{message}'. Let me help you create an event. Could you tell me more about what type of event you'd like to organize?"
+            
+            self.logger.info(f"Final response prepared: {len(response_text)} chars, has_extracted_info={bool(extracted_info)}")
+            
+            # Reformat for consistency with existing code
             return {
-                "ai_response": ai_response.get('response', 'I apologize, but I encountered an error processing your message.'),
-                "extracted_info": ai_response.get('extracted_info'),
-                "event_preview": ai_response.get('extracted_info') is not None,
-                "tool_calls_made": bool(ai_response.get('tool_calls')),
-                "event_data_extracted": bool(ai_response.get('extracted_info')),
-                "provider": ai_provider.__class__.__name__,
-                "model": getattr(ai_provider, 'model_name', 'unknown'),
-                "agent_status": "completed"
+                "response": response_text,
+                "extracted_info": extracted_info,
+                "metrics": turn.summary()
             }
             
         except Exception as e:
-            self.logger.error(f"Failed to process chat message: {e}", exc_info=True)
+            self.logger.error(f"AI processing failed: {e}", exc_info=True)
+            # Fallback to a basic response that acknowledges the user's input
             return {
-                "ai_response": f"❌ Sorry, I encountered an error: {str(e)}",
-                "extracted_info": None,
-                "event_preview": None,
-                "tool_calls_made": False,
-                "event_data_extracted": False,
-                "provider": "error",
-                "model": "error",
-                "agent_status": "error"
+                "response": f"I understand you mentioned: '{message}'. Let me help you create an event. Could you tell me more about what type of event you'd like to organize?",
+                "extracted_info": None
             }
     
+    def _finish_chat_turn(
+        self,
+        conversation: ChatConversation,
+        agent_session: Optional[AgentSession],
+        ai_response: Dict[str, Any],
+        db: Session
+    ) -> Dict[str, Any]:
+        """Persist the assistant reply and agent memory, and build the response payload"""
+        from app.ai_assistant import ai_manager
+        ai_provider = ai_manager.get_current_provider()
+        
+        # Save AI response
+        assistant_message = ChatMessage(
+            conversation_id=conversation.id,
+            role='assistant',
+            content=ai_response.get('response', 'I apologize, but I encountered an error processing your message.'),
+            msg_metadata={"metrics": ai_response["metrics"]} if ai_response.get("metrics") else None
+        )
+        db.add(assistant_message)
+        
+        # Update agent session with extracted info
+        if agent_session and ai_response.get('extracted_info'):
+            # Merge with existing memory
+            current_memory = agent_session.memory or {}
+            current_memory.update(ai_response['extracted_info'])
+            agent_session.memory = current_memory
+            self.logger.info(f"Updated agent memory with extracted info")
+        
+        db.commit()
+        
+        # Return the response with tracking info
+        return {
+            "ai_response": ai_response.get('response', 'I apologize, but I encountered an error processing your message.'),
+            "extracted_info": ai_response.get('extracted_info'),
+            "event_preview": ai_response.get('extracted_info') is not None,
+            "tool_calls_made": bool(ai_response.get('tool_calls')),
+            "event_data_extracted": bool(ai_response.get('extracted_info')),
+            "provider": ai_provider.__class__.__name__,
+            "model": getattr(ai_provider, 'model_name', 'unknown'),
+            "agent_status": "completed"
+        }
+    
+    def _chat_error_result(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "ai_response": f"❌ Sorry, I encountered an error: {str(error)}",
+            "extracted_info": None,
+            "event_preview": None,
+            "tool_calls_made": False,
+            "event_data_extracted": False,
+            "provider": "error",
+            "model": "error",
+            "agent_status": "error"
+        }
+    
     async def get_event_preview(
         self, 
         session_id: str, 
@@ -0,0 +1,200 @@
+"""
+Conversation Context Service
+
+Builds the history sent to the model on each chat turn without loading the
+whole conversation:
+
+- the last AI_CONTEXT_RECENT_MESSAGES messages are sent verbatim
+- older messages are folded into a rolling summary stored on
+  ChatConversation.agent_context, updated in the background a batch at a
+  time so only new messages are ever summarised
+- messages not yet summarised fill whatever budget is left
+- the current event draft is always included
+- everything fits a per-provider token budget, estimated locally
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.inference_scheduler import InferencePriority, inference_context
+from app.models import ChatConversation, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Tokens of history per provider, after the agent's system prompt, tools and reply are set aside.
+# Ollama runs with num_ctx 8192, so its share is the smallest.
+DEFAULT_TOKEN_BUDGETS = {"ollama": 3000, "openai": 6000, "anthropic": 6000, "mock": 2000}
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a parent and an assistant that helps "
+    "create homeschool community events. Merge the new messages into the summary. Keep every concrete "
+    "detail (names, dates, times, places, prices, ages, capacities) and any decisions or open questions. "
+    "Write at most 150 words of plain prose and reply with the summary only."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: the larger of a characters and a words estimate"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 1.3))
+
+
+def _message_tokens(message: Dict[str, Any]) -> int:
+    return estimate_tokens(message.get("content") or "") + 4  # role and framing
+
+
+class ConversationContextService:
+    """Bounded chat history with a rolling summary"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        provider_factory: Optional[Callable[[], Any]] = None,
+        recent_messages: Optional[int] = None,
+        summary_batch: Optional[int] = None,
+        budgets: Optional[Dict[str, int]] = None
+    ):
+        self.session_factory = session_factory
+        self.provider_factory = provider_factory or self._current_provider
+        self.recent_messages = recent_messages or int(os.getenv("AI_CONTEXT_RECENT_MESSAGES", "8"))
+        self.summary_batch = summary_batch or int(os.getenv("AI_CONTEXT_SUMMARY_BATCH", "6"))
+        self.budgets = budgets or {
+            provider: int(os.getenv(f"AI_CONTEXT_BUDGET_{provider.upper()}", str(default)))
+            for provider, default in DEFAULT_TOKEN_BUDGETS.items()
+        }
+        self._summarizing: Dict[str, asyncio.Task] = {}
+        self.metrics = {"summaries": 0, "summary_failures": 0, "trimmed_messages": 0}
+
+    @staticmethod
+    def _current_provider():
+        from app.ai_providers import ai_manager
+        return ai_manager.get_current_provider()
+
+    def token_budget(self, provider: Optional[str]) -> int:
+        return self.budgets.get(provider or "", DEFAULT_TOKEN_BUDGETS["ollama"])
+
+    def build_history(
+        self,
+        db: Session,
+        conversation: ChatConversation,
+        provider: Optional[str] = None,
+        draft: Optional[Dict[str, Any]] = None,
+        before_id: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        History for the next model call, oldest first. Pass the id of the message being
+        answered as before_id so it is left for the caller to append.
+        """
+        state = conversation.agent_context or {}
+        summarized_through = state.get("summary_through_id", 0)
+
+        query = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation.id)
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        recent = query.order_by(ChatMessage.id.desc()).limit(self.recent_messages).all()
+
+        backlog = []
+        if recent:
+            backlog = query.filter(
+                ChatMessage.id > summarized_through,
+                ChatMessage.id < recent[-1].id
+            ).order_by(ChatMessage.id.desc()).limit(self.summary_batch * 3).all()
+            if len(backlog) >= self.summary_batch:
+                self.schedule_summary(conversation.id)
+
+        preamble = []
+        if state.get("summary"):
+            preamble.append({"role": "system", "content": f"Summary of the earlier conversation: {state['summary']}"})
+        if draft:
+            fields = {key: value for key, value in draft.items() if value not in (None, "", [], {})}
+            preamble.append({"role": "system", "content": f"Current event draft: {json.dumps(fields, default=str)}"})
+
+        remaining = self.token_budget(provider) - sum(_message_tokens(m) for m in preamble)
+        selected = []
+        for message in recent + backlog:  # newest first
+            entry = {"role": message.role, "content": message.content}
+            cost = _message_tokens(entry)
+            if selected and cost > remaining:
+                break
+            selected.append(entry)
+            remaining -= cost
+
+        self.metrics["trimmed_messages"] += len(recent) + len(backlog) - len(selected)
+        return preamble + list(reversed(selected))
+
+    def schedule_summary(self, conversation_id: str):
+        """Fold older messages into the summary in the background, once per conversation at a time"""
+        if conversation_id in self._summarizing:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._summarize_logged(conversation_id))
+        except RuntimeError:
+            return  # no event loop (sync caller); the next async turn will pick it up
+        self._summarizing[conversation_id] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(conversation_id, None))
+
+    async def _summarize_logged(self, conversation_id: str):
+        try:
+            await self.summarize(conversation_id)
+        except Exception as e:
+            self.metrics["summary_failures"] += 1
+            logger.warning(f"Conversation summary failed for {conversation_id}: {e}")
+
+    async def summarize(self, conversation_id: str) -> bool:
+        """Merge the next batch of unsummarised messages (outside the recent window) into the summary"""
+        db = self.session_factory()
+        try:
+            conversation = db.query(ChatConversation).filter(ChatConversation.id == conversation_id).first()
+            if not conversation:
+                return False
+            state = dict(conversation.agent_context or {})
+            summarized_through = state.get("summary_through_id", 0)
+
+            messages = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id)
+            recent_ids = [row.id for row in messages.with_entities(ChatMessage.id)
+                          .order_by(ChatMessage.id.desc()).limit(self.recent_messages)]
+            if len(recent_ids) < self.recent_messages:
+                return False
+            pending = messages.filter(
+                ChatMessage.id > summarized_through,
+                ChatMessage.id < min(recent_ids)
+            ).order_by(ChatMessage.id).limit(self.summary_batch * 3).all()
+            if not pending:
+                return False
+
+            transcript = "\n".join(f"{m.role}: {m.content}" for m in pending)
+            prompt = [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Summary so far:\n{state.get('summary') or '(none)'}\n\nNew messages:\n{transcript}"}
+            ]
+            with inference_context(priority=InferencePriority.BACKGROUND):
+                result = await self.provider_factory().chat_completion(prompt)
+
+            summary = (result.get("content") or "").strip()
+            if result.get("error") or not summary:
+                self.metrics["summary_failures"] += 1
+                return False
+
+            state.update(
+                summary=summary,
+                summary_through_id=pending[-1].id,
+                summary_updated_at=datetime.now().isoformat()
+            )
+            conversation.agent_context = state
+            db.commit()
+            self.metrics["summaries"] += 1
+            return True
+        finally:
+            db.close()
+
+
+conversation_context = ConversationContextService()
@@ -6,6 +6,7 @@ This service handles AI-related event management functionality, including:
 - Event creation from chat conversations
 - HTMX event preview interfaces
 - Integration with event draft manager
+- Draft version history
 
 Extracted from main.py as part of Phase 2 AI architecture refactoring.
 """
@@ -301,6 +302,48 @@ class EventService:
             </div>
             """
     
+    def _require_draft_access(self, session_id: str, user: User, db: Session):
+        from app.models import ChatConversation
+        
+        if not user:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        conversation = db.query(ChatConversation.user_id).filter(ChatConversation.id == session_id).first()
+        if not conversation or (conversation.user_id != user.id and not user.is_admin):
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    async def get_draft_versions(
+        self,
+        session_id: str,
+        user: User,
+        db: Session
+    ) -> Dict[str, Any]:
+        """List every version of the conversation's event draft as field-level changes"""
+        self._require_draft_access(session_id, user, db)
+        from app.event_draft_manager import EventDraftManager
+        
+        versions = EventDraftManager(db).get_draft_history(session_id)
+        return {
+            "session_id": session_id,
+            "current_version": versions[-1]["version"] if versions else None,
+            "versions": versions
+        }
+    
+    async def get_draft_version(
+        self,
+        session_id: str,
+        version: int,
+        user: User,
+        db: Session
+    ) -> Dict[str, Any]:
+        """The full event draft as it was at one version"""
+        self._require_draft_access(session_id, user, db)
+        from app.event_draft_manager import EventDraftManager
+        
+        event_data = EventDraftManager(db).get_draft_version(session_id, version)
+        if event_data is None:
+            raise HTTPException(status_code=404, detail="Draft version not found")
+        return {"session_id": session_id, "version": version, "event_data": event_data}
+    
     async def create_event_from_chat(
         self, 
         session_id: str, 
@@ -78,11 +78,15 @@ class HealthService:
                 }
                 
                 # Add queue monitoring for Ollama
-                if hasattr(provider, '_request_queue') and provider._request_queue:
-                    queue_size = provider._request_queue.qsize()
+                if provider.__class__.__name__ == "OllamaProvider":
+                    from app.inference_scheduler import inference_scheduler
+                    from app.model_residency import model_residency
+                    queue_size = inference_scheduler.queue_depth()
                     provider_info["queue_size"] = queue_size
+                    provider_info["scheduler"] = inference_scheduler.get_metrics()
                     provider_info["current_model"] = getattr(provider, '_current_model', None)
                     provider_info["model_loaded"] = getattr(provider, '_model_loaded', False)
+                    provider_info["residency"] = model_residency.status()
                     
                     # Warn if queue is backing up
                     if queue_size > 5:
@@ -109,9 +113,13 @@ class HealthService:
             health_status["overall_status"] = "unhealthy"
         
         # Circuit Breaker Status
+        from app.provider_router import provider_router
+        routing = provider_router.status()
+        open_circuits = [key for key, circuit in routing["circuits"].items() if circuit["state"] == "OPEN"]
         health_status["checks"]["circuit_breaker"] = {
-            "status": "monitoring",
-            "message": "Circuit breaker pattern active for fault tolerance."
+            "status": "degraded" if open_circuits else "monitoring",
+            "message": f"Circuits open for: {', '.join(open_circuits)}" if open_circuits else "Circuit breaker pattern active for fault tolerance.",
+            "routing": routing
         }
         
         return health_status
@@ -24,7 +24,16 @@ from typing import Dict, List, Optional, Any
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
+from app.database import SessionLocal
 from app.models import User, AgentSession, ChatConversation, Event, AgentStatus
+from app.ai_jobs import JobContext, ai_job_runner
+from app.ai_telemetry import ai_telemetry, telemetry_route
+from app.inference_scheduler import InferencePriority, inference_context, inference_scheduler
+from app.model_residency import model_residency
+
+
+# Model tests switch the app's current model while they run, so only one runs at a time
+_model_switch_lock = asyncio.Lock()
 
 
 class ModelService:
@@ -49,7 +58,8 @@ class ModelService:
             "available_models": available_models,
             "current_model": current_model,
             "current_user": user,
-            "csrf_token": self._generate_csrf_token()
+            "csrf_token": self._generate_csrf_token(),
+            "telemetry": ai_telemetry.snapshot()
         })
     
     async def set_current_model(self, model_key: str, user: User, csrf_token: str) -> Dict[str, Any]:
@@ -60,26 +70,55 @@ class ModelService:
         from app.ai_assistant import ai_manager
         success = ai_manager.set_current_model(model_key)
         
+        if success and ai_manager.pending_model == model_key:
+            return {"success": True, "pending": True, "message": f"Loading {model_key}; chat switches to it once it is ready"}
         if success:
             return {"success": True, "message": f"AI model set to {model_key}"}
         else:
             return {"success": False, "message": "Failed to set AI model"}
     
     async def test_model(self, model_key: str, user: User, csrf_token: str) -> Dict[str, Any]:
-        """Test an AI model with comprehensive capabilities testing"""
+        """Start a background job testing an AI model's capabilities; poll /api/ai/jobs/{job_id}"""
         if not csrf_token or not self._verify_csrf_token(csrf_token):
             raise HTTPException(status_code=400, detail="Invalid CSRF token")
         
+        jobs = self.submit_model_tests([model_key], user)
+        return jobs[0]
+    
+    def submit_model_tests(self, model_keys: List[str], user: User) -> List[Dict[str, Any]]:
+        """One model test job per model; each waits for a slot on its own provider"""
+        from app.ai_assistant import ai_manager
+        
+        available_models = ai_manager.get_available_models()
+        jobs = []
+        for model_key in model_keys:
+            if model_key not in available_models:
+                jobs.append({"success": False, "model_key": model_key, "error": "Model not found"})
+                continue
+            job = ai_job_runner.submit("model_test", available_models[model_key].provider,
+                                       params={"model_key": model_key}, model_key=model_key, user_id=user.id)
+            jobs.append({"success": True, **job})
+        return jobs
+    
+    async def _run_model_tests(self, model_key: str, job: Optional[JobContext] = None) -> Dict[str, Any]:
+        """Connection, chat and function-calling tests for one model"""
         from app.ai_assistant import ai_manager
         
+        async def report(percent: int, stage: str):
+            if job:
+                await job.progress(percent, stage)
+        
+        await report(5, "Checking the connection")
         result = await ai_manager.test_provider(model_key)
         
         # Try comprehensive testing if basic test passes
         if result.get("success"):
+            await report(20, "Waiting for other model tests to finish")
+            await _model_switch_lock.acquire()
             try:
                 # Temporarily set this model and test capabilities
                 old_model = ai_manager.current_config
-                ai_manager.set_current_model(model_key)
+                ai_manager.set_current_model(model_key, warm_first=False)
                 
                 provider = ai_manager.get_current_provider()
                 
@@ -87,15 +126,9 @@ class ModelService:
                 start_time = time.time()
                 
                 async def run_test(test_func):
-                    """Run test function without timeout - user can cancel via UI"""
+                    """Run a test function; the job's timeout and cancellation bound it"""
                     try:
                         return await test_func()
-                    except asyncio.CancelledError:
-                        elapsed = time.time() - start_time
-                        return {
-                            "content": None,
-                            "error": f"Test was cancelled after {elapsed:.1f} seconds"
-                        }
                     except Exception as e:
                         elapsed = time.time() - start_time
                         return {
@@ -108,6 +141,7 @@ class ModelService:
                         {"role": "user", "content": "Hello, can you help me create events? Please respond briefly."}
                     ])
                 
+                await report(30, "Running the chat test")
                 test_response = await run_test(chat_test)
                 elapsed_time = time.time() - start_time
                 
@@ -154,6 +188,7 @@ class ModelService:
                             tools=test_functions
                         )
                     
+                    await report(55, "Running the function calling test")
                     func_start_time = time.time()
                     function_test_response = await run_test(function_test)
                     func_elapsed = time.time() - func_start_time
@@ -185,6 +220,7 @@ class ModelService:
                 
                 # Test 3: Dynamic Event Creation (if function calling passed)
                 if result.get("success") and result.get("function_test", "").startswith("✅"):
+                    await report(75, "Running the dynamic event creation test")
                     dynamic_start_time = time.time()
                     dynamic_test_response = await self._test_dynamic_event_creation(run_test)
                     dynamic_elapsed = time.time() - dynamic_start_time
@@ -212,20 +248,19 @@ class ModelService:
                 else:
                     result["dynamic_test"] = "⏭️ Dynamic test skipped (function calling required)"
                 
-                # Restore old model
-                ai_manager.set_current_model(old_model)
-                
             except Exception as e:
                 elapsed = time.time() - start_time if 'start_time' in locals() else 0
                 result["chat_test"] = f"❌ Test error: {str(e)} ({elapsed:.1f}s)"
                 result["function_test"] = "❌ Function test skipped due to chat test failure"
                 result["success"] = False
                 result["error"] = f"Test failed with exception: {str(e)}"
-                # Make sure to restore model even if there's an error
+            finally:
+                # Restore the old model, also when the job was cancelled or timed out
                 try:
-                    ai_manager.set_current_model(old_model)
-                except:
+                    ai_manager.set_current_model(old_model, warm_first=False)
+                except Exception:
                     pass
+                _model_switch_lock.release()
         
         return result
     
@@ -250,7 +285,10 @@ class ModelService:
         return {
             "models": models_list,
             "current_model": current_model,
-            "ollama_endpoint": ai_manager.ollama_endpoint
+            "ollama_endpoint": ai_manager.ollama_endpoint,
+            "discovery": ai_manager.model_discovery_status(),
+            "pending_model": ai_manager.pending_model,
+            "residency": model_residency.status()
         }
     
     async def refresh_ollama_models(self, user: User, csrf_token: str) -> Dict[str, Any]:
@@ -261,7 +299,7 @@ class ModelService:
         try:
             from app.ai_assistant import ai_manager
             # Force refresh Ollama models
-            ollama_models = ai_manager.refresh_ollama_models()
+            ollama_models = await ai_manager.refresh_ollama_models()
             
             return {
                 "success": True,
@@ -284,27 +322,18 @@ class ModelService:
             if not provider:
                 raise HTTPException(status_code=404, detail="No AI provider configured")
             
-            # Clear Ollama queue if it exists
-            if hasattr(provider, '_request_queue') and provider._request_queue:
-                queue_size = provider._request_queue.qsize()
-                
-                # Clear the queue
-                while not provider._request_queue.empty():
-                    try:
-                        provider._request_queue.get_nowait()
-                        provider._request_queue.task_done()
-                    except:
-                        break
+            # Clear the Ollama inference queue; requests already running are left to finish
+            if provider.__class__.__name__ == "OllamaProvider":
+                queue_size = inference_scheduler.cancel_queued()
                 
-                # Reset model loaded status to force reload
-                if hasattr(provider, '_model_loaded'):
-                    provider._model_loaded = False
+                # Reset model loaded status to force a fresh availability check
+                type(provider)._model_loaded = False
                 
                 return {
                     "success": True,
                     "message": f"Cleared {queue_size} requests from queue",
                     "queue_size_before": queue_size,
-                    "queue_size_after": provider._request_queue.qsize(),
+                    "queue_size_after": inference_scheduler.queue_depth(),
                     "timestamp": datetime.now().isoformat()
                 }
             else:
@@ -319,17 +348,28 @@ class ModelService:
             raise HTTPException(status_code=500, detail=f"Failed to clear queue: {str(e)}")
     
     async def test_dynamic_connection(self, user: User, db: Session) -> Dict[str, Any]:
+        """Start a background job testing the AI tools -> draft -> event API flow; poll /api/ai/jobs/{job_id}"""
+        from app.ai_assistant import ai_manager
+        
+        config = ai_manager.get_available_models().get(ai_manager.current_config)
+        job = ai_job_runner.submit("dynamic_connection_test", config.provider if config else "unknown",
+                                   model_key=ai_manager.current_config, user_id=user.id)
+        return {"success": True, **job}
+    
+    async def _run_dynamic_connection_test(self, user_id: int, job: JobContext) -> Dict[str, Any]:
         """Test the dynamic connection between AI tools and event creation API"""
+        db = SessionLocal()
         try:
             from app.ai_assistant import ThinkingEventAgent
             from app.event_draft_manager import EventDraftManager
             
+            await job.progress(10, "Creating a test conversation")
             # Create test session
             test_session_id = str(uuid.uuid4())
             
             conversation = ChatConversation(
                 id=test_session_id,
-                user_id=user.id,
+                user_id=user_id,
                 title="Dynamic Connection Test",
                 status="active"
             )
@@ -345,6 +385,7 @@ class ModelService:
             db.commit()
             
             # Test AI Assistant with Dynamic Integration
+            await job.progress(30, "Asking the model to draft an event")
             agent = ThinkingEventAgent()
             
             test_message = "Create a coding workshop for teenagers next Saturday from 2-4pm at the community center, $15 per student, max 20 students"
@@ -352,7 +393,7 @@ class ModelService:
             ai_response = await agent.chat(
                 user_message=test_message,
                 conversation_history=[],
-                user_id=user.id,
+                user_id=user_id,
                 db=db,
                 session_id=test_session_id
             )
@@ -364,7 +405,8 @@ class ModelService:
             # Test API connection
             api_result = None
             if current_draft:
-                api_result = draft_manager.create_event_from_draft(test_session_id, user.id)
+                await job.progress(80, "Creating an event from the draft")
+                api_result = draft_manager.create_event_from_draft(test_session_id, user_id)
             
             # Clean up test data
             if api_result and api_result.get("success"):
@@ -392,7 +434,7 @@ class ModelService:
                 "ai_response": ai_response.get("response", "")[:200] + "..." if len(ai_response.get("response", "")) > 200 else ai_response.get("response", "")
             }
             
-        except Exception as e:
+        except (Exception, asyncio.CancelledError) as e:
             # Clean up on error
             try:
                 if 'agent_session' in locals():
@@ -402,12 +444,16 @@ class ModelService:
                 db.commit()
             except:
                 pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
             
             return {
                 "success": False,
                 "error": str(e),
                 "message": "Dynamic connection test failed"
             }
+        finally:
+            db.close()
     
     def _parse_function_call(self, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Parse function call from AI response (handles different provider formats)"""
@@ -500,7 +546,7 @@ class ModelService:
                     "success": True
                 }
                 
-            except Exception as e:
+            except (Exception, asyncio.CancelledError) as e:
                 # Clean up on error
                 try:
                     if 'db' in locals():
@@ -512,6 +558,8 @@ class ModelService:
                         db.close()
                 except:
                     pass
+                if isinstance(e, asyncio.CancelledError):
+                    raise
                 
                 return {
                     "success": False,
@@ -530,4 +578,18 @@ class ModelService:
         """Verify CSRF token"""
         # Import from main.py or security module
         from app.main import verify_csrf_token
-        return verify_csrf_token(token) 
\ No newline at end of file
+        return verify_csrf_token(token) 
+
+
+@ai_job_runner.job("model_test")
+async def _model_test_job(job: JobContext, model_key: str) -> Dict[str, Any]:
+    # Model tests wait behind interactive chat for inference slots, and are
+    # reported apart from chat traffic in the telemetry
+    with inference_context(user_id=job.user_id, priority=InferencePriority.ADMIN), telemetry_route("model_test"):
+        return await ModelService()._run_model_tests(model_key, job)
+
+
+@ai_job_runner.job("dynamic_connection_test")
+async def _dynamic_connection_test_job(job: JobContext) -> Dict[str, Any]:
+    with inference_context(user_id=job.user_id, priority=InferencePriority.ADMIN), telemetry_route("model_test"):
+        return await ModelService()._run_dynamic_connection_test(job.user_id, job)
@@ -11,6 +11,7 @@ from app.models import (
     Event, TicketType, EventCustomField, DynamicFieldDefinition, 
     DynamicFieldValue, User
 )
+from app.tool_schema_registry import tool_schema_registry
 
 class DynamicToolGenerator:
     """Generate AI tool schemas automatically from database models"""
@@ -21,7 +22,13 @@ class DynamicToolGenerator:
         self.logger = logging.getLogger(__name__)
     
     def generate_dynamic_tools(self) -> List[Dict[str, Any]]:
-        """Generate AI tools based on current database schema and dynamic fields"""
+        """
+        Generate AI tools based on current database schema and dynamic fields.
+        Rebuilt only after a DynamicFieldDefinition changes; see tool_schema_registry.
+        """
+        return tool_schema_registry.get("dynamic_model_tools", self._build_dynamic_tools, dynamic=True)
+    
+    def _build_dynamic_tools(self) -> List[Dict[str, Any]]:
         tools = []
         
         # Generate core model tools
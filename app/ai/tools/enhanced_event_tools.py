@@ -17,6 +17,8 @@ import json
 import logging
 from sqlalchemy.orm import Session
 
+from app.tool_schema_registry import tool_schema_registry
+
 logger = logging.getLogger(__name__)
 
 class EnhancedEventTools:
@@ -29,7 +31,9 @@ class EnhancedEventTools:
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """Get all available AI tools for event creation"""
-        
+        return tool_schema_registry.get(f"{__name__}.tool_definitions", self._build_tool_definitions)
+    
+    def _build_tool_definitions(self) -> List[Dict[str, Any]]:
         return [
             # ===== CORE EVENT TOOLS =====
             {
@@ -23,6 +23,7 @@ from app.models import (
     EventAddOn, EventDiscount, User, Child, Booking, BookingAddOn,
     EventStatus, VenueType, TicketStatus, PaymentStatus
 )
+from app.tool_schema_registry import tool_schema_registry
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +37,9 @@ class EnhancedEventTools:
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """Get all available AI tools for event creation"""
-        
+        return tool_schema_registry.get(f"{__name__}.tool_definitions", self._build_tool_definitions)
+    
+    def _build_tool_definitions(self) -> List[Dict[str, Any]]:
         return [
             # ===== CORE EVENT TOOLS =====
             {
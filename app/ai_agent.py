@@ -20,49 +20,16 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from app.models import ChatConversation, ChatMessage, AgentSession, AgentStatus, User, Event
 from app.ai_providers import ai_manager, BaseAIProvider
+from app.provider_router import CircuitBreaker
+from app.ai_response_cache import reuse_responses
 from app.ai_tools import EventCreationTools, DynamicEventTools
+from app.tool_schema_registry import tool_schema_registry
 from app.database import get_db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class CircuitBreaker:
-    """Circuit breaker pattern for AI provider calls"""
-    
-    def __init__(self, failure_threshold=5, recovery_timeout=60):
-        self.failure_threshold = failure_threshold
-        self.recovery_timeout = recovery_timeout
-        self.failure_count = 0
-        self.last_failure_time = None
-        self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
-    
-    def call(self, func):
-        """Execute function with circuit breaker protection"""
-        if self.state == 'OPEN':
-            if time.time() - self.last_failure_time > self.recovery_timeout:
-                self.state = 'HALF_OPEN'
-                logger.info("Circuit breaker moving to HALF_OPEN state")
-            else:
-                raise Exception("Circuit breaker is OPEN - AI provider unavailable")
-        
-        try:
-            result = func()
-            if self.state == 'HALF_OPEN':
-                self.state = 'CLOSED'
-                self.failure_count = 0
-                logger.info("Circuit breaker reset to CLOSED state")
-            return result
-        except Exception as e:
-            self.failure_count += 1
-            self.last_failure_time = time.time()
-            
-            if self.failure_count >= self.failure_threshold:
-                self.state = 'OPEN'
-                logger.error(f"Circuit breaker opened after {self.failure_count} failures")
-            
-            raise e
-
 def retry_with_backoff(retries=3, backoff_factor=1.0, exceptions=(Exception,)):
     """Retry decorator with exponential backoff"""
     def decorator(func):
@@ -225,10 +192,18 @@ class EventCreationAgent:
                 return {"error": "Conversation not found"}
             
             # Add user message
-            self._add_message(conversation_id, "user", user_message, AgentStatus.thinking)
-            
-            # Get conversation history
-            messages = self._get_conversation_messages(conversation_id)
+            message = self._add_message(conversation_id, "user", user_message, AgentStatus.thinking)
+            self.db.flush()
+            
+            # Recent turns plus the rolling summary, sized for the active provider
+            from app.ai.services.context_service import conversation_context
+            model_config = ai_manager.get_current_model_config()
+            messages = conversation_context.build_history(
+                self.db,
+                conversation,
+                provider=model_config.provider if model_config else None,
+                before_id=message.id
+            )
             
             # Process with AI
             response = await self._process_with_ai(user_message, messages)
@@ -287,14 +262,14 @@ Be natural and helpful. Ask questions when needed. Use tools when they would be
         # Build messages
         messages = [
             {"role": "system", "content": system_prompt},
-            *conversation_history[-8:],  # Last 8 messages for context
+            *conversation_history,
             {"role": "user", "content": user_message}
         ]
         
         try:
             # Get tools and call AI
             tool_definitions = tools.get_tool_definitions()
-            formatted_tools = provider.format_tools_for_provider(tool_definitions)
+            formatted_tools = tool_schema_registry.formatted(provider, tool_definitions)
             
             ai_response = await provider.chat_completion(messages, formatted_tools)
             
@@ -453,7 +428,9 @@ Be natural and helpful. Ask questions when needed. Use tools when they would be
                 }
             ]
             
-            response = await provider.chat_completion(messages)
+            # Fixed prompt: any greeting from the last hour is as good as a fresh one
+            with reuse_responses(ttl=3600):
+                response = await provider.chat_completion(messages)
             return response.get("content", "Hi! I'm here to help you create an event. What would you like to organize?")
             
         except Exception:
@@ -475,17 +452,7 @@ Be natural and helpful. Ask questions when needed. Use tools when they would be
             msg_metadata={"timestamp": datetime.now().isoformat()}
         )
         self.db.add(message)
-    
-    def _get_conversation_messages(self, conversation_id: str) -> List[Dict]:
-        """Get conversation messages as list of dicts"""
-        messages = self.db.query(ChatMessage).filter_by(
-            conversation_id=conversation_id
-        ).order_by(ChatMessage.created_at).all()
-        
-        return [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ]
+        return message
 
 
 class ConversationManager:
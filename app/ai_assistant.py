@@ -5,9 +5,14 @@ Uses ReAct pattern for reasoning and tool usage
 
 import json
 import logging
-from typing import Dict, List, Any, Optional
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from app.ai_providers import ai_manager
 from app.ai_tools import DynamicEventTools
+from app.event_extractor import event_extractor
+from app.provider_router import provider_router
+from app.tool_call_parser import parse_tool_calls
 from app.event_draft_manager import DynamicToolIntegration
 from sqlalchemy.orm import Session
 
@@ -17,7 +22,7 @@ class ThinkingEventAgent:
     """AI Agent that uses reasoning to create events through natural conversation"""
     
     def __init__(self):
-        pass
+        self.rule_extraction_enabled = os.getenv("AI_RULE_EXTRACTION_ENABLED", "true").lower() == "true"
     
     def _get_minimal_system_prompt(self) -> str:
         """Enhanced system prompt that encourages tool usage for event creation"""
@@ -84,14 +89,29 @@ Don't just say "I understand you want to create an event" - actually CREATE the
         conversation_history: List[Dict[str, str]], 
         user_id: int,
         db: Session,
-        session_id: str = None
+        session_id: str = None,
+        emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
-        """Process user message with thinking and reasoning"""
+        """
+        Process user message with thinking and reasoning.
+        Pass `emit` to receive provider stream events (tokens, tool calls) while the turn runs.
+        """
         
         # Initialize dynamic tool integration (provides the connection you requested)
         tool_integration = DynamicToolIntegration(db, user_id)
         tools = tool_integration.tools
         
+        # First stage: rule-based extraction. A message that describes the whole
+        # event starts the draft without a model call; otherwise it becomes hints.
+        extraction = event_extractor.extract(user_message)
+        if (
+            self.rule_extraction_enabled and session_id and extraction.is_complete()
+            and not tool_integration.draft_manager.get_current_draft(session_id)
+        ):
+            rule_response = await self._draft_from_extraction(extraction, user_message, tool_integration, session_id)
+            if rule_response:
+                return rule_response
+        
         # Get AI provider
         try:
             provider = ai_manager.get_current_provider()
@@ -113,9 +133,16 @@ Don't just say "I understand you want to create an event" - actually CREATE the
             {"role": "system", "content": self._get_minimal_system_prompt()}
         ]
         
-        # Add conversation history (last 8 messages to keep context manageable)
-        for msg in conversation_history[-8:]:
-            messages.append(msg)
+        # Conversation history arrives already bounded (see ConversationContextService)
+        messages.extend(conversation_history)
+        
+        hints = extraction.hints()
+        if hints:
+            messages.append({
+                "role": "system",
+                "content": "Details already read from the user's latest message (use them in create_event_draft, "
+                           f"confirm anything that looks wrong and ask only about what is missing): {json.dumps(hints)}"
+            })
         
         # Add current user message
         messages.append({"role": "user", "content": user_message})
@@ -125,37 +152,33 @@ Don't just say "I understand you want to create an event" - actually CREATE the
         try:
             # Get tool definitions
             tool_definitions = tools.get_tool_definitions()
-            formatted_tools = provider.format_tools_for_provider(tool_definitions) if tool_definitions else None
             
             logger.info(f"Processing message with {len(tool_definitions)} available tools")
             
-            # Call AI provider with tools
-            response = await provider.chat_completion(messages, formatted_tools)
+            # Call AI provider with tools (falls back along the provider chain)
+            response = await self._complete(messages, tool_definitions, emit)
             
             logger.info(f"AI provider response received: has_content={bool(response.get('content'))}, has_tool_calls={bool(response.get('tool_calls'))}")
             
             # Handle tool calls if any
             if response.get("tool_calls"):
                 logger.info(f"Processing {len(response['tool_calls'])} tool calls")
-                return await self._handle_tool_calls(response, tool_integration, provider, session_id)
+                return await self._handle_tool_calls(response, tool_integration, provider, session_id, emit)
             else:
                 # Direct text response - check if it contains function calls in text format
                 content = response.get("content", "").strip()
                 
                 # Check for text-based function calls (Ollama fallback format)
-                if content and "TOOL_CALL:" in content:
-                    logger.info("Detected text-based function calls, parsing and executing")
-                    
-                    # Parse text-based function calls
-                    parsed_calls = self._parse_text_based_function_calls(content, tool_definitions)
+                parsed_calls = self._parse_text_based_function_calls(content, tool_definitions) if content else []
+                if parsed_calls:
+                    logger.info(f"Detected {len(parsed_calls)} text-based function calls, executing")
                     
-                    if parsed_calls:
-                        # Create a mock response with the parsed tool calls
-                        mock_response = {
-                            "tool_calls": parsed_calls,
-                            "content": content
-                        }
-                        return await self._handle_tool_calls(mock_response, tool_integration, provider, session_id)
+                    # Create a mock response with the parsed tool calls
+                    mock_response = {
+                        "tool_calls": parsed_calls,
+                        "content": content
+                    }
+                    return await self._handle_tool_calls(mock_response, tool_integration, provider, session_id, emit)
                 
                 # ENHANCED: More aggressive fallback for AI thinking responses
                 elif content and (
@@ -268,71 +291,46 @@ Don't just say "I understand you want to create an event" - actually CREATE the
                 "model": current_config.model_name if current_config else "unknown"
             }
     
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List[Dict[str, Any]]],
+        emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]],
+        route: str = "chat"
+    ) -> Dict[str, Any]:
+        """One model call through the provider router, streamed through `emit` when the caller is listening"""
+        return await provider_router.complete(messages, tools, route=route, emit=emit)
+    
     async def _handle_tool_calls(
         self, 
         response: Dict[str, Any], 
         tool_integration: DynamicToolIntegration,
         provider,
-        session_id: str = None
+        session_id: str = None,
+        emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Handle AI tool calls and generate follow-up response with dynamic integration"""
         
-        tool_results = []
         tool_calls = response.get("tool_calls", [])
         
         logger.info(f"Executing {len(tool_calls)} tool calls with dynamic integration")
         
-        # Execute each tool call using dynamic integration
-        for tool_call in tool_calls:
-            function_name = tool_call["function"]["name"]
-            arguments_str = tool_call["function"]["arguments"]
-            
-            try:
-                # Parse arguments
-                if isinstance(arguments_str, str):
-                    arguments = json.loads(arguments_str)
-                else:
-                    arguments = arguments_str
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse tool arguments: {e}")
-                tool_results.append({
-                    "function": function_name,
-                    "error": f"Invalid arguments: {str(e)}"
-                })
-                continue
-            
-            # Execute the tool with dynamic integration
-            try:
-                if session_id and function_name == "create_event_draft":
-                    # Use dynamic integration for event creation
-                    result = await tool_integration.execute_tool_with_draft_integration(
-                        session_id, function_name, arguments
-                    )
-                else:
-                    # Use standard tool execution for other tools
-                    result = await tool_integration.tools.execute_tool(function_name, arguments)
-                
-                tool_results.append({
-                    "function": function_name,
-                    "result": result
-                })
-                logger.info(f"Tool {function_name} executed successfully with integration")
-                
-            except Exception as e:
-                logger.error(f"Tool {function_name} failed: {e}")
-                tool_results.append({
-                    "function": function_name,
-                    "error": str(e)
-                })
+        # Independent calls run concurrently; draft changes are saved once, as one version
+        tool_results = await tool_integration.execute_tool_calls(session_id, tool_calls)
+        
+        if emit:
+            # Anything streamed so far was the tool-calling turn; the follow-up replaces it
+            await emit({"type": "tool_results", "functions": [result["function"] for result in tool_results]})
         
         # Generate follow-up response based on tool results
-        return await self._generate_follow_up_response(response, tool_results, provider)
+        return await self._generate_follow_up_response(response, tool_results, provider, emit)
     
     async def _generate_follow_up_response(
         self, 
         initial_response: Dict[str, Any],
         tool_results: List[Dict],
-        provider
+        provider,
+        emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Generate intelligent follow-up response after tool execution"""
         
@@ -362,7 +360,7 @@ Don't just say "I understand you want to create an event" - actually CREATE the
                 }
             ]
             
-            follow_up_response = await provider.chat_completion(follow_up_messages)
+            follow_up_response = await self._complete(follow_up_messages, None, emit, route="follow_up")
             
             # Extract response content with fallback handling
             response_content = follow_up_response.get("content", "").strip()
@@ -382,32 +380,6 @@ Don't just say "I understand you want to create an event" - actually CREATE the
                 else:
                     response_content = "I've processed your request. What would you like to do next with your event?"
             
-            # Add a brief reflection step after tool use
-            reflection_message = {
-                "role": "system",
-                "content": f"Just added: {'; '.join(tool_context)}"
-            }
-            follow_up_messages.append(reflection_message)
-            
-            # Ask AI to reflect on the tool use
-            reflection_response = await provider.chat_completion(follow_up_messages)
-            
-            # Extract reflection content with fallback handling
-            reflection_content = reflection_response.get("content", "").strip()
-            
-            # FIX: Enhanced fallback for empty AI reflection responses
-            if not reflection_content:
-                logger.warning("AI provider returned empty reflection response, generating fallback")
-                
-                # Generate contextual fallback based on tool results
-                if any("create_event_draft" in str(result) for result in tool_results):
-                    if event_preview and event_preview.get("title"):
-                        reflection_content = f"Great! I've created a draft for your '{event_preview['title']}' event. What other details would you like to add or modify?"
-                    else:
-                        reflection_content = "I've created an initial event draft based on your request. What additional details would you like to include?"
-                elif any("error" in result for result in tool_results):
-                    reflection_content = "I've processed your request. What would you like to do next with your event?"
-            
             return {
                 "response": response_content,
                 "type": "tool_result",
@@ -441,146 +413,48 @@ Don't just say "I understand you want to create an event" - actually CREATE the
                 "model": initial_response.get("model")
             }
 
+    async def _draft_from_extraction(
+        self,
+        extraction,
+        user_message: str,
+        tool_integration: DynamicToolIntegration,
+        session_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Create the draft straight from rule-extracted fields, skipping the model"""
+        arguments = {**extraction.draft(), "description": user_message.strip()[:500]}
+        result = await tool_integration.execute_tool_with_draft_integration(session_id, "create_event_draft", arguments)
+        if not result.get("success"):
+            return None
+
+        fields = extraction.fields
+        missing = [label for name, label in (("cost", "the price"), ("min_age", "the age range"), ("max_pupils", "how many can come"))
+                   if name not in fields]
+        starts = datetime.fromisoformat(fields["date"])
+        when = starts.strftime("%A %d %B %Y").replace(" 0", " ")
+        if "start_time" in fields:
+            when += " at " + starts.strftime("%I:%M%p").lstrip("0").lower()
+        details = f"'{fields['title']}' at {fields['location']} on {when}"
+        follow_up = f" Could you tell me {', '.join(missing)}?" if missing else " Would you like to change anything before creating it?"
+        logger.info(f"Draft filled by rule extraction, no model call: {sorted(fields)}")
+        return {
+            "response": f"I've drafted {details}.{follow_up}",
+            "type": "rule_extraction",
+            "event_preview": result.get("event_data"),
+            "tool_results": [{"function": "create_event_draft", "result": result}],
+            "needs_input": True,
+            "provider": "rules",
+            "model": "event_extractor"
+        }
+
     def _extract_event_information(self, user_message: str) -> Dict[str, Any]:
-        """Extract event information from user message using enhanced patterns"""
-        import re
-        from datetime import datetime
-        
-        info = {}
-        message_lower = user_message.lower()
-        
-        # Enhanced title extraction
-        event_patterns = [
-            r'(?:visit|trip|tour)(?:\s+to\s+|\s+)(?:the\s+)?(\w+(?:\s+\w+)*)',  # "visit to the zoo"
-            r'(\w+(?:\s+\w+)*)\s+(?:visit|trip|tour)',  # "zoo visit"
-            r'(?:party|celebration)(?:\s+for\s+|\s+)([^,.]+)',  # "party for twins"
-            r'(\w+(?:\s+\w+)*)\s+(?:party|celebration)',  # "birthday party"
-            r'(?:workshop|class|session)(?:\s+on\s+|\s+about\s+|\s+)([^,.]+)',  # "workshop on science"
-            r'(\w+(?:\s+\w+)*)\s+(?:workshop|class|session)',  # "science workshop"
-        ]
-        
-        for pattern in event_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                extracted_title = match.group(1).strip().title()
-                if extracted_title:
-                    # Generate proper event title
-                    if 'zoo' in extracted_title.lower():
-                        info['title'] = 'Zoo Visit'
-                    elif 'party' in user_message.lower():
-                        info['title'] = f'{extracted_title} Party'
-                    elif 'visit' in user_message.lower():
-                        info['title'] = f'{extracted_title} Visit'
-                    else:
-                        info['title'] = extracted_title
-                    break
-        
-        # Enhanced date extraction
-        date_patterns = [
-            r'(?:on\s+)?(?:august|aug)\s+(\d{1,2})(?:th|st|nd|rd)?(?:\s*,?\s*(\d{4}))?',
-            r'(\d{1,2})/(\d{1,2})(?:/(\d{4}))?',
-            r'(\d{1,2})-(\d{1,2})(?:-(\d{4}))?',
-            r'(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2})(?:th|st|nd|rd)?'
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                if 'august' in pattern or 'aug' in pattern:
-                    day = match.group(1)
-                    year = match.group(2) if match.group(2) else '2024'
-                    info['date'] = f'{year}-08-{day.zfill(2)}'
-                    break
-        
-        # Enhanced location extraction
-        location_patterns = [
-            r'at\s+([\w\s]+?)(?:\s+at\s+|\s*,|\s*$)',  # "at 100 south st"
-            r'(?:location|venue|place):\s*([^,.]+)',
-            r'(?:held\s+at|taking\s+place\s+at)\s+([^,.]+)'
-        ]
-        
-        for pattern in location_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                location = match.group(1).strip().title()
-                if location and len(location) > 2:  # Avoid single words
-                    info['location'] = location
-                    break
-        
-        # Enhanced capacity extraction
-        capacity_patterns = [
-            r'(?:up\s+to\s+|maximum\s+of\s+|max\s+)?(\d+)\s+people',
-            r'capacity\s+(?:of\s+)?(\d+)',
-            r'(\d+)\s+(?:participants|attendees|guests)'
-        ]
-        
-        for pattern in capacity_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                info['max_pupils'] = int(match.group(1))
-                break
-        
-        # Enhanced cost extraction
-        cost_patterns = [
-            r'(?:children|kids|child)\s+(?:are\s+)?\$?(\d+)',
-            r'(?:adults?)\s+(?:are\s+)?\$?(\d+)',
-            r'\$(\d+)(?:\s+(?:per\s+)?(?:person|adult|child))?'
-        ]
-        
-        costs = []
-        for pattern in cost_patterns:
-            matches = re.findall(pattern, user_message)
-            costs.extend([int(match) for match in matches])
-        
-        if costs:
-            # Use average cost or most common cost
-            info['cost'] = sum(costs) / len(costs)
-        
-        # Set defaults for missing information
-        if not info.get('title') and any(word in message_lower for word in ['zoo', 'visit']):
-            info['title'] = 'Zoo Visit'
-        
-        if not info.get('date') and 'august' in message_lower:
-            info['date'] = '2024-08-12'  # Default from user message
-            
-        if not info.get('description'):
-            info['description'] = f"Event created from: {user_message[:100]}..."
-        
+        """Fallback draft fields when the model talked about an event instead of drafting it"""
+        info = event_extractor.extract(user_message).draft()
+        info['description'] = f"Event created from: {user_message[:100]}..."
         return info
 
     def _parse_text_based_function_calls(self, content: str, tool_definitions: List[Dict]) -> List[Dict]:
         """Parse text-based function calls from content"""
-        import re
-        import json
-        
-        calls = []
-        tool_names = [tool.get("name", "") for tool in tool_definitions]
-        
-        # Pattern to match TOOL_CALL: function_name {"param": "value"}
-        pattern = r'TOOL_CALL:\s*(\w+)\s*(\{[^}]*\})'
-        matches = re.findall(pattern, content)
-        
-        for function_name, args_str in matches:
-            if function_name in tool_names:
-                try:
-                    # Parse the JSON arguments
-                    arguments = json.loads(args_str)
-                    calls.append({
-                        "function": {
-                            "name": function_name,
-                            "arguments": json.dumps(arguments)
-                        }
-                    })
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, use the raw string
-                    calls.append({
-                        "function": {
-                            "name": function_name,
-                            "arguments": args_str
-                        }
-                    })
-        
-        return calls
+        return parse_tool_calls(content, tool_definitions)
 
     def _mentions_event_creation(self, content: str, user_message: str) -> bool:
         """Check if the AI response mentions event creation but didn't use tools"""
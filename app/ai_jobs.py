@@ -0,0 +1,301 @@
+"""
+Background jobs for long AI operations
+
+Model tests and the dynamic connection test make several model calls in a
+row; with a large local model that takes minutes, and they used to run inside
+the HTTP request that asked for them. They now run as jobs:
+
+- submit() records an ai_jobs row and starts an asyncio task; the request
+  returns the job id straight away
+- handlers report progress through their JobContext, which is written to the
+  row so any worker can answer a poll (GET /api/ai/jobs/{id})
+- at most AI_JOBS_MAX_PER_PROVIDER jobs run at once per provider; the rest
+  wait, queued, and every job is bounded by AI_JOB_TIMEOUT
+- cancel() stops a queued or running job; a job running in another worker
+  sees the cancellation at its next progress report
+- each row records the process running it (host:pid:boot id), which
+  refreshes heartbeat_at every AI_JOB_HEARTBEAT seconds; jobs whose owner
+  stopped beating, or was an earlier process with this host and pid, are
+  failed. Jobs other live workers are running are left alone
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import AIJob, AIJobStatus
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (AIJobStatus.queued, AIJobStatus.running)
+
+Handler = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+def job_to_dict(job: AIJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "provider": job.provider,
+        "model_key": job.model_key,
+        "status": job.status.value,
+        "progress": job.progress,
+        "stage": job.stage,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobContext:
+    """What a running handler knows about its job"""
+
+    def __init__(self, runner: "AIJobRunner", job: AIJob):
+        self.runner = runner
+        self.job_id = job.id
+        self.user_id = job.created_by
+        self.model_key = job.model_key
+
+    async def progress(self, percent: int, stage: str):
+        """Record progress; raises CancelledError if the job was cancelled elsewhere"""
+        if not self.runner._update(self.job_id, progress=max(0, min(100, int(percent))), stage=stage[:255]):
+            raise asyncio.CancelledError()
+
+
+class AIJobRunner:
+    """Runs AI jobs as asyncio tasks, persisting their state in ai_jobs"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_per_provider: Optional[int] = None,
+        timeout: Optional[float] = None,
+        heartbeat_interval: Optional[float] = None
+    ):
+        self.session_factory = session_factory
+        self.max_per_provider = max_per_provider or int(os.getenv("AI_JOBS_MAX_PER_PROVIDER", "1"))
+        self.timeout = timeout or float(os.getenv("AI_JOB_TIMEOUT", "600"))
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv("AI_JOB_HEARTBEAT", "30"))
+        # A worker that missed three heartbeats is gone
+        self.stale_after = self.heartbeat_interval * 3
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, Handler] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running: Counter = Counter()
+        self._waiting: Counter = Counter()
+        self._stopping = False
+
+    def job(self, kind: str):
+        """Register an async handler(job: JobContext, **params) -> result dict for a job kind"""
+        def register(handler: Handler) -> Handler:
+            self._handlers[kind] = handler
+            return handler
+        return register
+
+    # ----- public API -----
+
+    def submit(
+        self,
+        kind: str,
+        provider: str,
+        params: Optional[Dict[str, Any]] = None,
+        model_key: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Record a job and schedule it on the running event loop"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown AI job kind: {kind}")
+
+        db = self.session_factory()
+        try:
+            job = AIJob(
+                id=str(uuid.uuid4()),
+                kind=kind,
+                provider=provider,
+                model_key=model_key,
+                status=AIJobStatus.queued,
+                progress=0,
+                stage="Waiting for a free slot",
+                params=params or {},
+                created_by=user_id,
+                owner=self.owner,
+                heartbeat_at=datetime.utcnow()
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            self._tasks[job.id] = asyncio.create_task(self._run(job.id))
+            return job_to_dict(job)
+        finally:
+            db.close()
+
+    def get(self, db: Session, job_id: str) -> Optional[AIJob]:
+        return db.query(AIJob).filter(AIJob.id == job_id).first()
+
+    def recent(self, db: Session, limit: int = 20) -> List[Dict[str, Any]]:
+        jobs = db.query(AIJob).order_by(AIJob.created_at.desc()).limit(limit).all()
+        return [job_to_dict(job) for job in jobs]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False when it had already finished"""
+        cancelled = self._update(job_id, status=AIJobStatus.cancelled, stage="Cancelled", finished_at=datetime.utcnow())
+        task = self._tasks.get(job_id)
+        if cancelled and task and not task.done():
+            task.cancel()
+        return cancelled
+
+    async def start(self):
+        """Fail jobs a dead process left queued or running, then keep this process's jobs alive"""
+        self._stopping = False
+        count = self.fail_abandoned()
+        if count:
+            logger.info(f"Marked {count} interrupted AI jobs as failed")
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        self._stopping = True
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        for task in self._tasks.values():
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def fail_abandoned(self) -> int:
+        """Fail active jobs whose owner stopped heartbeating or was an earlier process on this host and pid"""
+        host_pid = self.owner.rsplit(":", 1)[0]
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        db = self.session_factory()
+        try:
+            active = db.query(AIJob.id, AIJob.owner, AIJob.heartbeat_at).filter(
+                AIJob.status.in_(ACTIVE_STATUSES), or_(AIJob.owner.is_(None), AIJob.owner != self.owner)
+            ).all()
+            abandoned = [
+                job_id for job_id, owner, heartbeat_at in active
+                if heartbeat_at is None or heartbeat_at < cutoff or (owner or "").rsplit(":", 1)[0] == host_pid
+            ]
+            if abandoned:
+                db.query(AIJob).filter(AIJob.id.in_(abandoned), AIJob.status.in_(ACTIVE_STATUSES)).update({
+                    AIJob.status: AIJobStatus.failed,
+                    AIJob.error: "Interrupted by a restart",
+                    AIJob.finished_at: datetime.utcnow()
+                }, synchronize_session=False)
+                db.commit()
+            return len(abandoned)
+        finally:
+            db.close()
+
+    def heartbeat(self):
+        """Mark this process's queued and running jobs as still alive"""
+        if not self._tasks:
+            return
+        db = self.session_factory()
+        try:
+            db.query(AIJob).filter(AIJob.id.in_(list(self._tasks)), AIJob.status.in_(ACTIVE_STATUSES)).update(
+                {AIJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+                count = self.fail_abandoned()
+                if count:
+                    logger.info(f"Marked {count} AI jobs of a stopped worker as failed")
+            except Exception as e:
+                logger.warning(f"AI job heartbeat failed: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "running": dict(self._running),
+            "queued": dict(self._waiting),
+            "max_per_provider": self.max_per_provider,
+            "timeout_seconds": self.timeout,
+            "owner": self.owner,
+        }
+
+    # ----- job execution -----
+
+    def _update(self, job_id: str, **values) -> bool:
+        """Write `values` to a job that is still queued or running; False otherwise"""
+        db = self.session_factory()
+        try:
+            updated = db.query(AIJob).filter(AIJob.id == job_id, AIJob.status.in_(ACTIVE_STATUSES)).update(
+                {AIJob.heartbeat_at: datetime.utcnow(), **{getattr(AIJob, key): value for key, value in values.items()}},
+                synchronize_session=False
+            )
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def _slot(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._slots:
+            self._slots[provider] = asyncio.Semaphore(self.max_per_provider)
+        return self._slots[provider]
+
+    async def _run(self, job_id: str):
+        db = self.session_factory()
+        try:
+            job = self.get(db, job_id)
+            handler = self._handlers[job.kind]
+            context = JobContext(self, job)
+            provider, params = job.provider, dict(job.params or {})
+        finally:
+            db.close()
+
+        try:
+            self._waiting[provider] += 1
+            try:
+                await self._slot(provider).acquire()
+            finally:
+                self._waiting[provider] -= 1
+            self._running[provider] += 1
+            try:
+                if not self._update(job_id, status=AIJobStatus.running, stage="Started", started_at=datetime.utcnow()):
+                    return  # cancelled while it was queued
+                result = await asyncio.wait_for(handler(context, **params), self.timeout)
+            finally:
+                self._running[provider] -= 1
+                self._slot(provider).release()
+            self._update(job_id, status=AIJobStatus.succeeded, progress=100, stage="Finished",
+                         result=result, finished_at=datetime.utcnow())
+        except asyncio.TimeoutError:
+            logger.warning(f"AI job {job_id} timed out after {self.timeout:.0f}s")
+            self._update(job_id, status=AIJobStatus.failed, error=f"Timed out after {self.timeout:.0f}s",
+                         finished_at=datetime.utcnow())
+        except asyncio.CancelledError:
+            if self._stopping:
+                self._update(job_id, status=AIJobStatus.failed, error="Interrupted by shutdown",
+                             finished_at=datetime.utcnow())
+            else:
+                self._update(job_id, status=AIJobStatus.cancelled, stage="Cancelled", finished_at=datetime.utcnow())
+        except Exception as e:
+            logger.error(f"AI job {job_id} failed: {e}")
+            self._update(job_id, status=AIJobStatus.failed, error=str(e), finished_at=datetime.utcnow())
+        finally:
+            self._tasks.pop(job_id, None)
+
+
+ai_job_runner = AIJobRunner()
@@ -9,12 +9,17 @@ import httpx
 import asyncio
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 from dataclasses import dataclass
-from asyncio import Queue, Lock
 from datetime import datetime
 import logging
 
+from app.ai_response_cache import ResponseCache, cached_completion, cached_stream
+from app.ai_telemetry import observed_completion, observed_stream
+from app.inference_scheduler import InferencePriority, inference_scheduler
+from app.model_residency import model_residency
+from app.tool_call_parser import ToolCallParser, parse_tool_calls
+
 @dataclass
 class ModelConfig:
     """Configuration for an AI model"""
@@ -29,6 +34,9 @@ class ModelConfig:
 class BaseAIProvider(ABC):
     """Abstract base class for AI providers"""
     
+    # Set by AIProviderManager; providers built directly run uncached
+    response_cache: Optional[ResponseCache] = None
+    
     def __init__(self, config: ModelConfig):
         self.config = config
     
@@ -41,95 +49,168 @@ class BaseAIProvider(ABC):
         """Generate chat completion with optional tool calling"""
         pass
     
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        tools: List[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion as events:
+        {"type": "token", "content": ...} for each text fragment,
+        {"type": "tool_call", "tool_call": ...} as each tool call is fully assembled,
+        and a final {"type": "done", ...} carrying the same fields chat_completion returns.
+        Providers without native streaming send the whole reply as one token.
+        """
+        result = await self.chat_completion(messages, tools)
+        if result.get("content"):
+            yield {"type": "token", "content": result["content"]}
+        yield {"type": "done", **result}
+    
     @abstractmethod
     def format_tools_for_provider(self, tools: List[Dict[str, Any]]) -> Any:
         """Format tools for specific provider's API"""
         pass
 
+def _env_timeout(name: str, default: str) -> Optional[float]:
+    """Read a timeout in seconds from the environment; 0 or 'none' disables it"""
+    value = os.getenv(name, default).strip().lower()
+    return None if value in ("", "0", "none") else float(value)
+
+def _usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Optional[Dict[str, int]]:
+    """Token counts in the same shape for every provider; None when the API didn't report them"""
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    return {"prompt_tokens": prompt_tokens or 0, "completion_tokens": completion_tokens or 0}
+
+
+class OllamaClientPool:
+    """Process-wide httpx clients, one per Ollama base URL.
+
+    Reusing a client keeps TCP connections to Ollama alive between chat turns.
+    Reads default to no limit because large models can take minutes to load,
+    but connecting and waiting for a free pooled connection fail fast.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        # Clients replaced because their loop is gone; closed by aclose()
+        self._retired: List[httpx.AsyncClient] = []
+        self.timeout = httpx.Timeout(
+            connect=_env_timeout("OLLAMA_CONNECT_TIMEOUT", "5"),
+            read=_env_timeout("OLLAMA_READ_TIMEOUT", "none"),
+            write=_env_timeout("OLLAMA_WRITE_TIMEOUT", "30"),
+            pool=_env_timeout("OLLAMA_POOL_TIMEOUT", "30")
+        )
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "120"))
+        )
+        # Short timeout for metadata calls (/api/tags, /api/ps) that should never be slow
+        self.probe_timeout = httpx.Timeout(10.0, connect=self.timeout.connect)
+
+    def get(self, base_url: str) -> httpx.AsyncClient:
+        base_url = base_url.rstrip('/')
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(base_url)
+        # Connections belong to the loop that opened them, so a new loop needs a new client
+        if client is None or client.is_closed or self._loops.get(base_url) is not loop:
+            if client is not None and not client.is_closed:
+                self._retire(client, self._loops.get(base_url))
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._clients[base_url] = client
+            self._loops[base_url] = loop
+        return client
+
+    def _retire(self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]):
+        """Close a replaced client on the loop that owns its connections, or keep it for aclose()"""
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            self._retired.append(client)
+
+    async def aclose(self):
+        """Close every pooled client; called on application shutdown"""
+        clients = list(self._clients.values())
+        retired = self._retired
+        self._clients.clear()
+        self._loops.clear()
+        self._retired = []
+        for client in clients:
+            if not client.is_closed:
+                await client.aclose()
+        for client in retired:
+            try:
+                await client.aclose()
+            except RuntimeError as e:  # its loop is closed; the sockets go with it
+                logging.debug(f"Could not close a retired Ollama client: {e}")
+
+# Global client pool
+ollama_clients = OllamaClientPool()
+
 class OllamaProvider(BaseAIProvider):
-    """Ollama local model provider with request queuing to prevent memory issues"""
+    """Ollama local model provider; concurrency is managed by the shared inference scheduler"""
     
-    # Class-level queue and lock for all instances
-    _request_queue: Optional[Queue] = None
-    _processing_lock: Optional[Lock] = None
+    # Last model confirmed to exist on the server, for monitoring
     _current_model: Optional[str] = None
     _model_loaded: bool = False
     
     def __init__(self, config: ModelConfig):
         super().__init__(config)
-        self.client = httpx.AsyncClient(timeout=None)  # No timeout - let user cancel if needed
         self.base_url = config.endpoint_url.rstrip('/')
         self.model = config.model_name
-        self.timeout = None  # No artificial timeout limits
-        
-        # Initialize class-level queue and lock if not exists
-        if OllamaProvider._request_queue is None:
-            OllamaProvider._request_queue = Queue(maxsize=10)  # Limit queue size
-        if OllamaProvider._processing_lock is None:
-            OllamaProvider._processing_lock = Lock()
+        self.timeout = ollama_clients.timeout.read  # None unless OLLAMA_READ_TIMEOUT is set
     
     async def _ensure_model_loaded(self) -> bool:
-        """Ensure the correct model is loaded, unloading others if necessary"""
-        async with OllamaProvider._processing_lock:
-            if OllamaProvider._current_model == self.model and OllamaProvider._model_loaded:
-                return True
+        """Ensure the requested model exists on the server"""
+        if OllamaProvider._current_model == self.model and OllamaProvider._model_loaded:
+            return True
+        if model_residency.is_loaded(self.base_url, self.model):
+            return True
+        
+        try:
+            # If a different model is loaded, we need to be careful about memory
+            if OllamaProvider._current_model and OllamaProvider._current_model != self.model:
+                logging.warning(f"Model change requested: {OllamaProvider._current_model} -> {self.model}")
+                # Note: Ollama doesn't have explicit unload, but we track this for monitoring
             
-            try:
-                # If a different model is loaded, we need to be careful about memory
-                if OllamaProvider._current_model and OllamaProvider._current_model != self.model:
-                    logging.warning(f"Model change requested: {OllamaProvider._current_model} -> {self.model}")
-                    # Note: Ollama doesn't have explicit unload, but we track this for monitoring
+            # Check if model exists
+            client = ollama_clients.get(self.base_url)
+            response = await client.get(f"{self.base_url}/api/tags", timeout=ollama_clients.probe_timeout)
+            if response.status_code == 200:
+                models = response.json().get("models", [])
+                available_models = [m["name"] for m in models]
                 
-                # Check if model exists
-                async with httpx.AsyncClient(timeout=30) as client:
-                    response = await client.get(f"{self.base_url}/api/tags")
-                    if response.status_code == 200:
-                        models = response.json().get("models", [])
-                        available_models = [m["name"] for m in models]
-                        
-                        if self.model not in available_models:
-                            raise Exception(f"Model {self.model} not available. Available: {available_models}")
-                        
-                        OllamaProvider._current_model = self.model
-                        OllamaProvider._model_loaded = True
-                        return True
-                    else:
-                        raise Exception(f"Failed to check available models: {response.status_code}")
-                        
-            except Exception as e:
-                logging.error(f"Failed to ensure model loaded: {e}")
-                OllamaProvider._model_loaded = False
-                return False
+                if self.model not in available_models:
+                    raise Exception(f"Model {self.model} not available. Available: {available_models}")
+                
+                OllamaProvider._current_model = self.model
+                OllamaProvider._model_loaded = True
+                return True
+            else:
+                raise Exception(f"Failed to check available models: {response.status_code}")
+                
+        except Exception as e:
+            logging.error(f"Failed to ensure model loaded: {e}")
+            OllamaProvider._model_loaded = False
+            return False
     
     async def _process_request(self, payload: Dict) -> Dict:
-        """Process a single request through the queue"""
-        # Add request to queue
-        request_id = f"req_{datetime.now().timestamp()}"
-        await OllamaProvider._request_queue.put((request_id, payload))
-        
-        # Process requests one by one
-        async with OllamaProvider._processing_lock:
+        """Run a raw /api/generate request once a scheduler slot is free"""
+        async with inference_scheduler.slot(self.model):
             try:
-                # Get our request (should be the one we just added)
-                current_req_id, current_payload = await asyncio.wait_for(
-                    OllamaProvider._request_queue.get(), timeout=1.0
-                )
-                
-                if current_req_id != request_id:
-                    # Put it back and wait
-                    await OllamaProvider._request_queue.put((current_req_id, current_payload))
-                    raise Exception("Request queue ordering issue")
-                
                 # Ensure model is loaded
                 if not await self._ensure_model_loaded():
                     raise Exception("Failed to load model")
                 
                 # Configure for hybrid CPU/GPU execution (large model support)
-                if "options" not in current_payload:
-                    current_payload["options"] = {}
+                if "options" not in payload:
+                    payload["options"] = {}
+                payload.setdefault("keep_alive", model_residency.keep_alive)
                 
                 # Enable automatic CPU/GPU hybrid execution for large models
-                current_payload["options"].update({
+                payload["options"].update({
                     # Let Ollama automatically determine optimal GPU layers based on VRAM
                     # "num_gpu": -1,  # Auto-detect (default behavior)
                     
@@ -140,31 +221,28 @@ class OllamaProvider(BaseAIProvider):
                     "num_ctx": 8192,  # Increased from 4096 for larger models
                     
                     # Keep response length reasonable but not overly restrictive
-                    "num_predict": min(2000, current_payload["options"].get("num_predict", 1000)),
+                    "num_predict": min(2000, payload["options"].get("num_predict", 1000)),
                 })
                 
                 # Make the actual request using /api/generate (auto-loads models)
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        f"{self.base_url}/api/generate",
-                        json=current_payload,
-                        headers={"Content-Type": "application/json"}
-                    )
+                client = ollama_clients.get(self.base_url)
+                response = await client.post(
+                    f"{self.base_url}/api/generate",
+                    json=payload,
+                    headers={"Content-Type": "application/json"}
+                )
+                
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    raise Exception(f"Ollama request failed: {response.status_code} - {response.text}")
                     
-                    if response.status_code == 200:
-                        return response.json()
-                    else:
-                        raise Exception(f"Ollama request failed: {response.status_code} - {response.text}")
-                        
-            except asyncio.TimeoutError:
-                raise Exception("Request timeout in queue")
             except Exception as e:
                 logging.error(f"Request processing failed: {e}")
                 raise
-            finally:
-                # Mark task as done
-                OllamaProvider._request_queue.task_done()
     
+    @observed_completion
+    @cached_completion
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
@@ -176,17 +254,18 @@ class OllamaProvider(BaseAIProvider):
             # Add debugging
             logging.info(f"Ollama chat_completion called with {len(messages)} messages, tools: {bool(tools)}")
             
-            # Try /api/chat first (more reliable and modern)
-            chat_result = await self._try_chat_endpoint(messages, tools)
-            if chat_result.get("success", False):
-                logging.info(f"Chat endpoint succeeded, content length: {len(chat_result.get('content', ''))}")
-                return chat_result
-            
-            # Fallback to /api/generate with prompt conversion
-            logging.warning(f"Chat endpoint failed, falling back to generate: {chat_result.get('error')}")
-            generate_result = await self._try_generate_endpoint(messages, tools)
-            logging.info(f"Generate endpoint result, content length: {len(generate_result.get('content', ''))}")
-            return generate_result
+            async with inference_scheduler.slot(self.model):
+                # Try /api/chat first (more reliable and modern)
+                chat_result = await self._try_chat_endpoint(messages, tools)
+                if chat_result.get("success", False):
+                    logging.info(f"Chat endpoint succeeded, content length: {len(chat_result.get('content', ''))}")
+                    return chat_result
+                
+                # Fallback to /api/generate with prompt conversion
+                logging.warning(f"Chat endpoint failed, falling back to generate: {chat_result.get('error')}")
+                generate_result = await self._try_generate_endpoint(messages, tools)
+                logging.info(f"Generate endpoint result, content length: {len(generate_result.get('content', ''))}")
+                return generate_result
             
         except Exception as e:
             logging.error(f"Chat completion failed: {e}", exc_info=True)
@@ -197,12 +276,96 @@ class OllamaProvider(BaseAIProvider):
                 "error": str(e)
             }
     
-    async def _try_chat_endpoint(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Try the modern /api/chat endpoint first"""
+    @observed_stream
+    @cached_stream
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        tools: List[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream /api/chat tokens as they are generated; falls back to the buffered path if streaming fails"""
+        content_parts: List[str] = []
+        tool_calls: List[Dict[str, Any]] = []
+        # Models without native tool support write calls into the text instead
+        text_calls = ToolCallParser(tools) if tools else None
+        error = None
+        usage = None
+        
+        async with inference_scheduler.slot(self.model):
+            try:
+                start_time = time.time()
+                client = ollama_clients.get(self.base_url)
+                async with client.stream(
+                    "POST",
+                    f"{self.base_url}/api/chat",
+                    json=self._chat_payload(messages, tools, stream=True)
+                ) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        error = f"Chat endpoint returned {response.status_code}"
+                    else:
+                        async for line in response.aiter_lines():
+                            if not line.strip():
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                error = chunk["error"]
+                                break
+                            message = chunk.get("message", {})
+                            if message.get("content"):
+                                content_parts.append(message["content"])
+                                yield {"type": "token", "content": message["content"]}
+                                if text_calls and not tool_calls:
+                                    for tool_call in text_calls.feed(message["content"]):
+                                        yield {"type": "tool_call", "tool_call": tool_call}
+                            # Ollama sends each tool call whole, in the chunk where the model finished it
+                            for tool_call in message.get("tool_calls") or []:
+                                tool_calls.append(tool_call)
+                                yield {"type": "tool_call", "tool_call": tool_call}
+                            if chunk.get("done"):
+                                usage = _usage(chunk.get("prompt_eval_count"), chunk.get("eval_count"))
+                                break
+            except httpx.TimeoutException:
+                error = f"Chat request timeout after {self.timeout}s"
+            except Exception as e:
+                error = f"Chat endpoint error: {str(e)}"
+        
+        if error and not content_parts and not tool_calls:
+            # Nothing reached the client yet, so the buffered /api/chat -> /api/generate path can take over
+            logging.warning(f"Streaming chat failed, using buffered completion: {error}")
+            result = await self.chat_completion(messages, tools)
+            if result.get("content"):
+                yield {"type": "token", "content": result["content"]}
+            yield {"type": "done", **result}
+            return
+        
+        if text_calls and not tool_calls:
+            known = len(text_calls.calls)
+            tool_calls = text_calls.finish()
+            for tool_call in tool_calls[known:]:
+                yield {"type": "tool_call", "tool_call": tool_call}
+        
+        done = {
+            "type": "done",
+            "content": "".join(content_parts),
+            "tool_calls": (tool_calls or None) if tools else None,
+            "provider": "ollama",
+            "model": self.model,
+            "endpoint": "/api/chat",
+            "elapsed": f"{time.time() - start_time:.1f}s",
+            "usage": usage
+        }
+        if error:
+            done["error"] = error
+        yield done
+    
+    def _chat_payload(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None, stream: bool = False) -> Dict[str, Any]:
+        """Request body for /api/chat"""
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
+            "keep_alive": model_residency.keep_alive,
             "options": {
                 "temperature": self.config.temperature,
                 "num_predict": self.config.max_tokens,
@@ -228,58 +391,65 @@ class OllamaProvider(BaseAIProvider):
             
             payload["tools"] = formatted_tools
         
+        return payload
+    
+    async def _try_chat_endpoint(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Try the modern /api/chat endpoint first"""
+        payload = self._chat_payload(messages, tools)
+        
         try:
             start_time = time.time()
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                elapsed = time.time() - start_time
+            client = ollama_clients.get(self.base_url)
+            response = await client.post(
+                f"{self.base_url}/api/chat",
+                json=payload,
+                headers={"Content-Type": "application/json"}
+            )
+            elapsed = time.time() - start_time
+            
+            if response.status_code == 200:
+                result = response.json()
+                message = result.get("message", {})
+                content = message.get("content", "")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    message = result.get("message", {})
-                    content = message.get("content", "")
-                    
-                    # Parse tool calls from Ollama response
-                    tool_calls = None
-                    if tools and message.get("tool_calls"):
-                        tool_calls = message["tool_calls"]
-                    
-                    # FIXED: Don't consider empty content as success when tools are available
-                    if not content.strip() and tools:
-                        return {
-                            "success": False,
-                            "error": "Empty content returned from chat endpoint with tools available",
-                            "fallback_available": True,
-                            "should_use_generate": True
-                        }
-                    
-                    return {
-                        "success": True,
-                        "content": content,
-                        "tool_calls": tool_calls,
-                        "provider": "ollama",
-                        "model": self.model,
-                        "endpoint": "/api/chat",
-                        "elapsed": f"{elapsed:.1f}s"
-                    }
+                # Parse tool calls from Ollama response
+                tool_calls = None
+                if tools and message.get("tool_calls"):
+                    tool_calls = message["tool_calls"]
                 
-                elif response.status_code == 404:
+                # FIXED: Don't consider empty content as success when tools are available
+                if not content.strip() and tools:
                     return {
                         "success": False,
-                        "error": "/api/chat endpoint not available",
-                        "fallback_available": True
+                        "error": "Empty content returned from chat endpoint with tools available",
+                        "fallback_available": True,
+                        "should_use_generate": True
                     }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"Chat endpoint returned {response.status_code}",
-                        "details": response.text[:200]
-                    }
-                    
+                
+                return {
+                    "success": True,
+                    "content": content,
+                    "tool_calls": tool_calls,
+                    "provider": "ollama",
+                    "model": self.model,
+                    "endpoint": "/api/chat",
+                    "elapsed": f"{elapsed:.1f}s",
+                    "usage": _usage(result.get("prompt_eval_count"), result.get("eval_count"))
+                }
+            
+            elif response.status_code == 404:
+                return {
+                    "success": False,
+                    "error": "/api/chat endpoint not available",
+                    "fallback_available": True
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"Chat endpoint returned {response.status_code}",
+                    "details": response.text[:200]
+                }
+                
         except httpx.TimeoutException:
             return {
                 "success": False,
@@ -348,6 +518,7 @@ class OllamaProvider(BaseAIProvider):
                     if example_params:
                         tool_examples.append(f'TOOL_CALL: {name} {json.dumps(example_params)}')
             
+            tool_text = "\n".join(tool_descriptions + tool_examples)
             enhanced_system_prompt = f"""You are a helpful AI assistant with access to function calling tools.
 
 CRITICAL: When you have information to act on, USE the tools immediately. Do not just explain what you would do.
@@ -356,10 +527,8 @@ For example, if a user provides event details like "party for twins at 100 south
 - IMMEDIATELY call: TOOL_CALL: create_event_draft {{"title": "Birthday Party for Twins", "date": "2024-08-12", "time": "10:00", "location": "100 South St"}}
 - Do NOT just say "I would use the create_event_draft tool" - actually use it!
 
-{original_system_prompt}
-
 Available tools:
-{tool_examples}
+{tool_text}
 
 Remember: ACT, don't just describe!"""
             
@@ -373,6 +542,7 @@ Remember: ACT, don't just describe!"""
             "model": self.model,
             "prompt": prompt,
             "stream": False,
+            "keep_alive": model_residency.keep_alive,
             "options": {
                 "temperature": self.config.temperature,
                 "num_predict": self.config.max_tokens,
@@ -383,50 +553,48 @@ Remember: ACT, don't just describe!"""
         
         try:
             start_time = time.time()
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                elapsed = time.time() - start_time
+            client = ollama_clients.get(self.base_url)
+            response = await client.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                headers={"Content-Type": "application/json"}
+            )
+            elapsed = time.time() - start_time
+            
+            if response.status_code == 200:
+                result = response.json()
+                content = result.get("response", "")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    content = result.get("response", "")
+                if content:
+                    # Enhanced tool call parsing
+                    tool_calls = self._parse_tool_calls_from_text(content, tools) if tools else []
                     
-                    if content:
-                        # Enhanced tool call parsing
-                        tool_calls = []
-                        if tools and "TOOL_CALL:" in content:
-                            tool_calls = self._parse_tool_calls_from_text(content, tools)
-                            logging.info(f"Parsed {len(tool_calls)} tool calls from response")
-                        
-                        return {
-                            "content": content,
-                            "tool_calls": tool_calls if tool_calls else None,
-                            "provider": "ollama",
-                            "model": self.model,
-                            "endpoint": "/api/generate",
-                            "elapsed": f"{elapsed:.1f}s"
-                        }
-                    else:
-                        return {
-                            "content": "No response generated",
-                            "tool_calls": None,
-                            "provider": "ollama",
-                            "error": "Empty response from generate endpoint",
-                            "raw_response": str(result)
-                        }
+                    return {
+                        "content": content,
+                        "tool_calls": tool_calls if tool_calls else None,
+                        "provider": "ollama",
+                        "model": self.model,
+                        "endpoint": "/api/generate",
+                        "elapsed": f"{elapsed:.1f}s",
+                        "usage": _usage(result.get("prompt_eval_count"), result.get("eval_count"))
+                    }
                 else:
                     return {
-                        "content": f"Generation failed with status {response.status_code}",
+                        "content": "No response generated",
                         "tool_calls": None,
                         "provider": "ollama",
-                        "error": f"HTTP {response.status_code}",
-                        "details": response.text[:200]
+                        "error": "Empty response from generate endpoint",
+                        "raw_response": str(result)
                     }
-                    
+            else:
+                return {
+                    "content": f"Generation failed with status {response.status_code}",
+                    "tool_calls": None,
+                    "provider": "ollama",
+                    "error": f"HTTP {response.status_code}",
+                    "details": response.text[:200]
+                }
+                
         except httpx.TimeoutException:
             return {
                 "content": f"Request timeout after {self.timeout}s - model may be loading",
@@ -444,96 +612,7 @@ Remember: ACT, don't just describe!"""
     
     def _parse_tool_calls_from_text(self, content: str, available_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Parse tool calls from text response for models without native function calling"""
-        import re
-        import json
-        
-        tool_calls = []
-        tool_names = [tool.get("name", "") for tool in available_tools]
-        
-        # Add debugging
-        logging.info(f"Available tool names: {tool_names}")
-        logging.info(f"Content to parse: {content[:200]}...")
-        
-        # Enhanced patterns to match different function call formats
-        patterns = [
-            # Original TOOL_CALL: format
-            r'TOOL_CALL:\s*(\w+)\s*(\{[^}]*\})',
-            # Alternative formats that models might use
-            r'```(?:json)?\s*(\w+)\s*(\{[^}]*\})\s*```',
-            r'function:\s*(\w+)\s*(\{[^}]*\})',
-            r'call\s+(\w+)\s*(\{[^}]*\})',
-            # More flexible JSON-like patterns
-            r'(\w+)\s*\(\s*(\{[^}]*\})\s*\)',
-            # Direct tool name mentions with JSON
-            rf'({"|".join(re.escape(name) for name in tool_names if name)})\s*[:=]\s*(\{{[^}}]*\}})',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, content, re.IGNORECASE | re.MULTILINE)
-            
-            if matches:
-                logging.info(f"Found {len(matches)} matches with pattern: {pattern}")
-                
-                for function_name, args_str in matches:
-                    logging.info(f"Checking function: '{function_name}' against available tools: {tool_names}")
-                    
-                    # Check if function name matches (case insensitive)
-                    matching_tool = None
-                    for tool_name in tool_names:
-                        if tool_name.lower() == function_name.lower():
-                            matching_tool = tool_name
-                            break
-                    
-                    if matching_tool:
-                        try:
-                            # Parse the JSON arguments
-                            arguments = json.loads(args_str)
-                            
-                            tool_calls.append({
-                                "function": {
-                                    "name": matching_tool,
-                                    "arguments": json.dumps(arguments)
-                                }
-                            })
-                            logging.info(f"Successfully parsed tool call: {matching_tool} with args: {arguments}")
-                            
-                        except json.JSONDecodeError as e:
-                            logging.warning(f"Failed to parse tool call arguments: {args_str} - {e}")
-                            continue
-                    else:
-                        logging.warning(f"Unknown tool function: {function_name} (available: {tool_names})")
-                
-                # If we found matches with this pattern, don't try other patterns
-                if tool_calls:
-                    break
-        
-        # Additional fallback: look for tool names mentioned in text with likely parameters
-        if not tool_calls:
-            for tool_name in tool_names:
-                if tool_name.lower() in content.lower():
-                    logging.info(f"Tool '{tool_name}' mentioned in content, attempting parameter extraction")
-                    
-                    # Try to extract JSON-like structures near the tool name
-                    tool_context = re.search(rf'{re.escape(tool_name)}.*?(\{{[^}}]*\}})', content, re.IGNORECASE | re.DOTALL)
-                    if tool_context:
-                        try:
-                            args_str = tool_context.group(1)
-                            arguments = json.loads(args_str)
-                            
-                            tool_calls.append({
-                                "function": {
-                                    "name": tool_name,
-                                    "arguments": json.dumps(arguments)
-                                }
-                            })
-                            logging.info(f"Extracted tool call from context: {tool_name} with args: {arguments}")
-                            break
-                            
-                        except json.JSONDecodeError:
-                            continue
-        
-        logging.info(f"Final tool calls extracted: {len(tool_calls)}")
-        return tool_calls
+        return parse_tool_calls(content, available_tools, loose=True)
     
     def format_tools_for_provider(self, tools: List[Dict[str, Any]]) -> Any:
         """Format tools for Ollama's native tool calling API"""
@@ -548,36 +627,36 @@ Remember: ACT, don't just describe!"""
     async def _check_running_models(self) -> Dict[str, Any]:
         """Check which models are currently loaded in Ollama memory/VRAM"""
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(f"{self.base_url}/api/ps")
+            client = ollama_clients.get(self.base_url)
+            response = await client.get(f"{self.base_url}/api/ps", timeout=ollama_clients.probe_timeout)
+            
+            if response.status_code == 200:
+                data = response.json()
+                models = data.get("models", [])
+                
+                # Find our specific model
+                our_model = None
+                for model in models:
+                    if model.get("name") == self.model or model.get("model") == self.model:
+                        our_model = model
+                        break
+                
+                return {
+                    "success": True,
+                    "total_models_loaded": len(models),
+                    "all_loaded_models": [m.get("name", "unknown") for m in models],
+                    "our_model_loaded": our_model is not None,
+                    "our_model_info": our_model,
+                    "total_vram_used": sum(m.get("size_vram", 0) for m in models),
+                    "models_detail": models
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"Failed to check running models: {response.status_code}",
+                    "details": response.text[:200]
+                }
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    models = data.get("models", [])
-                    
-                    # Find our specific model
-                    our_model = None
-                    for model in models:
-                        if model.get("name") == self.model or model.get("model") == self.model:
-                            our_model = model
-                            break
-                    
-                    return {
-                        "success": True,
-                        "total_models_loaded": len(models),
-                        "all_loaded_models": [m.get("name", "unknown") for m in models],
-                        "our_model_loaded": our_model is not None,
-                        "our_model_info": our_model,
-                        "total_vram_used": sum(m.get("size_vram", 0) for m in models),
-                        "models_detail": models
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"Failed to check running models: {response.status_code}",
-                        "details": response.text[:200]
-                    }
-                    
         except Exception as e:
             return {
                 "success": False,
@@ -589,86 +668,88 @@ Remember: ACT, don't just describe!"""
         """Test connection with progressive complexity and detailed diagnostics"""
         try:
             # Level 1: Basic connection test
-            async with httpx.AsyncClient(timeout=10) as client:
-                try:
-                    logging.info(f"Testing connection to Ollama at {self.base_url}/api/tags")
-                    response = await client.get(f"{self.base_url}/api/tags")
-                    logging.info(f"Connection response: {response.status_code}")
-                    
-                    if response.status_code != 200:
-                        return {
-                            "success": False, 
-                            "error": f"Ollama server returned {response.status_code}",
-                            "level_failed": "connection",
-                            "details": response.text[:200] if response.text else "No response body"
-                        }
-                except httpx.ConnectError as e:
-                    logging.error(f"Connection error to {self.base_url}: {e}")
-                    return {
-                        "success": False,
-                        "error": f"Cannot connect to Ollama at {self.base_url}",
-                        "level_failed": "connection",
-                        "details": str(e)
-                    }
-                except httpx.TimeoutException:
-                    logging.error(f"Connection timeout to {self.base_url}")
-                    return {
-                        "success": False,
-                        "error": "Connection timeout to Ollama server",
-                        "level_failed": "connection",
-                        "details": f"Timeout after 10s connecting to {self.base_url}"
-                    }
-                
-                # Check if our model is available
-                models_data = response.json()
-                models = models_data.get("models", [])
-                available_models = [m["name"] for m in models]
-                
-                logging.info(f"Available models: {available_models}")
-                logging.info(f"Looking for model: {self.model}")
+            client = ollama_clients.get(self.base_url)
+            try:
+                logging.info(f"Testing connection to Ollama at {self.base_url}/api/tags")
+                response = await client.get(f"{self.base_url}/api/tags", timeout=ollama_clients.probe_timeout)
+                logging.info(f"Connection response: {response.status_code}")
                 
-                if self.model not in available_models:
+                if response.status_code != 200:
                     return {
                         "success": False, 
-                        "error": f"Model {self.model} not available",
-                        "level_failed": "model_availability",
-                        "available_models": available_models
+                        "error": f"Ollama server returned {response.status_code}",
+                        "level_failed": "connection",
+                        "details": response.text[:200] if response.text else "No response body"
                     }
-                
-                # Level 2: Check model loading status before generation
-                logging.info("Checking model loading status")
-                model_status = await self._check_running_models()
-                
-                # Level 2: Test simple generation (bypass queue system)
-                logging.info("Starting simple generation test")
-                simple_test = await self._test_simple_generation()
-                if not simple_test["success"]:
-                    logging.error(f"Simple generation test failed: {simple_test}")
-                    # Add model status to the error response for debugging
-                    simple_test["model_status_before_test"] = model_status
-                    return simple_test
-                
-                # Level 3: Test chat format
-                logging.info("Starting chat generation test")
-                chat_test = await self._test_chat_generation()
-                if not chat_test["success"]:
-                    logging.error(f"Chat generation test failed: {chat_test}")
-                    return chat_test
-                
-                logging.info("All tests passed successfully")
-                
-                # Final model status check
-                final_model_status = await self._check_running_models()
-                
+            except httpx.ConnectError as e:
+                logging.error(f"Connection error to {self.base_url}: {e}")
                 return {
-                    "success": True,
-                    "model": self.model,
-                    "available_models": available_models,
-                    "queue_size": OllamaProvider._request_queue.qsize() if OllamaProvider._request_queue else 0,
-                    "tests_passed": ["connection", "model_availability", "simple_generation", "chat_generation"],
-                    "final_model_status": final_model_status
+                    "success": False,
+                    "error": f"Cannot connect to Ollama at {self.base_url}",
+                    "level_failed": "connection",
+                    "details": str(e)
                 }
-                
+            except httpx.TimeoutException:
+                logging.error(f"Connection timeout to {self.base_url}")
+                return {
+                    "success": False,
+                    "error": "Connection timeout to Ollama server",
+                    "level_failed": "connection",
+                    "details": f"Timeout after 10s connecting to {self.base_url}"
+                }
+            
+            # Check if our model is available
+            models_data = response.json()
+            models = models_data.get("models", [])
+            available_models = [m["name"] for m in models]
+            
+            logging.info(f"Available models: {available_models}")
+            logging.info(f"Looking for model: {self.model}")
+            
+            if self.model not in available_models:
+                return {
+                    "success": False, 
+                    "error": f"Model {self.model} not available",
+                    "level_failed": "model_availability",
+                    "available_models": available_models
+                }
+            
+            # Level 2: Check model loading status before generation
+            logging.info("Checking model loading status")
+            model_status = await self._check_running_models()
+            
+            # Level 2: Test simple generation (queued behind interactive chat)
+            logging.info("Starting simple generation test")
+            async with inference_scheduler.slot(self.model, priority=InferencePriority.ADMIN):
+                simple_test = await self._test_simple_generation()
+            if not simple_test["success"]:
+                logging.error(f"Simple generation test failed: {simple_test}")
+                # Add model status to the error response for debugging
+                simple_test["model_status_before_test"] = model_status
+                return simple_test
+            
+            # Level 3: Test chat format
+            logging.info("Starting chat generation test")
+            async with inference_scheduler.slot(self.model, priority=InferencePriority.ADMIN):
+                chat_test = await self._test_chat_generation()
+            if not chat_test["success"]:
+                logging.error(f"Chat generation test failed: {chat_test}")
+                return chat_test
+            
+            logging.info("All tests passed successfully")
+            
+            # Final model status check
+            final_model_status = await self._check_running_models()
+            
+            return {
+                "success": True,
+                "model": self.model,
+                "available_models": available_models,
+                "queue_size": inference_scheduler.queue_depth(),
+                "tests_passed": ["connection", "model_availability", "simple_generation", "chat_generation"],
+                "final_model_status": final_model_status
+            }
+            
         except Exception as e:
             logging.error(f"Unexpected error in test_connection: {e}")
             return {
@@ -697,58 +778,58 @@ Remember: ACT, don't just describe!"""
             pre_request_status = await self._check_running_models()
             logging.info(f"Model status before generation: {pre_request_status.get('our_model_loaded', False)}")
             
-            async with httpx.AsyncClient(timeout=None) as client:  # No timeout for large models
-                start_time = time.time()
-                logging.info(f"Sending POST request to {self.base_url}/api/generate")
-                
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                elapsed = time.time() - start_time
-                
-                logging.info(f"Generation response: {response.status_code} (took {elapsed:.1f}s)")
-                
-                # Check model status after the request
-                post_request_status = await self._check_running_models()
-                logging.info(f"Model status after generation: {post_request_status.get('our_model_loaded', False)}")
+            client = ollama_clients.get(self.base_url)
+            start_time = time.time()
+            logging.info(f"Sending POST request to {self.base_url}/api/generate")
+            
+            response = await client.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                headers={"Content-Type": "application/json"}
+            )
+            elapsed = time.time() - start_time
+            
+            logging.info(f"Generation response: {response.status_code} (took {elapsed:.1f}s)")
+            
+            # Check model status after the request
+            post_request_status = await self._check_running_models()
+            logging.info(f"Model status after generation: {post_request_status.get('our_model_loaded', False)}")
+            
+            if response.status_code == 200:
+                result = response.json()
+                logging.info(f"Generation result keys: {list(result.keys())}")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    logging.info(f"Generation result keys: {list(result.keys())}")
-                    
-                    if result.get("response"):
-                        logging.info(f"Generation successful, response: '{result['response'][:100]}'")
-                        return {
-                            "success": True,
-                            "test": "simple_generation",
-                            "elapsed": f"{elapsed:.1f}s",
-                            "response_preview": result["response"][:50],
-                            "model_status_before": pre_request_status,
-                            "model_status_after": post_request_status
-                        }
-                    else:
-                        logging.error(f"Empty response from Ollama: {result}")
-                        return {
-                            "success": False,
-                            "error": "Empty response from Ollama",
-                            "level_failed": "simple_generation",
-                            "elapsed": f"{elapsed:.1f}s",
-                            "raw_response": str(result),
-                            "model_status_before": pre_request_status,
-                            "model_status_after": post_request_status
-                        }
+                if result.get("response"):
+                    logging.info(f"Generation successful, response: '{result['response'][:100]}'")
+                    return {
+                        "success": True,
+                        "test": "simple_generation",
+                        "elapsed": f"{elapsed:.1f}s",
+                        "response_preview": result["response"][:50],
+                        "model_status_before": pre_request_status,
+                        "model_status_after": post_request_status
+                    }
                 else:
-                    logging.error(f"Generation failed with status {response.status_code}: {response.text[:200]}")
+                    logging.error(f"Empty response from Ollama: {result}")
                     return {
                         "success": False,
-                        "error": f"Generation failed with status {response.status_code}",
+                        "error": "Empty response from Ollama",
                         "level_failed": "simple_generation",
                         "elapsed": f"{elapsed:.1f}s",
-                        "details": response.text[:200]
+                        "raw_response": str(result),
+                        "model_status_before": pre_request_status,
+                        "model_status_after": post_request_status
                     }
-                    
+            else:
+                logging.error(f"Generation failed with status {response.status_code}: {response.text[:200]}")
+                return {
+                    "success": False,
+                    "error": f"Generation failed with status {response.status_code}",
+                    "level_failed": "simple_generation",
+                    "elapsed": f"{elapsed:.1f}s",
+                    "details": response.text[:200]
+                }
+                
         except httpx.TimeoutException:
             # This should rarely happen now with no timeout limits
             logging.error("Generation request was cancelled or timed out")
@@ -786,49 +867,49 @@ Remember: ACT, don't just describe!"""
         }
         
         try:
-            async with httpx.AsyncClient(timeout=None) as client:  # No timeout for large models
-                start_time = time.time()
-                
-                # Try /api/chat first (newer endpoint)
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json=chat_payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                elapsed = time.time() - start_time
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("message", {}).get("content"):
-                        return {
-                            "success": True,
-                            "test": "chat_generation",
-                            "endpoint_used": "/api/chat",
-                            "elapsed": f"{elapsed:.1f}s",
-                            "response_preview": result["message"]["content"][:50]
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "error": "Empty message content from /api/chat",
-                            "level_failed": "chat_generation",
-                            "elapsed": f"{elapsed:.1f}s",
-                            "raw_response": str(result)
-                        }
-                        
-                elif response.status_code == 404:
-                    # /api/chat not available, fallback to /api/generate with chat format
-                    return await self._test_generate_with_chat_format()
-                    
+            client = ollama_clients.get(self.base_url)
+            start_time = time.time()
+            
+            # Try /api/chat first (newer endpoint)
+            response = await client.post(
+                f"{self.base_url}/api/chat",
+                json=chat_payload,
+                headers={"Content-Type": "application/json"}
+            )
+            elapsed = time.time() - start_time
+            
+            if response.status_code == 200:
+                result = response.json()
+                if result.get("message", {}).get("content"):
+                    return {
+                        "success": True,
+                        "test": "chat_generation",
+                        "endpoint_used": "/api/chat",
+                        "elapsed": f"{elapsed:.1f}s",
+                        "response_preview": result["message"]["content"][:50]
+                    }
                 else:
                     return {
                         "success": False,
-                        "error": f"Chat generation failed with status {response.status_code}",
+                        "error": "Empty message content from /api/chat",
                         "level_failed": "chat_generation",
                         "elapsed": f"{elapsed:.1f}s",
-                        "details": response.text[:200]
+                        "raw_response": str(result)
                     }
                     
+            elif response.status_code == 404:
+                # /api/chat not available, fallback to /api/generate with chat format
+                return await self._test_generate_with_chat_format()
+                
+            else:
+                return {
+                    "success": False,
+                    "error": f"Chat generation failed with status {response.status_code}",
+                    "level_failed": "chat_generation",
+                    "elapsed": f"{elapsed:.1f}s",
+                    "details": response.text[:200]
+                }
+                
         except httpx.TimeoutException:
             return {
                 "success": False,
@@ -859,42 +940,42 @@ Remember: ACT, don't just describe!"""
         }
         
         try:
-            async with httpx.AsyncClient(timeout=None) as client:  # No timeout for large models
-                start_time = time.time()
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                elapsed = time.time() - start_time
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("response"):
-                        return {
-                            "success": True,
-                            "test": "chat_generation",
-                            "endpoint_used": "/api/generate (chat format)",
-                            "elapsed": f"{elapsed:.1f}s",
-                            "response_preview": result["response"][:50]
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "error": "Empty response from /api/generate",
-                            "level_failed": "chat_generation",
-                            "elapsed": f"{elapsed:.1f}s",
-                            "raw_response": str(result)
-                        }
+            client = ollama_clients.get(self.base_url)
+            start_time = time.time()
+            response = await client.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                headers={"Content-Type": "application/json"}
+            )
+            elapsed = time.time() - start_time
+            
+            if response.status_code == 200:
+                result = response.json()
+                if result.get("response"):
+                    return {
+                        "success": True,
+                        "test": "chat_generation",
+                        "endpoint_used": "/api/generate (chat format)",
+                        "elapsed": f"{elapsed:.1f}s",
+                        "response_preview": result["response"][:50]
+                    }
                 else:
                     return {
                         "success": False,
-                        "error": f"Generate with chat format failed: {response.status_code}",
+                        "error": "Empty response from /api/generate",
                         "level_failed": "chat_generation",
                         "elapsed": f"{elapsed:.1f}s",
-                        "details": response.text[:200]
+                        "raw_response": str(result)
                     }
-                    
+            else:
+                return {
+                    "success": False,
+                    "error": f"Generate with chat format failed: {response.status_code}",
+                    "level_failed": "chat_generation",
+                    "elapsed": f"{elapsed:.1f}s",
+                    "details": response.text[:200]
+                }
+                
         except Exception as e:
             return {
                 "success": False,
@@ -906,36 +987,36 @@ Remember: ACT, don't just describe!"""
     async def _check_running_models(self) -> Dict[str, Any]:
         """Check which models are currently loaded in Ollama memory/VRAM"""
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(f"{self.base_url}/api/ps")
+            client = ollama_clients.get(self.base_url)
+            response = await client.get(f"{self.base_url}/api/ps", timeout=ollama_clients.probe_timeout)
+            
+            if response.status_code == 200:
+                data = response.json()
+                models = data.get("models", [])
+                
+                # Find our specific model
+                our_model = None
+                for model in models:
+                    if model.get("name") == self.model or model.get("model") == self.model:
+                        our_model = model
+                        break
+                
+                return {
+                    "success": True,
+                    "total_models_loaded": len(models),
+                    "all_loaded_models": [m.get("name", "unknown") for m in models],
+                    "our_model_loaded": our_model is not None,
+                    "our_model_info": our_model,
+                    "total_vram_used": sum(m.get("size_vram", 0) for m in models),
+                    "models_detail": models
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"Failed to check running models: {response.status_code}",
+                    "details": response.text[:200]
+                }
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    models = data.get("models", [])
-                    
-                    # Find our specific model
-                    our_model = None
-                    for model in models:
-                        if model.get("name") == self.model or model.get("model") == self.model:
-                            our_model = model
-                            break
-                    
-                    return {
-                        "success": True,
-                        "total_models_loaded": len(models),
-                        "all_loaded_models": [m.get("name", "unknown") for m in models],
-                        "our_model_loaded": our_model is not None,
-                        "our_model_info": our_model,
-                        "total_vram_used": sum(m.get("size_vram", 0) for m in models),
-                        "models_detail": models
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"Failed to check running models: {response.status_code}",
-                        "details": response.text[:200]
-                    }
-                    
         except Exception as e:
             return {
                 "success": False,
@@ -946,15 +1027,23 @@ Remember: ACT, don't just describe!"""
 class OpenAIProvider(BaseAIProvider):
     """OpenAI API provider"""
     
-    def __init__(self, config: ModelConfig):
+    def __init__(self, config: ModelConfig, client: Any = None):
         super().__init__(config)
+        # Clients built by ProviderRegistry are shared by every model on the same key
+        self.client = client or self.build_client(config)
+    
+    @staticmethod
+    def build_client(config: ModelConfig) -> Any:
         # Import here to make it optional
         try:
             from openai import AsyncOpenAI
-            self.client = AsyncOpenAI(api_key=config.api_key)
         except ImportError:
             raise ImportError("openai package required for OpenAI provider")
+        # endpoint_url also points the client at OpenAI-compatible servers (vLLM, LM Studio, benchmarks)
+        return AsyncOpenAI(api_key=config.api_key, base_url=config.endpoint_url or None)
     
+    @observed_completion
+    @cached_completion
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
@@ -977,11 +1066,14 @@ class OpenAIProvider(BaseAIProvider):
             response = await self.client.chat.completions.create(**kwargs)
             message = response.choices[0].message
             
+            usage = getattr(response, "usage", None)
+            
             return {
                 "content": message.content,
                 "tool_calls": message.tool_calls,
                 "provider": "openai",
-                "model": self.config.model_name
+                "model": self.config.model_name,
+                "usage": _usage(usage.prompt_tokens, usage.completion_tokens) if usage else None
             }
             
         except Exception as e:
@@ -992,6 +1084,78 @@ class OpenAIProvider(BaseAIProvider):
                 "error": str(e)
             }
     
+    @observed_stream
+    @cached_stream
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        tools: List[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream with OpenAI; tool call fragments are stitched together by index"""
+        content_parts: List[str] = []
+        partial_calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        
+        try:
+            kwargs = {
+                "model": self.config.model_name,
+                "messages": messages,
+                "max_tokens": self.config.max_tokens,
+                "temperature": self.config.temperature,
+                "stream": True,
+                # Token counts arrive in one extra, choice-less chunk at the end
+                "stream_options": {"include_usage": True}
+            }
+            
+            if tools:
+                kwargs["tools"] = [{"type": "function", "function": func} for func in tools]
+                kwargs["tool_choice"] = "auto"
+            
+            stream = await self.client.chat.completions.create(**kwargs)
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = _usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield {"type": "token", "content": delta.content}
+                for fragment in delta.tool_calls or []:
+                    call = partial_calls.setdefault(fragment.index, {
+                        "id": None,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if fragment.id:
+                        call["id"] = fragment.id
+                    if fragment.function and fragment.function.name:
+                        call["function"]["name"] += fragment.function.name
+                    if fragment.function and fragment.function.arguments:
+                        call["function"]["arguments"] += fragment.function.arguments
+            
+            tool_calls = [partial_calls[index] for index in sorted(partial_calls)]
+            for tool_call in tool_calls:
+                yield {"type": "tool_call", "tool_call": tool_call}
+            
+            yield {
+                "type": "done",
+                "content": "".join(content_parts),
+                "tool_calls": tool_calls or None,
+                "provider": "openai",
+                "model": self.config.model_name,
+                "usage": usage
+            }
+            
+        except Exception as e:
+            yield {
+                "type": "done",
+                "content": "".join(content_parts) or f"Sorry, I encountered an error: {str(e)}",
+                "tool_calls": None,
+                "provider": "openai",
+                "error": str(e)
+            }
+    
     def format_tools_for_provider(self, tools: List[Dict[str, Any]]) -> Any:
         """OpenAI expects tools in specific format"""
         return tools
@@ -999,15 +1163,49 @@ class OpenAIProvider(BaseAIProvider):
 class AnthropicProvider(BaseAIProvider):
     """Anthropic Claude API provider"""
     
-    def __init__(self, config: ModelConfig):
+    def __init__(self, config: ModelConfig, client: Any = None):
         super().__init__(config)
+        # Clients built by ProviderRegistry are shared by every model on the same key
+        self.client = client or self.build_client(config)
+    
+    @staticmethod
+    def build_client(config: ModelConfig) -> Any:
         # Import here to make it optional
         try:
             import anthropic
-            self.client = anthropic.AsyncAnthropic(api_key=config.api_key)
         except ImportError:
             raise ImportError("anthropic package required for Anthropic provider")
+        return anthropic.AsyncAnthropic(api_key=config.api_key)
     
+    def _request_kwargs(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Convert messages format for Anthropic"""
+        system_parts = []
+        claude_messages = []
+        
+        for msg in messages:
+            if msg["role"] == "system":
+                system_parts.append(msg["content"])
+            else:
+                claude_messages.append(msg)
+        system_message = "\n\n".join(system_parts)
+        
+        kwargs = {
+            "model": self.config.model_name,
+            "max_tokens": self.config.max_tokens,
+            "temperature": self.config.temperature,
+            "messages": claude_messages
+        }
+        
+        if system_message:
+            kwargs["system"] = system_message
+        
+        if tools:
+            kwargs["tools"] = self.format_tools_for_provider(tools)
+        
+        return kwargs
+    
+    @observed_completion
+    @cached_completion
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
@@ -1016,30 +1214,7 @@ class AnthropicProvider(BaseAIProvider):
         """Generate chat completion with Anthropic Claude"""
         
         try:
-            # Convert messages format for Anthropic
-            system_message = ""
-            claude_messages = []
-            
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_message = msg["content"]
-                else:
-                    claude_messages.append(msg)
-            
-            kwargs = {
-                "model": self.config.model_name,
-                "max_tokens": self.config.max_tokens,
-                "temperature": self.config.temperature,
-                "messages": claude_messages
-            }
-            
-            if system_message:
-                kwargs["system"] = system_message
-            
-            if tools:
-                kwargs["tools"] = self.format_tools_for_provider(tools)
-            
-            response = await self.client.messages.create(**kwargs)
+            response = await self.client.messages.create(**self._request_kwargs(messages, tools))
             
             # Extract tool calls if any
             tool_calls = []
@@ -1060,7 +1235,8 @@ class AnthropicProvider(BaseAIProvider):
                 "content": content,
                 "tool_calls": tool_calls if tool_calls else None,
                 "provider": "anthropic",
-                "model": self.config.model_name
+                "model": self.config.model_name,
+                "usage": _usage(response.usage.input_tokens, response.usage.output_tokens) if getattr(response, "usage", None) else None
             }
             
         except Exception as e:
@@ -1071,6 +1247,63 @@ class AnthropicProvider(BaseAIProvider):
                 "error": str(e)
             }
     
+    @observed_stream
+    @cached_stream
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        tools: List[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream with Anthropic; tool_use input arrives as partial JSON until its block stops"""
+        content_parts: List[str] = []
+        tool_calls: List[Dict[str, Any]] = []
+        open_blocks: Dict[int, Dict[str, Any]] = {}
+        prompt_tokens = completion_tokens = None
+        
+        try:
+            stream = await self.client.messages.create(**self._request_kwargs(messages, tools), stream=True)
+            async for event in stream:
+                if event.type == "message_start":
+                    prompt_tokens = event.message.usage.input_tokens
+                elif event.type == "message_delta" and getattr(event, "usage", None):
+                    completion_tokens = event.usage.output_tokens
+                elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+                    open_blocks[event.index] = {"name": event.content_block.name, "json": []}
+                elif event.type == "content_block_delta":
+                    if event.delta.type == "text_delta":
+                        content_parts.append(event.delta.text)
+                        yield {"type": "token", "content": event.delta.text}
+                    elif event.delta.type == "input_json_delta" and event.index in open_blocks:
+                        open_blocks[event.index]["json"].append(event.delta.partial_json)
+                elif event.type == "content_block_stop" and event.index in open_blocks:
+                    block = open_blocks.pop(event.index)
+                    tool_call = {
+                        "function": {
+                            "name": block["name"],
+                            "arguments": "".join(block["json"]) or "{}"
+                        }
+                    }
+                    tool_calls.append(tool_call)
+                    yield {"type": "tool_call", "tool_call": tool_call}
+            
+            yield {
+                "type": "done",
+                "content": "".join(content_parts),
+                "tool_calls": tool_calls or None,
+                "provider": "anthropic",
+                "model": self.config.model_name,
+                "usage": _usage(prompt_tokens, completion_tokens)
+            }
+            
+        except Exception as e:
+            yield {
+                "type": "done",
+                "content": "".join(content_parts) or f"Sorry, I encountered an error: {str(e)}",
+                "tool_calls": None,
+                "provider": "anthropic",
+                "error": str(e)
+            }
+    
     def format_tools_for_provider(self, tools: List[Dict[str, Any]]) -> Any:
         """Format tools for Anthropic's format"""
         formatted_tools = []
@@ -1092,6 +1325,7 @@ class MockAIProvider(BaseAIProvider):
     def __init__(self, config: ModelConfig):
         super().__init__(config)
     
+    @observed_completion
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
@@ -1111,17 +1345,85 @@ class MockAIProvider(BaseAIProvider):
         """Mock provider can handle any tool format"""
         return tools
 
+PROVIDER_CLASSES = {
+    "mock": MockAIProvider,
+    "ollama": OllamaProvider,
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider
+}
+
+class ProviderRegistry:
+    """One warm provider per model config, reused across chat turns.
+
+    Providers hold no per-request state, so concurrent turns can share one.
+    A provider is rebuilt only when its config changes. OpenAI and Anthropic
+    SDK clients, each with its own connection pool, are shared by every model
+    using the same API key and endpoint; Ollama already shares ollama_clients.
+    """
+
+    def __init__(self):
+        self._providers: Dict[tuple, tuple] = {}  # model identity -> (config fingerprint, provider)
+        self._clients: Dict[tuple, Any] = {}
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, config: ModelConfig, response_cache: Optional[ResponseCache] = None) -> BaseAIProvider:
+        identity = (config.provider, config.model_name, config.endpoint_url)
+        fingerprint = tuple(vars(config).values())
+        entry = self._providers.get(identity)
+        if entry and entry[0] == fingerprint and entry[1].response_cache is response_cache:
+            self.hits += 1
+            return entry[1]
+
+        provider_class = PROVIDER_CLASSES.get(config.provider)
+        if provider_class is None:
+            raise ValueError(f"Unknown provider: {config.provider}")
+        if hasattr(provider_class, "build_client"):
+            client_key = (config.provider, config.endpoint_url, config.api_key)
+            if client_key not in self._clients:
+                self._clients[client_key] = provider_class.build_client(config)
+            provider = provider_class(config, client=self._clients[client_key])
+        else:
+            provider = provider_class(config)
+        provider.response_cache = response_cache
+        self._providers[identity] = (fingerprint, provider)
+        self.builds += 1
+        return provider
+
+    def stats(self) -> Dict[str, int]:
+        return {"providers": len(self._providers), "clients": len(self._clients), "builds": self.builds, "hits": self.hits}
+
+    async def aclose(self):
+        """Close the shared SDK clients; called on application shutdown"""
+        clients = list(self._clients.values())
+        self._providers.clear()
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                logging.warning(f"Closing AI client failed: {e}")
+
 class AIProviderManager:
     """Manages different AI providers and configurations"""
     
     def __init__(self):
-        self.providers = {}
+        self.providers = ProviderRegistry()
         self.default_configs = self._get_default_configs()
         self.current_config = self._load_current_config()
         self.ollama_endpoint = os.getenv("OLLAMA_ENDPOINT", "http://host.docker.internal:11434")
-        # Cache for Ollama models to avoid repeated API calls
-        self._ollama_models_cache = None
-        self._ollama_cache_time = 0
+        # Ollama models found by background discovery; request paths only read this snapshot
+        self.discovery_interval = float(os.getenv("OLLAMA_DISCOVERY_INTERVAL", "30"))
+        self._ollama_models: Dict[str, ModelConfig] = {}
+        self._ollama_refreshed_at = 0.0
+        self._ollama_attempted_at = 0.0
+        self._ollama_error: Optional[str] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._discovery_task: Optional[asyncio.Task] = None
+        # Model selected but still warming up (see set_current_model)
+        self.pending_model: Optional[str] = None
+        # Shared by every provider this manager creates
+        self.response_cache = ResponseCache.from_env()
     
     def _get_default_configs(self) -> Dict[str, ModelConfig]:
         """Get default model configurations"""
@@ -1200,30 +1502,54 @@ class AIProviderManager:
             if not all_models:
                 raise ValueError("No AI models configured or available")
             config = list(all_models.values())[0]
-            self.current_config = list(all_models.keys())[0]
+            # Keep an Ollama selection until discovery has had a chance to find it
+            if not (self.current_config.startswith("ollama_") and not self._ollama_refreshed_at):
+                self.current_config = list(all_models.keys())[0]
         
         return self._create_provider(config)
     
     def _create_provider(self, config: ModelConfig) -> BaseAIProvider:
-        """Create provider instance for given config"""
-        if config.provider == "mock":
-            return MockAIProvider(config)
-        elif config.provider == "ollama":
-            return OllamaProvider(config)
-        elif config.provider == "openai":
-            return OpenAIProvider(config)
-        elif config.provider == "anthropic":
-            return AnthropicProvider(config)
-        else:
-            raise ValueError(f"Unknown provider: {config.provider}")
+        """Warm provider instance for given config (see ProviderRegistry)"""
+        return self.providers.get(config, self.response_cache)
     
-    def set_current_model(self, model_key: str) -> bool:
-        """Set the current model"""
+    def set_current_model(self, model_key: str, warm_first: bool = True) -> bool:
+        """
+        Set the current model. An Ollama model that isn't loaded yet is warmed in
+        the background and traffic moves to it once it is; pass warm_first=False
+        to switch immediately.
+        """
         all_models = self.get_available_models()
-        if model_key in all_models and all_models[model_key].enabled:
+        if model_key not in all_models or not all_models[model_key].enabled:
+            return False
+        config = all_models[model_key]
+        self.pending_model = None
+        if warm_first and config.provider == "ollama" and not model_residency.is_loaded(config.endpoint_url, config.model_name):
+            try:
+                asyncio.get_running_loop().create_task(self._switch_when_warm(model_key, config))
+                self.pending_model = model_key
+                return True
+            except RuntimeError:
+                pass  # no event loop to warm on; switch straight away
+        self.current_config = model_key
+        return True
+
+    async def _switch_when_warm(self, model_key: str, config: ModelConfig):
+        warmed = await model_residency.warm(config.endpoint_url, config.model_name)
+        if self.pending_model != model_key:
+            return  # another model was selected meanwhile
+        self.pending_model = None
+        if warmed:
             self.current_config = model_key
-            return True
-        return False
+            logging.info(f"Switched AI model to {model_key} after warm-up")
+        else:
+            logging.warning(f"Kept AI model {self.current_config}: {model_key} failed to load")
+
+    def current_ollama_target(self) -> Optional[tuple]:
+        """(endpoint, model) to keep resident, if the current model runs on Ollama"""
+        config = self.get_current_model_config()
+        if config and config.provider == "ollama":
+            return config.endpoint_url, config.model_name
+        return None
     
     async def test_provider(self, model_key: str) -> Dict[str, Any]:
         """Test if a provider is working with progressive testing and detailed diagnostics"""
@@ -1283,58 +1609,85 @@ class AIProviderManager:
             }
 
     def _get_ollama_models(self) -> Dict[str, ModelConfig]:
-        """Discover available Ollama models dynamically"""
-        current_time = time.time()
-        
-        # Use cache if it's less than 30 seconds old
-        if (self._ollama_models_cache is not None and 
-            current_time - self._ollama_cache_time < 30):
-            return self._ollama_models_cache
-        
-        models = {}
-        
+        """Last discovered Ollama models; a stale snapshot is returned as is and refreshed in the background"""
+        if time.time() - self._ollama_attempted_at >= self.discovery_interval:
+            self._schedule_refresh()
+        return self._ollama_models
+
+    def _schedule_refresh(self):
+        if self._refresh_task and not self._refresh_task.done():
+            return
         try:
-            # Query Ollama API for available models
-            response = httpx.get(f"{self.ollama_endpoint}/api/tags", timeout=5.0)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                for model_info in data.get("models", []):
-                    model_name = model_info.get("name", "")
-                    if model_name:
-                        # Create a safe key for the model
-                        safe_key = f"ollama_{model_name.replace(':', '_').replace('/', '_')}"
-                        
-                        # Determine temperature based on model type
-                        temperature = 0.3 if "code" in model_name.lower() else 0.7
-                        
-                        models[safe_key] = ModelConfig(
-                            provider="ollama",
-                            model_name=model_name,
-                            endpoint_url=self.ollama_endpoint,
-                            max_tokens=500,
-                            temperature=temperature,
-                            enabled=True
-                        )
-                        
-                # Update cache
-                self._ollama_models_cache = models
-                self._ollama_cache_time = current_time
-                
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh_ollama_models())
+        except RuntimeError:
+            pass  # no event loop (scripts, sync tests); the snapshot stays as it is
+
+    async def _fetch_ollama_tags(self) -> List[Dict[str, Any]]:
+        client = ollama_clients.get(self.ollama_endpoint)
+        response = await client.get(f"{self.ollama_endpoint}/api/tags", timeout=ollama_clients.probe_timeout)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+    async def refresh_ollama_models(self) -> Dict[str, ModelConfig]:
+        """Query Ollama for its models now; on failure the previous snapshot is kept"""
+        self._ollama_attempted_at = time.time()
+        try:
+            tags = await self._fetch_ollama_tags()
         except Exception as e:
-            # If Ollama is not available, just return empty dict
-            # Don't raise an error as other providers might still work
-            print(f"Could not connect to Ollama at {self.ollama_endpoint}: {e}")
-            models = {}
-        
+            # Other providers may still work, so this is not an error for callers
+            self._ollama_error = str(e) or type(e).__name__
+            logging.warning(f"Could not refresh Ollama models from {self.ollama_endpoint}: {self._ollama_error}")
+            return self._ollama_models
+
+        models = {}
+        for model_info in tags:
+            model_name = model_info.get("name", "")
+            if model_name:
+                # Create a safe key for the model
+                safe_key = f"ollama_{model_name.replace(':', '_').replace('/', '_')}"
+                models[safe_key] = ModelConfig(
+                    provider="ollama",
+                    model_name=model_name,
+                    endpoint_url=self.ollama_endpoint,
+                    max_tokens=500,
+                    temperature=0.3 if "code" in model_name.lower() else 0.7,
+                    enabled=True
+                )
+        self._ollama_models = models
+        self._ollama_refreshed_at = time.time()
+        self._ollama_error = None
         return models
-    
-    def refresh_ollama_models(self) -> Dict[str, ModelConfig]:
-        """Force refresh of Ollama models cache"""
-        self._ollama_models_cache = None
-        self._ollama_cache_time = 0
-        return self._get_ollama_models()
+
+    async def start_model_discovery(self):
+        """Discover Ollama models once, then keep refreshing them on an interval"""
+        if self._discovery_task and not self._discovery_task.done():
+            return
+        await self.refresh_ollama_models()
+        self._discovery_task = asyncio.create_task(self._discover())
+
+    async def _discover(self):
+        while True:
+            await asyncio.sleep(self.discovery_interval)
+            await self.refresh_ollama_models()
+
+    async def stop_model_discovery(self):
+        for task in (self._discovery_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._discovery_task = self._refresh_task = None
+
+    def model_discovery_status(self) -> Dict[str, Any]:
+        return {
+            "models": len(self._ollama_models),
+            "refreshed_at": datetime.fromtimestamp(self._ollama_refreshed_at).isoformat() if self._ollama_refreshed_at else None,
+            "stale": time.time() - self._ollama_refreshed_at > 2 * self.discovery_interval,
+            "error": self._ollama_error,
+            "running": bool(self._discovery_task and not self._discovery_task.done())
+        }
 
 # Global manager instance
 ai_manager = AIProviderManager() 
\ No newline at end of file
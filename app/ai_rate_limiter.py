@@ -0,0 +1,270 @@
+"""
+Rate limiting and fair share for the AI endpoints
+
+Every model call ends up in the same Ollama queue, so one user sending
+messages in a loop slowed chat down for everyone. Requests to the /api/ai
+routes that call a model (MODEL_ROUTES) now pass through token buckets, one per user and one per client IP: a bucket
+holds up to `burst` requests and refills at `rate` per second, so short
+bursts go through while sustained floods are turned away with a 429 and a
+Retry-After header. A per-user concurrency cap bounds how many AI requests
+(streams included) one user can have open at a time. Status polls, health
+checks and admin metrics never reach a model and are not limited, so polling
+can't use up the budget meant for chat.
+
+State lives in memory by default. With AI_RATE_LIMIT_BACKEND=redis the
+buckets and counters are kept in Redis so every uvicorn worker shares them;
+if Redis can't be reached requests are let through rather than refused.
+"""
+
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# (method, path under the prefix) of the routes that call a model
+MODEL_ROUTES = (
+    ("POST", r"/chat/start"),
+    ("POST", r"/chat/new"),
+    ("GET", r"/chat/init"),
+    ("POST", r"/chat/[^/]+/message"),
+    ("POST", r"/chat/message"),
+    ("GET", r"/chat/stream/\d+"),
+    ("POST", r"/test-dynamic-connection"),
+    ("POST", r"/jobs/model-tests"),
+)
+
+
+class MemoryBackend:
+    """Buckets and counters for a single process"""
+
+    def __init__(self):
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.active: Dict[str, int] = {}
+
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """Take one token; returns 0 when allowed, else seconds until a token is available"""
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets[key] = (tokens, now)
+        return wait
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        if self.active.get(key, 0) >= limit:
+            return False
+        self.active[key] = self.active.get(key, 0) + 1
+        return True
+
+    async def release(self, key: str):
+        count = self.active.get(key, 0) - 1
+        if count > 0:
+            self.active[key] = count
+        else:
+            self.active.pop(key, None)
+
+
+# Refill and take in one round trip, so workers racing on a bucket can't both spend its last token
+_TAKE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Buckets and counters shared by every app worker; needs the optional redis package"""
+
+    prefix = "ai-rate:"
+    # A worker that dies mid-request can't release its slot; the counter expires instead
+    active_ttl = 600
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency
+        self.client = redis.from_url(url)
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        wait = await self._take(keys=[self.prefix + key], args=[rate, burst, now])
+        return float(wait.decode() if isinstance(wait, bytes) else wait)
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        key = self.prefix + "active:" + key
+        async with self.client.pipeline(transaction=True) as pipe:
+            count, _ = await pipe.incr(key).expire(key, self.active_ttl).execute()
+        if count > limit:
+            await self.client.decr(key)
+            return False
+        return True
+
+    async def release(self, key: str):
+        await self.client.decr(self.prefix + "active:" + key)
+
+
+class AIRateLimiter:
+    """Per-user and per-IP token buckets plus a per-user concurrency cap"""
+
+    def __init__(
+        self,
+        user_rate: float = 0.5,
+        user_burst: float = 10,
+        ip_rate: float = 2.0,
+        ip_burst: float = 40,
+        max_concurrent: int = 2,
+        backend: Optional[Any] = None,
+        enabled: bool = True
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.max_concurrent = max_concurrent
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+        self.metrics = {"allowed": 0, "limited_user": 0, "limited_ip": 0, "limited_concurrency": 0, "backend_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "AIRateLimiter":
+        backend = None
+        if os.getenv("AI_RATE_LIMIT_BACKEND", "memory").lower() == "redis":
+            try:
+                backend = RedisBackend(os.getenv("REDIS_URL", "redis://redis:6379"))
+            except Exception as e:
+                logger.warning(f"AI rate limiter: redis backend unavailable, limiting per worker ({e})")
+        return cls(
+            user_rate=float(os.getenv("AI_RATE_LIMIT_USER_PER_MINUTE", "30")) / 60,
+            user_burst=float(os.getenv("AI_RATE_LIMIT_USER_BURST", "10")),
+            ip_rate=float(os.getenv("AI_RATE_LIMIT_IP_PER_MINUTE", "120")) / 60,
+            ip_burst=float(os.getenv("AI_RATE_LIMIT_IP_BURST", "40")),
+            max_concurrent=int(os.getenv("AI_MAX_CONCURRENT_PER_USER", "2")),
+            backend=backend,
+            enabled=os.getenv("AI_RATE_LIMIT_ENABLED", "true").lower() == "true"
+        )
+
+    async def check(self, user_id: Optional[int], ip: str) -> Optional[Tuple[str, int]]:
+        """Spend this request's tokens; returns (reason, retry_after seconds) when it's refused"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            wait = await self.backend.take(f"ip:{ip}", self.ip_rate, self.ip_burst, now)
+            if wait:
+                self.metrics["limited_ip"] += 1
+                return "Too many AI requests from this address", math.ceil(wait)
+            if user_id is not None:
+                wait = await self.backend.take(f"user:{user_id}", self.user_rate, self.user_burst, now)
+                if wait:
+                    self.metrics["limited_user"] += 1
+                    return "Too many AI requests, please slow down", math.ceil(wait)
+        except Exception as e:
+            # Redis hiccups shouldn't take chat down with them
+            self.metrics["backend_errors"] += 1
+            logger.warning(f"AI rate limiter: bucket check failed, allowing request ({e})")
+        return None
+
+    async def acquire(self, owner: str) -> bool:
+        """Claim one of the owner's concurrent request slots"""
+        if not self.enabled:
+            return True
+        try:
+            if not await self.backend.acquire(owner, self.max_concurrent):
+                self.metrics["limited_concurrency"] += 1
+                return False
+        except Exception as e:
+            self.metrics["backend_errors"] += 1
+            logger.warning(f"AI rate limiter: concurrency check failed, allowing request ({e})")
+            return True
+        self.metrics["allowed"] += 1
+        return True
+
+    async def release(self, owner: str):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.release(owner)
+        except Exception as e:
+            self.metrics["backend_errors"] += 1
+            logger.warning(f"AI rate limiter: could not release slot for {owner} ({e})")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "user_per_minute": round(self.user_rate * 60, 2),
+            "user_burst": self.user_burst,
+            "ip_per_minute": round(self.ip_rate * 60, 2),
+            "ip_burst": self.ip_burst,
+            "max_concurrent_per_user": self.max_concurrent,
+            **self.metrics
+        }
+
+
+ai_rate_limiter = AIRateLimiter.from_env()
+
+
+class AIRateLimitMiddleware:
+    """
+    Applies the AI rate limiter to the `routes` under `prefix`.
+
+    Plain ASGI rather than BaseHTTPMiddleware so the concurrency slot is held
+    until a streamed reply has finished, not just until its headers are sent.
+    Add it before UserContextMiddleware so request.state.user is already set.
+    """
+
+    def __init__(
+        self,
+        app,
+        prefix: str = "/api/ai",
+        limiter: Optional[AIRateLimiter] = None,
+        routes: Iterable[Tuple[str, str]] = MODEL_ROUTES
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.limiter = limiter
+        self.routes = [(method, re.compile(re.escape(prefix) + path + "/?")) for method, path in routes]
+
+    def limits(self, scope) -> bool:
+        return scope["type"] == "http" and any(
+            scope["method"] == method and pattern.fullmatch(scope["path"]) for method, pattern in self.routes
+        )
+
+    async def __call__(self, scope, receive, send):
+        if not self.limits(scope):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter or ai_rate_limiter
+        user = scope.get("state", {}).get("user")
+        user_id = getattr(user, "id", None)
+        ip = scope["client"][0] if scope.get("client") else "unknown"
+
+        refused = await limiter.check(user_id, ip)
+        if refused is None:
+            owner = f"user:{user_id}" if user_id is not None else f"ip:{ip}"
+            if await limiter.acquire(owner):
+                try:
+                    await self.app(scope, receive, send)
+                finally:
+                    await limiter.release(owner)
+                return
+            refused = ("Too many AI requests in progress, wait for one to finish", 1)
+
+        detail, retry_after = refused
+        response = JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(retry_after)})
+        await response(scope, receive, send)
@@ -0,0 +1,299 @@
+"""
+Response cache for AI provider calls
+
+Completions are keyed by (provider, model, normalized messages, tools hash,
+temperature, max_tokens). A sampled reply at temperature 0.7 is one draw out
+of many, so by default only calls at or below AI_CACHE_MAX_TEMPERATURE are
+cached; callers with fixed prompts where any recent reply will do (greetings)
+can opt in explicitly with reuse_responses().
+
+Entries live in an in-process LRU, optionally backed by SQLite or Redis so
+they survive restarts and are shared between workers.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_reuse_ttl: ContextVar[Optional[float]] = ContextVar("ai_cache_reuse_ttl", default=None)
+
+
+@contextmanager
+def reuse_responses(ttl: float = 3600):
+    """Allow cached replies for calls in this block regardless of temperature"""
+    token = _reuse_ttl.set(ttl)
+    try:
+        yield
+    finally:
+        _reuse_ttl.reset(token)
+
+
+class MemoryLRU:
+    """Bounded in-process store with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """Persistent store in a local SQLite file; calls run off the event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM ai_response_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, expires_at: float):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ai_response_cache WHERE expires_at < ?", (time.time(),))
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+    def _clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ai_response_cache")
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, expires_at: float):
+        await asyncio.to_thread(self._set, key, value, expires_at)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+
+class RedisStore:
+    """Persistent store shared by every app worker; needs the optional redis package"""
+
+    prefix = "ai-cache:"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, expires_at: float):
+        await self.client.set(self.prefix + key, value, ex=max(1, int(expires_at - time.time())))
+
+    async def clear(self):
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+def _normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop fields that don't reach the model and whitespace that doesn't change the prompt"""
+    normalized = []
+    for message in messages:
+        entry = {"role": message.get("role"), "content": " ".join(str(message.get("content") or "").split())}
+        if message.get("tool_calls"):
+            entry["tool_calls"] = message["tool_calls"]
+        normalized.append(entry)
+    return normalized
+
+
+class ResponseCache:
+    """LRU response cache with optional persistence, TTLs and hit/miss metrics"""
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 512,
+        max_temperature: float = 0.2,
+        store: Optional[Any] = None,
+        enabled: bool = True
+    ):
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+        self.memory = MemoryLRU(max_entries)
+        self.store = store
+        self.metrics = {"hits": 0, "store_hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "store_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        backend = os.getenv("AI_CACHE_BACKEND", "memory").lower()
+        store = None
+        try:
+            if backend == "sqlite":
+                store = SQLiteStore(os.getenv("AI_CACHE_SQLITE_PATH", "./ai_response_cache.db"))
+            elif backend == "redis":
+                store = RedisStore(os.getenv("REDIS_URL", "redis://redis:6379"))
+        except Exception as e:
+            logger.warning(f"AI response cache: {backend} backend unavailable, using memory only ({e})")
+        return cls(
+            ttl=float(os.getenv("AI_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "512")),
+            max_temperature=float(os.getenv("AI_CACHE_MAX_TEMPERATURE", "0.2")),
+            store=store,
+            enabled=os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+        )
+
+    def key_for(self, config, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+        """Cache key for a call, or None when the call must go to the model"""
+        if not self.enabled or (config.temperature > self.max_temperature and _reuse_ttl.get() is None):
+            self.metrics["bypassed"] += 1
+            return None
+        tools_hash = hashlib.sha256(json.dumps(tools or [], sort_keys=True, default=str).encode()).hexdigest()
+        material = json.dumps({
+            "provider": config.provider,
+            "model": config.model_name,
+            "messages": _normalize_messages(messages),
+            "tools": tools_hash,
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.metrics["hits"] += 1
+            return value
+        if self.store is not None:
+            try:
+                raw = await self.store.get(key)
+            except Exception as e:
+                self.metrics["store_errors"] += 1
+                logger.warning(f"AI response cache read failed: {e}")
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                self.memory.set(key, value, time.time() + self._ttl())
+                self.metrics["store_hits"] += 1
+                return value
+        self.metrics["misses"] += 1
+        return None
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        """Keep successful results only; errors and timeouts should be retried"""
+        if result.get("error") or result.get("success") is False:
+            return
+        try:
+            raw = json.dumps(result)
+        except (TypeError, ValueError):
+            # SDK objects in tool_calls (OpenAI) aren't worth a custom encoder
+            return
+        expires_at = time.time() + self._ttl()
+        self.memory.set(key, json.loads(raw), expires_at)
+        self.metrics["stored"] += 1
+        if self.store is not None:
+            try:
+                await self.store.set(key, raw, expires_at)
+            except Exception as e:
+                self.metrics["store_errors"] += 1
+                logger.warning(f"AI response cache write failed: {e}")
+
+    def _ttl(self) -> float:
+        return _reuse_ttl.get() or self.ttl
+
+    async def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            await self.store.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["store_hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "enabled": self.enabled,
+            "backend": type(self.store).__name__ if self.store else "memory",
+            "entries": len(self.memory),
+            "max_temperature": self.max_temperature,
+            "hit_rate": round((self.metrics["hits"] + self.metrics["store_hits"]) / lookups, 3) if lookups else None
+        }
+
+
+def cached_completion(method):
+    """Serve a provider's chat_completion from its response cache when allowed"""
+    @functools.wraps(method)
+    async def wrapper(provider, messages, tools=None):
+        cache = provider.response_cache
+        key = cache.key_for(provider.config, messages, tools) if cache else None
+        if key is None:
+            return await method(provider, messages, tools)
+        cached = await cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+        result = await method(provider, messages, tools)
+        await cache.set(key, result)
+        return result
+    return wrapper
+
+
+def cached_stream(method):
+    """Streaming counterpart of cached_completion; a hit replays as one token"""
+    @functools.wraps(method)
+    async def wrapper(provider, messages, tools=None):
+        cache = provider.response_cache
+        key = cache.key_for(provider.config, messages, tools) if cache else None
+        if key is None:
+            async for event in method(provider, messages, tools):
+                yield event
+            return
+        cached = await cache.get(key)
+        if cached is not None:
+            if cached.get("content"):
+                yield {"type": "token", "content": cached["content"]}
+            for tool_call in cached.get("tool_calls") or []:
+                yield {"type": "tool_call", "tool_call": tool_call}
+            yield {"type": "done", **cached, "cached": True}
+            return
+        async for event in method(provider, messages, tools):
+            if event["type"] == "done":
+                await cache.set(key, {k: v for k, v in event.items() if k != "type"})
+            yield event
+    return wrapper
@@ -0,0 +1,380 @@
+"""
+Telemetry for AI provider calls and tool executions
+
+Every chat_completion / stream_chat_completion is wrapped by observed_completion
+or observed_stream, which record queue wait (time spent waiting for an
+inference slot), time to first token, total latency, prompt and completion
+tokens, the number of tool calls the model made and the class of any error.
+Tool executions are timed with ai_telemetry.tool(). Samples are aggregated
+per provider/model (and per tool) into fixed-bucket histograms, so memory
+stays flat however long the process runs.
+
+A chat turn opens ai_telemetry.turn(); every call and tool run inside it,
+including ones in tasks spawned from it, is also collected there so the chat
+service can store the turn's metrics on the assistant message.
+
+Token prices (USD per million tokens) come from AI_MODEL_PRICES as
+"model=input/output,...", matched on the longest model-name prefix; local
+Ollama models cost nothing.
+"""
+
+import bisect
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000, 300000)
+COST_BUCKETS_USD = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+DEFAULT_PRICES = "gpt-4o-mini=0.15/0.60,gpt-4o=2.50/10,gpt-4=30/60,gpt-3.5-turbo=0.50/1.50,claude-3-sonnet=3/15,claude-3-5-sonnet=3/15,claude-3-haiku=0.25/1.25,claude-3-opus=15/75"
+
+# The call being measured in this task, so the scheduler can report its queue wait
+_current_call: ContextVar[Optional[Dict[str, Any]]] = ContextVar("ai_telemetry_call", default=None)
+_current_turn: ContextVar[Optional["TurnMetrics"]] = ContextVar("ai_telemetry_turn", default=None)
+_current_route: ContextVar[str] = ContextVar("ai_telemetry_route", default="direct")
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are interpolated within the bucket"""
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.max
+                lower = self.bounds[index - 1] if index else 0.0
+                estimate = lower + (self.bounds[index] - lower) * (rank - seen) / count
+                return min(estimate, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self, digits: int = 1) -> Dict[str, Any]:
+        def rounded(value):
+            return round(value, digits) if value is not None else None
+        return {
+            "count": self.count,
+            "mean": rounded(self.total / self.count) if self.count else None,
+            "p50": rounded(self.percentile(0.50)),
+            "p95": rounded(self.percentile(0.95)),
+            "max": rounded(self.max)
+        }
+
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for part in spec.split(","):
+        model, _, price = part.partition("=")
+        prompt, _, completion = price.partition("/")
+        if model.strip() and prompt.strip():
+            prices[model.strip()] = (float(prompt), float(completion or prompt))
+    return prices
+
+
+def error_class(error: Any) -> Optional[str]:
+    """Coarse error label: the exception type, or a guess from a provider's error string"""
+    if not error:
+        return None
+    if isinstance(error, BaseException):
+        return type(error).__name__
+    text = str(error).lower()
+    if "timeout" in text or "timed out" in text:
+        return "Timeout"
+    if "queue" in text:
+        return "QueueFull"
+    if "no real ai provider" in text:
+        return "NoProvider"
+    if "http" in text or "returned" in text or "status" in text:
+        return "HTTPError"
+    return "ProviderError"
+
+
+class TurnMetrics:
+    """Calls and tool runs made while answering one chat message"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.calls: List[Dict[str, Any]] = []
+        self.tools: List[Dict[str, Any]] = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": round((time.monotonic() - self.started) * 1000, 1),
+            "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in self.calls),
+            "completion_tokens": sum(call["completion_tokens"] or 0 for call in self.calls),
+            "cost_usd": round(sum(call["cost_usd"] for call in self.calls), 6),
+            "calls": list(self.calls),
+            "tools": list(self.tools)
+        }
+
+
+class _ModelSeries:
+    def __init__(self):
+        self.calls = 0
+        self.cached = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.errors: Dict[str, int] = {}
+        self.routes: Dict[str, int] = {}
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.ttft_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.queue_wait_ms = Histogram(LATENCY_BUCKETS_MS)
+
+
+class _ToolSeries:
+    def __init__(self):
+        self.calls = 0
+        self.errors: Dict[str, int] = {}
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+
+
+class AITelemetry:
+    """Aggregates call and tool metrics per provider/model and per tool"""
+
+    def __init__(self, prices: Optional[str] = None):
+        self.prices = _parse_prices(prices if prices is not None else os.getenv("AI_MODEL_PRICES") or DEFAULT_PRICES)
+        self.reset()
+
+    def reset(self):
+        """Drop every sample, e.g. between benchmark runs"""
+        self.models: Dict[Tuple[str, str], _ModelSeries] = {}
+        self.tools: Dict[str, _ToolSeries] = {}
+        self.events_created = 0
+        self.event_cost_usd = 0.0
+        self.cost_per_event = Histogram(COST_BUCKETS_USD)
+
+    def price(self, provider: str, model: str) -> Tuple[float, float]:
+        if provider in ("ollama", "mock"):
+            return 0.0, 0.0
+        matches = [name for name in self.prices if model.startswith(name)]
+        return self.prices[max(matches, key=len)] if matches else (0.0, 0.0)
+
+    # ----- recording -----
+
+    def start_call(self, provider: str, model: str) -> Dict[str, Any]:
+        return {
+            "provider": provider, "model": model, "route": _current_route.get(),
+            "queue_wait_ms": None, "ttft_ms": None, "latency_ms": None,
+            "prompt_tokens": None, "completion_tokens": None, "tool_calls": 0,
+            "cached": False, "error": None, "cost_usd": 0.0, "_started": time.monotonic()
+        }
+
+    def mark_first_token(self, record: Dict[str, Any]):
+        if record["ttft_ms"] is None:
+            record["ttft_ms"] = round((time.monotonic() - record["_started"]) * 1000, 1)
+
+    def finish_call(self, record: Dict[str, Any], result: Optional[Dict[str, Any]] = None, error: Any = None):
+        """Aggregate a call started with start_call, from its result dict or the exception it raised"""
+        record["latency_ms"] = round((time.monotonic() - record.pop("_started")) * 1000, 1)
+        record["error"] = error_class(error)
+        self._finish(record, result)
+
+    def _finish(self, record: Dict[str, Any], result: Optional[Dict[str, Any]]):
+        if result is not None:
+            usage = result.get("usage") or {}
+            record["cached"] = bool(result.get("cached"))
+            record["tool_calls"] = len(result.get("tool_calls") or [])
+            record["error"] = record["error"] or error_class(result.get("error"))
+            if not record["cached"]:
+                record["prompt_tokens"] = usage.get("prompt_tokens")
+                record["completion_tokens"] = usage.get("completion_tokens")
+                prompt_price, completion_price = self.price(record["provider"], record["model"])
+                record["cost_usd"] = round(
+                    ((record["prompt_tokens"] or 0) * prompt_price + (record["completion_tokens"] or 0) * completion_price) / 1e6, 6
+                )
+
+        series = self.models.setdefault((record["provider"], record["model"]), _ModelSeries())
+        series.calls += 1
+        series.cached += record["cached"]
+        series.tool_calls += record["tool_calls"]
+        series.prompt_tokens += record["prompt_tokens"] or 0
+        series.completion_tokens += record["completion_tokens"] or 0
+        series.cost_usd += record["cost_usd"]
+        series.routes[record["route"]] = series.routes.get(record["route"], 0) + 1
+        if record["error"]:
+            series.errors[record["error"]] = series.errors.get(record["error"], 0) + 1
+        series.latency_ms.observe(record["latency_ms"])
+        if record["ttft_ms"] is not None:
+            series.ttft_ms.observe(record["ttft_ms"])
+        if record["queue_wait_ms"] is not None:
+            series.queue_wait_ms.observe(record["queue_wait_ms"])
+
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.calls.append(record)
+
+    @contextmanager
+    def tool(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Time one tool execution; set "error" on the record for failures that don't raise"""
+        record = {"tool": name, "latency_ms": None, "error": None}
+        started = time.monotonic()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = error_class(e)
+            raise
+        finally:
+            record["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+            series = self.tools.setdefault(name, _ToolSeries())
+            series.calls += 1
+            series.latency_ms.observe(record["latency_ms"])
+            if record["error"]:
+                series.errors[record["error"]] = series.errors.get(record["error"], 0) + 1
+            turn = _current_turn.get()
+            if turn is not None:
+                turn.tools.append(record)
+
+    @contextmanager
+    def turn(self) -> Iterator[TurnMetrics]:
+        """Collect the calls and tool runs of one chat turn"""
+        metrics = TurnMetrics()
+        token = _current_turn.set(metrics)
+        try:
+            yield metrics
+        finally:
+            _current_turn.reset(token)
+
+    def record_event_created(self, cost_usd: float):
+        """An event was created from a chat whose model calls cost `cost_usd` in total"""
+        self.events_created += 1
+        self.event_cost_usd += cost_usd
+        self.cost_per_event.observe(cost_usd)
+
+    # ----- reporting -----
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "models": {
+                f"{provider}/{model}": {
+                    "provider": provider,
+                    "model": model,
+                    "calls": series.calls,
+                    "cached": series.cached,
+                    "errors": dict(series.errors),
+                    "error_rate": round(sum(series.errors.values()) / series.calls, 3) if series.calls else 0.0,
+                    "routes": dict(series.routes),
+                    "tool_calls": series.tool_calls,
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "cost_usd": round(series.cost_usd, 6),
+                    "latency_ms": series.latency_ms.snapshot(),
+                    "ttft_ms": series.ttft_ms.snapshot(),
+                    "queue_wait_ms": series.queue_wait_ms.snapshot()
+                }
+                for (provider, model), series in self.models.items()
+            },
+            "tools": {
+                name: {
+                    "calls": series.calls,
+                    "errors": dict(series.errors),
+                    "latency_ms": series.latency_ms.snapshot()
+                }
+                for name, series in self.tools.items()
+            },
+            "events": {
+                "created": self.events_created,
+                "cost_usd": round(self.event_cost_usd, 6),
+                "cost_per_event_usd": round(self.event_cost_usd / self.events_created, 6) if self.events_created else None,
+                "cost_per_event": self.cost_per_event.snapshot(digits=6)
+            }
+        }
+
+
+ai_telemetry = AITelemetry()
+
+
+def note_queue_wait(wait_ms: float):
+    """Called by the inference scheduler when the current call gets its slot"""
+    record = _current_call.get()
+    if record is not None and record["queue_wait_ms"] is None:
+        record["queue_wait_ms"] = round(wait_ms, 1)
+
+
+@contextmanager
+def telemetry_route(route: str):
+    """Label provider calls made inside the block with a route (chat, follow_up, model_test...)"""
+    token = _current_route.set(route)
+    try:
+        yield
+    finally:
+        _current_route.reset(token)
+
+
+def observed_completion(method):
+    """Record a provider's chat_completion; calls nested in an observed call aren't counted twice"""
+    @functools.wraps(method)
+    async def wrapper(provider, messages, tools=None):
+        if _current_call.get() is not None:
+            return await method(provider, messages, tools)
+        record = ai_telemetry.start_call(provider.config.provider, provider.config.model_name)
+        token = _current_call.set(record)
+        try:
+            result = await method(provider, messages, tools)
+        except BaseException as e:
+            ai_telemetry.finish_call(record, error=e)
+            raise
+        finally:
+            _current_call.reset(token)
+        ai_telemetry.mark_first_token(record)
+        ai_telemetry.finish_call(record, result)
+        return result
+    return wrapper
+
+
+def observed_stream(method):
+    """Streaming counterpart of observed_completion; time to first token is the first token event"""
+    @functools.wraps(method)
+    async def wrapper(provider, messages, tools=None):
+        if _current_call.get() is not None:
+            async for event in method(provider, messages, tools):
+                yield event
+            return
+        record = ai_telemetry.start_call(provider.config.provider, provider.config.model_name)
+        # Set and restored by hand: callers often stop iterating at "done", and the
+        # generator is then closed later from another context
+        previous = _current_call.get()
+        _current_call.set(record)
+        finished = False
+        try:
+            async for event in method(provider, messages, tools):
+                if event["type"] in ("token", "tool_call"):
+                    ai_telemetry.mark_first_token(record)
+                elif event["type"] == "done":
+                    _current_call.set(previous)
+                    ai_telemetry.finish_call(record, event)
+                    finished = True
+                yield event
+        except BaseException as e:
+            if not finished:
+                finished = True
+                _current_call.set(previous)
+                ai_telemetry.finish_call(record, error=e)
+            raise
+        finally:
+            if not finished:
+                _current_call.set(previous)
+                ai_telemetry.finish_call(record)
+    return wrapper
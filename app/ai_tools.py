@@ -9,26 +9,33 @@ from app.models import Event, User, Child, Booking
 from app.database import get_db
 from sqlalchemy.orm import Session
 from sqlalchemy import inspect
+import enum
 import json
 
+from app.ai_telemetry import ai_telemetry
+from app.event_index import event_index
+from app.tool_schema_registry import tool_schema_registry
+
 class DynamicEventTools:
     """Dynamic tools that introspect the database schema and system capabilities"""
     
     def __init__(self, db: Session, user_id: int):
         self.db = db
         self.user_id = user_id
-        self.event_schema = self._introspect_event_schema()
+        self.event_schema = tool_schema_registry.get("event_schema", self._introspect_event_schema)
     
     def _introspect_event_schema(self) -> Dict[str, Any]:
-        """Dynamically discover what fields are available for events"""
+        """Dynamically discover what fields are available for events (built once, see tool_schema_registry)"""
         inspector = inspect(Event)
         schema = {}
         
         for column in inspector.columns:
+            # Only plain defaults: callables (datetime.utcnow) and enums can't go to the model or into JSON columns
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
             column_info = {
                 "type": str(column.type),
                 "nullable": column.nullable,
-                "default": column.default.arg if column.default else None
+                "default": default.value if isinstance(default, enum.Enum) else default
             }
             
             # Add field descriptions based on column names
@@ -57,7 +64,9 @@ class DynamicEventTools:
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """Dynamically generate tool definitions based on current system capabilities"""
-        
+        return tool_schema_registry.get("event_creation_tools", self._build_tool_definitions)
+    
+    def _build_tool_definitions(self) -> List[Dict[str, Any]]:
         # Generate create_event_draft parameters from schema
         event_properties = {}
         required_fields = []
@@ -110,7 +119,7 @@ class DynamicEventTools:
                         },
                         "filters": {
                             "type": "object",
-                            "description": "Query filters (e.g., date range, event type, age range)"
+                            "description": "Query filters (e.g., text, title or category to match similar events, event type, age range, limit)"
                         }
                     },
                     "required": ["query_type"]
@@ -175,22 +184,45 @@ class DynamicEventTools:
         except Exception as e:
             return {"error": f"Failed to create event draft: {str(e)}"}
     
+    def _similar_events(self, filters: Dict) -> List[tuple]:
+        """[(event, similarity)] for the events closest to the filters' text (see app.event_index)"""
+        limit = min(int(filters.get("limit", 5)), 20)
+        text = filters.get("text") or " ".join(
+            str(filters[key]) for key in ("title", "category", "description") if filters.get(key)
+        )
+        age_range = filters.get("age_range")
+
+        def matches(event: Event) -> bool:
+            if "event_type" in filters and event.event_type != filters["event_type"]:
+                return False
+            if age_range:
+                min_age, max_age = age_range
+                return (event.min_age or 0) >= min_age and (event.max_age or 0) <= max_age
+            return True
+
+        if not text:
+            # Nothing to compare against: fall back to the structured filters alone
+            query = self.db.query(Event)
+            if "event_type" in filters:
+                query = query.filter(Event.event_type == filters["event_type"])
+            if age_range:
+                min_age, max_age = age_range
+                query = query.filter(Event.min_age >= min_age, Event.max_age <= max_age)
+            return [(event, None) for event in query.limit(limit).all()]
+
+        # Over-fetch so the structured filters still leave `limit` events
+        hits = event_index.similar(self.db, text, k=limit * 4, exclude=filters.get("exclude_ids") or ())
+        events = {event.id: event for event in self.db.query(Event).filter(Event.id.in_([id for id, _ in hits]))}
+        ranked = [(events[id], score) for id, score in hits if id in events and matches(events[id])]
+        return ranked[:limit]
+
     async def query_database(self, query_type: str, filters: Dict = None) -> Dict[str, Any]:
         """Query the database for relevant information"""
         try:
             filters = filters or {}
             
             if query_type == "similar_events":
-                # Find similar events based on filters
-                query = self.db.query(Event)
-                
-                if "event_type" in filters:
-                    query = query.filter(Event.event_type == filters["event_type"])
-                if "age_range" in filters:
-                    min_age, max_age = filters["age_range"]
-                    query = query.filter(Event.min_age >= min_age, Event.max_age <= max_age)
-                
-                events = query.limit(5).all()
+                events = self._similar_events(filters)
                 return {
                     "similar_events": [
                         {
@@ -198,15 +230,19 @@ class DynamicEventTools:
                             "cost": event.cost,
                             "max_pupils": event.max_pupils,
                             "location": event.location,
-                            "event_type": event.event_type
+                            "event_type": event.event_type,
+                            "category": event.category,
+                            "similarity": score
                         }
-                        for event in events
+                        for event, score in events
                     ]
                 }
             
             elif query_type == "user_history":
-                # Get user's event creation history
-                user_events = self.db.query(Event).limit(10).all()  # In real system, filter by creator
+                # Events this user created, most recent first
+                user_events = self.db.query(Event).filter(Event.created_by == self.user_id).order_by(
+                    Event.date.desc()
+                ).limit(10).all()
                 return {
                     "user_events": [
                         {
@@ -239,25 +275,40 @@ class DynamicEventTools:
         try:
             partial_event = partial_event or {}
             
+            # Ground pricing and capacity in the events most like this one
+            filters = {key: partial_event[key] for key in ("title", "category", "description") if partial_event.get(key)}
+            if partial_event.get("event_type") or not filters:
+                filters["event_type"] = partial_event.get("event_type") or "homeschool"
+            
             if suggestion_type == "pricing":
-                # Suggest pricing based on similar events
-                similar_events = await self.query_database("similar_events", {
-                    "event_type": partial_event.get("event_type", "homeschool")
-                })
+                similar_events = await self.query_database("similar_events", filters)
                 
                 if similar_events.get("similar_events"):
-                    costs = [e["cost"] for e in similar_events["similar_events"] if e["cost"]]
+                    priced = [e for e in similar_events["similar_events"] if e["cost"]]
+                    costs = [e["cost"] for e in priced]
                     if costs:
                         avg_cost = sum(costs) / len(costs)
                         return {
                             "suggested_price": round(avg_cost, 2),
                             "price_range": {"min": min(costs), "max": max(costs)},
+                            "similar_events": [e["title"] for e in priced],
                             "reasoning": f"Based on {len(costs)} similar events"
                         }
                 
                 return {"suggested_price": 25.0, "reasoning": "Default pricing for homeschool events"}
             
             elif suggestion_type == "capacity":
+                similar_events = await self.query_database("similar_events", filters)
+                sized = [e for e in similar_events.get("similar_events", []) if e["max_pupils"]]
+                if sized:
+                    capacities = sorted(e["max_pupils"] for e in sized)
+                    return {
+                        "suggested_capacity": capacities[len(capacities) // 2],
+                        "capacity_range": {"min": capacities[0], "max": capacities[-1]},
+                        "similar_events": [e["title"] for e in sized],
+                        "reasoning": f"Median of {len(capacities)} similar events"
+                    }
+                
                 event_type = partial_event.get("event_type", "homeschool")
                 if event_type == "homeschool":
                     return {"suggested_capacity": 20, "reasoning": "Typical homeschool group size"}
@@ -317,19 +368,25 @@ class DynamicEventTools:
 
     async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a tool by name with arguments"""
-        try:
-            if tool_name == "create_event_draft":
-                return await self.create_event_draft(**arguments)
-            elif tool_name == "query_database":
-                return await self.query_database(**arguments)
-            elif tool_name == "suggest_event_details":
-                return await self.suggest_event_details(**arguments)
-            elif tool_name == "validate_event_data":
-                return await self.validate_event_data(**arguments)
-            else:
-                return {"error": f"Unknown tool: {tool_name}"}
-        except Exception as e:
-            return {"error": f"Tool execution failed: {str(e)}"}
+        with ai_telemetry.tool(tool_name) as record:
+            try:
+                if tool_name == "create_event_draft":
+                    result = await self.create_event_draft(**arguments)
+                elif tool_name == "query_database":
+                    result = await self.query_database(**arguments)
+                elif tool_name == "suggest_event_details":
+                    result = await self.suggest_event_details(**arguments)
+                elif tool_name == "validate_event_data":
+                    result = await self.validate_event_data(**arguments)
+                else:
+                    record["error"] = "UnknownTool"
+                    return {"error": f"Unknown tool: {tool_name}"}
+            except Exception as e:
+                record["error"] = type(e).__name__
+                return {"error": f"Tool execution failed: {str(e)}"}
+            if isinstance(result, dict) and result.get("error"):
+                record["error"] = "ToolError"
+            return result
 
 # Backward compatibility - keep the old class name as an alias
 EventCreationTools = DynamicEventTools
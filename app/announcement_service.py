@@ -0,0 +1,313 @@
+"""
+Event Announcement Mailer
+Queues a personalised announcement email for every family when an event is
+published. Recipients are streamed from the database in chunks, queued into the
+email outbox at a throttled rate, and checkpointed so an interrupted campaign
+resumes after the last queued user instead of starting again.
+
+A process claims a campaign before sending it and refreshes its heartbeat
+while it does, so with several workers only one sends each campaign. Another
+process takes it over only once that heartbeat is stale, or when the owner
+was an earlier process with the same host and pid.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import config
+from app.database import SessionLocal
+from app.email_service import get_email_worker
+from app.models import (
+    AnnouncementCampaign, AnnouncementRecipient, CampaignStatus,
+    EmailStatus, Event, OutboundEmail, User
+)
+
+logger = logging.getLogger(__name__)
+
+# Compiled templates are cached by the environment for the life of the process
+_template_env = Environment(
+    loader=FileSystemLoader("app/templates/emails"),
+    autoescape=False,
+    undefined=StrictUndefined,
+    keep_trailing_newline=True,
+    auto_reload=False
+)
+
+
+def _event_context(event: Event) -> Dict[str, Any]:
+    """Event fields shared by every recipient, computed once per campaign"""
+    age_range = None
+    if event.min_age is not None and event.max_age is not None:
+        age_range = f"{event.min_age}-{event.max_age}"
+    elif event.min_age is not None:
+        age_range = f"{event.min_age}+"
+
+    return {
+        "title": event.title,
+        "subtitle": event.subtitle,
+        "date": event.date.strftime('%A %d %B %Y, %I:%M %p') if event.date else None,
+        "location": event.venue_name or event.location,
+        "age_range": age_range,
+        "cost": "Free" if event.is_free else (f"${event.cost:.2f}" if event.cost else None),
+        "summary": event.short_description or (event.description or "")[:500],
+        "url": f"{config.SITE_URL}/event/{event.id}",
+    }
+
+
+class AnnouncementMailer:
+    """Runs announcement campaigns in background threads, one per campaign"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        send_rate: float = None,
+        chunk_size: int = None,
+        heartbeat_interval: float = None
+    ):
+        self.session_factory = session_factory
+        self.send_rate = send_rate or config.ANNOUNCEMENT_SEND_RATE
+        self.chunk_size = chunk_size or config.ANNOUNCEMENT_CHUNK_SIZE
+        self.heartbeat_interval = heartbeat_interval or config.ANNOUNCEMENT_HEARTBEAT
+        # A sender that missed three heartbeats is gone
+        self.stale_after = self.heartbeat_interval * 3
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    # ----- public API -----
+
+    def create_campaign(self, db: Session, event: Event, created_by: Optional[int] = None) -> AnnouncementCampaign:
+        campaign = AnnouncementCampaign(
+            event_id=event.id,
+            template_name="event_announcement",
+            status=CampaignStatus.running,
+            last_user_id=0,
+            queued_count=0,
+            created_by=created_by,
+            owner=self.owner,
+            heartbeat_at=datetime.utcnow()
+        )
+        db.add(campaign)
+        db.commit()
+        db.refresh(campaign)
+        return campaign
+
+    def start(self, campaign_id: int):
+        """Schedule a campaign on the running event loop"""
+        task = self._tasks.get(campaign_id)
+        if task and not task.done():
+            return
+        self._stop.clear()
+        self._tasks[campaign_id] = asyncio.create_task(self._run(campaign_id))
+
+    async def resume_interrupted(self) -> List[int]:
+        """Restart running campaigns whose sender is gone; run_campaign claims each one"""
+        db = self.session_factory()
+        try:
+            campaign_ids = [row.id for row in db.query(AnnouncementCampaign.id).filter(
+                AnnouncementCampaign.status == CampaignStatus.running,
+                self._claimable()
+            ).all()]
+        finally:
+            db.close()
+
+        for campaign_id in campaign_ids:
+            logger.info(f"Resuming announcement campaign {campaign_id}")
+            self.start(campaign_id)
+        return campaign_ids
+
+    async def stop(self):
+        """Ask running campaigns to stop after their current chunk; they resume on next startup"""
+        self._stop.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def get_report(self, db: Session, campaign_id: int) -> Optional[Dict[str, Any]]:
+        campaign = db.query(AnnouncementCampaign).filter(AnnouncementCampaign.id == campaign_id).first()
+        if not campaign:
+            return None
+
+        counts = db.query(OutboundEmail.status, func.count(AnnouncementRecipient.id)).join(
+            OutboundEmail, AnnouncementRecipient.outbound_email_id == OutboundEmail.id
+        ).filter(
+            AnnouncementRecipient.campaign_id == campaign_id
+        ).group_by(OutboundEmail.status).all()
+
+        delivery = {status.value: 0 for status in EmailStatus}
+        for status, count in counts:
+            delivery[status.value] = count
+
+        return {
+            "campaign_id": campaign.id,
+            "event_id": campaign.event_id,
+            "status": campaign.status.value,
+            "queued": campaign.queued_count,
+            "last_user_id": campaign.last_user_id,
+            "delivery": delivery,
+            "last_error": campaign.last_error,
+            "created_at": campaign.created_at.isoformat() if campaign.created_at else None,
+            "completed_at": campaign.completed_at.isoformat() if campaign.completed_at else None,
+        }
+
+    # ----- ownership -----
+
+    def _claimable(self):
+        """Campaigns this process may send: its own, unowned, stale, or left by an earlier process here"""
+        host_pid = self.owner.rsplit(":", 1)[0]
+        return or_(
+            AnnouncementCampaign.owner.is_(None),
+            AnnouncementCampaign.owner == self.owner,
+            AnnouncementCampaign.owner.startswith(f"{host_pid}:", autoescape=True),
+            AnnouncementCampaign.heartbeat_at.is_(None),
+            AnnouncementCampaign.heartbeat_at < datetime.utcnow() - timedelta(seconds=self.stale_after)
+        )
+
+    def _claim(self, db: Session, campaign_id: int) -> bool:
+        """Take a running campaign unless another live process is sending it"""
+        claimed = db.query(AnnouncementCampaign).filter(
+            AnnouncementCampaign.id == campaign_id,
+            AnnouncementCampaign.status == CampaignStatus.running,
+            self._claimable()
+        ).update({
+            AnnouncementCampaign.owner: self.owner,
+            AnnouncementCampaign.heartbeat_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        return bool(claimed)
+
+    def _beat(self, db: Session, campaign_id: int) -> bool:
+        """Refresh the heartbeat; False once another process has taken the campaign over"""
+        beat = db.query(AnnouncementCampaign).filter(
+            AnnouncementCampaign.id == campaign_id,
+            AnnouncementCampaign.owner == self.owner
+        ).update({AnnouncementCampaign.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        if not beat:
+            logger.warning(f"Campaign {campaign_id} was taken over by another process")
+        return bool(beat)
+
+    def _throttle(self, db: Session, campaign_id: int, seconds: float) -> bool:
+        """Wait between chunks, beating as it goes; True if the campaign should stop"""
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._stop.wait(min(remaining, self.heartbeat_interval)) or not self._beat(db, campaign_id):
+                return True
+
+    # ----- campaign execution -----
+
+    async def _run(self, campaign_id: int):
+        try:
+            await asyncio.to_thread(self.run_campaign, campaign_id)
+        except Exception as e:
+            logger.error(f"Announcement campaign {campaign_id} failed: {e}")
+        finally:
+            self._tasks.pop(campaign_id, None)
+
+    def run_campaign(self, campaign_id: int) -> int:
+        """Queue every remaining recipient for a campaign. Runs in a worker thread."""
+        read_db = self.session_factory()
+        write_db = self.session_factory()
+        queued = 0
+        try:
+            if not self._claim(write_db, campaign_id):
+                logger.info(f"Campaign {campaign_id} is finished or being sent by another process")
+                return 0
+            campaign = write_db.query(AnnouncementCampaign).filter(AnnouncementCampaign.id == campaign_id).first()
+
+            event = campaign.event
+            subject_template = _template_env.get_template(f"{campaign.template_name}_subject.txt")
+            body_template = _template_env.get_template(f"{campaign.template_name}.txt")
+            event_context = _event_context(event)
+            subject = subject_template.render(event=event_context).strip()
+
+            # Server-side cursor: rows arrive in chunk_size partitions instead of all at once
+            recipients = read_db.execute(
+                select(User.id, User.email, User.first_name).where(
+                    User.id > campaign.last_user_id,
+                    User.email_confirmed.is_(True)
+                ).order_by(User.id).execution_options(stream_results=True, yield_per=self.chunk_size)
+            )
+
+            for chunk in recipients.partitions():
+                if self._stop.is_set():
+                    logger.info(f"Campaign {campaign_id} paused at user {campaign.last_user_id}")
+                    return queued
+                if not self._beat(write_db, campaign_id):
+                    return queued
+
+                started = time.monotonic()
+                self._queue_chunk(write_db, campaign, chunk, subject, body_template, event_context)
+                queued += len(chunk)
+                get_email_worker().notify()
+
+                # Throttle so the outbox is fed at no more than send_rate emails per second
+                remaining = len(chunk) / self.send_rate - (time.monotonic() - started)
+                if remaining > 0 and self._throttle(write_db, campaign_id, remaining):
+                    return queued
+
+            campaign.status = CampaignStatus.completed
+            campaign.completed_at = datetime.utcnow()
+            write_db.commit()
+            logger.info(f"Campaign {campaign_id} complete: {campaign.queued_count} recipients queued")
+            return queued
+
+        except Exception as e:
+            write_db.rollback()
+            # A campaign another process has taken over is theirs to finish
+            campaign = write_db.query(AnnouncementCampaign).filter(
+                AnnouncementCampaign.id == campaign_id,
+                AnnouncementCampaign.owner == self.owner
+            ).first()
+            if campaign:
+                campaign.status = CampaignStatus.failed
+                campaign.last_error = str(e)[:1000]
+                write_db.commit()
+            raise
+        finally:
+            read_db.close()
+            write_db.close()
+
+    def _queue_chunk(self, db: Session, campaign: AnnouncementCampaign, chunk, subject: str, body_template, event_context: Dict[str, Any]):
+        """Insert outbox rows, recipient rows and the new checkpoint in one transaction"""
+        now = datetime.utcnow()
+        for row in chunk:
+            email = OutboundEmail(
+                to_email=row.email,
+                subject=subject,
+                body=body_template.render(first_name=row.first_name, event=event_context),
+                status=EmailStatus.pending,
+                attempts=0,
+                next_attempt_at=now
+            )
+            db.add(email)
+            db.add(AnnouncementRecipient(campaign_id=campaign.id, user_id=row.id, outbound_email=email))
+
+        campaign.last_user_id = chunk[-1].id
+        campaign.queued_count += len(chunk)
+        db.commit()
+
+
+# Global mailer instance
+_announcement_mailer: Optional[AnnouncementMailer] = None
+
+
+def get_announcement_mailer() -> AnnouncementMailer:
+    global _announcement_mailer
+    if _announcement_mailer is None:
+        _announcement_mailer = AnnouncementMailer()
+    return _announcement_mailer
@@ -0,0 +1,226 @@
+"""
+Chat History Paging and Retention
+Chat history is read a page at a time with a keyset cursor on
+(created_at, id), so a page costs the same however long the conversation is.
+
+Retention compaction moves a conversation's oldest messages into
+chat_message_archives: batches of zlib-compressed JSON, one row per batch.
+The newest CHAT_KEEP_RECENT_MESSAGES of every conversation always stay live,
+and only messages older than CHAT_ARCHIVE_AFTER_DAYS are moved, so archived
+messages are always older than live ones and paging simply continues into
+the archive batches once the live rows run out.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import config
+from app.database import SessionLocal
+from app.models import ChatMessage, ChatMessageArchive
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 100
+
+Position = Tuple[datetime, int]
+
+
+def encode_cursor(created_at: str, message_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{message_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Position:
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+
+def _older_than(created_at_column, id_column, position: Position):
+    created_at, message_id = position
+    return or_(created_at_column < created_at, and_(created_at_column == created_at, id_column < message_id))
+
+
+def _pack(messages: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(json.dumps(messages, separators=(",", ":")).encode(), 6)
+
+
+def unpack_archive(archive: ChatMessageArchive) -> List[Dict[str, Any]]:
+    """Messages of an archive batch, oldest first, in ChatMessage.to_dict() form"""
+    return json.loads(zlib.decompress(archive.payload))
+
+
+def _archived_before(db: Session, conversation_id: str, position: Optional[Position]) -> Iterator[Dict[str, Any]]:
+    """Archived messages newest first, starting below `position`; batches are decoded lazily"""
+    archives = db.query(ChatMessageArchive).filter(ChatMessageArchive.conversation_id == conversation_id)
+    if position:
+        archives = archives.filter(
+            _older_than(ChatMessageArchive.first_created_at, ChatMessageArchive.first_message_id, position)
+        )
+    for archive in archives.order_by(ChatMessageArchive.last_created_at.desc(), ChatMessageArchive.last_message_id.desc()):
+        for message in reversed(unpack_archive(archive)):
+            if position is None or (datetime.fromisoformat(message["created_at"]), message["id"]) < position:
+                yield message
+
+
+def page_messages(db: Session, conversation_id: str, before: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+    """
+    One page of a conversation's history, oldest first within the page.
+    Pass the returned next_cursor as `before` to get the page before it.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    position = decode_cursor(before) if before else None
+
+    query = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id)
+    if position:
+        query = query.filter(_older_than(ChatMessage.created_at, ChatMessage.id, position))
+    rows = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+    page = [row.to_dict() for row in rows]
+
+    if len(page) <= limit:
+        for message in _archived_before(db, conversation_id, position):
+            page.append(message)
+            if len(page) > limit:
+                break
+
+    has_more = len(page) > limit
+    page = page[:limit]
+    return {
+        "messages": list(reversed(page)),
+        "next_cursor": encode_cursor(page[-1]["created_at"], page[-1]["id"]) if has_more else None,
+        "has_more": has_more
+    }
+
+
+class ChatRetention:
+    """Archives old chat messages into compressed batches, nightly or on demand"""
+
+    def __init__(
+        self,
+        archive_after_days: Optional[int] = None,
+        keep_recent: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        delete_after_days: Optional[int] = None
+    ):
+        self.archive_after_days = archive_after_days if archive_after_days is not None else config.CHAT_ARCHIVE_AFTER_DAYS
+        self.keep_recent = keep_recent if keep_recent is not None else config.CHAT_KEEP_RECENT_MESSAGES
+        self.batch_size = batch_size or config.CHAT_ARCHIVE_BATCH_SIZE
+        self.delete_after_days = delete_after_days if delete_after_days is not None else config.CHAT_ARCHIVE_DELETE_AFTER_DAYS
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def compact(self, db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Archive every eligible message, one committed batch at a time"""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=self.archive_after_days)
+        report = {"started_at": now.isoformat(), "conversations": 0, "archived_messages": 0, "archives_created": 0, "archives_deleted": 0}
+
+        conversation_ids = [row[0] for row in db.query(ChatMessage.conversation_id).filter(
+            ChatMessage.created_at < cutoff
+        ).distinct()]
+        for conversation_id in conversation_ids:
+            archived = self._compact_conversation(db, conversation_id, cutoff, report)
+            if archived:
+                report["conversations"] += 1
+
+        if self.delete_after_days > 0:
+            expired_before = now - timedelta(days=self.delete_after_days)
+            report["archives_deleted"] = db.query(ChatMessageArchive).filter(
+                ChatMessageArchive.last_created_at < expired_before
+            ).delete(synchronize_session=False)
+            db.commit()
+
+        report["finished_at"] = datetime.utcnow().isoformat()
+        self.last_report = report
+        logger.info(f"Chat retention: archived {report['archived_messages']} messages from {report['conversations']} conversations")
+        return report
+
+    def _compact_conversation(self, db: Session, conversation_id: str, cutoff: datetime, report: Dict[str, Any]) -> int:
+        messages = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id)
+        boundary = messages.with_entities(ChatMessage.created_at, ChatMessage.id).order_by(
+            ChatMessage.created_at.desc(), ChatMessage.id.desc()
+        ).offset(max(self.keep_recent - 1, 0)).limit(1).first()
+        if boundary is None:
+            return 0
+
+        eligible = messages.filter(
+            ChatMessage.created_at < cutoff,
+            _older_than(ChatMessage.created_at, ChatMessage.id, tuple(boundary))
+        ).order_by(ChatMessage.created_at, ChatMessage.id)
+
+        archived = 0
+        while True:
+            batch = eligible.limit(self.batch_size).all()
+            if not batch:
+                return archived
+            db.add(ChatMessageArchive(
+                conversation_id=conversation_id,
+                first_message_id=batch[0].id,
+                first_created_at=batch[0].created_at,
+                last_message_id=batch[-1].id,
+                last_created_at=batch[-1].created_at,
+                message_count=len(batch),
+                payload=_pack([message.to_dict() for message in batch])
+            ))
+            db.query(ChatMessage).filter(ChatMessage.id.in_([message.id for message in batch])).delete(synchronize_session=False)
+            db.commit()
+            archived += len(batch)
+            report["archived_messages"] += len(batch)
+            report["archives_created"] += 1
+
+    async def run(self) -> Dict[str, Any]:
+        def compact_in_session():
+            db = SessionLocal()
+            try:
+                return self.compact(db)
+            finally:
+                db.close()
+        return await asyncio.to_thread(compact_in_session)
+
+    # ----- scheduling -----
+
+    def start_nightly(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._nightly())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _nightly(self):
+        while True:
+            now = datetime.utcnow()
+            next_run = now.replace(hour=config.CHAT_RETENTION_HOUR_UTC, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Chat retention compaction failed: {e}")
+
+
+# Global retention instance
+_chat_retention: Optional[ChatRetention] = None
+
+
+def get_chat_retention() -> ChatRetention:
+    global _chat_retention
+    if _chat_retention is None:
+        _chat_retention = ChatRetention()
+    return _chat_retention
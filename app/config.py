@@ -17,6 +17,20 @@ class Config:
     SMTP_PORT: int = int(os.getenv("SMTP_PORT", "1025"))
     SMTP_USER: str = os.getenv("SMTP_USER", "")
     SMTP_PASS: str = os.getenv("SMTP_PASS", "")
+    SMTP_FROM: str = os.getenv("SMTP_FROM", "noreply@lifelearners.org.nz")
+    SMTP_TIMEOUT: float = float(os.getenv("SMTP_TIMEOUT", "10"))
+    
+    # Outbound email queue
+    EMAIL_WORKER_ENABLED: bool = os.getenv("EMAIL_WORKER_ENABLED", "true").lower() == "true"
+    EMAIL_BATCH_SIZE: int = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+    EMAIL_POLL_INTERVAL: float = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+    EMAIL_RETRY_BASE_SECONDS: float = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+
+    # Event announcement campaigns
+    ANNOUNCEMENT_SEND_RATE: float = float(os.getenv("ANNOUNCEMENT_SEND_RATE", "5"))  # emails queued per second
+    ANNOUNCEMENT_CHUNK_SIZE: int = int(os.getenv("ANNOUNCEMENT_CHUNK_SIZE", "200"))
+    ANNOUNCEMENT_HEARTBEAT: float = float(os.getenv("ANNOUNCEMENT_HEARTBEAT", "30"))  # seconds; 3 missed = sender gone
     
     # Site Configuration
     SITE_URL: str = os.getenv("SITE_URL", "http://localhost:8000")
@@ -37,6 +51,32 @@ class Config:
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "")
     STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET", "")
     STRIPE_CURRENCY: str = os.getenv("STRIPE_CURRENCY", "nzd")
+    STRIPE_TIMEOUT: float = float(os.getenv("STRIPE_TIMEOUT", "15"))  # seconds per HTTP attempt
+    STRIPE_MAX_NETWORK_RETRIES: int = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+    STRIPE_EXECUTOR_WORKERS: int = int(os.getenv("STRIPE_EXECUTOR_WORKERS", "8"))
+    MOCK_PAYMENT_LATENCY_MS: float = float(os.getenv("MOCK_PAYMENT_LATENCY_MS", "0"))
+    MOCK_PAYMENT_JITTER_MS: float = float(os.getenv("MOCK_PAYMENT_JITTER_MS", "0"))
+
+    # Stripe webhook processing
+    WEBHOOK_WORKER_ENABLED: bool = os.getenv("WEBHOOK_WORKER_ENABLED", "true").lower() == "true"
+    WEBHOOK_BATCH_SIZE: int = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+    WEBHOOK_POLL_INTERVAL: float = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+
+    # Nightly payment reconciliation against Stripe
+    RECONCILIATION_ENABLED: bool = os.getenv("RECONCILIATION_ENABLED", "false").lower() == "true"
+    RECONCILIATION_HOUR_UTC: int = int(os.getenv("RECONCILIATION_HOUR_UTC", "14"))  # 2-3am NZ time
+    RECONCILIATION_LOOKBACK_DAYS: int = int(os.getenv("RECONCILIATION_LOOKBACK_DAYS", "3"))
+    RECONCILIATION_STALE_HOURS: float = float(os.getenv("RECONCILIATION_STALE_HOURS", "24"))
+    RECONCILIATION_AUTO_FIX: bool = os.getenv("RECONCILIATION_AUTO_FIX", "false").lower() == "true"
+
+    # Chat history retention: old messages move to compressed archive batches
+    CHAT_RETENTION_ENABLED: bool = os.getenv("CHAT_RETENTION_ENABLED", "false").lower() == "true"
+    CHAT_RETENTION_HOUR_UTC: int = int(os.getenv("CHAT_RETENTION_HOUR_UTC", "15"))
+    CHAT_ARCHIVE_AFTER_DAYS: int = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "30"))
+    CHAT_KEEP_RECENT_MESSAGES: int = int(os.getenv("CHAT_KEEP_RECENT_MESSAGES", "50"))  # Per conversation, never archived
+    CHAT_ARCHIVE_BATCH_SIZE: int = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "200"))
+    CHAT_ARCHIVE_DELETE_AFTER_DAYS: int = int(os.getenv("CHAT_ARCHIVE_DELETE_AFTER_DAYS", "0"))  # 0 keeps archives forever
     
     # Payment Configuration
     ENABLE_PAYMENTS: bool = os.getenv("ENABLE_PAYMENTS", "false").lower() == "true"
@@ -0,0 +1,307 @@
+"""
+Outbound Email Queue
+Request handlers enqueue mail into the outbound_emails table; a background
+worker delivers it in batches over a reused SMTP connection with retries.
+"""
+
+import asyncio
+import logging
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config import config
+from app.database import SessionLocal
+from app.models import EmailStatus, OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Rows stuck in "sending" longer than this are assumed orphaned by a crashed worker
+STALE_CLAIM_SECONDS = 300
+MAX_RETRY_DELAY_SECONDS = 6 * 60 * 60
+# Idle connections are probed with NOOP before reuse; servers commonly drop them after ~60s
+SMTP_IDLE_CHECK_SECONDS = 30
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str) -> OutboundEmail:
+    """Persist an email to the outbox and wake the worker. Never touches SMTP."""
+    email = OutboundEmail(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        status=EmailStatus.pending,
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(email)
+    db.commit()
+    db.refresh(email)
+
+    get_email_worker().notify()
+    return email
+
+
+class SMTPConnection:
+    """A single persistent SMTP connection, reopened lazily when the server drops it"""
+
+    def __init__(
+        self,
+        host: str = None,
+        port: int = None,
+        username: str = None,
+        password: str = None,
+        timeout: float = None
+    ):
+        self.host = host or config.SMTP_HOST
+        self.port = port or config.SMTP_PORT
+        self.username = config.SMTP_USER if username is None else username
+        self.password = config.SMTP_PASS if password is None else password
+        self.timeout = timeout or config.SMTP_TIMEOUT
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.connects += 1
+        return server
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, msg: MIMEText):
+        """Send a message, reconnecting once if the cached connection has gone stale"""
+        idle = time.monotonic() - self._last_used
+        if self._server is None or (idle > SMTP_IDLE_CHECK_SECONDS and not self._is_alive()):
+            self.close()
+            self._server = self._connect()
+        try:
+            self._server.sendmail(msg["From"], [msg["To"]], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self._server = self._connect()
+            self._server.sendmail(msg["From"], [msg["To"]], msg.as_string())
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class EmailWorker:
+    """Background delivery of the email outbox with exponential backoff and dead-lettering"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        smtp: Optional[SMTPConnection] = None,
+        batch_size: int = None,
+        poll_interval: float = None,
+        max_attempts: int = None,
+        retry_base_seconds: float = None
+    ):
+        self.session_factory = session_factory
+        self.smtp = smtp or SMTPConnection()
+        self.batch_size = batch_size or config.EMAIL_BATCH_SIZE
+        self.poll_interval = poll_interval or config.EMAIL_POLL_INTERVAL
+        self.max_attempts = max_attempts or config.EMAIL_MAX_ATTEMPTS
+        self.retry_base_seconds = config.EMAIL_RETRY_BASE_SECONDS if retry_base_seconds is None else retry_base_seconds
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+        self.metrics: Dict[str, Any] = {
+            "sent_total": 0,
+            "retried_total": 0,
+            "dead_lettered_total": 0,
+            "batches_total": 0,
+            "last_batch_size": 0,
+            "last_batch_seconds": 0.0,
+            "last_error": None,
+        }
+
+    # ----- lifecycle -----
+
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Email worker started")
+
+    async def stop(self):
+        self._stopping = True
+        if self._wake:
+            self._wake.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.smtp.timeout + 5)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.smtp.close)
+        logger.info("Email worker stopped")
+
+    def notify(self):
+        """Wake the worker early instead of waiting for the next poll. Safe to call from any thread."""
+        if self._wake is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                processed = await asyncio.to_thread(self.process_batch)
+            except Exception as e:
+                logger.error(f"Email worker batch failed: {e}")
+                self.metrics["last_error"] = str(e)
+                processed = 0
+
+            # A full batch means there is probably more waiting; go straight round again
+            if processed >= self.batch_size:
+                continue
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # ----- delivery -----
+
+    def process_batch(self) -> int:
+        """Claim and deliver one batch of due emails. Runs in a worker thread."""
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            batch = self._claim_batch(db)
+            for index, email in enumerate(batch):
+                if not self._deliver(email):
+                    # Server unreachable: hand the rest back untouched rather than burning their attempts
+                    for remaining in batch[index + 1:]:
+                        remaining.status = EmailStatus.pending
+                        remaining.claimed_at = None
+                    break
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if batch:
+            self.metrics["batches_total"] += 1
+            self.metrics["last_batch_size"] = len(batch)
+            self.metrics["last_batch_seconds"] = round(time.perf_counter() - started, 4)
+        return len(batch)
+
+    def _claim_batch(self, db: Session) -> List[OutboundEmail]:
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=STALE_CLAIM_SECONDS)
+
+        batch = db.query(OutboundEmail).filter(
+            or_(
+                (OutboundEmail.status == EmailStatus.pending) & (OutboundEmail.next_attempt_at <= now),
+                (OutboundEmail.status == EmailStatus.sending) & (OutboundEmail.claimed_at < stale_before)
+            )
+        ).order_by(OutboundEmail.next_attempt_at).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        for email in batch:
+            email.status = EmailStatus.sending
+            email.claimed_at = now
+        db.commit()
+        return batch
+
+    def _deliver(self, email: OutboundEmail) -> bool:
+        """Send one email and record the outcome. Returns False if the SMTP server is unreachable."""
+        msg = MIMEText(email.body)
+        msg["Subject"] = email.subject
+        msg["From"] = config.SMTP_FROM
+        msg["To"] = email.to_email
+
+        try:
+            self.smtp.send(msg)
+        except Exception as e:
+            self._record_failure(email, e)
+            return not isinstance(e, (OSError, smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError))
+
+        email.status = EmailStatus.sent
+        email.sent_at = datetime.utcnow()
+        email.claimed_at = None
+        email.last_error = None
+        self.metrics["sent_total"] += 1
+        return True
+
+    def _record_failure(self, email: OutboundEmail, error: Exception):
+        email.attempts += 1
+        email.claimed_at = None
+        email.last_error = f"{type(error).__name__}: {error}"[:1000]
+        self.metrics["last_error"] = email.last_error
+
+        if self._is_permanent(error) or email.attempts >= self.max_attempts:
+            email.status = EmailStatus.dead
+            self.metrics["dead_lettered_total"] += 1
+            logger.error(f"Email {email.id} to {email.to_email} dead-lettered after {email.attempts} attempts: {error}")
+            return
+
+        # The connection may be in an unknown state after an error
+        self.smtp.close()
+        email.status = EmailStatus.pending
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=self._retry_delay(email.attempts))
+        self.metrics["retried_total"] += 1
+        logger.warning(f"Email {email.id} attempt {email.attempts} failed, retrying at {email.next_attempt_at}: {error}")
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.retry_base_seconds * (2 ** (attempts - 1)), MAX_RETRY_DELAY_SECONDS)
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code >= 500
+        return False
+
+    # ----- metrics -----
+
+    def get_metrics(self, db: Session = None) -> Dict[str, Any]:
+        """Worker counters plus current outbox depth by status"""
+        metrics = dict(self.metrics)
+        metrics["running"] = bool(self._task and not self._task.done())
+        metrics["smtp_connects_total"] = self.smtp.connects
+
+        if db is not None:
+            counts = db.query(OutboundEmail.status, func.count(OutboundEmail.id)).group_by(OutboundEmail.status).all()
+            metrics["queue"] = {status.value: 0 for status in EmailStatus}
+            for status, count in counts:
+                metrics["queue"][status.value] = count
+        return metrics
+
+
+# Global worker instance
+_email_worker: Optional[EmailWorker] = None
+
+
+def get_email_worker() -> EmailWorker:
+    global _email_worker
+    if _email_worker is None:
+        _email_worker = EmailWorker()
+    return _email_worker
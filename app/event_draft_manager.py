@@ -11,11 +11,31 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 import re
 
-from app.models import Event, AgentSession, ChatConversation, ChatMessage
+from app.models import Event, AgentSession, ChatConversation, ChatMessage, EventDraft, EventDraftVersion
 from app.ai_tools import DynamicEventTools
+from app.tool_execution import ToolExecutionEngine
 
 logger = logging.getLogger(__name__)
 
+# Every Nth version also stores the full draft, so rebuilding an old version replays at most N-1 diffs
+SNAPSHOT_EVERY = 20
+
+
+def diff_drafts(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Field-level changes that turn `old` into `new`"""
+    return {
+        "set": {key: value for key, value in new.items() if key not in old or old[key] != value},
+        "unset": [key for key in old if key not in new]
+    }
+
+
+def apply_changes(data: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    result = {**data, **changes.get("set", {})}
+    for key in changes.get("unset", []):
+        result.pop(key, None)
+    return result
+
+
 class EventDraftManager:
     """
     Dynamic connection between AI agent tool creation and actual event creation API.
@@ -25,6 +45,9 @@ class EventDraftManager:
     2. Reliable retrieval for event creation API
     3. Validation and transformation of draft data
     4. Audit trail of draft evolution
+    
+    Each save appends a small diff row to event_draft_versions and moves the
+    event_drafts head, which holds the materialised current draft.
     """
     
     def __init__(self, db: Session):
@@ -59,7 +82,7 @@ class EventDraftManager:
         """
         try:
             # Get agent session
-            agent_session = self.db.query(AgentSession).filter(
+            agent_session = self.db.query(AgentSession.id).filter(
                 AgentSession.conversation_id == session_id
             ).first()
             
@@ -67,33 +90,30 @@ class EventDraftManager:
                 logger.error(f"No agent session found for session_id: {session_id}")
                 return False
             
-            # Initialize memory if needed
-            if not agent_session.memory:
-                agent_session.memory = {}
-            
-            # Create structured draft storage
             safe_draft_data = self._make_json_safe(draft_data)
-            draft_entry = {
-                "event_data": safe_draft_data,
-                "source": source,
-                "timestamp": datetime.now().isoformat(),
-                "version": self._get_next_version(agent_session.memory)
-            }
-            
-            # Store current draft
-            agent_session.memory["current_event_draft"] = draft_entry
+            head = self.db.query(EventDraft).filter(
+                EventDraft.conversation_id == session_id
+            ).with_for_update().first()
+            if not head:
+                head = EventDraft(conversation_id=session_id, current_version=0, event_data=None)
+                self.db.add(head)
             
-            # Maintain draft history
-            if "draft_history" not in agent_session.memory:
-                agent_session.memory["draft_history"] = []
-            
-            agent_session.memory["draft_history"].append(draft_entry)
-            
-            # Update agent session
-            agent_session.updated_at = datetime.now()
+            # Append the diff against the previous version; the head is overwritten in place
+            version = head.current_version + 1
+            self.db.add(EventDraftVersion(
+                conversation_id=session_id,
+                version=version,
+                source=source,
+                changes=diff_drafts(head.event_data or {}, safe_draft_data),
+                snapshot=safe_draft_data if version % SNAPSHOT_EVERY == 0 else None
+            ))
+            head.current_version = version
+            head.event_data = safe_draft_data
+            head.source = source
+            head.used_for_event_id = None
             self.db.commit()
             
-            logger.info(f"Saved event draft v{draft_entry['version']} for session {session_id}")
+            logger.info(f"Saved event draft v{version} for session {session_id}")
             return True
             
         except Exception as e:
@@ -112,6 +132,13 @@ class EventDraftManager:
             Dict containing event data or None if not found
         """
         try:
+            head = self.db.query(EventDraft).filter(
+                EventDraft.conversation_id == session_id
+            ).first()
+            if head:
+                return head.event_data or None
+            
+            # Sessions from before event_drafts kept the draft in agent memory
             agent_session = self.db.query(AgentSession).filter(
                 AgentSession.conversation_id == session_id
             ).first()
@@ -227,45 +254,62 @@ class EventDraftManager:
             }
     
     def get_draft_history(self, session_id: str) -> List[Dict[str, Any]]:
-        """Get the evolution history of drafts for this session."""
+        """Get the evolution history of drafts for this session, as field-level changes."""
         try:
-            agent_session = self.db.query(AgentSession).filter(
-                AgentSession.conversation_id == session_id
-            ).first()
+            versions = self.db.query(EventDraftVersion).filter(
+                EventDraftVersion.conversation_id == session_id
+            ).order_by(EventDraftVersion.version).all()
             
-            if not agent_session or not agent_session.memory:
-                return []
-            
-            return agent_session.memory.get("draft_history", [])
+            return [
+                {
+                    "version": version.version,
+                    "source": version.source,
+                    "changes": version.changes,
+                    "timestamp": version.created_at.isoformat() if version.created_at else None
+                }
+                for version in versions
+            ]
             
         except Exception as e:
             logger.error(f"Failed to get draft history: {e}")
             return []
     
-    def clear_draft(self, session_id: str) -> bool:
-        """Clear the current draft for a session."""
+    def get_draft_version(self, session_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the draft as it was at `version`, replaying diffs from the
+        nearest snapshot at or before it.
+        """
         try:
-            agent_session = self.db.query(AgentSession).filter(
-                AgentSession.conversation_id == session_id
-            ).first()
+            checkpoint = self.db.query(EventDraftVersion).filter(
+                EventDraftVersion.conversation_id == session_id,
+                EventDraftVersion.version <= version,
+                EventDraftVersion.snapshot.isnot(None)
+            ).order_by(EventDraftVersion.version.desc()).first()
+            start = checkpoint.version if checkpoint else 0
             
-            if agent_session and agent_session.memory:
-                agent_session.memory.pop("current_event_draft", None)
-                self.db.commit()
-                return True
+            versions = self.db.query(EventDraftVersion).filter(
+                EventDraftVersion.conversation_id == session_id,
+                EventDraftVersion.version > start,
+                EventDraftVersion.version <= version
+            ).order_by(EventDraftVersion.version).all()
+            latest = versions[-1].version if versions else start
+            if latest != version or version < 1:
+                return None
             
-            return False
+            data = dict(checkpoint.snapshot) if checkpoint else {}
+            for entry in versions:
+                data = apply_changes(data, entry.changes)
+            return data
             
         except Exception as e:
-            logger.error(f"Failed to clear draft: {e}")
-            return False
+            logger.error(f"Failed to get draft version: {e}")
+            return None
     
-    def _get_next_version(self, memory: Dict) -> int:
-        """Get next version number for draft history."""
-        history = memory.get("draft_history", [])
-        if not history:
-            return 1
-        return max(entry.get("version", 0) for entry in history) + 1
+    def clear_draft(self, session_id: str) -> bool:
+        """Clear the current draft for a session; the cleared state is recorded as a version."""
+        if self.get_current_draft(session_id) is None:
+            return False
+        return self.save_event_draft(session_id, {}, source="clear")
     
     def _validate_draft_data(self, draft_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate draft data before creating event."""
@@ -337,16 +381,12 @@ class EventDraftManager:
     def _mark_draft_as_used(self, session_id: str, event_id: int):
         """Mark the current draft as used to create an event."""
         try:
-            agent_session = self.db.query(AgentSession).filter(
-                AgentSession.conversation_id == session_id
+            head = self.db.query(EventDraft).filter(
+                EventDraft.conversation_id == session_id
             ).first()
             
-            if agent_session and agent_session.memory:
-                current_draft = agent_session.memory.get("current_event_draft")
-                if current_draft:
-                    current_draft["used_to_create_event"] = event_id
-                    current_draft["event_created_at"] = datetime.now().isoformat()
-                
+            if head:
+                head.used_for_event_id = event_id
                 self.db.commit()
                 
         except Exception as e:
@@ -390,30 +430,39 @@ class DynamicToolIntegration:
                     )
                     tool_result["draft_saved"] = saved
                     tool_result["can_create_event"] = saved
-
-                    # --- NEW LOGIC: Parse and add ticket types if mentioned in arguments ---
-                    ticket_types = []
-                    # Example: parse arguments['description'] or similar for ticket info
-                    desc = arguments.get('description') or arguments.get('notes') or ''
-                    # Look for patterns like 'Children are only $17, adult tickets will be $38'
-                    child_match = re.search(r'child(?:ren)?[^\d$]*(\$?\d+(?:\.\d{1,2})?)', desc, re.IGNORECASE)
-                    adult_match = re.search(r'adult[^\d$]*(\$?\d+(?:\.\d{1,2})?)', desc, re.IGNORECASE)
-                    if child_match:
-                        price = float(child_match.group(1).replace('$',''))
-                        ticket_types.append({"name": "Child", "price": price})
-                    if adult_match:
-                        price = float(adult_match.group(1).replace('$',''))
-                        ticket_types.append({"name": "Adult", "price": price})
-                    # Optionally, add more parsing for other ticket types
-                    # Add each ticket type using the tool
-                    for ticket in ticket_types:
-                        await self.tools.execute_tool("add_ticket_type", ticket)
-                    tool_result["ticket_types_added"] = ticket_types
+                    tool_result["ticket_types_added"] = await self.add_ticket_types(arguments)
             return tool_result
         except Exception as e:
             logger.error(f"Tool integration failed: {e}")
             return {"error": f"Tool integration failed: {str(e)}"}
     
+    async def add_ticket_types(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Add ticket types mentioned in a drafted event's description"""
+        ticket_types = []
+        # Example: parse arguments['description'] or similar for ticket info
+        desc = arguments.get('description') or arguments.get('notes') or ''
+        # Look for patterns like 'Children are only $17, adult tickets will be $38'
+        child_match = re.search(r'child(?:ren)?[^\d$]*(\$?\d+(?:\.\d{1,2})?)', desc, re.IGNORECASE)
+        adult_match = re.search(r'adult[^\d$]*(\$?\d+(?:\.\d{1,2})?)', desc, re.IGNORECASE)
+        if child_match:
+            price = float(child_match.group(1).replace('$',''))
+            ticket_types.append({"name": "Child", "price": price})
+        if adult_match:
+            price = float(adult_match.group(1).replace('$',''))
+            ticket_types.append({"name": "Adult", "price": price})
+        # Optionally, add more parsing for other ticket types
+        # Add each ticket type using the tool
+        for ticket in ticket_types:
+            await self.tools.execute_tool("add_ticket_type", ticket)
+        return ticket_types
+    
+    async def execute_tool_calls(self, session_id: Optional[str], tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run one model turn's tool calls: independent ones concurrently, and
+        every draft change saved together as a single draft version.
+        """
+        return await ToolExecutionEngine(self).run(tool_calls, session_id)
+    
     def create_event_from_current_draft(self, session_id: str) -> Dict[str, Any]:
         """
         Direct API to create event from current draft.
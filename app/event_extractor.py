@@ -0,0 +1,364 @@
+"""
+Rule-based event extractor
+First stage of the event creation pipeline. It pulls NZ-style dates and
+times, prices, age ranges, capacities, venues and a title out of a user's
+message with precompiled patterns, giving each field a confidence score.
+
+When the title, date and venue are all extracted confidently, the agent fills
+the draft without calling the model. A title read only from an event word
+("zoo trip") has to lead the sentence to count, and questions or requests to
+cancel or change an event never skip the model. Otherwise the extracted fields go to the
+model as hints, so it only has to confirm them and ask about what is missing.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+    NZ_TZ = ZoneInfo("Pacific/Auckland")
+except Exception:  # no tz database on this host
+    NZ_TZ = None
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+WEEKDAYS = ("mon", "tues", "wednes", "thurs", "fri", "satur", "sun")
+
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_WEEKDAY = r"(mon|tues|wednes|thurs|fri|satur|sun)day"
+_CLOCK = r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)"
+
+# Dates, most specific first; NZ writes numeric dates day first
+_DATE_PATTERNS = [
+    ("iso", re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), 0.95),
+    ("day_month", re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?(?:\s+of)?\s+{_MONTH}\b\.?(?:,?\s+(\d{{4}}))?", re.I), 0.9),
+    ("month_day", re.compile(rf"\b{_MONTH}\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?", re.I), 0.85),
+    ("numeric", re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{4}|\d{2}))?\b"), 0.8),
+    ("relative", re.compile(rf"\b(today|tomorrow|(this|next)\s+{_WEEKDAY}|{_WEEKDAY})\b", re.I), 0.75),
+]
+
+_TIME_RANGE = re.compile(
+    r"\b(?:from\s+)?(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?\s*(?:-|–|to|until|till)\s*" + _CLOCK + r"(?!\w)", re.I
+)
+_TIME = re.compile(r"\b" + _CLOCK + r"(?!\w)", re.I)
+_TIME_24H = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+_NOON = re.compile(r"\b(noon|midday)\b", re.I)
+
+_AMOUNT = r"\$\s?(\d+(?:\.\d{1,2})?)"
+_CHILD = r"(?:children|child|kids?|students?|pupils?|tamariki)"
+_AUDIENCE = r"(children|child|kids?|students?|pupils?|tamariki|adults?|parents?|caregivers?|families|family)"
+_AUDIENCE_PRICE = re.compile(_AUDIENCE + r"[^$\d.;\n]{0,20}" + _AMOUNT, re.I)
+_PRICE_AUDIENCE = re.compile(_AMOUNT + r"\s*(?:per|a|an|each|/)?\s*" + _AUDIENCE, re.I)
+_PRICE = re.compile(_AMOUNT + r"|\b(\d+(?:\.\d{1,2})?)\s*(?:dollars|nzd)\b", re.I)
+_FREE = re.compile(r"\b(?:free(?! to\b)(?: of charge)?|no cost|no charge)\b", re.I)
+_GOLD_COIN = re.compile(r"\bgold coin(?: donation)?\b", re.I)
+
+_AGE_PATTERNS = [
+    (re.compile(r"\b(?:ages?|aged)\s*(\d{1,2})\s*(?:-|–|to)\s*(\d{1,2})\b", re.I), "range", 0.95),
+    (re.compile(r"\b(\d{1,2})\s*(?:-|–|to)\s*(\d{1,2})\s*(?:years?|yrs?|y/?o|year[- ]olds?)\b", re.I), "range", 0.9),
+    (re.compile(r"\b(?:ages?|aged)\s*(\d{1,2})\s*(?:\+|and (?:up|over|older)\b)", re.I), "min", 0.9),
+    (re.compile(r"\b(\d{1,2})\s*(?:years?|yrs?)\s*(?:\+|and (?:up|over|older)\b)", re.I), "min", 0.85),
+    (re.compile(r"\b(\d{1,2})\s*(?:and|&)\s*under\b", re.I), "max", 0.85),
+    (re.compile(r"\bunder\s*(\d{1,2})s\b", re.I), "under", 0.8),
+]
+
+_PEOPLE = r"(?:kids|children|students|pupils|people|participants|attendees|guests|families|tamariki|spots|places|spaces|tickets|seats)"
+_CAPACITY_PATTERNS = [
+    (re.compile(r"\b(?:up to|max(?:imum)?(?: of)?|limit(?:ed)? (?:to|of)|capacity(?: of| is)?|room for|only)\s*(\d{1,4})\s*" + _PEOPLE + r"\b", re.I), 0.9),
+    (re.compile(r"\b(\d{1,4})\s*" + _PEOPLE + r"\s*(?:max(?:imum)?|only|limit)\b", re.I), 0.9),
+    (re.compile(r"\b(\d{1,4})\s*(?:spots|places|spaces|tickets|seats)\b", re.I), 0.85),
+    (re.compile(r"\b(?:capacity|max(?:imum)?)\s*(?:of|is|:)?\s*(\d{1,4})\b", re.I), 0.8),
+    (re.compile(r"\bfor\s*(\d{1,4})\s*(?:kids|children|students|pupils|people|families|tamariki)\b", re.I), 0.6),
+]
+
+_STREET = r"(?:St|Street|Rd|Road|Ave|Avenue|Dr|Drive|Lane|Ln|Pl|Place|Cres|Crescent|Tce|Terrace|Way|Blvd|Boulevard|Hwy|Highway|Parade|Pde|Quay)"
+_VENUE_PATTERNS = [
+    (re.compile(r"\b(?:venue|location|place|address)\s*(?:is|:|-)\s*([^,.;\n]+)", re.I), 0.95),
+    (re.compile(r"\b(\d{1,5}[a-z]?\s+(?:[a-z][\w']*\s+){1,3}" + _STREET + r")\b\.?(?:,\s*([A-Z][\w']*(?:\s[A-Z][\w']*)?))?", re.I), 0.9),
+    (re.compile(r"\b(?:held|hosted|happening|taking place|meet(?:ing)?)\s+at\s+(?:the\s+)?([^,.;\n]+?)(?=\s+(?:on|from|at|for|this|next)\b|[,.;\n]|$)", re.I), 0.85),
+    (re.compile(r"\b(?:at|to)\s+(?:the\s+)?([A-Z][\w'&-]*(?:\s+(?:[A-Z][\w'&-]*|of|the|and|&))*)"), 0.8),
+    (re.compile(r"\bat\s+the\s+([a-z]+(?:\s+[a-z]+)?)\b(?=\s+(?:on|from|at|for|this|next)\b|[,.;\n]|$)"), 0.6),
+]
+
+_EVENT_WORDS = (
+    "visit|trip|tour|excursion|outing|party|picnic|workshop|class|classes|lesson|lessons|session|camp|fair|"
+    "day|club|meetup|meet-up|playdate|play date|concert|show|festival|practice|hui|gathering|walk|hike|bake-off"
+)
+_EVENT_PHRASE = re.compile(
+    r"\b((?:[\w'&-]+\s+){0,3}?(?:" + _EVENT_WORDS + r"))\b(?:\s+to\s+(?:the\s+)?(?-i:([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)))?", re.I
+)
+# A title read from an event word alone; on its own not enough to skip the model
+EVENT_PHRASE_CONFIDENCE = 0.75
+_SMALL_WORDS = {"a", "an", "and", "at", "for", "in", "of", "on", "the", "to"}
+_TITLE_PATTERNS = [
+    (re.compile(r"\b(?:called|named|titled|title\s*(?:is|:))\s*[\"'“‘]?([^\"'”’\n,.;!?]{3,80}?)(?=\s+(?:at|on|from|for|in|this|next)\b|[\"'”’\n,.;!?]|$)", re.I), 0.95),
+    (re.compile(r"[\"“]([^\"”]{3,80})[\"”]"), 0.85),
+    (_EVENT_PHRASE, EVENT_PHRASE_CONFIDENCE),
+]
+_TITLE_STOPWORDS = {
+    "a", "an", "the", "our", "my", "to", "organise", "organize", "create", "plan", "host", "hosting",
+    "having", "run", "running", "set", "up", "make", "for", "some", "another", "new", "want", "i", "we",
+    "please", "book", "arrange", "on", "at", "of", "and", "i'd", "we'd", "like", "it's", "is", "this", "next",
+    "can", "you", "help", "me", "us", "with", "hi", "hello", "kia", "ora", "let's", "lets", "going", "have",
+    "are", "am", "i'm", "we're", "will", "would", "could", "add", "do", "organising", "organizing", "planning"
+}
+_QUESTION = re.compile(r"\?|^\W*(?:what|when|where|which|who|why|how|is|are|does|do|did)\b", re.I)
+_NOT_NEW_EVENT = re.compile(
+    r"\b(?:cancel\w*|call(?:ing|ed)? off|reschedul\w*|postpon\w*|delet\w*|remov\w*|renam\w*)\b"
+    r"|^\W*(?:(?:please|can you|could you|i (?:want|need) to|we (?:want|need) to)\s+)?(?:change|update|edit|move)\b",
+    re.I
+)
+_NOT_VENUES = re.compile(rf"^(?:{_MONTH}|{_WEEKDAY}|noon|midday|christmas|easter|term \d)\b", re.I)
+
+# Fields that must all be confident for the draft to skip the model
+REQUIRED_FIELDS = ("title", "date", "location")
+
+
+def nz_today() -> date:
+    return datetime.now(NZ_TZ).date() if NZ_TZ else date.today()
+
+
+def _hour(hour: int, minute: Optional[str], meridiem: Optional[str]) -> Optional[time]:
+    if meridiem:
+        meridiem = meridiem.replace(".", "").lower()
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    if not 0 <= hour <= 23:
+        return None
+    return time(hour, int(minute or 0))
+
+
+def _audience_label(audience: str) -> str:
+    if re.fullmatch(_CHILD, audience):
+        return "Children"
+    if audience.startswith("famil"):
+        return "Families"
+    return audience.rstrip("s").capitalize() + "s"
+
+
+@dataclass
+class Extraction:
+    """Fields pulled from one message, with a 0-1 confidence per field"""
+    fields: Dict[str, Any] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+    # False for questions and requests to cancel or change an event
+    describes_event: bool = True
+
+    def set(self, name: str, value: Any, confidence: float):
+        if value in (None, "") or confidence <= self.confidence.get(name, 0):
+            return
+        self.fields[name] = value
+        self.confidence[name] = confidence
+
+    def is_complete(self, threshold: float = 0.75) -> bool:
+        if not self.describes_event or self.confidence.get("title", 0) <= EVENT_PHRASE_CONFIDENCE:
+            return False
+        return all(self.confidence.get(name, 0) >= threshold for name in REQUIRED_FIELDS)
+
+    def draft(self) -> Dict[str, Any]:
+        """create_event_draft arguments"""
+        return dict(self.fields)
+
+    def hints(self, threshold: float = 0.5) -> Dict[str, Any]:
+        if not self.describes_event:
+            return {}
+        return {name: value for name, value in self.fields.items() if self.confidence.get(name, 0) >= threshold}
+
+
+class EventExtractor:
+    """Precompiled rule-based extraction of event fields from free text"""
+
+    def extract(self, text: str, today: Optional[date] = None) -> Extraction:
+        today = today or nz_today()
+        result = Extraction(describes_event=not (_QUESTION.search(text) or _NOT_NEW_EVENT.search(text)))
+        self._title(text, result)
+        event_date = self._date(text, today, result)
+        self._time(text, event_date, result)
+        self._price(text, result)
+        self._ages(text, result)
+        self._capacity(text, result)
+        self._venue(text, result)
+        return result
+
+    # ----- dates and times -----
+
+    def _date(self, text: str, today: date, result: Extraction) -> Optional[date]:
+        for kind, pattern, confidence in _DATE_PATTERNS:
+            for match in pattern.finditer(text):
+                found = self._resolve_date(kind, match, today)
+                if found:
+                    value, explicit_year = found
+                    result.set("date", value.isoformat(), confidence if explicit_year or kind == "relative" else confidence - 0.05)
+                    return value
+        return None
+
+    def _resolve_date(self, kind: str, match: "re.Match", today: date) -> Optional[Tuple[date, bool]]:
+        groups = match.groups()
+        try:
+            if kind == "iso":
+                return date(int(groups[0]), int(groups[1]), int(groups[2])), True
+            if kind == "relative":
+                word = groups[0].lower()
+                if word == "today":
+                    return today, True
+                if word == "tomorrow":
+                    return today + timedelta(days=1), True
+                weekday = WEEKDAYS.index((groups[2] or groups[3]).lower())
+                ahead = (weekday - today.weekday()) % 7 or 7
+                return today + timedelta(days=ahead), True
+            if kind == "day_month":
+                day, month, year = int(groups[0]), MONTHS[groups[1][:3].lower()], groups[2]
+            elif kind == "month_day":
+                month, day, year = MONTHS[groups[0][:3].lower()], int(groups[1]), groups[2]
+            else:
+                day, month, year = int(groups[0]), int(groups[1]), groups[2]
+                if year and len(year) == 2:
+                    year = f"20{year}"
+            if year:
+                return date(int(year), month, day), True
+            # No year: the next time that day comes round
+            candidate = date(today.year, month, day)
+            if candidate < today:
+                candidate = date(today.year + 1, month, day)
+            return candidate, False
+        except ValueError:
+            return None
+
+    def _time(self, text: str, event_date: Optional[date], result: Extraction):
+        start = end = None
+        confidence = 0.0
+        match = _TIME_RANGE.search(text)
+        if match:
+            end = _hour(int(match.group(4)), match.group(5), match.group(6))
+            meridiem = match.group(3)
+            if not meridiem and end:
+                # "10-2pm" is 10am; "1-3pm" is 1pm
+                meridiem = match.group(6) if int(match.group(1)) % 12 <= int(match.group(4)) % 12 else "am"
+            start = _hour(int(match.group(1)), match.group(2), meridiem)
+            confidence = 0.9
+        if not start:
+            match = _TIME.search(text)
+            if match:
+                start, confidence = _hour(int(match.group(1)), match.group(2), match.group(3)), 0.9
+        if not start:
+            match = _TIME_24H.search(text)
+            if match:
+                start, confidence = time(int(match.group(1)), int(match.group(2))), 0.7
+        if not start and _NOON.search(text):
+            start, confidence = time(12, 0), 0.85
+        if not start:
+            return
+
+        result.set("start_time", start.strftime("%H:%M"), confidence)
+        if end:
+            result.set("end_time", end.strftime("%H:%M"), confidence)
+        if event_date:
+            result.fields["date"] = datetime.combine(event_date, start).isoformat()
+            if end and end > start:
+                result.set("end_date", datetime.combine(event_date, end).isoformat(), confidence)
+
+    # ----- money, ages, numbers -----
+
+    def _price(self, text: str, result: Extraction):
+        audience_prices: List[Tuple[str, float]] = []
+        for match in _AUDIENCE_PRICE.finditer(text):
+            audience_prices.append((match.group(1).lower(), float(match.group(2))))
+        for match in _PRICE_AUDIENCE.finditer(text):
+            audience_prices.append((match.group(2).lower(), float(match.group(1))))
+
+        child = [price for audience, price in audience_prices if re.fullmatch(_CHILD, audience)]
+        if child:
+            result.set("cost", child[0], 0.9)
+        if audience_prices:
+            notes = []
+            for audience, price in audience_prices:
+                note = f"{_audience_label(audience)} ${price:g}"
+                if note not in notes:
+                    notes.append(note)
+            result.set("pricing_notes", ", ".join(notes), 0.85)
+        if not child:
+            prices = sorted({float(a or b) for a, b in _PRICE.findall(text)})
+            if len(prices) == 1:
+                result.set("cost", prices[0], 0.85)
+            elif prices:
+                result.set("cost", prices[0], 0.5)
+
+        if "cost" not in result.fields:
+            if _GOLD_COIN.search(text):
+                result.set("cost", 2.0, 0.7)
+                result.set("pricing_notes", "Gold coin donation", 0.9)
+            elif _FREE.search(text):
+                result.set("cost", 0.0, 0.8)
+                result.set("is_free", True, 0.8)
+
+    def _ages(self, text: str, result: Extraction):
+        for pattern, kind, confidence in _AGE_PATTERNS:
+            match = pattern.search(text)
+            if not match:
+                continue
+            first = int(match.group(1))
+            if kind == "range":
+                low, high = sorted((first, int(match.group(2))))
+                if high > 18:
+                    continue
+                result.set("min_age", low, confidence)
+                result.set("max_age", high, confidence)
+            elif kind == "min":
+                result.set("min_age", first, confidence)
+            elif kind == "max":
+                result.set("max_age", first, confidence)
+            else:
+                result.set("max_age", first - 1, confidence)
+
+    def _capacity(self, text: str, result: Extraction):
+        for pattern, confidence in _CAPACITY_PATTERNS:
+            match = pattern.search(text)
+            if match and 0 < int(match.group(1)) <= 5000:
+                result.set("max_pupils", int(match.group(1)), confidence)
+                return
+
+    # ----- places and names -----
+
+    def _venue(self, text: str, result: Extraction):
+        for pattern, confidence in _VENUE_PATTERNS:
+            for match in pattern.finditer(text):
+                venue = ", ".join(part.strip() for part in match.groups() if part).strip(" -")
+                venue = re.sub(r"\s+(?:on|from|at|for|this|next|and|&|of|the)$", "", venue, flags=re.I)
+                if len(venue) < 3 or _NOT_VENUES.match(venue) or venue.lower() in _TITLE_STOPWORDS:
+                    continue
+                if match.group(0)[:1].islower() or not venue[:1].isupper():
+                    venue = venue.title() if venue.islower() else venue
+                result.set("location", venue, confidence)
+                return
+
+    def _title(self, text: str, result: Extraction):
+        for pattern, confidence in _TITLE_PATTERNS:
+            for match in pattern.finditer(text):
+                words = match.group(1).split()
+                while words and words[0].lower() in _TITLE_STOPWORDS:
+                    words.pop(0)
+                if not words:
+                    continue
+                title = " ".join(words)
+                if len(match.groups()) > 1 and match.group(2):
+                    title = f"{title} to {match.group(2)}"
+                if pattern is _EVENT_PHRASE:
+                    # Only trust the phrase when it leads its sentence ("I want to organise a zoo visit"),
+                    # not when it sits inside one ("what time does the zoo trip start")
+                    lead = re.split(r"[.!?\n]", text[:match.start()])[-1]
+                    if all(word.strip(",:;").lower() in _TITLE_STOPWORDS for word in lead.split()):
+                        confidence += 0.05
+                    title = " ".join(
+                        word if index and word.lower() in _SMALL_WORDS else word[:1].upper() + word[1:]
+                        for index, word in enumerate(title.split())
+                    )
+                result.set("title", title, confidence)
+                return
+
+
+event_extractor = EventExtractor()
@@ -0,0 +1,265 @@
+"""
+Inference scheduler for local model servers
+
+Ollama serves OLLAMA_NUM_PARALLEL requests per loaded model and queues the
+rest internally, with no notion of who is waiting. This scheduler keeps that
+queue on our side so we can order it: requests wait for a per-model slot,
+interactive chat goes ahead of background work and admin model tests, and
+users at the same priority are served round-robin so one busy session can't
+starve everybody else. Waiters whose client goes away are dropped from the
+queue without ever reaching the model.
+
+Call sites don't pass scheduling details through every layer; the route that
+owns the request sets them once with inference_context() and the provider
+picks them up when it asks for a slot.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Deque, Dict, Optional, Tuple
+
+from app.ai_telemetry import note_queue_wait
+
+logger = logging.getLogger(__name__)
+
+
+class InferencePriority(IntEnum):
+    """Lower values are served first"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    ADMIN = 2
+
+
+class InferenceQueueFull(Exception):
+    """Raised when a model's wait queue is at its limit"""
+
+
+class InferenceCancelled(Exception):
+    """Raised in waiters that were removed from the queue by an admin"""
+
+
+class ClientDisconnected(Exception):
+    """Raised by run_until_disconnected when the HTTP client goes away"""
+
+
+_inference_context: ContextVar[Tuple[Optional[int], InferencePriority]] = ContextVar(
+    "inference_context", default=(None, InferencePriority.BACKGROUND)
+)
+
+
+@contextmanager
+def inference_context(user_id: Optional[int] = None, priority: InferencePriority = InferencePriority.INTERACTIVE):
+    """Attribute model calls made inside the block to a user and priority"""
+    token = _inference_context.set((user_id, priority))
+    try:
+        yield
+    finally:
+        _inference_context.reset(token)
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 1)
+
+
+class _ModelQueue:
+    """Slots and waiters for one model"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        # priority -> user -> waiters, users kept in round-robin order
+        self.waiters: Dict[InferencePriority, "OrderedDict[Any, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in InferencePriority
+        }
+
+    def depth(self, priority: Optional[InferencePriority] = None) -> int:
+        priorities = [priority] if priority is not None else list(InferencePriority)
+        return sum(len(waiting) for p in priorities for waiting in self.waiters[p].values())
+
+    def push(self, priority: InferencePriority, user_key: Any, future: asyncio.Future):
+        self.waiters[priority].setdefault(user_key, deque()).append(future)
+
+    def remove(self, priority: InferencePriority, user_key: Any, future: asyncio.Future):
+        users = self.waiters[priority]
+        waiting = users.get(user_key)
+        if waiting is None:
+            return
+        try:
+            waiting.remove(future)
+        except ValueError:
+            pass
+        if not waiting:
+            del users[user_key]
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """Next waiter: highest priority first, then rotate between users"""
+        for priority in InferencePriority:
+            users = self.waiters[priority]
+            while users:
+                user_key, waiting = next(iter(users.items()))
+                future = waiting.popleft()
+                if waiting:
+                    users.move_to_end(user_key)
+                else:
+                    del users[user_key]
+                if not future.done():
+                    return future
+        return None
+
+
+class InferenceScheduler:
+    """Per-model concurrency slots with prioritised, per-user fair queuing"""
+
+    def __init__(self, capacity: Optional[int] = None, max_queue: Optional[int] = None):
+        self.capacity = max(1, capacity or int(os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+        self.max_queue = max_queue or int(os.getenv("OLLAMA_MAX_QUEUE", "50"))
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._wait_ms: Deque[float] = deque(maxlen=1000)
+        self.metrics = {"granted": 0, "rejected": 0, "cancelled": 0, "max_queue_depth": 0}
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.capacity)
+        return queue
+
+    def set_capacity(self, model: str, capacity: int):
+        """Override the slot count for one model (e.g. a small model run with more parallelism)"""
+        queue = self._queue(model)
+        queue.capacity = max(1, capacity)
+        self._dispatch(queue)
+
+    @asynccontextmanager
+    async def slot(self, model: str, user_id: Optional[int] = None, priority: Optional[InferencePriority] = None):
+        """Hold one of the model's slots for the duration of the block"""
+        context_user, context_priority = _inference_context.get()
+        user_id = context_user if user_id is None else user_id
+        priority = context_priority if priority is None else priority
+
+        await self._acquire(model, user_id, priority)
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    async def _acquire(self, model: str, user_id: Optional[int], priority: InferencePriority):
+        queue = self._queue(model)
+        started = time.monotonic()
+
+        if queue.active < queue.capacity and not queue.depth():
+            queue.active += 1
+            self._granted(started)
+            return
+
+        if queue.depth() >= self.max_queue:
+            self.metrics["rejected"] += 1
+            raise InferenceQueueFull(f"{queue.depth()} requests already waiting for {model}")
+
+        future = asyncio.get_running_loop().create_future()
+        user_key = user_id if user_id is not None else "anonymous"
+        queue.push(priority, user_key, future)
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], queue.depth())
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.metrics["cancelled"] += 1
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self._release(model)
+            else:
+                queue.remove(priority, user_key, future)
+            raise
+        self._granted(started)
+
+    def _granted(self, started: float):
+        wait_ms = (time.monotonic() - started) * 1000
+        self.metrics["granted"] += 1
+        self._wait_ms.append(wait_ms)
+        note_queue_wait(wait_ms)
+
+    def _release(self, model: str):
+        queue = self._queue(model)
+        queue.active = max(0, queue.active - 1)
+        self._dispatch(queue)
+
+    def _dispatch(self, queue: _ModelQueue):
+        while queue.active < queue.capacity:
+            future = queue.pop()
+            if future is None:
+                return
+            queue.active += 1
+            future.set_result(None)
+
+    def cancel_queued(self, model: Optional[str] = None) -> int:
+        """Fail every waiting request (optionally for one model); running ones finish"""
+        cleared = 0
+        for name, queue in self._queues.items():
+            if model is not None and name != model:
+                continue
+            while True:
+                future = queue.pop()
+                if future is None:
+                    break
+                future.set_exception(InferenceCancelled("Request removed from the inference queue"))
+                cleared += 1
+        self.metrics["cancelled"] += cleared
+        return cleared
+
+    def queue_depth(self) -> int:
+        return sum(queue.depth() for queue in self._queues.values())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        samples = list(self._wait_ms)
+        return {
+            **self.metrics,
+            "default_capacity": self.capacity,
+            "max_queue": self.max_queue,
+            "queued": self.queue_depth(),
+            "models": {
+                name: {
+                    "capacity": queue.capacity,
+                    "active": queue.active,
+                    "queued": queue.depth(),
+                    "queued_by_priority": {p.name.lower(): queue.depth(p) for p in InferencePriority}
+                }
+                for name, queue in self._queues.items()
+            },
+            "wait_ms": {
+                "p50": _percentile(samples, 0.50),
+                "p95": _percentile(samples, 0.95),
+                "max": round(max(samples), 1) if samples else None
+            }
+        }
+
+
+async def run_until_disconnected(request, awaitable: Awaitable, poll_interval: float = 0.5):
+    """
+    Await `awaitable`, cancelling it if the HTTP client disconnects first.
+    A cancelled chat turn gives up its queue position (or its slot) straight away.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling inference request")
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+inference_scheduler = InferenceScheduler()
@@ -5,7 +5,17 @@ from sqlalchemy.orm import Session, joinedload
 from app.database import SessionLocal, engine, get_db
 from app.models import Base, Event, User, Child, Adult, Booking, AdultBooking, GalleryImage, ChatConversation, ChatMessage, AgentSession, AgentStatus
 from app.config import config
-from app.payment_service import get_payment_service
+from app.payment_service import get_payment_gateway
+from app.email_service import enqueue_email, get_email_worker
+from app.announcement_service import get_announcement_mailer
+from app.webhook_service import ingest_webhook_event, get_webhook_processor
+from app.reconciliation_service import get_payment_reconciler
+from app.chat_retention import get_chat_retention
+from app.ai_providers import ai_manager, ollama_clients
+from app.model_residency import model_residency
+from app.ai_rate_limiter import AIRateLimitMiddleware
+from app.ai_jobs import ai_job_runner
+from app.event_index import event_index  # also registers the listeners that keep it current
 from starlette.status import HTTP_303_SEE_OTHER
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
@@ -18,8 +28,6 @@ from sqlalchemy.exc import IntegrityError
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from typing import List, Dict
-import smtplib
-from email.mime.text import MIMEText
 import uuid
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -96,6 +104,8 @@ class UserContextMiddleware(BaseHTTPMiddleware):
         db.close()
         return response
 
+# Added before UserContextMiddleware so it runs inside it and sees request.state.user
+app.add_middleware(AIRateLimitMiddleware)
 app.add_middleware(UserContextMiddleware)
 
 # Initialize rate limiter
@@ -117,10 +127,6 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Simple in-memory session store for OAuth flows
 oauth_sessions: Dict[str, int] = {}
 
-SMTP_HOST = os.getenv("SMTP_HOST", "mailhog")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 1025))
-SMTP_USER = os.getenv("SMTP_USER", "")
-SMTP_PASS = os.getenv("SMTP_PASS", "")
 SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")
 
 def get_password_hash(password):
@@ -225,7 +231,7 @@ async def signup(request: Request, db: Session = Depends(get_db), email: str = F
     If you did not sign up for LifeLearners, you can safely ignore this email.
     """
     try:
-        send_email(email, "Welcome to LifeLearners - Please Confirm Your Email", email_body)
+        send_email(db, email, "Welcome to LifeLearners - Please Confirm Your Email", email_body)
     except Exception as e:
         print("Email send failed:", e)
         csrf_token = generate_csrf_token()
@@ -982,6 +988,12 @@ async def create_event(
         db.commit()
         db.refresh(new_event)
         
+        # Announce newly published events to every family in the background
+        if final_status == "published" and send_notifications:
+            mailer = get_announcement_mailer()
+            campaign = mailer.create_campaign(db, new_event, created_by=user.id)
+            mailer.start(campaign.id)
+        
         # Redirect based on status
         if final_status == "draft":
             return RedirectResponse(url=f"/admin/events?draft_saved={new_event.id}", status_code=HTTP_303_SEE_OTHER)
@@ -1075,7 +1087,13 @@ async def startup_tasks():
     print("\n🔬 AI SYSTEM CONNECTIVITY TEST")
     print("-" * 30)
     try:
-        from app.ai_providers import ai_manager
+        await ai_manager.start_model_discovery()
+        print(f"🔍 Ollama Model Discovery: every {ai_manager.discovery_interval:g}s")
+        await model_residency.start(ai_manager.current_ollama_target)
+        print(f"🔍 Ollama Keep-Alive: {model_residency.keep_alive} (residency checked every {model_residency.check_interval:g}s)")
+        await ai_job_runner.start()
+        print(f"🔍 AI Jobs: {ai_job_runner.max_per_provider} per provider, {ai_job_runner.timeout:g}s timeout")
+        print(f"🔍 Similar-Events Index: {event_index.mode}, {event_index.path or 'in memory'} (synced every {event_index.sync_interval:g}s)")
         
         # Get available models
         available_models = ai_manager.get_available_models()
@@ -1131,12 +1149,46 @@ async def startup_tasks():
     print(f"🔍 Stripe Publishable Key: {'SET' if config.STRIPE_PUBLISHABLE_KEY else 'NOT SET'}")
     print(f"🔍 Stripe Secret Key: {'SET' if config.STRIPE_SECRET_KEY else 'NOT SET'}")
     print(f"🔍 Stripe Test Mode: {config.stripe_is_test_mode}")
+    print(f"🔍 Webhook Processor Enabled: {config.WEBHOOK_WORKER_ENABLED}")
+    if config.WEBHOOK_WORKER_ENABLED:
+        await get_webhook_processor().start()
+    print(f"🔍 Nightly Reconciliation Enabled: {config.RECONCILIATION_ENABLED}")
+    if config.RECONCILIATION_ENABLED and config.STRIPE_SECRET_KEY and config.ENABLE_PAYMENTS:
+        get_payment_reconciler().start_nightly()
+    print(f"🔍 Chat Retention Enabled: {config.CHAT_RETENTION_ENABLED}")
+    if config.CHAT_RETENTION_ENABLED:
+        get_chat_retention().start_nightly()
+    
+    # Outbound email worker
+    print("\n📧 EMAIL CONFIGURATION")
+    print("-" * 30)
+    print(f"🔍 SMTP Server: {config.SMTP_HOST}:{config.SMTP_PORT}")
+    print(f"🔍 Email Worker Enabled: {config.EMAIL_WORKER_ENABLED}")
+    if config.EMAIL_WORKER_ENABLED:
+        await get_email_worker().start()
+    resumed = await get_announcement_mailer().resume_interrupted()
+    if resumed:
+        print(f"🔍 Resumed Announcement Campaigns: {resumed}")
     
     create_test_users()
     
     print("\n🎉 LifeLearners startup complete!")
     print("=" * 60)
 
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    await get_announcement_mailer().stop()
+    await get_payment_reconciler().stop()
+    await get_chat_retention().stop()
+    await get_webhook_processor().stop()
+    await get_email_worker().stop()
+    get_payment_gateway().shutdown()
+    await ai_manager.stop_model_discovery()
+    await model_residency.stop()
+    await ai_job_runner.stop()
+    await ai_manager.providers.aclose()
+    await ollama_clients.aclose()
+
 def create_test_users():
     from app.models import User
     from app.database import SessionLocal
@@ -1305,7 +1357,7 @@ async def cancel_booking(request: Request, booking_id: int = Form(...), csrf_tok
                 Please review this cancellation request and process any necessary refunds.
                 """
                 # You can implement admin notification here
-                # send_email("admin@lifelearners.org.nz", "Cancellation Request", admin_email_body)
+                # send_email(db, "admin@lifelearners.org.nz", "Cancellation Request", admin_email_body)
             except Exception as e:
                 print(f"Failed to send admin notification: {e}")
             
@@ -1460,6 +1512,8 @@ async def book_event_post(
     booked_children = []
     duplicate_children = []
     booked_adults = []
+    new_bookings = []
+    new_adult_bookings = []
     duplicate_adults = []
     already_booked_children = []
     already_booked_adults = []
@@ -1480,6 +1534,7 @@ async def book_event_post(
             else:
                 booking = Booking(event_id=event.id, child_id=child.id)
                 db.add(booking)
+                new_bookings.append(booking)
                 booked_children.append(child.name)
     
     # Add and book new children with duplicate detection
@@ -1509,6 +1564,7 @@ async def book_event_post(
                 else:
                     booking = Booking(event_id=event.id, child_id=existing_child.id)
                     db.add(booking)
+                    new_bookings.append(booking)
                     booked_children.append(existing_child.name)
             continue
         
@@ -1532,6 +1588,7 @@ async def book_event_post(
         if not existing_booking:
             booking = Booking(event_id=event.id, child_id=child.id)
             db.add(booking)
+            new_bookings.append(booking)
             booked_children.append(child.name)
     
     # Book existing adults
@@ -1552,6 +1609,7 @@ async def book_event_post(
                 role = form_data.get(f"adult_role_{aid}", "attendee")
                 adult_booking = AdultBooking(event_id=event.id, adult_id=adult.id, role=role)
                 db.add(adult_booking)
+                new_adult_bookings.append(adult_booking)
                 booked_adults.append(adult.name)
     
     # Add and book new adults with duplicate detection
@@ -1582,6 +1640,7 @@ async def book_event_post(
                     role = new_adult_roles[i] if i < len(new_adult_roles) else "attendee"
                     adult_booking = AdultBooking(event_id=event.id, adult_id=existing_adult.id, role=role)
                     db.add(adult_booking)
+                    new_adult_bookings.append(adult_booking)
                     booked_adults.append(existing_adult.name)
             continue
         
@@ -1617,6 +1676,7 @@ async def book_event_post(
         if not existing_booking:
             adult_booking = AdultBooking(event_id=event.id, adult_id=adult.id, role=role)
             db.add(adult_booking)
+            new_adult_bookings.append(adult_booking)
             booked_adults.append(adult.name)
     
     # Check if event requires payment
@@ -1632,17 +1692,21 @@ async def book_event_post(
         # Only proceed with payment if there are new bookings
         if total_new_participants > 0:
             # Create payment intent or checkout session
-            payment_service = get_payment_service()
+            payment_gateway = get_payment_gateway()
+            # Assign ids so the webhook processor can match the payment to these exact bookings
+            db.flush()
             booking_details = {
                 'event_id': event.id,
                 'event_title': event.title,
                 'child_count': len(booked_children),
                 'adult_count': len(booked_adults),
-                'total_participants': total_new_participants
+                'total_participants': total_new_participants,
+                'booking_ids': [b.id for b in new_bookings],
+                'adult_booking_ids': [b.id for b in new_adult_bookings]
             }
         
             # For this example, we'll use Stripe Checkout (easier for initial implementation)
-            payment_result = payment_service.create_checkout_session(
+            payment_result = await payment_gateway.create_checkout_session(
                 amount_cents=total_cost_cents,
                 booking_details=booking_details,
                 customer_email=user.email,
@@ -1653,10 +1717,7 @@ async def book_event_post(
             if payment_result['success']:
                 # Store temporary booking info in session or database
                 # For now, we'll commit the bookings but mark them as pending payment
-                for booking in db.query(Booking).filter(
-                    Booking.event_id == event.id,
-                    Booking.child_id.in_([b.child_id for b in db.query(Booking).filter(Booking.event_id == event.id)])
-                ):
+                for booking in new_bookings + new_adult_bookings:
                     booking.payment_status = 'pending'
                 
                 db.commit()
@@ -1789,7 +1850,7 @@ async def resend_confirmation(request: Request, db: Session = Depends(get_db), e
     If you did not sign up for LifeLearners, you can safely ignore this email.
     """
     try:
-        send_email(email, "LifeLearners - Email Confirmation", email_body)
+        send_email(db, email, "LifeLearners - Email Confirmation", email_body)
     except Exception as e:
         print("Email send failed:", e)
         csrf_token = generate_csrf_token()
@@ -2357,6 +2418,49 @@ async def update_stripe_config(
     # For now, just redirect back
     return RedirectResponse(url="/admin/stripe", status_code=HTTP_303_SEE_OTHER)
 
+@app.get("/admin/stripe/metrics")
+async def admin_stripe_metrics(user: User = Depends(require_admin)):
+    """Payment gateway call counts, errors and latency percentiles"""
+    return get_payment_gateway().get_metrics()
+
+@app.get("/admin/stripe/webhook-metrics")
+async def admin_stripe_webhook_metrics(user: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Webhook processor counters and stored events by status"""
+    return get_webhook_processor().get_metrics(db)
+
+@app.post("/admin/stripe/reconcile")
+async def admin_stripe_reconcile(
+    user: User = Depends(require_admin),
+    days: int = Form(3),
+    auto_fix: bool = Form(False),
+    csrf_token: str = Form(None)
+):
+    """Reconcile Stripe payments and refunds from the last N days against bookings"""
+    if not csrf_token or not verify_csrf_token(csrf_token):
+        raise HTTPException(status_code=400, detail="Invalid CSRF token")
+    if not (config.STRIPE_SECRET_KEY and config.ENABLE_PAYMENTS):
+        raise HTTPException(status_code=400, detail="Stripe is not configured")
+    
+    end = datetime.utcnow()
+    return await get_payment_reconciler().run_window(end - timedelta(days=days), end, auto_fix=auto_fix)
+
+@app.get("/admin/stripe/reconciliation")
+async def admin_stripe_reconciliation(user: User = Depends(require_admin)):
+    """Most recent reconciliation report"""
+    return get_payment_reconciler().last_report or {"status": "not_run"}
+
+@app.post("/admin/chat/compact")
+async def admin_chat_compact(user: User = Depends(require_admin), csrf_token: str = Form(None)):
+    """Archive old chat messages now instead of waiting for the nightly run"""
+    if not csrf_token or not verify_csrf_token(csrf_token):
+        raise HTTPException(status_code=400, detail="Invalid CSRF token")
+    return await get_chat_retention().run()
+
+@app.get("/admin/chat/retention")
+async def admin_chat_retention(user: User = Depends(require_admin)):
+    """Most recent chat retention report"""
+    return get_chat_retention().last_report or {"status": "not_run"}
+
 # Payment Success and Webhook Routes
 @app.get("/payment/success", response_class=HTMLResponse)
 async def payment_success(
@@ -2407,76 +2511,53 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
     
-    payment_service = get_payment_service()
-    webhook_result = payment_service.handle_webhook_event(payload, sig_header)
+    webhook_result = get_payment_gateway().handle_webhook_event(payload, sig_header)
     
     if not webhook_result['success']:
         raise HTTPException(status_code=400, detail=webhook_result['error'])
     
-    event_type = webhook_result['event_type']
-    event_data = webhook_result['data']
-    
-    # Handle different webhook events
-    if event_type == 'payment_intent.succeeded':
-        payment_intent = event_data['object']
-        metadata = payment_intent.get('metadata', {})
-        
-        if metadata.get('booking_type') == 'event_booking':
-            event_id = metadata.get('event_id')
-            user_email = metadata.get('user_email')
-            
-            if event_id and user_email:
-                # Find user and update booking status
-                user = db.query(User).filter(User.email == user_email).first()
-                if user:
-                    bookings = db.query(Booking).filter(
-                        Booking.event_id == event_id,
-                        Booking.child.has(Child.user_id == user.id),
-                        Booking.payment_status == 'pending'
-                    ).all()
-                    
-                    for booking in bookings:
-                        booking.payment_status = 'paid'
-                        booking.stripe_payment_id = payment_intent['id']
-                    
-                    db.commit()
-    
-    elif event_type == 'payment_intent.payment_failed':
-        payment_intent = event_data['object']
-        metadata = payment_intent.get('metadata', {})
-        
-        if metadata.get('booking_type') == 'event_booking':
-            event_id = metadata.get('event_id')
-            user_email = metadata.get('user_email')
-            
-            if event_id and user_email:
-                user = db.query(User).filter(User.email == user_email).first()
-                if user:
-                    bookings = db.query(Booking).filter(
-                        Booking.event_id == event_id,
-                        Booking.child.has(Child.user_id == user.id),
-                        Booking.payment_status == 'pending'
-                    ).all()
-                    
-                    for booking in bookings:
-                        booking.payment_status = 'failed'
-                    
-                    db.commit()
+    # Store and acknowledge; the webhook processor applies it to bookings in the background
+    ingest_webhook_event(
+        db,
+        stripe_event_id=webhook_result['event_id'],
+        event_type=webhook_result['event_type'],
+        created=webhook_result['created'],
+        payload=payload
+    )
     
     return {"status": "success"}
 
 # Middleware will be added after OAuth setup
 
-# Simple email sender
-def send_email(to_email, subject, body):
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = "noreply@lifelearners.org.nz"
-    msg["To"] = to_email
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        if SMTP_USER and SMTP_PASS:
-            server.login(SMTP_USER, SMTP_PASS)
-        server.sendmail(msg["From"], [to_email], msg.as_string())
+# Email is queued in the outbox and delivered by the background worker (app/email_service.py)
+def send_email(db: Session, to_email, subject, body):
+    enqueue_email(db, to_email, subject, body)
+
+@app.get("/admin/email/metrics")
+async def admin_email_metrics(user: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Outbound email delivery metrics and queue depth"""
+    return get_email_worker().get_metrics(db)
+
+@app.post("/admin/events/{event_id}/announce")
+async def admin_announce_event(event_id: int = Path(...), csrf_token: str = Form(None), user: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Start an announcement campaign emailing every family about an event"""
+    if not csrf_token or not verify_csrf_token(csrf_token):
+        raise HTTPException(status_code=403, detail="Invalid or missing CSRF token")
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    mailer = get_announcement_mailer()
+    campaign = mailer.create_campaign(db, event, created_by=user.id)
+    mailer.start(campaign.id)
+    return mailer.get_report(db, campaign.id)
+
+@app.get("/admin/announcements/{campaign_id}")
+async def admin_announcement_status(campaign_id: int = Path(...), user: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Progress and per-recipient delivery counts for an announcement campaign"""
+    report = get_announcement_mailer().get_report(db, campaign_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return report
 
 # ============================================================================
 # FAMILY MANAGEMENT ROUTES
@@ -3047,7 +3128,7 @@ async def test_ai_model(
     csrf_token: str = Form(...),
     user: User = Depends(get_current_user)
 ):
-    """Test an AI model with chat and function calling capabilities"""
+    """Start a background test of an AI model's chat and function calling; returns the job to poll"""
     try:
         from app.ai.services import ModelService
         model_service = ModelService()
@@ -3142,12 +3223,14 @@ async def approve_booking_cancellation(
         refund_amount = refund_amount or float(booking.event.cost)
         
         # Process refund through payment service
-        payment_service = get_payment_service()
         if booking.stripe_payment_id:
-            refund_result = payment_service.process_refund(
+            refund_result = await get_payment_gateway().create_refund(
                 payment_intent_id=booking.stripe_payment_id,
                 amount_cents=int(refund_amount * 100),
-                reason=refund_reason or "Customer cancellation approved"
+                reason=refund_reason or "Customer cancellation approved",
+                idempotency_key=f"refund-booking-{booking.id}",
+                # One checkout intent can pay for several bookings; reconciliation matches on these
+                metadata={"booking_model": "booking", "booking_id": str(booking.id)}
             )
             
             if refund_result['success']:
@@ -3192,7 +3275,7 @@ Child: {booking.child.name}
 {refund_info}
 Thank you for your understanding.
 """
-        send_email(booking.child.user.email, f"Cancellation Approved - {booking.event.title}", customer_email_body)
+        send_email(db, booking.child.user.email, f"Cancellation Approved - {booking.event.title}", customer_email_body)
     except Exception as e:
         print(f"Failed to send customer notification: {e}")
     
@@ -3238,7 +3321,7 @@ async def deny_booking_cancellation(
         
         Your booking remains confirmed. Please contact us if you have any questions.
         """
-        send_email(booking.child.user.email, f"Cancellation Denied - {booking.event.title}", customer_email_body)
+        send_email(db, booking.child.user.email, f"Cancellation Denied - {booking.event.title}", customer_email_body)
     except Exception as e:
         print(f"Failed to send customer notification: {e}")
     
@@ -3271,12 +3354,13 @@ async def approve_adult_booking_cancellation(
         refund_amount = refund_amount or float(booking.event.cost)
         
         # Process refund through payment service
-        payment_service = get_payment_service()
         if booking.stripe_payment_id:
-            refund_result = payment_service.process_refund(
+            refund_result = await get_payment_gateway().create_refund(
                 payment_intent_id=booking.stripe_payment_id,
                 amount_cents=int(refund_amount * 100),
-                reason=refund_reason or "Customer cancellation approved"
+                reason=refund_reason or "Customer cancellation approved",
+                idempotency_key=f"refund-adult-booking-{booking.id}",
+                metadata={"booking_model": "adult_booking", "booking_id": str(booking.id)}
             )
             
             if refund_result['success']:
@@ -3321,7 +3405,7 @@ Adult: {booking.adult.name}
 {refund_info}
 Thank you for your understanding.
 """
-        send_email(booking.adult.user.email, f"Cancellation Approved - {booking.event.title}", customer_email_body)
+        send_email(db, booking.adult.user.email, f"Cancellation Approved - {booking.event.title}", customer_email_body)
     except Exception as e:
         print(f"Failed to send customer notification: {e}")
     
@@ -3367,7 +3451,7 @@ async def deny_adult_booking_cancellation(
         
         Your booking remains confirmed. Please contact us if you have any questions.
         """
-        send_email(booking.adult.user.email, f"Cancellation Denied - {booking.event.title}", customer_email_body)
+        send_email(db, booking.adult.user.email, f"Cancellation Denied - {booking.event.title}", customer_email_body)
     except Exception as e:
         print(f"Failed to send customer notification: {e}")
     
@@ -0,0 +1,160 @@
+"""
+Ollama model residency
+
+Ollama loads a model on its first request and unloads it after keep_alive
+(five minutes by default), so the first chat message after startup, a model
+switch or a quiet spell waits for a cold load. This manager keeps the
+configured model resident instead:
+
+- preloads it at startup and before traffic moves to a newly selected model
+- gives every request the same keep_alive, so activity extends residency
+- polls /api/ps on an interval, re-warming the model if Ollama evicted it
+- records per-model load state for the health and model admin pages
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.inference_scheduler import InferencePriority, inference_scheduler
+
+logger = logging.getLogger(__name__)
+
+# (base_url, model) of the model that should stay loaded, or None when it isn't an Ollama model
+Target = Optional[Tuple[str, str]]
+
+
+class ModelResidency:
+    """Warms Ollama models and tracks which ones are loaded"""
+
+    def __init__(self, keep_alive: Optional[str] = None, check_interval: Optional[float] = None):
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.check_interval = check_interval or float(os.getenv("OLLAMA_RESIDENCY_CHECK_INTERVAL", "60"))
+        self._states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._warming: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._target: Callable[[], Target] = lambda: None
+        self._task: Optional[asyncio.Task] = None
+
+    def _state(self, base_url: str, model: str) -> Dict[str, Any]:
+        key = (base_url.rstrip('/'), model)
+        if key not in self._states:
+            self._states[key] = {"state": "cold", "loaded_at": None, "expires_at": None,
+                                 "size_vram": None, "load_seconds": None, "error": None}
+        return self._states[key]
+
+    def is_loaded(self, base_url: str, model: str) -> bool:
+        return self._state(base_url, model)["state"] == "loaded"
+
+    # ----- Ollama calls (patched out in tests) -----
+
+    async def _load(self, base_url: str, model: str):
+        """A prompt-less generate request loads the model and returns straight away"""
+        from app.ai_providers import ollama_clients
+        client = ollama_clients.get(base_url)
+        response = await client.post(
+            f"{base_url}/api/generate",
+            json={"model": model, "keep_alive": self.keep_alive, "stream": False}
+        )
+        response.raise_for_status()
+
+    async def _running(self, base_url: str) -> List[Dict[str, Any]]:
+        from app.ai_providers import ollama_clients
+        client = ollama_clients.get(base_url)
+        response = await client.get(f"{base_url}/api/ps", timeout=ollama_clients.probe_timeout)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+    # ----- warming -----
+
+    async def warm(self, base_url: str, model: str) -> bool:
+        """Load a model if it isn't already; concurrent callers share one load"""
+        base_url = base_url.rstrip('/')
+        if self.is_loaded(base_url, model):
+            return True
+        key = (base_url, model)
+        task = self._warming.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._warm(base_url, model))
+            self._warming[key] = task
+        return await asyncio.shield(task)
+
+    async def _warm(self, base_url: str, model: str) -> bool:
+        state = self._state(base_url, model)
+        state.update(state="loading", error=None)
+        started = time.monotonic()
+        try:
+            # Background priority: a warm-up never holds up interactive chat on the same model
+            async with inference_scheduler.slot(model, priority=InferencePriority.BACKGROUND):
+                await self._load(base_url, model)
+        except Exception as e:
+            state.update(state="failed", error=str(e) or type(e).__name__)
+            logger.warning(f"Warming {model} failed: {state['error']}")
+            return False
+        finally:
+            self._warming.pop((base_url, model), None)
+        state.update(state="loaded", loaded_at=datetime.utcnow().isoformat(), load_seconds=round(time.monotonic() - started, 2))
+        logger.info(f"Warmed {model} in {state['load_seconds']}s")
+        return True
+
+    async def check(self, base_url: str) -> bool:
+        """Refresh load state for every model on a server from /api/ps"""
+        base_url = base_url.rstrip('/')
+        try:
+            running = await self._running(base_url)
+        except Exception as e:
+            logger.warning(f"Could not check running models at {base_url}: {e}")
+            return False
+        loaded = {model.get("name") or model.get("model"): model for model in running}
+        for name, info in loaded.items():
+            state = self._state(base_url, name)
+            state.update(state="loaded", expires_at=info.get("expires_at"), size_vram=info.get("size_vram"), error=None)
+        for (url, name), state in self._states.items():
+            if url == base_url and name not in loaded and state["state"] == "loaded":
+                state.update(state="cold", expires_at=None, size_vram=None)
+        return True
+
+    # ----- background monitor -----
+
+    async def start(self, target: Callable[[], Target]):
+        """Warm the target model in the background, then keep it resident"""
+        if self._task and not self._task.done():
+            return
+        self._target = target
+        self._task = asyncio.create_task(self._monitor())
+
+    async def _monitor(self):
+        while True:
+            target = self._target()
+            if target:
+                base_url, model = target
+                await self.check(base_url)
+                if not self.is_loaded(base_url, model):
+                    await self.warm(base_url, model)
+            await asyncio.sleep(self.check_interval)
+
+    async def stop(self):
+        tasks = [task for task in [self._task, *self._warming.values()] if task and not task.done()]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._warming.clear()
+
+    def status(self) -> Dict[str, Any]:
+        target = self._target()
+        return {
+            "keep_alive": self.keep_alive,
+            "monitoring": bool(self._task and not self._task.done()),
+            "target": target[1] if target else None,
+            "models": [{"endpoint": url, "model": name, **state} for (url, name), state in self._states.items()]
+        }
+
+
+model_residency = ModelResidency()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, Boolean, ForeignKey, Float, func, JSON, Enum, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, Boolean, ForeignKey, Float, func, JSON, Enum, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -505,6 +505,10 @@ class AdultBooking(Base):
     adult = relationship("Adult", back_populates="adult_bookings")
     ticket_type = relationship("TicketType")
 
+    __table_args__ = (
+        Index('idx_adult_bookings_stripe_payment_id', 'stripe_payment_id'),
+    )
+
 class Booking(Base):
     __tablename__ = "bookings"
     id = Column(Integer, primary_key=True, index=True)
@@ -563,6 +567,10 @@ class Booking(Base):
     ticket_type = relationship("TicketType", back_populates="bookings")
     booking_add_ons = relationship("BookingAddOn", back_populates="booking", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_bookings_stripe_payment_id', 'stripe_payment_id'),
+    )
+
 class BookingAddOn(Base):
     __tablename__ = "booking_add_ons"
     id = Column(Integer, primary_key=True, index=True)
@@ -589,6 +597,110 @@ class GalleryImage(Base):
     description = Column(Text, nullable=True)
     upload_date = Column(DateTime, default=func.now())
 
+class EmailStatus(enum.Enum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    dead = "dead"
+
+class OutboundEmail(Base):
+    """Persistent outbox for mail sent by the background email worker"""
+    __tablename__ = "outbound_emails"
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Message
+    to_email = Column(String(255), nullable=False)
+    subject = Column(String(300), nullable=False)
+    body = Column(Text, nullable=False)
+
+    # Delivery State
+    status = Column(Enum(EmailStatus), default=EmailStatus.pending, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    claimed_at = Column(DateTime, nullable=True)  # Set while a worker holds the row
+    last_error = Column(Text, nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_outbound_emails_due', 'status', 'next_attempt_at'),
+    )
+
+class CampaignStatus(enum.Enum):
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class AnnouncementCampaign(Base):
+    """A bulk email announcing an event to every family"""
+    __tablename__ = "announcement_campaigns"
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    template_name = Column(String(100), nullable=False, default="event_announcement")
+    status = Column(Enum(CampaignStatus), default=CampaignStatus.running, nullable=False)
+
+    # Resume checkpoint: every user with id <= last_user_id has been queued
+    last_user_id = Column(Integer, default=0, nullable=False)
+    queued_count = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    # host:pid:boot id of the process sending it, refreshed while that process is alive
+    owner = Column(String(255), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    event = relationship("Event")
+    recipients = relationship("AnnouncementRecipient", back_populates="campaign", cascade="all, delete-orphan")
+
+class AnnouncementRecipient(Base):
+    """One row per family per campaign; delivery state lives on the linked outbox email"""
+    __tablename__ = "announcement_recipients"
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("announcement_campaigns.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    outbound_email_id = Column(Integer, ForeignKey("outbound_emails.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    # Relationships
+    campaign = relationship("AnnouncementCampaign", back_populates="recipients")
+    outbound_email = relationship("OutboundEmail")
+
+    __table_args__ = (
+        UniqueConstraint('campaign_id', 'user_id', name='uq_announcement_recipient'),
+    )
+
+class WebhookEventStatus(enum.Enum):
+    pending = "pending"
+    processed = "processed"
+    ignored = "ignored"
+    failed = "failed"
+
+class StripeWebhookEvent(Base):
+    """Raw Stripe webhook event, stored on receipt and applied by the background processor"""
+    __tablename__ = "stripe_webhook_events"
+    id = Column(Integer, primary_key=True, index=True)
+    stripe_event_id = Column(String(255), nullable=False, unique=True)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    stripe_created = Column(Integer, nullable=False)  # Stripe's unix timestamp, used for ordering
+
+    status = Column(Enum(WebhookEventStatus), default=WebhookEventStatus.pending, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    received_at = Column(DateTime, default=datetime.datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_stripe_webhook_events_pending', 'status', 'stripe_created'),
+    )
+
 class AgentStatus(enum.Enum):
     """Agent status enumeration"""
     idle = "idle"
@@ -613,6 +725,9 @@ class ChatConversation(Base):
     # Relationships
     user = relationship("User", back_populates="chat_conversations")
     messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
+    message_archives = relationship("ChatMessageArchive", cascade="all, delete-orphan")
+    event_draft = relationship("EventDraft", uselist=False, cascade="all, delete-orphan")
+    event_draft_versions = relationship("EventDraftVersion", cascade="all, delete-orphan")
 
 class ChatMessage(Base):
     """Individual messages in conversations"""
@@ -625,6 +740,7 @@ class ChatMessage(Base):
     msg_metadata = Column(JSON, nullable=True)  # Tool calls, timing, etc.
     agent_status = Column(Enum(AgentStatus, name="agent_status"), nullable=True)
     created_at = Column(DateTime, default=func.now())
+    reply_started_at = Column(DateTime, nullable=True)  # Set while a streamed reply to this message runs
     
     # Relationships
     conversation = relationship("ChatConversation", back_populates="messages")
@@ -640,6 +756,28 @@ class ChatMessage(Base):
             "created_at": self.created_at.isoformat()
         }
 
+    __table_args__ = (
+        Index('idx_chat_messages_conversation_page', 'conversation_id', 'created_at', 'id'),
+    )
+
+class ChatMessageArchive(Base):
+    """A batch of old chat messages moved out of chat_messages by retention compaction"""
+    __tablename__ = "chat_message_archives"
+    
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(String(36), ForeignKey("chat_conversations.id"), nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    first_created_at = Column(DateTime, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON list of ChatMessage.to_dict()
+    archived_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index('idx_chat_message_archives_conversation', 'conversation_id', 'last_created_at', 'last_message_id'),
+    )
+
 class AgentSession(Base):
     """Agent session state for complex workflows"""
     __tablename__ = "agent_sessions"
@@ -658,6 +796,61 @@ class AgentSession(Base):
     # Relationships
     conversation = relationship("ChatConversation")
 
+class EventDraft(Base):
+    """Current event draft of a chat conversation; points at its newest version"""
+    __tablename__ = "event_drafts"
+    
+    conversation_id = Column(String(36), ForeignKey("chat_conversations.id", ondelete="CASCADE"), primary_key=True)
+    current_version = Column(Integer, nullable=False, default=0)
+    event_data = Column(JSON, nullable=True)  # Materialised head, so reads never replay versions
+    source = Column(String(100), nullable=True)
+    used_for_event_id = Column(Integer, ForeignKey("events.id", ondelete="SET NULL"), nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class EventDraftVersion(Base):
+    """One change to an event draft, stored as a field-level diff against the previous version"""
+    __tablename__ = "event_draft_versions"
+    
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(String(36), ForeignKey("chat_conversations.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    source = Column(String(100), nullable=True)
+    changes = Column(JSON, nullable=False)  # {"set": {field: value}, "unset": [field]}
+    snapshot = Column(JSON(none_as_null=True), nullable=True)  # Full draft on checkpoint versions, bounds replay
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('conversation_id', 'version', name='uq_event_draft_version'),
+    )
+
+class AIJobStatus(enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    cancelled = "cancelled"
+
+class AIJob(Base):
+    """A long AI operation (model test, batch run) executed by the background job runner"""
+    __tablename__ = "ai_jobs"
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    provider = Column(String(50), nullable=False)  # Jobs run at most N at a time per provider
+    model_key = Column(String(100), nullable=True)
+    status = Column(Enum(AIJobStatus), default=AIJobStatus.queued, nullable=False, index=True)
+    progress = Column(Integer, default=0, nullable=False)  # Percent
+    stage = Column(String(255), nullable=True)
+    params = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    owner = Column(String(255), nullable=True)  # host:pid:boot id of the process running it
+    heartbeat_at = Column(DateTime, nullable=True)  # Refreshed while the owner is alive
+
 # Add these new models after the existing models for dynamic schema extension
 
 class DynamicFieldDefinition(Base):
@@ -1,4 +1,11 @@
 import stripe
+import asyncio
+import functools
+import random
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 from app.config import config
 from app.models import Event, Booking, User, Child
@@ -10,13 +17,30 @@ logger = logging.getLogger(__name__)
 class PaymentService:
     def __init__(self):
         stripe.api_key = config.STRIPE_SECRET_KEY
+        stripe.max_network_retries = config.STRIPE_MAX_NETWORK_RETRIES
+        # RequestsClient keeps one keep-alive session per thread, so executor workers reuse connections
+        stripe.default_http_client = stripe.RequestsClient(timeout=config.STRIPE_TIMEOUT)
         self.currency = config.STRIPE_CURRENCY
         
+    @staticmethod
+    def _booking_metadata(booking_details: Dict[str, Any], customer_email: str) -> Dict[str, str]:
+        """Stripe metadata identifying the bookings a payment covers"""
+        return {
+            'booking_type': 'event_booking',
+            'user_email': customer_email,
+            'event_id': str(booking_details.get('event_id', '')),
+            'child_count': str(booking_details.get('child_count', 0)),
+            'booking_ids': ','.join(str(i) for i in booking_details.get('booking_ids', [])),
+            'adult_booking_ids': ','.join(str(i) for i in booking_details.get('adult_booking_ids', [])),
+            'environment': config.ENVIRONMENT
+        }
+    
     def create_payment_intent(
         self, 
         amount_cents: int, 
         booking_details: Dict[str, Any],
-        customer_email: str
+        customer_email: str,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create a Stripe PaymentIntent for the given amount and booking details"""
         try:
@@ -24,14 +48,9 @@ class PaymentService:
                 amount=amount_cents,
                 currency=self.currency,
                 automatic_payment_methods={'enabled': True},
-                metadata={
-                    'booking_type': 'event_booking',
-                    'user_email': customer_email,
-                    'event_id': str(booking_details.get('event_id', '')),
-                    'child_count': str(booking_details.get('child_count', 0)),
-                    'environment': config.ENVIRONMENT
-                },
-                description=f"Event booking: {booking_details.get('event_title', 'Unknown Event')}"
+                metadata=self._booking_metadata(booking_details, customer_email),
+                description=f"Event booking: {booking_details.get('event_title', 'Unknown Event')}",
+                idempotency_key=idempotency_key
             )
             
             return {
@@ -55,7 +74,8 @@ class PaymentService:
         booking_details: Dict[str, Any],
         customer_email: str,
         success_url: str,
-        cancel_url: str
+        cancel_url: str,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create a Stripe Checkout Session (alternative to PaymentIntent)"""
         try:
@@ -76,13 +96,10 @@ class PaymentService:
                 success_url=success_url,
                 cancel_url=cancel_url,
                 customer_email=customer_email,
-                metadata={
-                    'booking_type': 'event_booking',
-                    'user_email': customer_email,
-                    'event_id': str(booking_details.get('event_id', '')),
-                    'child_count': str(booking_details.get('child_count', 0)),
-                    'environment': config.ENVIRONMENT
-                }
+                metadata=self._booking_metadata(booking_details, customer_email),
+                # Checkout metadata is not copied to the PaymentIntent, and the webhook processor reads it there
+                payment_intent_data={'metadata': self._booking_metadata(booking_details, customer_email)},
+                idempotency_key=idempotency_key
             )
             
             return {
@@ -115,14 +132,27 @@ class PaymentService:
                 'error': str(e)
             }
     
-    def create_refund(self, payment_intent_id: str, amount_cents: Optional[int] = None) -> Dict[str, Any]:
-        """Create a refund for a payment"""
+    def create_refund(
+        self,
+        payment_intent_id: str,
+        amount_cents: Optional[int] = None,
+        reason: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Create a refund for a payment; metadata names the booking it is for"""
         try:
             refund_data = {'payment_intent': payment_intent_id}
             if amount_cents:
                 refund_data['amount'] = amount_cents
+            refund_metadata = dict(metadata or {})
+            if reason:
+                # Stripe's own reason field is an enum, so free-text reasons go in metadata
+                refund_metadata['reason'] = reason[:500]
+            if refund_metadata:
+                refund_data['metadata'] = refund_metadata
                 
-            refund = stripe.Refund.create(**refund_data)
+            refund = stripe.Refund.create(**refund_data, idempotency_key=idempotency_key)
             
             return {
                 'success': True,
@@ -148,6 +178,7 @@ class PaymentService:
                 'success': True,
                 'event_type': event['type'],
                 'event_id': event['id'],
+                'created': event['created'],
                 'data': event['data']
             }
         except ValueError:
@@ -180,7 +211,18 @@ class PaymentService:
 class MockPaymentService:
     """Mock payment service for development without Stripe keys"""
     
-    def create_payment_intent(self, amount_cents: int, booking_details: Dict[str, Any], customer_email: str) -> Dict[str, Any]:
+    def __init__(self, latency_ms: float = None, jitter_ms: float = None):
+        # Simulated Stripe round-trip time, for benchmarking the gateway without network access
+        self.latency_ms = config.MOCK_PAYMENT_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = config.MOCK_PAYMENT_JITTER_MS if jitter_ms is None else jitter_ms
+    
+    def _simulate_latency(self):
+        delay_ms = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+    
+    def create_payment_intent(self, amount_cents: int, booking_details: Dict[str, Any], customer_email: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        self._simulate_latency()
         return {
             'success': True,
             'client_secret': 'pi_mock_client_secret',
@@ -189,7 +231,8 @@ class MockPaymentService:
             'currency': 'nzd'
         }
     
-    def create_checkout_session(self, amount_cents: int, booking_details: Dict[str, Any], customer_email: str, success_url: str, cancel_url: str) -> Dict[str, Any]:
+    def create_checkout_session(self, amount_cents: int, booking_details: Dict[str, Any], customer_email: str, success_url: str, cancel_url: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        self._simulate_latency()
         # In development, redirect directly to success page
         return {
             'success': True,
@@ -198,6 +241,7 @@ class MockPaymentService:
         }
     
     def confirm_payment(self, payment_intent_id: str) -> Dict[str, Any]:
+        self._simulate_latency()
         return {
             'success': True,
             'status': 'succeeded',
@@ -205,7 +249,8 @@ class MockPaymentService:
             'metadata': {}
         }
     
-    def create_refund(self, payment_intent_id: str, amount_cents: Optional[int] = None) -> Dict[str, Any]:
+    def create_refund(self, payment_intent_id: str, amount_cents: Optional[int] = None, reason: Optional[str] = None, idempotency_key: Optional[str] = None, metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        self._simulate_latency()
         return {
             'success': True,
             'refund_id': 're_mock_refund',
@@ -218,10 +263,12 @@ class MockPaymentService:
             'success': True,
             'event_type': 'payment_intent.succeeded',
             'event_id': 'evt_mock',
+            'created': int(time.time()),
             'data': {}
         }
     
     def get_connection_status(self) -> Dict[str, Any]:
+        self._simulate_latency()
         return {
             'connected': True,
             'test_mode': True,
@@ -238,4 +285,137 @@ def get_payment_service() -> PaymentService:
         return PaymentService()
     else:
         logger.info("Using mock payment service (Stripe not configured)")
-        return MockPaymentService() 
\ No newline at end of file
+        return MockPaymentService()
+
+
+class AsyncPaymentGateway:
+    """Async front for the payment service.
+    
+    The Stripe SDK is synchronous, so every call runs on a small dedicated thread
+    pool instead of the event loop. Calls are bounded by a timeout, carry an
+    idempotency key so a retried request can't charge or refund twice, and record
+    per-operation latency.
+    """
+    
+    LATENCY_WINDOW = 500
+    
+    def __init__(self, service=None, max_workers: int = None, timeout: float = None):
+        self.service = service or get_payment_service()
+        self.max_workers = max_workers or config.STRIPE_EXECUTOR_WORKERS
+        # The SDK's own HTTP timeout covers each attempt; this covers its retries as well
+        self.timeout = timeout or config.STRIPE_TIMEOUT * (config.STRIPE_MAX_NETWORK_RETRIES + 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stripe")
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+    
+    async def _call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        method = getattr(self.service, operation)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, functools.partial(method, **kwargs)),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            self._record(operation, time.perf_counter() - started, ok=False, timed_out=True)
+            logger.error(f"Payment {operation} timed out after {self.timeout}s")
+            return {
+                'success': False,
+                'error': 'Payment provider did not respond in time',
+                'error_type': 'Timeout'
+            }
+        
+        ok = result.get('success', result.get('connected', True))
+        self._record(operation, time.perf_counter() - started, ok=ok)
+        return result
+    
+    @staticmethod
+    def _idempotency_key(operation: str, idempotency_key: Optional[str]) -> str:
+        return idempotency_key or f"{operation}-{uuid.uuid4().hex}"
+    
+    async def create_payment_intent(self, amount_cents: int, booking_details: Dict[str, Any], customer_email: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call(
+            'create_payment_intent',
+            amount_cents=amount_cents,
+            booking_details=booking_details,
+            customer_email=customer_email,
+            idempotency_key=self._idempotency_key('payment-intent', idempotency_key)
+        )
+    
+    async def create_checkout_session(self, amount_cents: int, booking_details: Dict[str, Any], customer_email: str, success_url: str, cancel_url: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call(
+            'create_checkout_session',
+            amount_cents=amount_cents,
+            booking_details=booking_details,
+            customer_email=customer_email,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            idempotency_key=self._idempotency_key('checkout', idempotency_key)
+        )
+    
+    async def confirm_payment(self, payment_intent_id: str) -> Dict[str, Any]:
+        return await self._call('confirm_payment', payment_intent_id=payment_intent_id)
+    
+    async def create_refund(self, payment_intent_id: str, amount_cents: Optional[int] = None, reason: Optional[str] = None, idempotency_key: Optional[str] = None, metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        return await self._call(
+            'create_refund',
+            payment_intent_id=payment_intent_id,
+            amount_cents=amount_cents,
+            reason=reason,
+            idempotency_key=self._idempotency_key('refund', idempotency_key),
+            metadata=metadata
+        )
+    
+    async def get_connection_status(self) -> Dict[str, Any]:
+        return await self._call('get_connection_status')
+    
+    def handle_webhook_event(self, payload: bytes, sig_header: str) -> Dict[str, Any]:
+        """Signature verification is local CPU work, so it stays on the caller's thread"""
+        return self.service.handle_webhook_event(payload, sig_header)
+    
+    def _record(self, operation: str, seconds: float, ok: bool, timed_out: bool = False):
+        stats = self._metrics.setdefault(operation, {
+            'calls': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'latencies': deque(maxlen=self.LATENCY_WINDOW)
+        })
+        stats['calls'] += 1
+        if not ok:
+            stats['errors'] += 1
+        if timed_out:
+            stats['timeouts'] += 1
+        stats['latencies'].append(seconds)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Call counts and latency percentiles (ms) over the most recent calls per operation"""
+        operations = {}
+        for operation, stats in self._metrics.items():
+            latencies = sorted(stats['latencies'])
+            percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+            operations[operation] = {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'timeouts': stats['timeouts'],
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'max_ms': round(latencies[-1] * 1000, 1)
+            }
+        return {
+            'service': type(self.service).__name__,
+            'max_workers': self.max_workers,
+            'timeout_seconds': self.timeout,
+            'operations': operations
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Global gateway instance
+_payment_gateway: Optional[AsyncPaymentGateway] = None
+
+def get_payment_gateway() -> AsyncPaymentGateway:
+    global _payment_gateway
+    if _payment_gateway is None:
+        _payment_gateway = AsyncPaymentGateway()
+    return _payment_gateway
@@ -0,0 +1,253 @@
+"""
+Provider routing: fallback chain, circuit breakers and hedged requests
+
+Chat used to depend on the one selected model; when it was slow or down the
+turn ended in a canned error. ProviderRouter tries an ordered chain of models
+instead (AI_FALLBACK_CHAIN, "current" meaning the selected one), skipping any
+whose circuit breaker is open after repeated failures.
+
+Each route (chat, follow_up, ...) has a latency SLO (AI_ROUTE_SLOS). With
+AI_HEDGING_ENABLED, a buffered call still unanswered after its route's SLO
+starts the next model in the chain alongside it, and the first good answer
+wins. Streamed calls are never hedged, because their tokens are already on
+the user's screen; they only fall back if the failing model streamed nothing.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.ai_providers import AIProviderManager, BaseAIProvider, ai_manager
+from app.ai_telemetry import telemetry_route
+from app.tool_schema_registry import tool_schema_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAIN = "current,openai_gpt4o_mini,mock_assistant"
+DEFAULT_SLOS = "chat=8,follow_up=5"
+
+
+class CircuitBreaker:
+    """Circuit breaker pattern for AI provider calls"""
+
+    def __init__(self, failure_threshold=5, recovery_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failure_count = 0
+        self.last_failure_time = None
+        self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; an expired OPEN circuit lets one trial call in"""
+        if self.state == 'OPEN':
+            if time.time() - self.last_failure_time <= self.recovery_timeout:
+                return False
+            self.state = 'HALF_OPEN'
+            logger.info("Circuit breaker moving to HALF_OPEN state")
+        return True
+
+    def record_success(self):
+        if self.state == 'HALF_OPEN':
+            logger.info("Circuit breaker reset to CLOSED state")
+        self.state = 'CLOSED'
+        self.failure_count = 0
+
+    def record_failure(self):
+        self.failure_count += 1
+        self.last_failure_time = time.time()
+        if self.state == 'HALF_OPEN' or self.failure_count >= self.failure_threshold:
+            if self.state != 'OPEN':
+                logger.error(f"Circuit breaker opened after {self.failure_count} failures")
+            self.state = 'OPEN'
+
+    def call(self, func):
+        """Execute function with circuit breaker protection"""
+        if not self.allow():
+            raise Exception("Circuit breaker is OPEN - AI provider unavailable")
+        try:
+            result = func()
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def _parse_slos(spec: str) -> Dict[str, float]:
+    slos = {}
+    for part in spec.split(","):
+        route, _, seconds = part.partition("=")
+        if route.strip() and seconds.strip():
+            slos[route.strip()] = float(seconds)
+    return slos
+
+
+def _good(result: Dict[str, Any]) -> bool:
+    # The mock provider is the designed last stop, so its notice counts as an answer
+    return not result.get("error") or result.get("provider") == "mock"
+
+
+class ProviderRouter:
+    """Routes model calls over an ordered fallback chain"""
+
+    def __init__(
+        self,
+        manager: AIProviderManager,
+        chain: Optional[str] = None,
+        hedging: Optional[bool] = None,
+        slos: Optional[str] = None,
+        failure_threshold: Optional[int] = None,
+        recovery_timeout: Optional[float] = None
+    ):
+        self.manager = manager
+        self.chain_spec = [key.strip() for key in (chain or os.getenv("AI_FALLBACK_CHAIN", DEFAULT_CHAIN)).split(",") if key.strip()]
+        self.hedging = hedging if hedging is not None else os.getenv("AI_HEDGING_ENABLED", "false").lower() == "true"
+        self.slos = _parse_slos(slos or os.getenv("AI_ROUTE_SLOS", DEFAULT_SLOS))
+        self.default_slo = self.slos.get("default", 10.0)
+        self.failure_threshold = failure_threshold or int(os.getenv("AI_CIRCUIT_FAILURES", "3"))
+        self.recovery_timeout = recovery_timeout or float(os.getenv("AI_CIRCUIT_RECOVERY", "60"))
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.metrics = {"calls": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0, "slo_breaches": 0, "exhausted": 0}
+
+    def slo(self, route: str) -> float:
+        return self.slos.get(route, self.default_slo)
+
+    def breaker(self, model_key: str) -> CircuitBreaker:
+        if model_key not in self.breakers:
+            self.breakers[model_key] = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+        return self.breakers[model_key]
+
+    def chain(self) -> List[Tuple[str, BaseAIProvider]]:
+        """Available models in fallback order, current model first when the chain says so"""
+        available = self.manager.get_available_models()
+        keys = []
+        for key in self.chain_spec:
+            key = self.manager.get_current_model_key() if key == "current" else key
+            if key in available and available[key].enabled and key not in keys:
+                keys.append(key)
+        if not keys and available:
+            keys.append(next(iter(available)))
+        return [(key, self.manager._create_provider(available[key])) for key in keys]
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        route: str = "chat",
+        emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """One model call for `route`; `tools` are raw definitions, formatted per provider"""
+        self.metrics["calls"] += 1
+        chain = self.chain()
+        candidates = [(key, provider) for key, provider in chain if self.breaker(key).allow()]
+        if not candidates:
+            self.metrics["exhausted"] += 1
+            return {"content": "", "tool_calls": None, "error": "No AI provider available: every circuit is open"}
+
+        if emit is None:
+            result = await self._buffered(candidates, messages, tools, route)
+        else:
+            result = await self._streamed(candidates, messages, tools, route, emit)
+        if result.get("model_key") != chain[0][0]:
+            self.metrics["fallbacks"] += 1
+        return result
+
+    async def _attempt(self, key: str, provider: BaseAIProvider, messages, tools, route: str, emit=None) -> Dict[str, Any]:
+        formatted = tool_schema_registry.formatted(provider, tools) if tools else None
+        started = time.monotonic()
+        try:
+            with telemetry_route(route):
+                if emit is None:
+                    result = await provider.chat_completion(messages, formatted)
+                else:
+                    result = {"content": "", "tool_calls": None}
+                    async for event in provider.stream_chat_completion(messages, formatted):
+                        if event["type"] == "done":
+                            result = {k: v for k, v in event.items() if k != "type"}
+                            break
+                        await emit(event)
+        except asyncio.CancelledError:
+            raise  # lost a hedge race; not the provider's fault
+        except Exception as e:
+            result = {"content": "", "tool_calls": None, "error": str(e) or type(e).__name__}
+
+        elapsed = time.monotonic() - started
+        if elapsed > self.slo(route):
+            self.metrics["slo_breaches"] += 1
+        breaker = self.breaker(key)
+        if _good(result):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            logger.warning(f"{route} call to {key} failed after {elapsed:.1f}s: {result.get('error')}")
+        return {**result, "model_key": key, "elapsed": round(elapsed, 3)}
+
+    async def _buffered(self, candidates, messages, tools, route: str) -> Dict[str, Any]:
+        remaining = list(candidates)
+        running: Dict[asyncio.Task, str] = {}
+        last: Dict[str, Any] = {}
+
+        def launch():
+            key, provider = remaining.pop(0)
+            running[asyncio.create_task(self._attempt(key, provider, messages, tools, route))] = key
+
+        launch()
+        try:
+            while running:
+                # At most one hedge: a second model once the first has used up the SLO
+                can_hedge = self.hedging and remaining and len(running) == 1
+                done, _ = await asyncio.wait(
+                    running, timeout=self.slo(route) if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.metrics["hedges"] += 1
+                    logger.info(f"{route} call to {next(iter(running.values()))} passed its {self.slo(route)}s SLO, hedging")
+                    launch()
+                    continue
+                for task in done:
+                    key = running.pop(task)
+                    result = task.result()
+                    if _good(result):
+                        if running:
+                            self.metrics["hedge_wins"] += 1
+                            result["hedged"] = True
+                        return result
+                    last = result
+                if not running and remaining:
+                    launch()
+            return last
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _streamed(self, candidates, messages, tools, route: str, emit) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for key, provider in candidates:
+            streamed = False
+
+            async def tracked(event, emit=emit):
+                nonlocal streamed
+                streamed = True
+                await emit(event)
+
+            result = await self._attempt(key, provider, messages, tools, route, tracked)
+            if _good(result) or streamed:
+                return result
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "chain": [key for key, _ in self.chain()],
+            "hedging": self.hedging,
+            "slos": {**self.slos, "default": self.default_slo},
+            "circuits": {
+                key: {"state": breaker.state, "failures": breaker.failure_count}
+                for key, breaker in self.breakers.items()
+            },
+            "metrics": dict(self.metrics)
+        }
+
+
+provider_router = ProviderRouter(ai_manager)
@@ -0,0 +1,310 @@
+"""
+Payment Reconciliation
+Compares Stripe PaymentIntents and Refunds for a date window with local
+bookings and reports the differences, optionally fixing the safe ones.
+Stripe is read a page at a time and each page is matched with set-based
+queries, so memory stays bounded by the page size rather than the window.
+"""
+
+import asyncio
+import calendar
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import stripe
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import config
+from app.database import SessionLocal
+from app.models import AdultBooking, Booking, PaymentStatus
+
+logger = logging.getLogger(__name__)
+
+BOOKING_MODELS = (("booking", Booking, "booking_ids"), ("adult_booking", AdultBooking, "adult_booking_ids"))
+SETTLED_STATUSES = (PaymentStatus.paid, PaymentStatus.refunded)
+ABANDONED_INTENT_STATUSES = ("canceled", "requires_payment_method")
+
+
+def _unix(value: datetime) -> int:
+    return calendar.timegm(value.utctimetuple())
+
+
+def _parse_ids(value: Optional[str]) -> List[int]:
+    return [int(part) for part in (value or "").split(",") if part.strip().isdigit()]
+
+
+class StripeSource:
+    """Pages through Stripe list endpoints using starting_after cursors"""
+
+    def __init__(self, payment_intents=None, refunds=None, page_size: int = 100, api_key: Optional[str] = None):
+        # Anything with a Stripe-style list(created=..., limit=..., starting_after=..., api_key=...) works here
+        self.payment_intents = payment_intents or stripe.PaymentIntent
+        self.refunds = refunds or stripe.Refund
+        self.page_size = page_size
+        # Passed on every call: the global stripe.api_key is only set once a PaymentService exists
+        self.api_key = api_key or config.STRIPE_SECRET_KEY
+
+    def payment_intent_pages(self, start: datetime, end: datetime) -> Iterator[List[Dict[str, Any]]]:
+        return self._pages(self.payment_intents, start, end)
+
+    def refund_pages(self, start: datetime, end: datetime) -> Iterator[List[Dict[str, Any]]]:
+        return self._pages(self.refunds, start, end)
+
+    def _pages(self, resource, start: datetime, end: datetime) -> Iterator[List[Dict[str, Any]]]:
+        params = {"created": {"gte": _unix(start), "lt": _unix(end)}, "limit": self.page_size}
+        while True:
+            page = resource.list(api_key=self.api_key, **params)
+            items = list(page.data)
+            if items:
+                yield items
+            if not page.has_more or not items:
+                return
+            params["starting_after"] = items[-1]["id"]
+
+
+class ReconciliationReport:
+    """Discrepancy counts plus a capped sample of each kind"""
+
+    def __init__(self, start: datetime, end: datetime, auto_fix: bool, sample_limit: int):
+        self.start = start
+        self.end = end
+        self.auto_fix = auto_fix
+        self.sample_limit = sample_limit
+        self.checked = {"payment_intents": 0, "refunds": 0, "bookings": 0}
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[Dict[str, Any]]] = {}
+        self.fixed: Dict[str, int] = {}
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    def add(self, kind: str, **details):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        samples = self.samples.setdefault(kind, [])
+        if len(samples) < self.sample_limit:
+            samples.append(details)
+
+    def add_fixed(self, kind: str, count: int):
+        if count:
+            self.fixed[kind] = self.fixed.get(kind, 0) + count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "window": {"start": self.start.isoformat(), "end": self.end.isoformat()},
+            "auto_fix": self.auto_fix,
+            "checked": self.checked,
+            "discrepancies": self.counts,
+            "fixed": self.fixed,
+            "samples": self.samples,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class PaymentReconciler:
+    """Matches Stripe payments and refunds against Booking and AdultBooking"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        source: Optional[StripeSource] = None,
+        stale_after_hours: float = None,
+        sample_limit: int = 100,
+        chunk_size: int = 500
+    ):
+        self.session_factory = session_factory
+        self.source = source or StripeSource()
+        self.stale_after = timedelta(hours=stale_after_hours or config.RECONCILIATION_STALE_HOURS)
+        self.sample_limit = sample_limit
+        self.chunk_size = chunk_size
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def run(self, start: datetime, end: datetime, auto_fix: bool = False) -> Dict[str, Any]:
+        """Reconcile one window. Blocking; call via asyncio.to_thread from async code."""
+        report = ReconciliationReport(start, end, auto_fix, self.sample_limit)
+        stale_before = datetime.utcnow() - self.stale_after
+        db = self.session_factory()
+        try:
+            for page in self.source.payment_intent_pages(start, end):
+                self._match_payment_intents(db, page, report, stale_before)
+                db.commit()
+
+            # Only payment intents with a refund in the window are kept, which is a small set
+            refunded_intents = set()
+            for page in self.source.refund_pages(start, end):
+                refunded_intents.update(r["payment_intent"] for r in page)
+                self._match_refunds(db, page, report)
+                db.commit()
+
+            self._check_local_refunds(db, start, end, refunded_intents, report)
+            self._check_stuck_pending(db, stale_before, report)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        report.finished_at = datetime.utcnow()
+        self.last_report = report.to_dict()
+        logger.info(f"Reconciliation {start:%Y-%m-%d} to {end:%Y-%m-%d}: {report.counts or 'no discrepancies'}")
+        return self.last_report
+
+    # ----- Stripe-side matching -----
+
+    def _bookings_for(self, db: Session, model, ids: List[int], intent_ids: List[str]):
+        return db.query(
+            model.id, model.payment_status, model.stripe_payment_id, model.refund_processed
+        ).filter(or_(model.id.in_(ids), model.stripe_payment_id.in_(intent_ids))).all()
+
+    def _match_payment_intents(self, db: Session, page: List[Dict[str, Any]], report: ReconciliationReport, stale_before: datetime):
+        report.checked["payment_intents"] += len(page)
+        intent_ids = [pi["id"] for pi in page]
+
+        for label, model, metadata_key in BOOKING_MODELS:
+            claimed = {pi["id"]: _parse_ids((pi.get("metadata") or {}).get(metadata_key)) for pi in page}
+            rows = self._bookings_for(db, model, [i for ids in claimed.values() for i in ids], intent_ids)
+            by_id = {row.id: row for row in rows}
+            by_intent: Dict[str, list] = {}
+            for row in rows:
+                by_intent.setdefault(row.stripe_payment_id, []).append(row)
+
+            to_mark_paid: Dict[str, List[int]] = {}
+            to_mark_failed: List[int] = []
+            for pi in page:
+                matched = {i: by_id[i] for i in claimed[pi["id"]] if i in by_id}
+                matched.update({row.id: row for row in by_intent.get(pi["id"], [])})
+
+                if pi["status"] == "succeeded":
+                    if not matched and claimed[pi["id"]]:
+                        report.add("orphan_payment", payment_intent=pi["id"], model=label, booking_ids=claimed[pi["id"]])
+                    for row in matched.values():
+                        if row.payment_status not in SETTLED_STATUSES:
+                            report.add("paid_not_recorded", payment_intent=pi["id"], model=label, booking_id=row.id, local_status=row.payment_status.value if row.payment_status else None)
+                            to_mark_paid.setdefault(pi["id"], []).append(row.id)
+                elif pi["status"] in ABANDONED_INTENT_STATUSES and datetime.utcfromtimestamp(pi["created"]) < stale_before:
+                    for row in matched.values():
+                        if row.payment_status == PaymentStatus.pending:
+                            report.add("payment_abandoned", payment_intent=pi["id"], model=label, booking_id=row.id)
+                            to_mark_failed.append(row.id)
+
+            if report.auto_fix:
+                for intent_id, ids in to_mark_paid.items():
+                    report.add_fixed("paid_not_recorded", db.query(model).filter(model.id.in_(ids)).update({
+                        model.payment_status: PaymentStatus.paid,
+                        model.stripe_payment_id: intent_id
+                    }, synchronize_session=False))
+                if to_mark_failed:
+                    report.add_fixed("payment_abandoned", db.query(model).filter(
+                        model.id.in_(to_mark_failed), model.payment_status == PaymentStatus.pending
+                    ).update({model.payment_status: PaymentStatus.failed}, synchronize_session=False))
+
+    def _match_refunds(self, db: Session, page: List[Dict[str, Any]], report: ReconciliationReport):
+        report.checked["refunds"] += len(page)
+        intent_ids = [r["payment_intent"] for r in page if r.get("payment_intent")]
+
+        for label, model, _ in BOOKING_MODELS:
+            # Refunds made since bookings were named in their metadata match that booking only
+            claimed = {}
+            for refund in page:
+                metadata = refund.get("metadata") or {}
+                if metadata.get("booking_id"):
+                    claimed[refund["id"]] = _parse_ids(metadata["booking_id"]) if metadata.get("booking_model") == label else []
+            rows = self._bookings_for(db, model, [i for ids in claimed.values() for i in ids], intent_ids)
+            by_id = {row.id: row for row in rows}
+            by_intent: Dict[str, list] = {}
+            for row in rows:
+                by_intent.setdefault(row.stripe_payment_id, []).append(row)
+
+            for refund in page:
+                if refund["id"] in claimed:
+                    matched = [by_id[i] for i in claimed[refund["id"]] if i in by_id]
+                else:
+                    matched = by_intent.get(refund.get("payment_intent"), [])
+                # An older refund on an intent shared by several bookings can't say which one it was for
+                ambiguous = refund["id"] not in claimed and len(matched) > 1
+                for row in matched:
+                    if refund["status"] == "succeeded" and not row.refund_processed:
+                        report.add("refund_not_recorded", refund=refund["id"], model=label, booking_id=row.id, amount_cents=refund["amount"], shared_intent=ambiguous)
+                        if report.auto_fix and not ambiguous:
+                            report.add_fixed("refund_not_recorded", db.query(model).filter(model.id == row.id).update({
+                                model.refund_processed: True,
+                                model.refund_amount: refund["amount"] / 100,
+                                model.refund_processed_at: datetime.utcfromtimestamp(refund["created"]),
+                                model.payment_status: PaymentStatus.refunded
+                            }, synchronize_session=False))
+                    elif refund["status"] in ("failed", "canceled") and row.refund_processed:
+                        report.add("refund_not_settled", refund=refund["id"], model=label, booking_id=row.id, stripe_status=refund["status"], shared_intent=ambiguous)
+
+    # ----- local-side checks -----
+
+    def _check_local_refunds(self, db: Session, start: datetime, end: datetime, refunded_intents: set, report: ReconciliationReport):
+        """Refunds recorded locally whose payment has no refund at all in Stripe"""
+        for label, model, _ in BOOKING_MODELS:
+            rows = db.query(model.id, model.stripe_payment_id).filter(
+                model.refund_processed.is_(True),
+                model.stripe_payment_id.isnot(None),
+                model.refund_processed_at >= start,
+                model.refund_processed_at < end
+            ).execution_options(yield_per=self.chunk_size)
+            for row in rows:
+                report.checked["bookings"] += 1
+                if row.stripe_payment_id not in refunded_intents:
+                    report.add("refund_missing_in_stripe", model=label, booking_id=row.id, payment_intent=row.stripe_payment_id)
+
+    def _check_stuck_pending(self, db: Session, stale_before: datetime, report: ReconciliationReport):
+        for label, model, _ in BOOKING_MODELS:
+            rows = db.query(model.id, model.event_id, model.timestamp).filter(
+                model.payment_status == PaymentStatus.pending,
+                model.timestamp < stale_before
+            ).execution_options(yield_per=self.chunk_size)
+            for row in rows:
+                report.checked["bookings"] += 1
+                report.add("stuck_pending", model=label, booking_id=row.id, event_id=row.event_id, since=row.timestamp.isoformat() if row.timestamp else None)
+
+    # ----- scheduling -----
+
+    async def run_window(self, start: datetime, end: datetime, auto_fix: bool = False) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.run, start, end, auto_fix)
+
+    def start_nightly(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._nightly())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _nightly(self):
+        while True:
+            now = datetime.utcnow()
+            next_run = now.replace(hour=config.RECONCILIATION_HOUR_UTC, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+
+            # Look back a few days so late webhooks and refunds are still caught
+            end = datetime.utcnow()
+            start = end - timedelta(days=config.RECONCILIATION_LOOKBACK_DAYS)
+            try:
+                await self.run_window(start, end, auto_fix=config.RECONCILIATION_AUTO_FIX)
+            except Exception as e:
+                logger.error(f"Nightly reconciliation failed: {e}")
+
+
+# Global reconciler instance
+_payment_reconciler: Optional[PaymentReconciler] = None
+
+
+def get_payment_reconciler() -> PaymentReconciler:
+    global _payment_reconciler
+    if _payment_reconciler is None:
+        _payment_reconciler = PaymentReconciler()
+    return _payment_reconciler
@@ -0,0 +1,181 @@
+"""
+Text tool-call parser
+Models without native function calling write their tool calls into the reply
+text, in a handful of shapes:
+
+    TOOL_CALL: create_event_draft {"title": "Park day", "tickets": {"adult": 10}}
+    create_event_draft({"title": "Park day"})
+    ```json {"name": "create_event_draft", "arguments": {"title": "Park day"}} ```
+    <tool_call>{"function": {"name": "create_event_draft", "parameters": {...}}}</tool_call>
+
+ToolCallParser finds them in one pass. It jumps from one "{" to the next,
+matches braces with a JSON-aware scanner (strings and escapes included, so
+nested arguments work), then decides whether the object is a call from the
+tool name written just before it or from its own name/arguments keys. Text
+can be fed in chunks while it streams; an object cut off at the end of a
+chunk is completed when the rest arrives.
+"""
+
+import functools
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STRUCTURAL = re.compile(r'[{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Tool name right before an object: `name {`, `name: {`, `name = {`, `name({`, `"name" {`
+_NAME_BEFORE = re.compile(r'([A-Za-z_][\w.-]*)["\'`]?\s*(?:[:=]\s*|\(\s*)?$')
+_NAME_LOOKBEHIND = 80
+_ARGUMENT_KEYS = ("arguments", "parameters", "args", "input", "tool_input")
+# An unclosed "{" with this much text after it is prose, not a call still streaming in
+MAX_PENDING_CHARS = 64 * 1024
+
+
+def _object_end(text: str, start: int) -> Optional[int]:
+    """Index just past the object opening at text[start], or None if it isn't closed yet"""
+    depth = 0
+    position = start
+    while True:
+        match = _STRUCTURAL.search(text, position)
+        if match is None:
+            return None
+        position = match.end()
+        char = match.group()
+        if char == '"':
+            while True:
+                match = _STRING_SPECIAL.search(text, position)
+                if match is None:
+                    return None
+                position = match.end()
+                if match.group() == '"':
+                    break
+                position += 1  # skip the escaped character
+        elif char == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return position
+
+
+@functools.lru_cache(maxsize=32)
+def _mention_pattern(tool_names: Tuple[str, ...]) -> "re.Pattern":
+    return re.compile("|".join(re.escape(name) for name in tool_names), re.IGNORECASE)
+
+
+def _tool_call(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return {"function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+class ToolCallParser:
+    """Incremental parser for tool calls written as text; feed() chunks, then finish()"""
+
+    def __init__(self, tools: Iterable[Dict[str, Any]], loose: bool = False):
+        """
+        loose=True also accepts the first JSON object anywhere after a tool name is
+        mentioned, when nothing stricter was found.
+        """
+        self.tool_names = {tool["name"].lower(): tool["name"] for tool in tools if tool.get("name")}
+        self.loose = loose
+        self.text = ""
+        self.calls: List[Dict[str, Any]] = []
+        self._position = 0
+        self._unattributed: List[Tuple[int, Dict[str, Any]]] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add streamed text; returns the calls completed by it"""
+        self.text += chunk
+        return self._scan(final=False)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Parse whatever is left and return every call found"""
+        self._scan(final=True)
+        if not self.calls and self.loose:
+            self._attribute_by_mention()
+        logger.debug(f"Parsed {len(self.calls)} text tool calls from {len(self.text)} chars")
+        return self.calls
+
+    def _scan(self, final: bool) -> List[Dict[str, Any]]:
+        found = []
+        text = self.text
+        while self.tool_names:
+            start = text.find("{", self._position)
+            if start < 0:
+                self._position = len(text)
+                break
+            end = _object_end(text, start)
+            if end is None:
+                if final or len(text) - start > MAX_PENDING_CHARS:
+                    self._position = start + 1
+                    continue
+                self._position = start  # wait for the rest of the object
+                break
+
+            call = self._interpret(start, end)
+            if call:
+                found.append(call)
+                self._position = end
+            else:
+                # Not a call itself, but it may wrap one ({"tool_calls": [{...}]})
+                self._position = start + 1
+        self.calls.extend(found)
+        return found
+
+    def _interpret(self, start: int, end: int) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(self.text[start:end])
+        except ValueError:
+            return None
+        if not isinstance(value, dict):
+            return None
+
+        prefix = _NAME_BEFORE.search(self.text, max(0, start - _NAME_LOOKBEHIND), start)
+        if prefix:
+            name = self.tool_names.get(prefix.group(1).lower())
+            if name:
+                return _tool_call(name, value)
+
+        call = self._named_call(value)
+        if call is None and len(self._unattributed) < 8:
+            self._unattributed.append((start, value))
+        return call
+
+    def _named_call(self, value: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """{"name": tool, "arguments": {...}} and the usual variations on it"""
+        target = value["function"] if isinstance(value.get("function"), dict) else value
+        name = target.get("name") or target.get("tool") or target.get("tool_name")
+        if not name and isinstance(value.get("function"), str):
+            name = value["function"]
+        if not isinstance(name, str) or name.lower() not in self.tool_names:
+            return None
+
+        key = next((key for key in _ARGUMENT_KEYS if key in target), None)
+        if key is None:
+            return None
+        arguments = target[key]
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                return None
+        if not isinstance(arguments, dict):
+            return None
+        return _tool_call(self.tool_names[name.lower()], arguments)
+
+    def _attribute_by_mention(self):
+        pattern = _mention_pattern(tuple(sorted(self.tool_names.values(), key=len, reverse=True)))
+        for start, value in self._unattributed:
+            mentions = list(pattern.finditer(self.text, 0, start))
+            if mentions:
+                self.calls.append(_tool_call(self.tool_names[mentions[-1].group().lower()], value))
+                return
+
+
+def parse_tool_calls(content: str, tools: Iterable[Dict[str, Any]], loose: bool = False) -> List[Dict[str, Any]]:
+    """All tool calls written into a complete reply"""
+    parser = ToolCallParser(tools, loose=loose)
+    parser.feed(content)
+    return parser.finish()
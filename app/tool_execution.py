@@ -0,0 +1,145 @@
+"""
+Tool execution engine for one model turn
+
+A model often asks for several tools at once (draft the event, look up
+similar events, validate the data). They used to run one after another, and
+every create_event_draft saved and committed its own draft version.
+
+ToolExecutionEngine plans the turn's calls from what each tool reads and
+writes (TOOL_ACCESS): calls that don't conflict run concurrently, and a call
+that touches state an earlier call writes waits for it, so call order is
+kept wherever it matters. Draft mutations aren't saved as they happen; they
+are folded together in call order and written once, as a single draft
+version in a single transaction, after every call has finished.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# tool name -> (state it reads, state it writes); calls conflict when one writes what the other touches
+TOOL_ACCESS: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {
+    "create_event_draft": (frozenset({"draft"}), frozenset({"draft"})),
+    "query_database": (frozenset({"events"}), frozenset()),
+    "suggest_event_details": (frozenset({"events"}), frozenset()),
+    "validate_event_data": (frozenset(), frozenset()),
+}
+# Tools we know nothing about are assumed to touch everything, so they run on their own
+_UNKNOWN_ACCESS = (frozenset({"*"}), frozenset({"*"}))
+
+DRAFT_TOOL = "create_event_draft"
+
+
+def _access(tool_name: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    return TOOL_ACCESS.get(tool_name, _UNKNOWN_ACCESS)
+
+
+def conflicts(first: str, second: str) -> bool:
+    """Whether two tool calls must not run at the same time"""
+    first_reads, first_writes = _access(first)
+    second_reads, second_writes = _access(second)
+    if "*" in first_writes or "*" in second_writes:
+        return True
+    return bool(first_writes & (second_reads | second_writes) or second_writes & first_reads)
+
+
+def plan_waves(tool_names: List[str]) -> List[List[int]]:
+    """
+    Group call indexes into waves that run one after another; calls in a wave
+    run concurrently. Each call goes in the wave after the last earlier call
+    it conflicts with.
+    """
+    waves: List[List[int]] = []
+    wave_of: List[int] = []
+    for index, name in enumerate(tool_names):
+        wave = 1 + max((wave_of[earlier] for earlier in range(index) if conflicts(tool_names[earlier], name)), default=-1)
+        wave_of.append(wave)
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(index)
+    return waves
+
+
+def _parse_call(tool_call: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """(name, arguments, error) from a provider's tool call"""
+    if hasattr(tool_call, "model_dump"):
+        tool_call = tool_call.model_dump()  # OpenAI SDK objects
+    function = tool_call.get("function", {})
+    name = function.get("name", "")
+    arguments = function.get("arguments")
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse tool arguments: {e}")
+            return name, None, f"Invalid arguments: {str(e)}"
+    return name, arguments or {}, None
+
+
+class ToolExecutionEngine:
+    """Runs one turn's tool calls with DynamicToolIntegration's tools and draft manager"""
+
+    def __init__(self, tool_integration):
+        self.tool_integration = tool_integration
+
+    async def run(self, tool_calls: List[Dict[str, Any]], session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Execute `tool_calls`; returns {"function", "result"} or {"function", "error"}
+        per call, in call order. With a session_id, draft mutations are saved.
+        """
+        calls = [_parse_call(tool_call) for tool_call in tool_calls]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+        for index, (name, _, error) in enumerate(calls):
+            if error:
+                results[index] = {"function": name, "error": error}
+
+        runnable = [index for index, (_, _, error) in enumerate(calls) if not error]
+        for wave in plan_waves([calls[index][0] for index in runnable]):
+            indexes = [runnable[position] for position in wave]
+            outcomes = await asyncio.gather(
+                *(self._execute(calls[index][0], calls[index][1]) for index in indexes)
+            )
+            for index, outcome in zip(indexes, outcomes):
+                results[index] = outcome
+
+        if session_id:
+            await self._save_draft(session_id, calls, results)
+        return results
+
+    async def _execute(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            result = await self.tool_integration.tools.execute_tool(name, arguments)
+        except Exception as e:
+            logger.error(f"Tool {name} failed: {e}")
+            return {"function": name, "error": str(e)}
+        logger.info(f"Tool {name} executed")
+        return {"function": name, "result": result}
+
+    async def _save_draft(self, session_id: str, calls, results: List[Dict[str, Any]]):
+        """Fold the turn's draft mutations in call order and save them as one version"""
+        draft: Optional[Dict[str, Any]] = None
+        drafting = []
+        for (name, arguments, _), outcome in zip(calls, results):
+            result = outcome.get("result") or {}
+            if name != DRAFT_TOOL or not result.get("success") or not result.get("event_data"):
+                continue
+            event_data = result["event_data"]
+            if draft is None:
+                draft = dict(event_data)
+            else:
+                # Later calls refine the draft; defaults they filled in don't undo earlier values
+                draft.update({key: value for key, value in event_data.items() if key in arguments})
+            drafting.append((result, arguments))
+        if draft is None:
+            return
+
+        saved = self.tool_integration.draft_manager.save_event_draft(session_id, draft, source=f"ai_tool_{DRAFT_TOOL}")
+        ticket_types = []
+        if saved:
+            for _, arguments in drafting:
+                ticket_types.extend(await self.tool_integration.add_ticket_types(arguments))
+        for result, _ in drafting:
+            result.update(event_data=draft, draft_saved=saved, can_create_event=saved, ticket_types_added=ticket_types)
@@ -0,0 +1,101 @@
+"""
+Tool Schema Registry
+Builds AI tool schemas once per process instead of on every chat turn.
+
+Static schemas (hand-written tool lists, schemas introspected from the
+SQLAlchemy models) never change while the app is running. Schemas that
+include DynamicFieldDefinition rows are rebuilt only after one of those rows
+is inserted, updated or deleted through the ORM. Provider-specific formats
+(format_tools_for_provider output) are cached per provider class alongside.
+
+Cached schemas are shared between callers and must be treated as read-only.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import event
+
+from app.models import DynamicFieldDefinition
+
+logger = logging.getLogger(__name__)
+
+
+class ToolSchemaRegistry:
+    """Process-wide cache of tool schemas and their provider formats"""
+
+    max_formatted = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schemas: Dict[str, Tuple[int, Any]] = {}
+        self._formatted: Dict[Tuple[str, int], Tuple[Any, Any]] = {}
+        self.dynamic_version = 0
+        self.metrics = {"hits": 0, "builds": 0, "format_hits": 0, "formats": 0, "invalidations": 0}
+
+    def get(self, key: str, builder: Callable[[], Any], dynamic: bool = False) -> Any:
+        """
+        Return the schema cached under `key`, building it on first use.
+        Pass dynamic=True when the builder reads DynamicFieldDefinition rows.
+        """
+        version = self.dynamic_version if dynamic else 0
+        entry = self._schemas.get(key)
+        if entry is not None and entry[0] == version:
+            self.metrics["hits"] += 1
+            return entry[1]
+
+        with self._lock:
+            entry = self._schemas.get(key)
+            if entry is not None and entry[0] == version:
+                self.metrics["hits"] += 1
+                return entry[1]
+            value = builder()
+            self._schemas[key] = (version, value)
+            self.metrics["builds"] += 1
+            return value
+
+    def formatted(self, provider, tools: List[Dict[str, Any]]) -> Any:
+        """provider.format_tools_for_provider(tools), cached while `tools` is the same registry object"""
+        if not tools:
+            return None
+        key = (type(provider).__name__, id(tools))
+        entry = self._formatted.get(key)
+        if entry is not None and entry[0] is tools:
+            self.metrics["format_hits"] += 1
+            return entry[1]
+
+        formatted = provider.format_tools_for_provider(tools)
+        with self._lock:
+            if len(self._formatted) >= self.max_formatted:
+                self._formatted.clear()
+            self._formatted[key] = (tools, formatted)
+        self.metrics["formats"] += 1
+        return formatted
+
+    def invalidate_dynamic(self):
+        """Drop schemas built from DynamicFieldDefinition rows"""
+        with self._lock:
+            self.dynamic_version += 1
+            self._formatted.clear()
+            self.metrics["invalidations"] += 1
+        logger.info(f"Tool schemas invalidated (dynamic fields v{self.dynamic_version})")
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+            self._formatted.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, "schemas": len(self._schemas), "dynamic_version": self.dynamic_version}
+
+
+tool_schema_registry = ToolSchemaRegistry()
+
+
+def _dynamic_fields_changed(mapper, connection, target):
+    tool_schema_registry.invalidate_dynamic()
+
+
+for _change in ("after_insert", "after_update", "after_delete"):
+    event.listen(DynamicFieldDefinition, _change, _dynamic_fields_changed)
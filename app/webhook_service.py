@@ -0,0 +1,253 @@
+"""
+Stripe Webhook Processing
+The webhook endpoint only verifies the signature and stores the raw event; a
+background processor applies stored events to bookings in Stripe's order.
+Stripe retries are absorbed by the unique stripe_event_id.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import config
+from app.database import SessionLocal
+from app.models import AdultBooking, Booking, PaymentStatus, StripeWebhookEvent, WebhookEventStatus
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_webhook_event(db: Session, stripe_event_id: str, event_type: str, created: int, payload: bytes) -> bool:
+    """Store a verified webhook event. Returns False if Stripe already delivered it."""
+    db.add(StripeWebhookEvent(
+        stripe_event_id=stripe_event_id,
+        event_type=event_type,
+        payload=payload.decode("utf-8"),
+        stripe_created=created,
+        status=WebhookEventStatus.pending,
+        attempts=0
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        get_webhook_processor().metrics["duplicates_total"] += 1
+        return False
+
+    get_webhook_processor().notify()
+    return True
+
+
+def _parse_ids(value: Optional[str]) -> List[int]:
+    return [int(part) for part in (value or "").split(",") if part.strip().isdigit()]
+
+
+class WebhookProcessor:
+    """Applies stored Stripe events to bookings in order, in batches"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: int = None,
+        poll_interval: float = None,
+        max_attempts: int = None
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or config.WEBHOOK_BATCH_SIZE
+        self.poll_interval = poll_interval or config.WEBHOOK_POLL_INTERVAL
+        self.max_attempts = max_attempts or config.WEBHOOK_MAX_ATTEMPTS
+
+        self._handlers = {
+            "payment_intent.succeeded": self._payment_succeeded,
+            "payment_intent.payment_failed": self._payment_failed,
+        }
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+        self.metrics: Dict[str, Any] = {
+            "processed_total": 0,
+            "ignored_total": 0,
+            "failed_total": 0,
+            "duplicates_total": 0,
+            "bookings_updated_total": 0,
+            "batches_total": 0,
+            "last_batch_seconds": 0.0,
+            "last_error": None,
+        }
+
+    # ----- lifecycle -----
+
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Webhook processor started")
+
+    async def stop(self):
+        self._stopping = True
+        if self._wake:
+            self._wake.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+        logger.info("Webhook processor stopped")
+
+    def notify(self):
+        """Wake the processor early instead of waiting for the next poll. Safe to call from any thread."""
+        if self._wake is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                processed = await asyncio.to_thread(self.process_batch)
+            except Exception as e:
+                logger.error(f"Webhook batch failed: {e}")
+                self.metrics["last_error"] = str(e)
+                processed = 0
+
+            if processed >= self.batch_size:
+                continue
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # ----- processing -----
+
+    def process_batch(self) -> int:
+        """Apply the oldest pending events in one transaction. Runs in a worker thread."""
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            events = db.query(StripeWebhookEvent).filter(
+                StripeWebhookEvent.status == WebhookEventStatus.pending
+            ).order_by(
+                StripeWebhookEvent.stripe_created, StripeWebhookEvent.id
+            ).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+            for event in events:
+                try:
+                    # A savepoint per event so one bad payload doesn't undo the rest of the batch
+                    with db.begin_nested():
+                        self._apply(db, event)
+                except Exception as e:
+                    self._record_failure(event, e)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if events:
+            self.metrics["batches_total"] += 1
+            self.metrics["last_batch_seconds"] = round(time.perf_counter() - started, 4)
+        return len(events)
+
+    def _apply(self, db: Session, event: StripeWebhookEvent):
+        handler = self._handlers.get(event.event_type)
+        data = json.loads(event.payload)
+        payment_intent = data.get("data", {}).get("object", {})
+        metadata = payment_intent.get("metadata") or {}
+
+        if handler is None or metadata.get("booking_type") != "event_booking":
+            self._finish(event, WebhookEventStatus.ignored)
+            return
+
+        booking_ids = _parse_ids(metadata.get("booking_ids"))
+        adult_booking_ids = _parse_ids(metadata.get("adult_booking_ids"))
+        if not booking_ids and not adult_booking_ids:
+            self._finish(event, WebhookEventStatus.ignored, "No booking ids in payment metadata")
+            return
+
+        updated = 0
+        for model, ids in ((Booking, booking_ids), (AdultBooking, adult_booking_ids)):
+            if ids:
+                updated += handler(db, model, ids, payment_intent["id"], event)
+        self.metrics["bookings_updated_total"] += updated
+        self._finish(event, WebhookEventStatus.processed)
+
+    @staticmethod
+    def _payment_succeeded(db: Session, model, ids: List[int], payment_intent_id: str, event: StripeWebhookEvent) -> int:
+        # A later success overrides an earlier failed attempt on the same bookings
+        return db.query(model).filter(
+            model.id.in_(ids),
+            model.payment_status.in_([PaymentStatus.unpaid, PaymentStatus.pending, PaymentStatus.failed])
+        ).update({
+            model.payment_status: PaymentStatus.paid,
+            model.stripe_payment_id: payment_intent_id,
+            model.payment_date: datetime.utcfromtimestamp(event.stripe_created)
+        }, synchronize_session=False)
+
+    @staticmethod
+    def _payment_failed(db: Session, model, ids: List[int], payment_intent_id: str, event: StripeWebhookEvent) -> int:
+        return db.query(model).filter(
+            model.id.in_(ids),
+            model.payment_status == PaymentStatus.pending
+        ).update({
+            model.payment_status: PaymentStatus.failed,
+            model.stripe_payment_id: payment_intent_id
+        }, synchronize_session=False)
+
+    def _finish(self, event: StripeWebhookEvent, status: WebhookEventStatus, note: str = None):
+        event.status = status
+        event.processed_at = datetime.utcnow()
+        event.last_error = note
+        if status == WebhookEventStatus.ignored:
+            self.metrics["ignored_total"] += 1
+        else:
+            self.metrics["processed_total"] += 1
+
+    def _record_failure(self, event: StripeWebhookEvent, error: Exception):
+        event.attempts += 1
+        event.last_error = f"{type(error).__name__}: {error}"[:1000]
+        self.metrics["last_error"] = event.last_error
+        if event.attempts >= self.max_attempts:
+            event.status = WebhookEventStatus.failed
+            self.metrics["failed_total"] += 1
+            logger.error(f"Webhook event {event.stripe_event_id} failed after {event.attempts} attempts: {error}")
+        else:
+            logger.warning(f"Webhook event {event.stripe_event_id} attempt {event.attempts} failed: {error}")
+
+    # ----- metrics -----
+
+    def get_metrics(self, db: Session = None) -> Dict[str, Any]:
+        """Processor counters plus stored events by status"""
+        metrics = dict(self.metrics)
+        metrics["running"] = bool(self._task and not self._task.done())
+
+        if db is not None:
+            counts = db.query(StripeWebhookEvent.status, func.count(StripeWebhookEvent.id)).group_by(StripeWebhookEvent.status).all()
+            metrics["events"] = {status.value: 0 for status in WebhookEventStatus}
+            for status, count in counts:
+                metrics["events"][status.value] = count
+        return metrics
+
+
+# Global processor instance
+_webhook_processor: Optional[WebhookProcessor] = None
+
+
+def get_webhook_processor() -> WebhookProcessor:
+    global _webhook_processor
+    if _webhook_processor is None:
+        _webhook_processor = WebhookProcessor()
+    return _webhook_processor
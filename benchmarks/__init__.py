@@ -0,0 +1 @@
+"""Local performance benchmarks; see each module for how to run it"""
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+AI load benchmark against the fake Ollama/OpenAI server
+
+Drives OllamaProvider, OpenAIProvider (through the OpenAI-compatible API),
+ChatService and ThinkingEventAgent end to end at each concurrency level and
+writes throughput, tail latency and queue wait to test_results/ as JSON.
+Nothing here needs a real model, so runs are reproducible and comparable.
+
+    python -m benchmarks.ai_load --concurrency 1,4,16 --requests 64 \\
+        --latency 0.2 --tokens-per-second 50 --response-tokens 40 --parallel 2 --failure-rate 0.02
+
+App-side inference slots come from OLLAMA_NUM_PARALLEL, as in production.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.ai_providers import ModelConfig, OllamaProvider, OpenAIProvider, ai_manager, ollama_clients
+from app.ai_telemetry import ai_telemetry
+from app.models import AgentSession, AgentStatus, Base, ChatConversation, User
+from benchmarks.fake_ollama import FakeOllamaServer
+
+TARGETS = ("ollama", "openai", "chat_service", "agent")
+BENCH_MODEL_KEY = "bench_fake_ollama"
+TOOL_CALL = {
+    "name": "create_event_draft",
+    "arguments": {"title": "Science Workshop", "date": "2026-11-14T10:00:00", "location": "Community Hall"}
+}
+
+# request index -> whether the request succeeded
+Request = Callable[[int], Awaitable[bool]]
+
+
+def _prompt(index: int) -> str:
+    # Unique per request so no layer can answer from its response cache, and
+    # incomplete so the rule-based extractor still hands the turn to the model
+    return f"Can you help me plan a science workshop for the kids? (request {index})"
+
+
+def _messages(index: int) -> List[Dict[str, str]]:
+    return [{"role": "user", "content": _prompt(index)}]
+
+
+def _tools() -> List[Dict[str, Any]]:
+    from app.ai_tools import DynamicEventTools
+    return DynamicEventTools(db=None, user_id=1).get_tool_definitions()
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, Optional[float]]:
+    if not seconds:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(seconds)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {
+        "mean": round(statistics.mean(ordered) * 1000, 1),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+# ----- targets -----
+
+def ollama_target(server: FakeOllamaServer, db_factory) -> Request:
+    provider = OllamaProvider(ModelConfig(provider="ollama", model_name=server.model, endpoint_url=server.base_url))
+    tools = _tools()
+
+    async def request(index: int) -> bool:
+        result = await provider.chat_completion(_messages(index), tools)
+        return not result.get("error")
+    return request
+
+
+def openai_target(server: FakeOllamaServer, db_factory) -> Request:
+    provider = OpenAIProvider(ModelConfig(provider="openai", model_name=server.model,
+                                          endpoint_url=f"{server.base_url}/v1", api_key="sk-bench"))
+    tools = _tools()
+
+    async def request(index: int) -> bool:
+        result = await provider.chat_completion(_messages(index), tools)
+        return not result.get("error")
+    return request
+
+
+def _new_conversation(db, user_id: int) -> str:
+    session_id = str(uuid.uuid4())
+    db.add(ChatConversation(id=session_id, user_id=user_id, title="Benchmark", status="active"))
+    db.add(AgentSession(id=str(uuid.uuid4()), conversation_id=session_id, agent_type="event_creator",
+                        status=AgentStatus.idle, memory={}))
+    db.commit()
+    return session_id
+
+
+def chat_service_target(server: FakeOllamaServer, db_factory) -> Request:
+    import app.main  # noqa: F401  (app.ai imports from app.main, so load it first)
+    from app.ai.services.chat_service import ChatService
+    service = ChatService()
+
+    async def request(index: int) -> bool:
+        db = db_factory()
+        try:
+            user = db.query(User).first()
+            session_id = _new_conversation(db, user.id)
+            result = await service.process_chat_message(session_id, _prompt(index), user, db)
+            return result.get("agent_status") != "error"
+        finally:
+            db.close()
+    return request
+
+
+def agent_target(server: FakeOllamaServer, db_factory) -> Request:
+    from app.ai_assistant import ThinkingEventAgent
+    agent = ThinkingEventAgent()
+
+    async def request(index: int) -> bool:
+        db = db_factory()
+        try:
+            user_id = db.query(User).first().id
+            session_id = _new_conversation(db, user_id)
+            result = await agent.chat(user_message=_prompt(index), conversation_history=[],
+                                      user_id=user_id, db=db, session_id=session_id)
+            return result.get("type") != "error"
+        finally:
+            db.close()
+    return request
+
+
+TARGET_FACTORIES: Dict[str, Callable[..., Request]] = {
+    "ollama": ollama_target,
+    "openai": openai_target,
+    "chat_service": chat_service_target,
+    "agent": agent_target,
+}
+
+
+# ----- driver -----
+
+async def drive(request: Request, total: int, concurrency: int) -> Dict[str, Any]:
+    """Send `total` requests from `concurrency` workers; closed loop, so each worker waits for its reply"""
+    latencies: List[float] = []
+    errors = 0
+    indexes = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            started = time.perf_counter()
+            try:
+                ok = await request(index)
+            except Exception as e:
+                logging.debug(f"Benchmark request {index} raised {e}")
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"requests": total, "errors": errors, "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+            "latency_ms": _percentiles(latencies)}
+
+
+def _model_report(snapshot: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    """Per-model calls, errors, tokens/s and queue wait from the app's own telemetry"""
+    return {
+        key: {
+            "calls": series["calls"],
+            "errors": series["errors"],
+            "completion_tokens_per_s": round(series["completion_tokens"] / elapsed, 1) if elapsed else None,
+            "latency_ms": series["latency_ms"],
+            "queue_wait_ms": series["queue_wait_ms"],
+        }
+        for key, series in snapshot["models"].items()
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = db_factory()
+    db.add(User(email="bench@example.com", first_name="Bench", is_admin=True))
+    db.commit()
+    db.close()
+
+    server = FakeOllamaServer(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        tool_call=TOOL_CALL if args.tool_call_rate > 0 else None,
+        tool_call_rate=args.tool_call_rate,
+        failure_rate=args.failure_rate,
+        parallel=args.parallel,
+        seed=args.seed
+    )
+    previous_model = ai_manager.current_config
+    results = []
+    with server:
+        # ChatService and the agent use the selected model, so select the fake one
+        ai_manager.default_configs[BENCH_MODEL_KEY] = ModelConfig(
+            provider="ollama", model_name=server.model, endpoint_url=server.base_url, enabled=True)
+        ai_manager.current_config = BENCH_MODEL_KEY
+        try:
+            for target in args.targets:
+                request = TARGET_FACTORIES[target](server, db_factory)
+                for concurrency in args.concurrency:
+                    ai_telemetry.reset()
+                    server.reset_stats()
+                    summary = await drive(request, args.requests, concurrency)
+                    results.append({
+                        "target": target,
+                        "concurrency": concurrency,
+                        **summary,
+                        "models": _model_report(ai_telemetry.snapshot(), summary["elapsed_s"]),
+                        "server": {
+                            "requests": server.requests,
+                            "failures_injected": server.failures,
+                            "tool_calls_returned": server.tool_calls,
+                            "queue_wait_ms": _percentiles(server.queue_wait),
+                        },
+                    })
+                    print(f"{target:>12} c={concurrency:<3} {results[-1]['throughput_rps']:>8} req/s  "
+                          f"p95 {results[-1]['latency_ms']['p95']} ms  errors {summary['errors']}")
+        finally:
+            ai_manager.default_configs.pop(BENCH_MODEL_KEY, None)
+            ai_manager.current_config = previous_model
+            await ollama_clients.aclose()
+            await ai_manager.providers.aclose()
+    engine.dispose()
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+
+
+def _csv(cast):
+    return lambda value: [cast(part) for part in value.split(",") if part]
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--targets", type=_csv(str), default=list(TARGETS), help="Comma-separated: " + ",".join(TARGETS))
+    parser.add_argument("--concurrency", type=_csv(int), default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="Requests per target and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake server seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--tool-call-rate", type=float, default=1.0, help="Share of tool-offering requests answered with a tool call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--parallel", type=int, default=None, help="Generations the fake server runs at once (default: unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Report path (default: test_results/ai_benchmark_<time>.json)")
+    args = parser.parse_args(argv)
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+
+    output = args.output or Path("test_results") / f"ai_benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
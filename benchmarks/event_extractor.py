@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Rule-based event extraction: accuracy and throughput on a labelled corpus
+
+Extracts every message in event_extraction_corpus.json (dates resolved against
+the corpus's fixed "today") and reports per-field accuracy, how often the
+"complete enough to skip the model" decision was right, and messages/second.
+
+    python -m benchmarks.event_extractor --rounds 500
+"""
+
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+from app.event_extractor import event_extractor
+
+CORPUS = json.loads((Path(__file__).parent / "event_extraction_corpus.json").read_text())
+TODAY = date(2026, 10, 18)
+
+
+def accuracy() -> dict:
+    expected, correct = Counter(), Counter()
+    complete_right = false_complete = 0
+    for sample in CORPUS:
+        extraction = event_extractor.extract(sample["message"], today=TODAY)
+        for name, value in sample["expected"].items():
+            expected[name] += 1
+            correct[name] += extraction.fields.get(name) == value
+        complete_right += extraction.is_complete() == sample["complete"]
+        false_complete += extraction.is_complete() and not sample["complete"]
+    return {
+        "messages": len(CORPUS),
+        "fields": {name: f"{correct[name]}/{expected[name]}" for name in sorted(expected)},
+        "field_accuracy": round(sum(correct.values()) / sum(expected.values()), 3),
+        "complete_decisions_right": f"{complete_right}/{len(CORPUS)}",
+        "skipped_model_wrongly": false_complete,
+    }
+
+
+def throughput(rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for sample in CORPUS:
+            event_extractor.extract(sample["message"], today=TODAY)
+        timings.append((time.perf_counter() - started) / len(CORPUS))
+    return {
+        "mean_us": round(statistics.mean(timings) * 1e6, 2),
+        "p95_us": round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1e6, 2),
+        "messages_per_sec": round(1 / statistics.mean(timings)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps({**accuracy(), **throughput(args.rounds)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Fake Ollama Server
+A stand-in for the Ollama HTTP API (/api/tags, /api/ps, /api/chat,
+/api/generate) and the OpenAI-compatible API (/v1/models,
+/v1/chat/completions), so providers can be driven without a real model.
+
+Both chat APIs stream when asked to (NDJSON for Ollama, SSE for OpenAI) and
+return a tool call when the last message contains "[tool]". Generation is
+shaped by:
+
+- latency: seconds before the first token (prompt processing, model load)
+- tokens_per_second / response_tokens: length and speed of the reply
+- tool_call / tool_call_rate: a tool call returned whenever tools are offered
+- failure_rate: share of generation requests answered with HTTP 500
+- parallel: generations run at once, like OLLAMA_NUM_PARALLEL on one GPU
+
+It records which client sockets connected, so benchmarks can tell whether
+connections are being reused, and how long requests queued for `parallel`.
+"""
+
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeOllamaServer:
+    """Runs the fake API with uvicorn on a background thread"""
+
+    def __init__(
+        self,
+        model: str = "fake:latest",
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        tokens_per_second: Optional[float] = None,
+        response_tokens: Optional[int] = None,
+        tool_call: Optional[Dict[str, Any]] = None,
+        tool_call_rate: float = 1.0,
+        failure_rate: float = 0.0,
+        parallel: Optional[int] = None,
+        seed: int = 0
+    ):
+        self.model = model
+        self.latency = latency
+        self.host = host
+        self.port = port or self._free_port()
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.tool_call = tool_call  # {"name": ..., "arguments": {...}}
+        self.tool_call_rate = tool_call_rate
+        self.failure_rate = failure_rate
+        self.parallel = parallel
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.connections: Set[Tuple[str, int]] = set()
+        self.failures = 0
+        self.tool_calls = 0
+        self.queue_wait: List[float] = []
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    # ----- generation -----
+
+    def _reply(self, body: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """(content, tool call) for a chat request"""
+        messages = body.get("messages") or []
+        last = (messages[-1].get("content") or "") if messages else ""
+        if body.get("tools"):
+            if "[tool]" in last:
+                # Ask for a tool call by putting "[tool]" in the last message
+                return "", {"name": body["tools"][0]["function"]["name"], "arguments": {"title": "Picnic"}}
+            if self.tool_call and self._random.random() < self.tool_call_rate:
+                self.tool_calls += 1
+                return "Creating the draft now.", self.tool_call
+        if self.response_tokens:
+            return " ".join(f"tok{i}" for i in range(self.response_tokens)), None
+        return f"echo: {last[:50]}", None
+
+    @staticmethod
+    def _prompt_tokens(body: Dict[str, Any]) -> int:
+        return sum(len(str(message.get("content") or "").split()) for message in body.get("messages") or [])
+
+    def _token_delay(self) -> float:
+        if self.tokens_per_second:
+            return 1 / self.tokens_per_second
+        return self.latency / 10
+
+    def _inject_failure(self) -> Optional[JSONResponse]:
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        return None
+
+    @asynccontextmanager
+    async def _generating(self, slots: Optional[asyncio.Semaphore]):
+        """Hold one of the `parallel` generation slots, recording how long it took to get one"""
+        queued = time.perf_counter()
+        if slots is None:
+            self.queue_wait.append(0.0)
+            yield
+            return
+        async with slots:
+            self.queue_wait.append(time.perf_counter() - queued)
+            yield
+
+    async def _generate(self, words: List[str]):
+        """Sleep for the whole reply at once (non-streaming requests)"""
+        delay = self.latency + (len(words) / self.tokens_per_second if self.tokens_per_second else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _app(self) -> FastAPI:
+        app = FastAPI()
+        slots = asyncio.Semaphore(self.parallel) if self.parallel else None
+
+        @app.middleware("http")
+        async def track_connections(request: Request, call_next):
+            self.requests += 1
+            self.connections.add((request.client.host, request.client.port))
+            return await call_next(request)
+
+        @app.get("/api/tags")
+        async def tags():
+            return {"models": [{"name": self.model, "size": 1}]}
+
+        @app.get("/api/ps")
+        async def ps():
+            return {"models": [{"name": self.model, "size_vram": 1}]}
+
+        @app.post("/api/chat")
+        async def chat(request: Request):
+            body = await request.json()
+            failure = self._inject_failure()
+            if failure:
+                return failure
+            content, tool_call = self._reply(body)
+            words = content.split(" ") if content else []
+            tool_calls = [{"function": tool_call}] if tool_call else None
+            usage = {"prompt_eval_count": self._prompt_tokens(body), "eval_count": len(words)}
+
+            if not body.get("stream"):
+                async with self._generating(slots):
+                    await self._generate(words)
+                message = {"role": "assistant", "content": content}
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                return {"model": body.get("model"), "message": message, "done": True, **usage}
+
+            async def chunks():
+                async with self._generating(slots):
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    # One NDJSON line per word, like Ollama's token stream
+                    for word in words:
+                        yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": word + " "}, "done": False}) + "\n"
+                        if self._token_delay():
+                            await asyncio.sleep(self._token_delay())
+                    if tool_calls:
+                        yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": "", "tool_calls": tool_calls}, "done": False}) + "\n"
+                    yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": ""}, "done": True, **usage}) + "\n"
+
+            return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            body = await request.json()
+            failure = self._inject_failure()
+            if failure:
+                return failure
+            async with self._generating(slots):
+                await self._generate([])
+            return {"model": body.get("model"), "response": "echo", "done": True}
+
+        @app.get("/v1/models")
+        async def models():
+            return {"object": "list", "data": [{"id": self.model, "object": "model", "owned_by": "fake"}]}
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            failure = self._inject_failure()
+            if failure:
+                return failure
+            content, tool_call = self._reply(body)
+            words = content.split(" ") if content else []
+            tool_calls = [{
+                "id": "call_0",
+                "type": "function",
+                "function": {"name": tool_call["name"], "arguments": json.dumps(tool_call.get("arguments", {}))}
+            }] if tool_call else None
+            usage = {"prompt_tokens": self._prompt_tokens(body), "completion_tokens": len(words),
+                     "total_tokens": self._prompt_tokens(body) + len(words)}
+            finish_reason = "tool_calls" if tool_calls else "stop"
+            created = int(time.time())
+
+            if not body.get("stream"):
+                async with self._generating(slots):
+                    await self._generate(words)
+                message = {"role": "assistant", "content": content or None}
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                return {"id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": body.get("model"),
+                        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}], "usage": usage}
+
+            def event(choices: List[Dict[str, Any]], **extra) -> str:
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                         "model": body.get("model"), "choices": choices, **extra}
+                return f"data: {json.dumps(chunk)}\n\n"
+
+            async def chunks():
+                async with self._generating(slots):
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    for word in words:
+                        yield event([{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+                        if self._token_delay():
+                            await asyncio.sleep(self._token_delay())
+                    for index, call in enumerate(tool_calls or []):
+                        yield event([{"index": 0, "delta": {"tool_calls": [{"index": index, **call}]}, "finish_reason": None}])
+                    yield event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        yield event([], usage=usage)
+                    yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        return app
+
+    def start(self):
+        config = uvicorn.Config(self._app(), host=self.host, port=self.port, log_level="warning", timeout_keep_alive=60)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake Ollama server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+    def reset_stats(self):
+        self.requests = 0
+        self.connections.clear()
+        self.failures = 0
+        self.tool_calls = 0
+        self.queue_wait.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
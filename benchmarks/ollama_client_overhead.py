@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Chat-turn overhead: a fresh httpx client per request vs the pooled client
+
+Runs sequential chat turns against the fake Ollama server and reports per-turn
+latency and how many TCP connections the server saw.
+
+    python -m benchmarks.ollama_client_overhead --turns 200
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from app.ai_providers import ModelConfig, OllamaProvider, ollama_clients
+from benchmarks.fake_ollama import FakeOllamaServer
+
+MESSAGES = [{"role": "user", "content": "What events are on this weekend?"}]
+
+
+def _summary(name: str, timings: List[float], server: FakeOllamaServer) -> Dict[str, Any]:
+    ordered = sorted(timings)
+    return {
+        "client": name,
+        "turns": len(timings),
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 3),
+        "server_connections": len(server.connections),
+    }
+
+
+async def fresh_client_turns(server: FakeOllamaServer, turns: int) -> List[float]:
+    """The previous behaviour: open and close a client for every request"""
+    timings = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=None) as client:
+            response = await client.post(f"{server.base_url}/api/chat", json={"model": server.model, "messages": MESSAGES, "stream": False})
+            response.raise_for_status()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def pooled_client_turns(server: FakeOllamaServer, turns: int) -> List[float]:
+    provider = OllamaProvider(ModelConfig(provider="ollama", model_name=server.model, endpoint_url=server.base_url))
+    timings = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        result = await provider._try_chat_endpoint(MESSAGES)
+        assert result["success"], result
+        timings.append(time.perf_counter() - started)
+    await ollama_clients.aclose()
+    return timings
+
+
+async def run(turns: int) -> List[Dict[str, Any]]:
+    results = []
+    with FakeOllamaServer() as server:
+        for name, scenario in (("fresh", fresh_client_turns), ("pooled", pooled_client_turns)):
+            server.reset_stats()
+            timings = await scenario(server, turns)
+            results.append(_summary(name, timings, server))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.turns)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
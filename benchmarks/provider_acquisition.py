@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Per-turn provider acquisition: building a provider every turn vs the registry
+
+For each provider type, reports the time to get a provider the way the previous
+AIProviderManager did (a new instance and SDK client every call) and through
+ProviderRegistry, plus how many SDK clients each approach leaves open.
+
+    python -m benchmarks.provider_acquisition --turns 2000
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from app.ai_providers import PROVIDER_CLASSES, ModelConfig, ProviderRegistry
+
+CONFIGS = [
+    ModelConfig(provider="ollama", model_name="llama3.2:3b", endpoint_url="http://localhost:11434"),
+    ModelConfig(provider="openai", model_name="gpt-4o-mini", endpoint_url="https://api.openai.com/v1", api_key="sk-bench"),
+    ModelConfig(provider="anthropic", model_name="claude-3-5-haiku", endpoint_url="https://api.anthropic.com", api_key="sk-ant-bench"),
+]
+
+
+def _time(acquire: Callable[[], Any], turns: int) -> List[float]:
+    timings = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        acquire()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(config: ModelConfig, name: str, timings: List[float], clients: int) -> Dict[str, Any]:
+    ordered = sorted(timings)
+    return {
+        "provider": config.provider,
+        "acquisition": name,
+        "mean_us": round(statistics.mean(timings) * 1e6, 2),
+        "p95_us": round(ordered[int(len(ordered) * 0.95) - 1] * 1e6, 2),
+        "sdk_clients_built": clients,
+    }
+
+
+def run(turns: int) -> List[Dict[str, Any]]:
+    results = []
+    for config in CONFIGS:
+        provider_class = PROVIDER_CLASSES[config.provider]
+        built = []
+        timings = _time(lambda: built.append(getattr(provider_class(config), "client", None)), turns)
+        results.append(_summary(config, "new_per_turn", timings, sum(client is not None for client in built)))
+        del built
+        gc.collect()
+
+        registry = ProviderRegistry()
+        timings = _time(lambda: registry.get(config), turns)
+        results.append(_summary(config, "registry", timings, registry.stats()["clients"]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.turns), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Text tool-call parsing: the previous regex cascade vs the single-pass parser
+
+Parses every output in tool_call_corpus.json repeatedly and reports time per
+output and how many outputs each parser got exactly right.
+
+    python -m benchmarks.tool_call_parser --rounds 2000
+"""
+
+import argparse
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from app.tool_call_parser import parse_tool_calls
+
+CORPUS = json.loads((Path(__file__).parent / "tool_call_corpus.json").read_text())
+TOOLS = [{"name": name} for name in ("create_event_draft", "query_database", "suggest_event_details", "validate_event_data")]
+
+
+def regex_cascade(content: str, available_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The previous OllamaProvider._parse_tool_calls_from_text, minus its logging"""
+    tool_calls = []
+    tool_names = [tool.get("name", "") for tool in available_tools]
+    patterns = [
+        r'TOOL_CALL:\s*(\w+)\s*(\{[^}]*\})',
+        r'```(?:json)?\s*(\w+)\s*(\{[^}]*\})\s*```',
+        r'function:\s*(\w+)\s*(\{[^}]*\})',
+        r'call\s+(\w+)\s*(\{[^}]*\})',
+        r'(\w+)\s*\(\s*(\{[^}]*\})\s*\)',
+        rf'({"|".join(re.escape(name) for name in tool_names if name)})\s*[:=]\s*(\{{[^}}]*\}})',
+    ]
+    for pattern in patterns:
+        for function_name, args_str in re.findall(pattern, content, re.IGNORECASE | re.MULTILINE):
+            matching_tool = next((name for name in tool_names if name.lower() == function_name.lower()), None)
+            if matching_tool:
+                try:
+                    tool_calls.append({"function": {"name": matching_tool, "arguments": json.dumps(json.loads(args_str))}})
+                except json.JSONDecodeError:
+                    continue
+        if tool_calls:
+            break
+    if not tool_calls:
+        for tool_name in tool_names:
+            if tool_name.lower() in content.lower():
+                tool_context = re.search(rf'{re.escape(tool_name)}.*?(\{{[^}}]*\}})', content, re.IGNORECASE | re.DOTALL)
+                if tool_context:
+                    try:
+                        tool_calls.append({"function": {"name": tool_name, "arguments": json.dumps(json.loads(tool_context.group(1)))}})
+                        break
+                    except json.JSONDecodeError:
+                        continue
+    return tool_calls
+
+
+def single_pass(content: str, available_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return parse_tool_calls(content, available_tools, loose=True)
+
+
+def _decoded(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{"name": call["function"]["name"], "arguments": json.loads(call["function"]["arguments"])} for call in calls]
+
+
+def measure(name: str, parse: Callable, rounds: int) -> Dict[str, Any]:
+    correct = sum(_decoded(parse(sample["output"], TOOLS)) == sample["expected"] for sample in CORPUS)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for sample in CORPUS:
+            parse(sample["output"], TOOLS)
+        timings.append((time.perf_counter() - started) / len(CORPUS))
+    return {
+        "parser": name,
+        "outputs": len(CORPUS),
+        "correct": correct,
+        "mean_us": round(statistics.mean(timings) * 1e6, 2),
+        "p95_us": round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    results = [measure("regex_cascade", regex_cascade, args.rounds), measure("single_pass", single_pass, args.rounds)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
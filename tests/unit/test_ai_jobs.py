@@ -0,0 +1,183 @@
+"""
+Unit tests for the background AI job runner
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.ai_jobs import AIJobRunner
+from app.models import Base, User, AIJob, AIJobStatus
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, AIJob.__table__])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def runner(session_factory):
+    runner = AIJobRunner(session_factory=session_factory, max_per_provider=1, timeout=5)
+    runner.running = []
+    runner.peak = {}
+
+    @runner.job("sleep")
+    async def sleep(job, seconds=0.05, provider=None):
+        runner.running.append(provider)
+        runner.peak[provider] = max(runner.peak.get(provider, 0), runner.running.count(provider))
+        try:
+            await job.progress(50, "Half way")
+            await asyncio.sleep(seconds)
+            return {"slept": seconds}
+        finally:
+            runner.running.remove(provider)
+
+    return runner
+
+
+def _job(session_factory, job_id) -> AIJob:
+    db = session_factory()
+    try:
+        return db.query(AIJob).filter(AIJob.id == job_id).first()
+    finally:
+        db.close()
+
+
+async def _settle(runner):
+    while runner._tasks:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.unit
+class TestAIJobRunner:
+    """Test progress, per-provider limits, cancellation, timeouts and restart recovery"""
+
+    @pytest.mark.asyncio
+    async def test_job_reports_progress_and_stores_its_result(self, runner, session_factory):
+        submitted = runner.submit("sleep", "ollama", params={"seconds": 0.1}, user_id=7)
+        assert submitted["status"] == "queued"
+
+        await asyncio.sleep(0.05)
+        job = _job(session_factory, submitted["job_id"])
+        assert job.status == AIJobStatus.running and job.progress == 50 and job.stage == "Half way"
+
+        await _settle(runner)
+        job = _job(session_factory, submitted["job_id"])
+        assert job.status == AIJobStatus.succeeded and job.progress == 100
+        assert job.result == {"slept": 0.1} and job.created_by == 7 and job.finished_at
+
+    @pytest.mark.asyncio
+    async def test_jobs_are_limited_per_provider(self, runner, session_factory):
+        jobs = [runner.submit("sleep", "ollama", params={"provider": "ollama"}) for _ in range(3)]
+        jobs.append(runner.submit("sleep", "openai", params={"provider": "openai"}))
+
+        await asyncio.sleep(0.02)
+        assert runner.get_metrics()["running"] == {"ollama": 1, "openai": 1}
+        assert runner.get_metrics()["queued"] == {"ollama": 2, "openai": 0}
+        assert _job(session_factory, jobs[2]["job_id"]).status == AIJobStatus.queued
+
+        await _settle(runner)
+        assert runner.peak == {"ollama": 1, "openai": 1}
+        assert all(_job(session_factory, job["job_id"]).status == AIJobStatus.succeeded for job in jobs)
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_running_and_queued_jobs(self, runner, session_factory):
+        running = runner.submit("sleep", "ollama", params={"seconds": 5, "provider": "ollama"})
+        queued = runner.submit("sleep", "ollama", params={"provider": "ollama"})
+        await asyncio.sleep(0.02)
+
+        assert runner.cancel(queued["job_id"]) and runner.cancel(running["job_id"])
+        await _settle(runner)
+
+        assert runner.running == [] and runner.peak == {"ollama": 1}
+        assert _job(session_factory, running["job_id"]).status == AIJobStatus.cancelled
+        assert _job(session_factory, queued["job_id"]).started_at is None
+        assert not runner.cancel(running["job_id"])  # already finished
+
+    @pytest.mark.asyncio
+    async def test_cancellation_from_another_worker_is_seen_at_the_next_progress_report(self, runner, session_factory):
+        stopped = []
+
+        @runner.job("steps")
+        async def steps(job):
+            for step in range(100):
+                await job.progress(step, f"Step {step}")
+                stopped.append(step)
+                await asyncio.sleep(0.01)
+
+        submitted = runner.submit("steps", "ollama")
+        await asyncio.sleep(0.05)
+        db = session_factory()
+        db.query(AIJob).filter(AIJob.id == submitted["job_id"]).update({AIJob.status: AIJobStatus.cancelled})
+        db.commit()
+        db.close()
+
+        await _settle(runner)
+        assert len(stopped) < 20
+        assert _job(session_factory, submitted["job_id"]).status == AIJobStatus.cancelled
+
+    @pytest.mark.asyncio
+    async def test_timeouts_fail_the_job_and_free_the_slot(self, session_factory, runner):
+        runner.timeout = 0.05
+        slow = runner.submit("sleep", "ollama", params={"seconds": 5, "provider": "ollama"})
+        fast = runner.submit("sleep", "ollama", params={"seconds": 0.01, "provider": "ollama"})
+        await _settle(runner)
+
+        job = _job(session_factory, slow["job_id"])
+        assert job.status == AIJobStatus.failed and "Timed out" in job.error
+        assert _job(session_factory, fast["job_id"]).status == AIJobStatus.succeeded
+
+    @pytest.mark.asyncio
+    async def test_start_only_fails_jobs_whose_owner_is_gone(self, runner, session_factory):
+        host_pid = runner.owner.rsplit(":", 1)[0]
+        now = datetime.utcnow()
+        db = session_factory()
+        db.add_all([
+            AIJob(id="stale-1", kind="sleep", provider="ollama", status=AIJobStatus.running, progress=30,
+                  owner="other-host:7:aaaa", heartbeat_at=now - timedelta(hours=1)),
+            AIJob(id="live-1", kind="sleep", provider="ollama", status=AIJobStatus.running, progress=30,
+                  owner="other-host:7:bbbb", heartbeat_at=now),
+            AIJob(id="restarted-1", kind="sleep", provider="ollama", status=AIJobStatus.queued,
+                  owner=f"{host_pid}:cccc", heartbeat_at=now),
+            AIJob(id="done-1", kind="sleep", provider="ollama", status=AIJobStatus.succeeded, progress=100),
+        ])
+        db.commit()
+        db.close()
+
+        await runner.start()
+        for job_id in ("stale-1", "restarted-1"):
+            assert _job(session_factory, job_id).status == AIJobStatus.failed
+            assert _job(session_factory, job_id).error == "Interrupted by a restart"
+        assert _job(session_factory, "live-1").status == AIJobStatus.running
+        assert _job(session_factory, "done-1").status == AIJobStatus.succeeded
+        await runner.stop()
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_keeps_this_workers_jobs_alive(self, runner, session_factory):
+        runner.heartbeat_interval = 0.02
+        runner.stale_after = 0.06
+        await runner.start()
+        submitted = runner.submit("sleep", "ollama", {"seconds": 0.3})
+        assert _job(session_factory, submitted["job_id"]).owner == runner.owner
+
+        # Another worker's sweep must not fail a job this one is still beating for
+        other = AIJobRunner(session_factory=session_factory, heartbeat_interval=0.02)
+        other.owner = "other-host:9:dddd"
+        other.stale_after = 0.06
+        await asyncio.sleep(0.15)
+        assert other.fail_abandoned() == 0
+        await runner.stop()
+
+        with pytest.raises(ValueError):
+            runner.submit("no_such_kind", "ollama")
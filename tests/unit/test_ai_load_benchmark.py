@@ -0,0 +1,61 @@
+"""
+Unit tests for the AI load benchmark and the fake server it drives
+"""
+
+import json
+
+import httpx
+import pytest
+
+from benchmarks import ai_load
+from benchmarks.fake_ollama import FakeOllamaServer
+
+
+@pytest.mark.unit
+class TestAILoadBenchmark:
+    """Test failure injection, the OpenAI-compatible endpoint and the report"""
+
+    def test_failure_injection_is_reproducible(self):
+        with FakeOllamaServer(failure_rate=0.5, seed=3) as server:
+            first = [httpx.post(f"{server.base_url}/api/chat", json={"messages": []}).status_code for _ in range(10)]
+            server.reset_stats()
+        with FakeOllamaServer(failure_rate=0.5, seed=3) as server:
+            second = [httpx.post(f"{server.base_url}/api/chat", json={"messages": []}).status_code for _ in range(10)]
+
+        assert first == second
+        assert 500 in first and 200 in first
+        assert server.failures == first.count(500)
+
+    def test_openai_endpoint_returns_tool_calls_and_usage(self):
+        tool = {"type": "function", "function": {"name": "create_event_draft", "parameters": {}}}
+        with FakeOllamaServer(tool_call={"name": "create_event_draft", "arguments": {"title": "Picnic"}}) as server:
+            body = httpx.post(f"{server.base_url}/v1/chat/completions", json={
+                "model": server.model,
+                "messages": [{"role": "user", "content": "plan a picnic"}],
+                "tools": [tool]
+            }).json()
+
+        choice = body["choices"][0]
+        assert choice["finish_reason"] == "tool_calls"
+        assert json.loads(choice["message"]["tool_calls"][0]["function"]["arguments"]) == {"title": "Picnic"}
+        assert body["usage"]["prompt_tokens"] == 3 and server.tool_calls == 1
+
+    def test_report_covers_every_target_and_concurrency_level(self, tmp_path):
+        output = tmp_path / "report.json"
+        report = ai_load.main([
+            "--targets", "ollama,openai", "--concurrency", "1,2", "--requests", "4",
+            "--latency", "0", "--response-tokens", "5", "--output", str(output)
+        ])
+
+        assert json.loads(output.read_text()) == report
+        assert [(r["target"], r["concurrency"]) for r in report["results"]] == [
+            ("ollama", 1), ("ollama", 2), ("openai", 1), ("openai", 2)
+        ]
+        for result in report["results"]:
+            assert result["errors"] == 0 and result["server"]["requests"] == 4
+            assert result["latency_ms"]["p95"] is not None and result["throughput_rps"] > 0
+        assert report["results"][0]["models"]["ollama/fake:latest"]["calls"] == 4
+
+    def test_unknown_targets_are_rejected(self):
+        with pytest.raises(SystemExit):
+            ai_load.main(["--targets", "ollama,nope"])
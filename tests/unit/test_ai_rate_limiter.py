@@ -0,0 +1,164 @@
+"""
+Unit tests for AI endpoint rate limiting under bursty multi-user load
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from app import ai_rate_limiter as rate_limiter_module
+from app.ai_rate_limiter import AIRateLimiter, AIRateLimitMiddleware
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def _client(limiter, delay=0.0):
+    """App with one AI route; the X-User header stands in for the session user"""
+
+    async def chat(request):
+        await asyncio.sleep(delay)
+        return PlainTextResponse("ok")
+
+    async def stream(request):
+        async def body():
+            yield "hel"
+            await asyncio.sleep(delay)
+            yield "lo"
+        return StreamingResponse(body())
+
+    async def health(request):
+        return PlainTextResponse("ok")
+
+    inner = Starlette(routes=[Route("/api/ai/chat/message", chat, methods=["POST"]),
+                              Route("/api/ai/chat/stream/{message_id}", stream),
+                              Route("/api/ai/jobs/{job_id}", health),
+                              Route("/api/ai/health-status", health),
+                              Route("/health", health)])
+    limited = AIRateLimitMiddleware(inner, limiter=limiter)
+
+    async def app(scope, receive, send):
+        user = dict(scope["headers"]).get(b"x-user")
+        scope.setdefault("state", {})["user"] = SimpleNamespace(id=int(user)) if user else None
+        await limited(scope, receive, send)
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def _send(client, user, path="/api/ai/chat/message"):
+    return await client.post(path, headers={"X-User": str(user)})
+
+
+async def _stream(client, user):
+    return await client.get("/api/ai/chat/stream/1", headers={"X-User": str(user)})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module.time, "time", clock.time)
+    return clock
+
+
+@pytest.mark.unit
+class TestAIRateLimiter:
+    """Test token buckets, concurrency caps and fair share between users"""
+
+    @pytest.mark.asyncio
+    async def test_burst_is_allowed_then_limited_with_retry_after(self, clock):
+        limiter = AIRateLimiter(user_rate=0.5, user_burst=3, ip_burst=100)
+        async with _client(limiter) as client:
+            statuses = [(await _send(client, 1)).status_code for _ in range(4)]
+            assert statuses == [200, 200, 200, 429]
+
+            refused = await _send(client, 1)
+            assert refused.headers["Retry-After"] == "2"
+            assert "slow down" in refused.json()["detail"]
+
+            clock.now += 2  # one token back at 0.5/s
+            assert (await _send(client, 1)).status_code == 200
+            assert (await _send(client, 1)).status_code == 429
+
+            assert (await client.get("/health")).status_code == 200
+        assert limiter.metrics["limited_user"] == 3
+
+    @pytest.mark.asyncio
+    async def test_noisy_user_does_not_starve_the_others(self, clock):
+        limiter = AIRateLimiter(user_rate=0.5, user_burst=5, ip_burst=1000, max_concurrent=10)
+        async with _client(limiter, delay=0.01) as client:
+            noisy = [_send(client, 1) for _ in range(40)]
+            quiet = [_send(client, user) for user in (2, 3, 4) for _ in range(4)]
+            responses = await asyncio.gather(*noisy, *quiet)
+
+        noisy_ok = sum(response.status_code == 200 for response in responses[:40])
+        assert noisy_ok == 5
+        assert all(response.status_code == 200 for response in responses[40:])
+        assert all("Retry-After" in response.headers for response in responses[:40] if response.status_code == 429)
+
+    @pytest.mark.asyncio
+    async def test_ip_bucket_is_shared_by_every_user_on_the_address(self, clock):
+        limiter = AIRateLimiter(user_burst=100, ip_rate=1.0, ip_burst=6)
+        async with _client(limiter) as client:
+            responses = [await _send(client, user) for user in range(1, 9)]
+
+        assert [response.status_code for response in responses] == [200] * 6 + [429] * 2
+        assert "address" in responses[-1].json()["detail"]
+        assert limiter.metrics["limited_ip"] == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap_holds_until_the_stream_finishes(self, clock):
+        limiter = AIRateLimiter(user_burst=100, ip_burst=100, max_concurrent=2)
+        async with _client(limiter, delay=0.05) as client:
+            responses = await asyncio.gather(*(_stream(client, 1) for _ in range(3)), _stream(client, 2))
+            assert sorted(response.status_code for response in responses[:3]) == [200, 200, 429]
+            assert responses[3].status_code == 200 and responses[3].text == "hello"
+            assert limiter.backend.active == {}
+
+            assert (await _stream(client, 1)).status_code == 200
+        assert limiter.metrics["limited_concurrency"] == 1
+
+    @pytest.mark.asyncio
+    async def test_backend_failures_let_requests_through(self, clock):
+        class Down:
+            async def take(self, *args):
+                raise ConnectionError("redis down")
+            acquire = release = take
+
+        limiter = AIRateLimiter(backend=Down())
+        async with _client(limiter) as client:
+            assert (await _send(client, 1)).status_code == 200
+        assert limiter.metrics["backend_errors"] == 3
+
+    @pytest.mark.asyncio
+    async def test_status_polls_are_not_limited(self, clock):
+        limiter = AIRateLimiter(user_rate=0.5, user_burst=2, ip_burst=2, max_concurrent=1)
+        async with _client(limiter) as client:
+            polls = [await client.get(path, headers={"X-User": "1"})
+                     for _ in range(20) for path in ("/api/ai/jobs/abc", "/api/ai/health-status")]
+            assert {response.status_code for response in polls} == {200}
+
+            # Polling left the user's budget for the calls that reach a model
+            assert [(await _send(client, 1)).status_code for _ in range(3)] == [200, 200, 429]
+        assert limiter.metrics["limited_user"] + limiter.metrics["limited_ip"] == 1
+
+    def test_job_routes_are_only_limited_on_submit(self):
+        middleware = AIRateLimitMiddleware(None)
+
+        def limited(method, path):
+            return middleware.limits({"type": "http", "method": method, "path": path})
+
+        assert limited("POST", "/api/ai/jobs/model-tests")
+        assert not limited("GET", "/api/ai/jobs")
+        assert not limited("GET", "/api/ai/jobs/3f2a/progress")
+        assert not limited("GET", "/api/ai/jobs/3f2a")
+        assert not limited("POST", "/api/ai/jobs/3f2a/cancel")
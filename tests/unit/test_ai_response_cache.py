@@ -0,0 +1,107 @@
+"""
+Unit tests for the AI response cache
+"""
+
+import pytest
+
+from app.ai_providers import BaseAIProvider, ModelConfig
+from app.ai_response_cache import ResponseCache, SQLiteStore, cached_completion, cached_stream, reuse_responses
+
+
+class CountingProvider(BaseAIProvider):
+    """Provider that answers with a call counter so repeats are visible"""
+
+    def __init__(self, temperature=0.0):
+        super().__init__(ModelConfig(provider="ollama", model_name="llama3", endpoint_url="", temperature=temperature))
+        self.calls = 0
+
+    @cached_completion
+    async def chat_completion(self, messages, tools=None):
+        self.calls += 1
+        return {"content": f"reply {self.calls}", "tool_calls": None, "provider": "ollama"}
+
+    @cached_stream
+    async def stream_chat_completion(self, messages, tools=None):
+        self.calls += 1
+        yield {"type": "token", "content": "streamed "}
+        yield {"type": "token", "content": f"{self.calls}"}
+        yield {"type": "done", "content": f"streamed {self.calls}", "tool_calls": None}
+
+    def format_tools_for_provider(self, tools):
+        return tools
+
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hello"}]
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """Test keys, bypass rules, persistence and metrics"""
+
+    @pytest.mark.asyncio
+    async def test_deterministic_calls_are_reused(self):
+        provider = CountingProvider()
+        provider.response_cache = ResponseCache()
+
+        first = await provider.chat_completion(MESSAGES)
+        again = await provider.chat_completion([{"role": "system", "content": "  Be   brief. "}, {"role": "user", "content": "Hello\n"}])
+        with_tools = await provider.chat_completion(MESSAGES, [{"name": "create_event_draft"}])
+
+        assert provider.calls == 2
+        assert again["content"] == first["content"] and again["cached"] is True
+        assert with_tools["content"] == "reply 2"
+        metrics = provider.response_cache.get_metrics()
+        assert (metrics["hits"], metrics["misses"], metrics["stored"]) == (1, 2, 2)
+
+    @pytest.mark.asyncio
+    async def test_sampled_calls_bypass_unless_reuse_allowed(self):
+        provider = CountingProvider(temperature=0.7)
+        provider.response_cache = ResponseCache(max_temperature=0.2)
+
+        await provider.chat_completion(MESSAGES)
+        await provider.chat_completion(MESSAGES)
+        assert provider.calls == 2
+        assert provider.response_cache.get_metrics()["bypassed"] == 2
+
+        with reuse_responses(ttl=60):
+            await provider.chat_completion(MESSAGES)
+            reused = await provider.chat_completion(MESSAGES)
+        assert provider.calls == 3
+        assert reused["cached"] is True
+
+    @pytest.mark.asyncio
+    async def test_errors_and_expired_entries_are_not_served(self):
+        cache = ResponseCache(ttl=-1)
+        await cache.set("expired", {"content": "old"})
+        await cache.set("failed", {"content": "", "error": "timeout"})
+
+        assert await cache.get("expired") is None
+        assert await cache.get("failed") is None
+
+    @pytest.mark.asyncio
+    async def test_sqlite_store_survives_a_new_cache(self, tmp_path):
+        path = str(tmp_path / "ai_cache.db")
+        provider = CountingProvider()
+        provider.response_cache = ResponseCache(store=SQLiteStore(path))
+        await provider.chat_completion(MESSAGES)
+
+        restarted = CountingProvider()
+        restarted.response_cache = ResponseCache(store=SQLiteStore(path))
+        result = await restarted.chat_completion(MESSAGES)
+
+        assert restarted.calls == 0
+        assert result["content"] == "reply 1"
+        assert restarted.response_cache.get_metrics()["store_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_hits_replay_cached_reply(self):
+        provider = CountingProvider()
+        provider.response_cache = ResponseCache()
+
+        first = [event async for event in provider.stream_chat_completion(MESSAGES)]
+        second = [event async for event in provider.stream_chat_completion(MESSAGES)]
+
+        assert provider.calls == 1
+        assert [e["type"] for e in first] == ["token", "token", "done"]
+        assert [e["type"] for e in second] == ["token", "done"]
+        assert second[-1]["content"] == "streamed 1" and second[-1]["cached"] is True
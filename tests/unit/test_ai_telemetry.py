@@ -0,0 +1,142 @@
+"""
+Unit tests for AI call and tool telemetry
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.main  # noqa: F401  (app.ai imports from app.main, so load it first)
+from app import ai_telemetry as telemetry_module, ai_tools
+from app.ai.services.chat_service import ChatService
+from app.ai_providers import BaseAIProvider, ModelConfig
+from app.ai_telemetry import AITelemetry, Histogram, observed_completion, observed_stream, telemetry_route
+from app.ai_tools import DynamicEventTools
+from app.inference_scheduler import InferenceScheduler
+from app.models import Base, ChatConversation, ChatMessage
+
+
+class FakeProvider(BaseAIProvider):
+    def __init__(self, provider="openai", model="gpt-4o-mini", delay=0.02, scheduler=None, error=None):
+        super().__init__(ModelConfig(provider=provider, model_name=model, endpoint_url=""))
+        self.delay = delay
+        self.scheduler = scheduler or InferenceScheduler(capacity=1)
+        self.error = error
+
+    @observed_completion
+    async def chat_completion(self, messages, tools=None):
+        async with self.scheduler.slot(self.config.model_name):
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"content": "hi", "tool_calls": [{"function": {"name": "create_event_draft", "arguments": "{}"}}],
+                "usage": {"prompt_tokens": 1000, "completion_tokens": 500}}
+
+    @observed_stream
+    async def stream_chat_completion(self, messages, tools=None):
+        await asyncio.sleep(self.delay)
+        yield {"type": "token", "content": "h"}
+        await asyncio.sleep(self.delay)
+        yield {"type": "done", "content": "h", "usage": {"prompt_tokens": 10, "completion_tokens": 1}}
+
+    def format_tools_for_provider(self, tools):
+        return tools
+
+
+@pytest.fixture
+def telemetry(monkeypatch):
+    telemetry = AITelemetry(prices="gpt-4o-mini=0.15/0.60")
+    monkeypatch.setattr(telemetry_module, "ai_telemetry", telemetry)
+    monkeypatch.setattr(ai_tools, "ai_telemetry", telemetry)
+    return telemetry
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.mark.unit
+class TestAITelemetry:
+    """Test call, stream and tool recording, turn collection and per-message persistence"""
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram((10, 100, 1000))
+        for value in [5] * 50 + [50] * 45 + [500] * 5:
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 100 and snapshot["max"] == 500
+        assert 0 < snapshot["p50"] <= 10
+        assert 10 < snapshot["p95"] <= 100
+
+    @pytest.mark.asyncio
+    async def test_calls_record_queue_wait_tokens_and_cost(self, telemetry):
+        provider = FakeProvider()
+        with telemetry_route("chat"):
+            await asyncio.gather(provider.chat_completion(MESSAGES), provider.chat_completion(MESSAGES))
+
+        series = telemetry.snapshot()["models"]["openai/gpt-4o-mini"]
+        assert series["calls"] == 2 and series["routes"] == {"chat": 2}
+        assert series["prompt_tokens"] == 2000 and series["completion_tokens"] == 1000
+        assert series["cost_usd"] == pytest.approx(2 * (1000 * 0.15 + 500 * 0.60) / 1e6)
+        assert series["tool_calls"] == 2
+        # One slot: the second call waited for the first
+        assert series["queue_wait_ms"]["count"] == 2 and series["queue_wait_ms"]["max"] >= 15
+
+    @pytest.mark.asyncio
+    async def test_errors_are_classified_and_local_models_are_free(self, telemetry):
+        with pytest.raises(TimeoutError):
+            await FakeProvider(error=TimeoutError()).chat_completion(MESSAGES)
+        await FakeProvider(provider="ollama", model="llama3.2:3b").chat_completion(MESSAGES)
+
+        models = telemetry.snapshot()["models"]
+        assert models["openai/gpt-4o-mini"]["errors"] == {"TimeoutError": 1}
+        assert models["ollama/llama3.2:3b"]["cost_usd"] == 0.0
+
+    @pytest.mark.asyncio
+    async def test_stream_records_first_token_even_when_the_caller_stops_at_done(self, telemetry):
+        provider = FakeProvider(delay=0.02)
+        async for event in provider.stream_chat_completion(MESSAGES):
+            if event["type"] == "done":
+                break
+        await provider.chat_completion(MESSAGES)
+
+        series = telemetry.snapshot()["models"]["openai/gpt-4o-mini"]
+        assert series["calls"] == 2  # the follow-up call wasn't mistaken for a nested one
+        assert series["ttft_ms"]["count"] == 2
+        assert series["prompt_tokens"] == 1010
+
+    @pytest.mark.asyncio
+    async def test_turn_collects_calls_from_spawned_tasks_and_tools(self, telemetry):
+        with telemetry.turn() as turn:
+            await asyncio.create_task(FakeProvider().chat_completion(MESSAGES))
+            await DynamicEventTools(db=None, user_id=1).execute_tool("no_such_tool", {})
+
+        summary = turn.summary()
+        assert [call["model"] for call in summary["calls"]] == ["gpt-4o-mini"]
+        assert summary["prompt_tokens"] == 1000 and summary["cost_usd"] > 0
+        assert summary["tools"][0]["tool"] == "no_such_tool" and summary["tools"][0]["error"] == "UnknownTool"
+        assert telemetry.snapshot()["tools"]["no_such_tool"]["errors"] == {"UnknownTool": 1}
+
+    def test_turn_metrics_are_stored_on_the_reply_and_priced_per_event(self, telemetry):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine, tables=[ChatConversation.__table__, ChatMessage.__table__])
+        db = sessionmaker(bind=engine)()
+        conversation = ChatConversation(id="conv-1", user_id=1, title="Chat")
+        db.add(conversation)
+        db.commit()
+
+        service = ChatService()
+        for cost in (0.002, 0.003):
+            service._finish_chat_turn(conversation, None, {"response": "ok", "metrics": {"cost_usd": cost}}, db)
+        service._finish_chat_turn(conversation, None, {"response": "no metrics"}, db)
+
+        stored = [message.msg_metadata for message in db.query(ChatMessage).order_by(ChatMessage.id)]
+        assert stored[0] == {"metrics": {"cost_usd": 0.002}} and stored[2] is None
+        assert service._conversation_cost("conv-1", db) == pytest.approx(0.005)
+
+        telemetry.record_event_created(0.005)
+        assert telemetry.snapshot()["events"]["cost_per_event_usd"] == 0.005
+        db.close()
+        engine.dispose()
@@ -0,0 +1,158 @@
+"""
+Unit tests for event announcement campaigns
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import (
+    Base, User, Event, OutboundEmail, EmailStatus,
+    AnnouncementCampaign, AnnouncementRecipient, CampaignStatus
+)
+from app.announcement_service import AnnouncementMailer, _template_env
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, Event.__table__, OutboundEmail.__table__,
+        AnnouncementCampaign.__table__, AnnouncementRecipient.__table__
+    ])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def event_id(session_factory):
+    db = session_factory()
+    for i in range(7):
+        db.add(User(email=f"family{i}@example.com", first_name=f"Parent{i}", email_confirmed=True))
+    db.add(User(email="unconfirmed@example.com", email_confirmed=False))
+    event = Event(title="Beach Clean-up", date=datetime(2026, 11, 7, 10, 0), location="Muriwai", is_free=True)
+    db.add(event)
+    db.commit()
+    event_id = event.id
+    db.close()
+    return event_id
+
+
+def _campaign(mailer, session_factory, event_id) -> int:
+    db = session_factory()
+    event = db.query(Event).get(event_id)
+    campaign_id = mailer.create_campaign(db, event).id
+    db.close()
+    return campaign_id
+
+
+@pytest.mark.unit
+class TestAnnouncementMailer:
+    """Test recipient streaming, templating and resume behaviour"""
+
+    def test_queues_every_confirmed_user(self, session_factory, event_id):
+        mailer = AnnouncementMailer(session_factory=session_factory, send_rate=10000, chunk_size=3)
+        campaign_id = _campaign(mailer, session_factory, event_id)
+
+        assert mailer.run_campaign(campaign_id) == 7
+
+        db = session_factory()
+        emails = db.query(OutboundEmail).order_by(OutboundEmail.id).all()
+        assert len(emails) == 7
+        assert all(e.status == EmailStatus.pending for e in emails)
+        assert "unconfirmed@example.com" not in [e.to_email for e in emails]
+        assert emails[0].subject.startswith("New event: Beach Clean-up")
+        assert "Kia ora Parent0," in emails[0].body
+        assert "/event/" in emails[0].body
+
+        report = mailer.get_report(db, campaign_id)
+        assert report["status"] == CampaignStatus.completed.value
+        assert report["queued"] == 7
+        assert report["delivery"]["pending"] == 7
+        db.close()
+
+    def test_resume_continues_after_checkpoint(self, session_factory, event_id):
+        mailer = AnnouncementMailer(session_factory=session_factory, send_rate=10000, chunk_size=3)
+        campaign_id = _campaign(mailer, session_factory, event_id)
+
+        # Simulate a process that stopped after queueing the first chunk
+        db = session_factory()
+        first_chunk = db.query(User).filter(User.email_confirmed.is_(True)).order_by(User.id).limit(3).all()
+        campaign = db.query(AnnouncementCampaign).get(campaign_id)
+        mailer._queue_chunk(db, campaign, first_chunk, "Subject", _template_env.from_string("Hello {{ first_name }}"), {})
+        db.close()
+
+        assert mailer.run_campaign(campaign_id) == 4
+
+        db = session_factory()
+        assert db.query(AnnouncementRecipient).count() == 7
+        assert db.query(OutboundEmail).count() == 7
+        db.close()
+
+    def test_finished_campaign_is_not_rerun(self, session_factory, event_id):
+        mailer = AnnouncementMailer(session_factory=session_factory, send_rate=10000, chunk_size=3)
+        campaign_id = _campaign(mailer, session_factory, event_id)
+
+        mailer.run_campaign(campaign_id)
+        assert mailer.run_campaign(campaign_id) == 0
+
+        db = session_factory()
+        assert db.query(OutboundEmail).count() == 7
+        db.close()
+
+    def test_campaign_sent_by_a_live_worker_is_left_alone(self, session_factory, event_id):
+        mailer = AnnouncementMailer(session_factory=session_factory, send_rate=10000, chunk_size=3)
+        campaign_id = _campaign(mailer, session_factory, event_id)
+        db = session_factory()
+        campaign = db.query(AnnouncementCampaign).get(campaign_id)
+        campaign.owner, campaign.heartbeat_at = "other-host:7:aaaa", datetime.utcnow()
+        db.commit()
+        db.close()
+
+        assert mailer.run_campaign(campaign_id) == 0
+
+        db = session_factory()
+        assert db.query(OutboundEmail).count() == 0
+        assert db.query(AnnouncementCampaign).get(campaign_id).status == CampaignStatus.running
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_resume_only_takes_campaigns_whose_sender_is_gone(self, session_factory, event_id):
+        mailer = AnnouncementMailer(session_factory=session_factory, send_rate=10000, chunk_size=3)
+        host_pid = mailer.owner.rsplit(":", 1)[0]
+        now = datetime.utcnow()
+        owners = {
+            "live": ("other-host:7:aaaa", now),
+            "stale": ("other-host:8:bbbb", now - timedelta(hours=1)),
+            "restarted": (f"{host_pid}:cccc", now),
+        }
+        campaign_ids = {}
+        db = session_factory()
+        for name, (owner, heartbeat_at) in owners.items():
+            campaign = AnnouncementCampaign(event_id=event_id, status=CampaignStatus.running, last_user_id=0,
+                                            queued_count=0, owner=owner, heartbeat_at=heartbeat_at)
+            db.add(campaign)
+            db.flush()
+            campaign_ids[name] = campaign.id
+        db.commit()
+        db.close()
+
+        resumed = await mailer.resume_interrupted()
+        await asyncio.gather(*mailer._tasks.values())
+
+        assert sorted(resumed) == sorted([campaign_ids["stale"], campaign_ids["restarted"]])
+        db = session_factory()
+        live = db.query(AnnouncementCampaign).get(campaign_ids["live"])
+        assert live.status == CampaignStatus.running and live.owner == "other-host:7:aaaa"
+        for name in ("stale", "restarted"):
+            campaign = db.query(AnnouncementCampaign).get(campaign_ids[name])
+            assert campaign.status == CampaignStatus.completed and campaign.owner == mailer.owner
+        db.close()
@@ -0,0 +1,99 @@
+"""
+Unit tests for chat history paging and retention compaction
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.chat_retention import ChatRetention, page_messages, unpack_archive
+from app.models import Base, User, ChatConversation, ChatMessage, ChatMessageArchive
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, ChatConversation.__table__, ChatMessage.__table__, ChatMessageArchive.__table__
+    ])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _conversation(db, count, days_old=60):
+    """`count` messages a minute apart, the last one `days_old` days ago"""
+    db.add(ChatConversation(id="conv-1", user_id=1, title="Chat"))
+    start = NOW - timedelta(days=days_old, minutes=count)
+    for n in range(count):
+        db.add(ChatMessage(conversation_id="conv-1", role="user", content=f"message {n}",
+                           created_at=start + timedelta(minutes=n)))
+    db.commit()
+
+
+def _all_pages(db, limit):
+    contents, cursor = [], None
+    while True:
+        page = page_messages(db, "conv-1", before=cursor, limit=limit)
+        contents = [m["content"] for m in page["messages"]] + contents
+        if not page["has_more"]:
+            return contents
+        cursor = page["next_cursor"]
+
+
+@pytest.mark.unit
+class TestChatRetention:
+    """Test keyset paging and archiving into compressed batches"""
+
+    def test_pages_walk_backwards_through_history(self, db):
+        _conversation(db, 7)
+
+        latest = page_messages(db, "conv-1", limit=3)
+        assert [m["content"] for m in latest["messages"]] == ["message 4", "message 5", "message 6"]
+        assert latest["has_more"] is True
+
+        assert _all_pages(db, limit=3) == [f"message {n}" for n in range(7)]
+
+    def test_compaction_keeps_recent_messages_live(self, db):
+        _conversation(db, 12)
+        retention = ChatRetention(archive_after_days=30, keep_recent=4, batch_size=5, delete_after_days=0)
+
+        report = retention.compact(db, now=NOW)
+
+        assert report["archived_messages"] == 8
+        assert report["archives_created"] == 2
+        assert db.query(ChatMessage).count() == 4
+        archives = db.query(ChatMessageArchive).order_by(ChatMessageArchive.id).all()
+        assert [a.message_count for a in archives] == [5, 3]
+        assert [m["content"] for m in unpack_archive(archives[1])] == ["message 5", "message 6", "message 7"]
+        assert retention.compact(db, now=NOW)["archived_messages"] == 0
+
+    def test_paging_continues_into_archives(self, db):
+        _conversation(db, 12)
+        ChatRetention(archive_after_days=30, keep_recent=4, batch_size=5, delete_after_days=0).compact(db, now=NOW)
+
+        assert _all_pages(db, limit=3) == [f"message {n}" for n in range(12)]
+        assert _all_pages(db, limit=100) == [f"message {n}" for n in range(12)]
+
+    def test_recent_and_expired_messages(self, db):
+        _conversation(db, 6, days_old=1)
+        retention = ChatRetention(archive_after_days=30, keep_recent=2, batch_size=5, delete_after_days=90)
+
+        assert retention.compact(db, now=NOW)["archived_messages"] == 0
+        assert retention.compact(db, now=NOW + timedelta(days=60))["archived_messages"] == 4
+        assert retention.compact(db, now=NOW + timedelta(days=120))["archives_deleted"] == 1
+        assert _all_pages(db, limit=10) == ["message 4", "message 5"]
+
+    def test_bad_cursor_is_rejected(self, db):
+        with pytest.raises(ValueError):
+            page_messages(db, "conv-1", before="not-a-cursor")
@@ -0,0 +1,258 @@
+"""
+Unit tests for streamed chat completions and the streamed chat turn
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.main  # noqa: F401  (app.ai imports from app.main, so load it first)
+import app.ai.router as ai_router_module
+from app.ai.router import _sse, ai_chat_stream
+from app.ai.services.chat_service import ChatService
+from app.ai_providers import ModelConfig, MockAIProvider, OllamaProvider, OpenAIProvider, ollama_clients
+from app.models import Base, User, ChatConversation, ChatMessage, AgentSession
+from benchmarks.fake_ollama import FakeOllamaServer
+
+TOOLS = [{"name": "create_event_draft", "description": "Create a draft", "parameters": {"type": "object"}}]
+
+
+@pytest.fixture(scope="module")
+def fake_ollama():
+    with FakeOllamaServer() as server:
+        yield server
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, ChatConversation.__table__, ChatMessage.__table__, AgentSession.__table__
+    ])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+async def _collect(stream):
+    return [event async for event in stream]
+
+
+def _ollama(server):
+    return OllamaProvider(ModelConfig(provider="ollama", model_name=server.model, endpoint_url=server.base_url))
+
+
+class FakeOpenAIStream:
+    """Async iterator over chat.completions chunks"""
+
+    def __init__(self, deltas):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=delta)]) for delta in deltas]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _delta(content=None, tool_calls=None):
+    return SimpleNamespace(content=content, tool_calls=tool_calls)
+
+
+def _call_fragment(index, call_id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+@pytest.mark.unit
+class TestProviderStreaming:
+    """Test token forwarding and incremental tool call assembly"""
+
+    @pytest.mark.asyncio
+    async def test_ollama_streams_tokens(self, fake_ollama):
+        events = await _collect(_ollama(fake_ollama).stream_chat_completion([{"role": "user", "content": "plan a beach picnic"}]))
+
+        tokens = [e["content"] for e in events if e["type"] == "token"]
+        assert len(tokens) > 1
+        assert events[-1]["type"] == "done"
+        assert events[-1]["content"] == "".join(tokens) == "echo: plan a beach picnic "
+        await ollama_clients.aclose()
+
+    @pytest.mark.asyncio
+    async def test_ollama_streams_tool_calls(self, fake_ollama):
+        events = await _collect(_ollama(fake_ollama).stream_chat_completion([{"role": "user", "content": "[tool]"}], TOOLS))
+
+        assert [e["type"] for e in events] == ["tool_call", "done"]
+        assert events[-1]["tool_calls"][0]["function"]["name"] == "create_event_draft"
+        await ollama_clients.aclose()
+
+    @pytest.mark.asyncio
+    async def test_openai_assembles_tool_call_fragments(self):
+        provider = OpenAIProvider(ModelConfig(provider="openai", model_name="gpt-4o-mini", endpoint_url="", api_key="sk-test"))
+        stream = FakeOpenAIStream([
+            _delta(content="On it"),
+            _delta(tool_calls=[_call_fragment(0, "call_1", "create_event_draft", '{"tit')]),
+            _delta(tool_calls=[_call_fragment(0, arguments='le": "Picnic"}')]),
+        ])
+
+        async def create(**kwargs):
+            assert kwargs["stream"] is True
+            return stream
+
+        provider.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        events = await _collect(provider.stream_chat_completion([{"role": "user", "content": "hi"}], TOOLS))
+
+        assert [e["type"] for e in events] == ["token", "tool_call", "done"]
+        assert events[-1]["tool_calls"] == [{
+            "id": "call_1",
+            "type": "function",
+            "function": {"name": "create_event_draft", "arguments": '{"title": "Picnic"}'}
+        }]
+
+    @pytest.mark.asyncio
+    async def test_buffered_providers_stream_one_token(self):
+        provider = MockAIProvider(ModelConfig(provider="mock", model_name="test", endpoint_url="local://mock"))
+        events = await _collect(provider.stream_chat_completion([{"role": "user", "content": "hi"}]))
+
+        assert [e["type"] for e in events] == ["token", "done"]
+        assert events[-1]["provider"] == "mock"
+
+
+@pytest.mark.unit
+class TestStreamedChatTurn:
+    """Test that a streamed turn forwards events, persists the reply once and checks ownership"""
+
+    @pytest.fixture
+    def conversation(self, db):
+        owner, other = User(email="parent@example.com"), User(email="other@example.com")
+        db.add_all([owner, other])
+        db.flush()
+        db.add(ChatConversation(id="conv-1", user_id=owner.id))
+        db.commit()
+        return owner, other
+
+    @pytest.mark.asyncio
+    async def test_reply_persisted_once_at_the_end(self, db, conversation, monkeypatch):
+        user, _ = conversation
+
+        async def fake_agent(message, history, user, db, session_id, emit=None):
+            for token in ("Sounds ", "fun!"):
+                await emit({"type": "token", "content": token})
+                assert db.query(ChatMessage).filter_by(role="assistant").count() == 0
+            return {"response": "Sounds fun!", "extracted_info": None}
+
+        service = ChatService()
+        monkeypatch.setattr(service, "_run_chat_agent", fake_agent)
+        queued = service.queue_chat_message("conv-1", "Beach day", user, db)
+        pending = service.pending_chat_message(queued.id, user, db)
+        events = await _collect(service.stream_chat_message(pending, user, db))
+
+        assert [e["type"] for e in events] == ["token", "token", "done"]
+        assert events[-1]["ai_response"] == "Sounds fun!"
+        stored = db.query(ChatMessage).order_by(ChatMessage.id).all()
+        assert [(m.role, m.content) for m in stored] == [("user", "Beach day"), ("assistant", "Sounds fun!")]
+
+        # A reconnecting browser gets the stored reply instead of a second turn
+        monkeypatch.setattr(service, "_run_chat_agent", None)
+        events = await _collect(service.stream_chat_message(pending, user, db))
+        assert events == [{"type": "done", "ai_response": "Sounds fun!", "agent_status": "completed"}]
+        assert db.query(ChatMessage).count() == 2
+
+    @pytest.mark.asyncio
+    async def test_reconnect_during_a_turn_waits_for_its_reply(self, db, conversation, monkeypatch):
+        user, _ = conversation
+        release = asyncio.Event()
+        runs = []
+
+        async def slow_agent(message, history, user, db, session_id, emit=None):
+            runs.append(message)
+            await emit({"type": "token", "content": "Thinking"})
+            await release.wait()
+            return {"response": "Sounds fun!", "extracted_info": None}
+
+        service = ChatService()
+        service.reply_poll_interval = 0.01
+        monkeypatch.setattr(service, "_run_chat_agent", slow_agent)
+        queued = service.queue_chat_message("conv-1", "Beach day", user, db)
+
+        first = asyncio.create_task(_collect(service.stream_chat_message(queued, user, db)))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(_collect(service.stream_chat_message(queued, user, db)))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        release.set()
+
+        first_events, second_events = await first, await second
+        assert runs == ["Beach day"]
+        assert [e["type"] for e in first_events] == ["token", "done"]
+        assert second_events == [{"type": "done", "ai_response": "Sounds fun!", "agent_status": "completed"}]
+        assert db.query(ChatMessage).filter_by(role="assistant").count() == 1
+
+    @pytest.mark.asyncio
+    async def test_dropped_turn_releases_its_message(self, db, conversation, monkeypatch):
+        user, _ = conversation
+
+        async def agent(message, history, user, db, session_id, emit=None):
+            await emit({"type": "token", "content": "Thinking"})
+            return {"response": "Sounds fun!", "extracted_info": None}
+
+        service = ChatService()
+        monkeypatch.setattr(service, "_run_chat_agent", agent)
+        queued = service.queue_chat_message("conv-1", "Beach day", user, db)
+
+        stream = service.stream_chat_message(queued, user, db)
+        assert (await stream.__anext__())["type"] == "token"
+        await stream.aclose()  # the browser went away mid-turn
+        assert db.get(ChatMessage, queued.id).reply_started_at is None
+
+        events = await _collect(service.stream_chat_message(queued, user, db))
+        assert events[-1]["ai_response"] == "Sounds fun!"
+
+    @pytest.mark.asyncio
+    async def test_only_the_owner_can_queue_or_stream(self, db, conversation):
+        owner, other = conversation
+        service = ChatService()
+
+        with pytest.raises(HTTPException) as refused:
+            service.queue_chat_message("conv-1", "Beach day", other, db)
+        assert refused.value.status_code == 404
+
+        queued = service.queue_chat_message("conv-1", "Beach day", owner, db)
+        with pytest.raises(HTTPException) as refused:
+            service.pending_chat_message(queued.id, other, db)
+        assert refused.value.status_code == 404
+
+    def test_sse_frames_split_multiline_html(self):
+        assert _sse("done", "<p>a</p>\n<p>b</p>") == "event: done\ndata: <p>a</p>\ndata: <p>b</p>\n\n"
+        assert _sse("token", "") == "event: token\ndata: \n\n"
+        assert _sse("token", "fun!\r\n") == "event: token\ndata: fun!\ndata: \n\n"
+
+    @pytest.mark.asyncio
+    async def test_stream_endpoint_sends_only_new_text_per_token(self, monkeypatch):
+        async def fake_stream(user_message, user, db):
+            for event in ({"type": "token", "content": "Sounds "}, {"type": "token", "content": "<fun>"},
+                          {"type": "tool_results", "functions": ["create_event_draft"]},
+                          {"type": "done", "ai_response": "Drafted!"}):
+                yield event
+
+        monkeypatch.setattr(ai_router_module, "SessionLocal", lambda: SimpleNamespace(close=lambda: None))
+        monkeypatch.setattr(ai_router_module.chat_service, "pending_chat_message",
+                            lambda message_id, user, db: SimpleNamespace(conversation_id="conv-1"))
+        monkeypatch.setattr(ai_router_module.chat_service, "stream_chat_message", fake_stream)
+
+        response = await ai_chat_stream(7, user=SimpleNamespace(id=1))
+        frames = [frame async for frame in response.body_iterator]
+
+        assert frames[:2] == ["event: token\ndata: Sounds \n\n", "event: token\ndata: &lt;fun&gt;\n\n"]
+        assert frames[2].startswith("event: tool_results\n") and 'id="chat-reply-7" hx-swap-oob="innerHTML"' in frames[2]
+        assert frames[3].startswith("event: done\n") and "Drafted!" in frames[3]
@@ -0,0 +1,130 @@
+"""
+Unit tests for bounded conversation context and rolling summaries
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.main  # noqa: F401  (app.ai imports from app.main, so load it first)
+from app.ai.services.context_service import ConversationContextService
+from app.models import Base, User, ChatConversation, ChatMessage
+
+
+class SummaryProvider:
+    """Records summary prompts and answers with a numbered summary"""
+
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    async def chat_completion(self, messages, tools=None):
+        self.prompts.append(messages)
+        if self.fail:
+            return {"content": "", "error": "timeout"}
+        return {"content": f"summary {len(self.prompts)}"}
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(
+        bind=engine, tables=[User.__table__, ChatConversation.__table__, ChatMessage.__table__]
+    )
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def _conversation(db, count, content="message {n}"):
+    conversation = ChatConversation(id="conv-1", user_id=1, title="Chat", agent_context={"mode": "event_creation"})
+    db.add(conversation)
+    for n in range(count):
+        db.add(ChatMessage(
+            conversation_id="conv-1",
+            role="user" if n % 2 == 0 else "assistant",
+            content=content.format(n=n)
+        ))
+    db.commit()
+    return conversation
+
+
+def _service(session_factory, provider=None, **kwargs):
+    return ConversationContextService(
+        session_factory=session_factory,
+        provider_factory=lambda: provider,
+        recent_messages=4,
+        summary_batch=3,
+        **kwargs
+    )
+
+
+@pytest.mark.unit
+class TestConversationContext:
+    """Test history windows, token budgets and incremental summaries"""
+
+    def test_history_is_windowed_and_excludes_current_message(self, session_factory):
+        db = session_factory()
+        conversation = _conversation(db, 6)
+        current = db.query(ChatMessage).order_by(ChatMessage.id.desc()).first()
+
+        history = _service(session_factory).build_history(
+            db, conversation, provider="openai", draft={"title": "Park day", "price": None}, before_id=current.id
+        )
+
+        assert history[0] == {"role": "system", "content": 'Current event draft: {"title": "Park day"}'}
+        assert [m["content"] for m in history[1:]] == [f"message {n}" for n in range(5)]
+
+    def test_budget_keeps_newest_messages(self, session_factory):
+        db = session_factory()
+        conversation = _conversation(db, 4, content="{n} " + "word " * 40)
+        service = _service(session_factory, budgets={"ollama": 120})
+
+        history = service.build_history(db, conversation, provider="ollama")
+
+        assert [m["content"].split()[0] for m in history] == ["2", "3"]
+        assert service.metrics["trimmed_messages"] == 2
+
+    @pytest.mark.asyncio
+    async def test_summary_folds_only_new_messages_outside_window(self, session_factory):
+        provider = SummaryProvider()
+        service = _service(session_factory, provider)
+        db = session_factory()
+        _conversation(db, 10)
+
+        assert await service.summarize("conv-1") is True
+        assert await service.summarize("conv-1") is False  # the rest is still the recent window
+
+        db.expire_all()
+        conversation = db.get(ChatConversation, "conv-1")
+        assert conversation.agent_context["summary"] == "summary 1"
+        assert conversation.agent_context["mode"] == "event_creation"
+        history = service.build_history(db, conversation, provider="openai")
+        assert history[0]["content"] == "Summary of the earlier conversation: summary 1"
+        assert [m["content"] for m in history[1:]] == [f"message {n}" for n in range(6, 10)]
+
+        for n in range(10, 13):
+            db.add(ChatMessage(conversation_id="conv-1", role="user", content=f"message {n}"))
+        db.commit()
+        assert await service.summarize("conv-1") is True
+
+        first, second = (prompt[1]["content"] for prompt in provider.prompts)
+        assert "message 0" in first and "message 5" in first and "message 6" not in first
+        assert "summary 1" in second and "message 6" in second and "message 8" in second
+        assert "message 5" not in second and "message 9" not in second
+
+    @pytest.mark.asyncio
+    async def test_failed_summary_keeps_messages_pending(self, session_factory):
+        service = _service(session_factory, SummaryProvider(fail=True))
+        db = session_factory()
+        _conversation(db, 10)
+
+        assert await service.summarize("conv-1") is False
+
+        db.expire_all()
+        assert "summary_through_id" not in db.get(ChatConversation, "conv-1").agent_context
+        assert service.metrics["summary_failures"] == 1
@@ -0,0 +1,140 @@
+"""
+Unit tests for the outbound email queue
+Delivers through a local aiosmtpd server instead of a real mail relay
+"""
+
+import socket
+from datetime import datetime
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import EmailStatus, OutboundEmail
+from app.email_service import EmailWorker, SMTPConnection
+
+
+class CollectingHandler:
+    """aiosmtpd handler that keeps every delivered message in memory"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    OutboundEmail.__table__.create(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def smtp_server():
+    handler = CollectingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def _queue(session_factory, count: int):
+    db = session_factory()
+    for i in range(count):
+        db.add(OutboundEmail(
+            to_email=f"family{i}@example.com",
+            subject=f"Subject {i}",
+            body="Hello",
+            status=EmailStatus.pending,
+            attempts=0,
+            next_attempt_at=datetime.utcnow()
+        ))
+    db.commit()
+    db.close()
+
+
+@pytest.mark.unit
+class TestEmailWorker:
+    """Test batching, connection reuse, retry and dead-lettering"""
+
+    def test_batch_delivered_over_one_connection(self, session_factory, smtp_server):
+        controller, handler = smtp_server
+        smtp = SMTPConnection(host=controller.hostname, port=controller.port, username="", password="")
+        worker = EmailWorker(session_factory=session_factory, smtp=smtp, batch_size=10)
+        _queue(session_factory, 5)
+
+        assert worker.process_batch() == 5
+
+        assert len(handler.messages) == 5
+        assert smtp.connects == 1
+        db = session_factory()
+        assert db.query(OutboundEmail).filter(OutboundEmail.status == EmailStatus.sent).count() == 5
+        db.close()
+        smtp.close()
+
+    def test_batch_size_respected(self, session_factory, smtp_server):
+        controller, handler = smtp_server
+        smtp = SMTPConnection(host=controller.hostname, port=controller.port, username="", password="")
+        worker = EmailWorker(session_factory=session_factory, smtp=smtp, batch_size=3)
+        _queue(session_factory, 5)
+
+        assert worker.process_batch() == 3
+        assert worker.process_batch() == 2
+        assert worker.process_batch() == 0
+        assert worker.metrics["sent_total"] == 5
+        smtp.close()
+
+    def test_unreachable_server_retries_with_backoff(self, session_factory):
+        smtp = SMTPConnection(host="127.0.0.1", port=_free_port(), username="", password="", timeout=1)
+        worker = EmailWorker(session_factory=session_factory, smtp=smtp, batch_size=10, retry_base_seconds=60)
+        _queue(session_factory, 3)
+
+        worker.process_batch()
+
+        db = session_factory()
+        emails = db.query(OutboundEmail).order_by(OutboundEmail.id).all()
+        # Only the first email spends an attempt; the rest are released untouched
+        assert emails[0].attempts == 1
+        assert emails[0].status == EmailStatus.pending
+        assert emails[0].next_attempt_at > datetime.utcnow()
+        assert all(e.attempts == 0 and e.status == EmailStatus.pending for e in emails[1:])
+        db.close()
+
+    def test_dead_letter_after_max_attempts(self, session_factory):
+        smtp = SMTPConnection(host="127.0.0.1", port=_free_port(), username="", password="", timeout=1)
+        worker = EmailWorker(session_factory=session_factory, smtp=smtp, max_attempts=2, retry_base_seconds=0)
+        _queue(session_factory, 1)
+
+        worker.process_batch()
+        worker.process_batch()
+
+        db = session_factory()
+        email = db.query(OutboundEmail).one()
+        assert email.status == EmailStatus.dead
+        assert email.attempts == 2
+        assert email.last_error
+        assert worker.get_metrics(db)["queue"]["dead"] == 1
+        db.close()
+
+    def test_retry_delay_is_exponential_and_capped(self):
+        worker = EmailWorker(session_factory=None, smtp=SMTPConnection(), retry_base_seconds=30)
+        assert worker._retry_delay(1) == 30
+        assert worker._retry_delay(2) == 60
+        assert worker._retry_delay(3) == 120
+        assert worker._retry_delay(50) == 6 * 60 * 60
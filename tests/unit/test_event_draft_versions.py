@@ -0,0 +1,109 @@
+"""
+Unit tests for versioned event drafts
+"""
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import event_draft_manager
+from app.event_draft_manager import EventDraftManager
+from app.models import Base, User, ChatConversation, AgentSession, Event, EventDraft, EventDraftVersion
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, ChatConversation.__table__, AgentSession.__table__,
+        EventDraft.__table__, EventDraftVersion.__table__
+    ])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(ChatConversation(id="conv-1", user_id=1, title="Chat"))
+    session.add(AgentSession(id="agent-1", conversation_id="conv-1", memory={}))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.unit
+class TestEventDraftVersions:
+    """Test diff storage, the current-draft head and version rebuilds"""
+
+    def test_saves_store_field_level_diffs(self, db):
+        manager = EventDraftManager(db)
+        assert manager.save_event_draft("conv-1", {"title": "Park day", "cost": 5})
+        assert manager.update_draft("conv-1", {"cost": 0, "location": "Cornwall Park"})
+
+        assert manager.get_current_draft("conv-1") == {"title": "Park day", "cost": 0, "location": "Cornwall Park"}
+        history = manager.get_draft_history("conv-1")
+        assert [entry["version"] for entry in history] == [1, 2]
+        assert history[1]["changes"] == {"set": {"cost": 0, "location": "Cornwall Park"}, "unset": []}
+        assert db.get(AgentSession, "agent-1").memory == {}
+
+    def test_any_version_can_be_rebuilt(self, db, monkeypatch):
+        monkeypatch.setattr(event_draft_manager, "SNAPSHOT_EVERY", 3)
+        manager = EventDraftManager(db)
+        for n in range(1, 8):
+            manager.save_event_draft("conv-1", {"title": "Park day", "max_pupils": n, **({"notes": "odd"} if n % 2 else {})})
+
+        assert manager.get_draft_version("conv-1", 4) == {"title": "Park day", "max_pupils": 4}
+        assert manager.get_draft_version("conv-1", 6) == {"title": "Park day", "max_pupils": 6}
+        assert manager.get_draft_version("conv-1", 7) == {"title": "Park day", "max_pupils": 7, "notes": "odd"}
+        assert manager.get_draft_version("conv-1", 8) is None
+        assert db.query(EventDraftVersion).filter(EventDraftVersion.snapshot.isnot(None)).count() == 2
+
+    def test_clear_is_recorded_and_legacy_drafts_still_read(self, db):
+        manager = EventDraftManager(db)
+        db.get(AgentSession, "agent-1").memory = {"current_event_draft": {"event_data": {"title": "Old draft"}}}
+        db.commit()
+        assert manager.get_current_draft("conv-1") == {"title": "Old draft"}
+
+        manager.update_draft("conv-1", {"cost": 10})
+        assert manager.get_current_draft("conv-1") == {"title": "Old draft", "cost": 10}
+        assert manager.clear_draft("conv-1") is True
+        assert manager.get_current_draft("conv-1") is None
+        assert manager.get_draft_version("conv-1", 1) == {"title": "Old draft", "cost": 10}
+        assert manager.get_draft_history("conv-1")[-1]["source"] == "clear"
+
+    def test_deleting_the_event_and_conversation_with_foreign_keys_enforced(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        event.listen(engine, "connect", lambda connection, record: connection.execute("PRAGMA foreign_keys=ON"))
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        try:
+            db.add(User(id=1, email="one@example.com"))
+            db.add(Event(id=10, title="Park day"))
+            db.add(ChatConversation(id="conv-1", user_id=1, title="Chat"))
+            db.add(ChatConversation(id="conv-2", user_id=1, title="Chat"))
+            db.add(AgentSession(id="agent-1", conversation_id="conv-1", memory={}))
+            db.add(AgentSession(id="agent-2", conversation_id="conv-2", memory={}))
+            db.commit()
+            manager = EventDraftManager(db)
+            for conversation_id in ("conv-1", "conv-2"):
+                manager.save_event_draft(conversation_id, {"title": "Park day"})
+                db.get(EventDraft, conversation_id).used_for_event_id = 10
+            db.commit()
+
+            # The admin delete-event route
+            db.delete(db.get(Event, 10))
+            db.commit()
+            db.expire_all()
+            assert db.get(EventDraft, "conv-2").used_for_event_id is None
+
+            # The model tests' clean-up
+            db.delete(db.get(AgentSession, "agent-1"))
+            db.delete(db.get(ChatConversation, "conv-1"))
+            db.commit()
+            assert db.get(EventDraft, "conv-1") is None
+            assert db.query(EventDraftVersion).filter(EventDraftVersion.conversation_id == "conv-1").count() == 0
+            assert db.query(EventDraftVersion).filter(EventDraftVersion.conversation_id == "conv-2").count() == 1
+        finally:
+            db.close()
+            engine.dispose()
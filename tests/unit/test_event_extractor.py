@@ -0,0 +1,106 @@
+"""
+Unit tests for the rule-based event extractor and its place in the agent pipeline
+"""
+
+import json
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import ai_assistant
+from app.ai_assistant import ThinkingEventAgent
+from app.ai_providers import ModelConfig, MockAIProvider
+from app.event_extractor import event_extractor
+from app.models import (
+    Base, User, DynamicFieldDefinition, ChatConversation, AgentSession, EventDraft, EventDraftVersion
+)
+
+CORPUS = json.loads((Path(__file__).parents[2] / "benchmarks" / "event_extraction_corpus.json").read_text())
+TODAY = date(2026, 10, 18)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, DynamicFieldDefinition.__table__, ChatConversation.__table__,
+        AgentSession.__table__, EventDraft.__table__, EventDraftVersion.__table__
+    ])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(ChatConversation(id="conv-1", user_id=1, title="Chat"))
+    session.add(AgentSession(id="agent-1", conversation_id="conv-1", memory={}))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """Agent whose model call is recorded instead of made"""
+    agent = ThinkingEventAgent()
+    agent.model_calls = []
+
+    async def complete(messages, tools, emit=None, route="chat"):
+        agent.model_calls.append(messages)
+        return {"content": "What date suits you?", "provider": "mock", "model": "test"}
+
+    provider = MockAIProvider(ModelConfig(provider="mock", model_name="test", endpoint_url="local://mock"))
+    monkeypatch.setattr(ai_assistant.ai_manager, "get_current_provider", lambda: provider)
+    monkeypatch.setattr(ai_assistant.ai_manager, "get_current_model_config", lambda: provider.config)
+    monkeypatch.setattr(agent, "_complete", complete)
+    return agent
+
+
+@pytest.mark.unit
+class TestEventExtractor:
+    """Test extraction against the labelled corpus and how the agent uses it"""
+
+    @pytest.mark.parametrize("sample", CORPUS, ids=[sample["case"] for sample in CORPUS])
+    def test_corpus(self, sample):
+        extraction = event_extractor.extract(sample["message"], today=TODAY)
+        assert {name: extraction.fields.get(name) for name in sample["expected"]} == sample["expected"]
+        assert extraction.is_complete() == sample["complete"]
+
+    def test_dates_without_a_year_are_the_next_occurrence(self):
+        assert event_extractor.extract("on 17 October", today=TODAY).fields["date"] == "2027-10-17"
+        assert event_extractor.extract("on 18 October", today=TODAY).fields["date"] == "2026-10-18"
+        assert event_extractor.extract("on 31/2", today=TODAY).fields == {}
+
+    @pytest.mark.asyncio
+    async def test_complete_message_drafts_without_the_model(self, db, agent):
+        message = CORPUS[0]["message"]
+        result = await agent.chat(message, [], user_id=1, db=db, session_id="conv-1")
+
+        assert agent.model_calls == []
+        assert result["type"] == "rule_extraction"
+        draft = db.get(EventDraft, "conv-1").event_data
+        assert draft["title"] == "Zoo Visit" and draft["location"] == "Auckland Zoo" and draft["max_pupils"] == 20
+
+    @pytest.mark.asyncio
+    async def test_partial_message_goes_to_the_model_with_hints(self, db, agent):
+        result = await agent.chat("Drama workshop at Titirangi Theatre, $30 per child", [], user_id=1, db=db, session_id="conv-1")
+
+        assert result["response"] == "What date suits you?"
+        hint = agent.model_calls[0][-2]
+        assert hint["role"] == "system" and '"location": "Titirangi Theatre"' in hint["content"]
+        assert agent.model_calls[0][-1]["role"] == "user"
+
+    @pytest.mark.asyncio
+    async def test_questions_and_cancellations_go_to_the_model_without_hints(self, db, agent):
+        for message in ("What time does the Zoo trip on 12 August start? Is it at Western Springs?",
+                        "Cancel the park day at Cornwall Park on 5/11"):
+            await agent.chat(message, [], user_id=1, db=db, session_id="conv-1")
+            assert agent.model_calls[-1][-2]["role"] == "system"
+            assert "Details already read" not in agent.model_calls[-1][-2]["content"]
+
+        assert len(agent.model_calls) == 2
+        assert db.get(EventDraft, "conv-1") is None
@@ -0,0 +1,165 @@
+"""
+Unit tests for the similar-events index and the AI tools that use it
+"""
+
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.ai_tools
+import app.event_index
+from app.ai_tools import DynamicEventTools
+from app.event_index import EventIndex
+from app.models import Base, Event, User
+
+EVENTS = [
+    ("Pottery Workshop", "arts", "Hands-on clay pottery for kids, wheel throwing and glazing", 30.0, 10),
+    ("Clay Sculpture Class", "arts", "Sculpt animals from clay with a local potter", 25.0, 12),
+    ("Forest Nature Walk", "outdoors", "Guided bush walk spotting native birds and trees", 5.0, 25),
+    ("Robotics Club", "science", "Build and program robots with LEGO kits", 40.0, 16),
+]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add_all([User(id=1, email="one@example.com"), User(id=2, email="two@example.com")])
+    for title, category, description, cost, capacity in EVENTS:
+        session.add(Event(title=title, category=category, description=description, cost=cost,
+                          max_pupils=capacity, created_by=1))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = EventIndex(sync_interval=3600)
+    # The ORM listeners and the tools use the module-level index
+    monkeypatch.setattr(app.event_index, "event_index", index)
+    monkeypatch.setattr(app.ai_tools, "event_index", index)
+    yield index
+    index.close()
+
+
+def _titles(db, hits):
+    return [db.get(Event, event_id).title for event_id, _ in hits]
+
+
+@pytest.mark.unit
+class TestEventIndex:
+    """Test ranking, incremental updates, syncing and the memory-mapped file"""
+
+    def test_ranks_events_by_text_similarity(self, db, index):
+        hits = index.similar(db, "clay pottery for children", k=3)
+
+        assert _titles(db, hits)[:2] == ["Pottery Workshop", "Clay Sculpture Class"]
+        assert hits[0][1] > hits[1][1] > 0
+        assert "Robotics Club" not in _titles(db, hits)
+        assert index.similar(db, "zzz unrelated", k=3) == []
+
+    def test_orm_writes_are_indexed_before_the_next_search(self, db, index):
+        index.similar(db, "robots", k=1)
+        assert index.metrics["syncs"] == 1
+
+        db.add(Event(title="Junior Robot Builders", description="Robots for beginners", created_by=1))
+        robotics = db.query(Event).filter(Event.title == "Robotics Club").one()
+        robotics.title = "Chess Club"
+        robotics.description = "Openings and endgames"
+        db.delete(db.query(Event).filter(Event.title == "Forest Nature Walk").one())
+        db.commit()
+
+        assert _titles(db, index.similar(db, "robots", k=3)) == ["Junior Robot Builders"]
+        assert index.similar(db, "native birds", k=3) == []
+        assert index.metrics["syncs"] == 1 and index.get_metrics()["events"] == 4
+
+    def test_sync_catches_writes_made_outside_the_orm(self, db, index):
+        index.similar(db, "robots", k=1)
+        db.execute(text("UPDATE events SET title = 'Astronomy Night', description = 'Telescopes and planets', "
+                        "updated_at = '2030-01-01 00:00:00' WHERE title = 'Robotics Club'"))
+        db.commit()
+        assert _titles(db, index.similar(db, "telescopes", k=1)) == []
+
+        index.sync_interval = 0
+        assert _titles(db, index.similar(db, "telescopes", k=1)) == ["Astronomy Night"]
+
+    def test_file_backed_index_survives_a_restart(self, db, index, tmp_path):
+        path = str(tmp_path / "events.f32")
+        first = EventIndex(path=path)
+        expected = first.similar(db, "clay pottery", k=2)
+        first.close()
+
+        second = EventIndex(path=path)
+        assert second.get_metrics()["events"] == len(EVENTS)
+        assert second.similar(db, "clay pottery", k=2) == expected
+        assert second.metrics["indexed"] == 0  # nothing changed, nothing re-read
+        second.close()
+
+    def test_rows_are_reused_and_the_matrix_grows(self, db, index):
+        index.sync(db)
+        for number in range(600):
+            index._put(1000 + number, f"event number {number} topic{number % 7}", None)
+        capacity = index.matrix.capacity
+        for number in range(300):
+            index._drop(1000 + number)
+        for number in range(300):
+            index._put(2000 + number, f"replacement {number}", None)
+
+        assert capacity >= 600 and index.matrix.capacity == capacity
+        assert index.similar(db, "replacement 5", k=1)[0][0] == 2005
+
+        started = time.perf_counter()
+        for _ in range(50):
+            index.similar(db, "topic3 event", k=5)
+        assert (time.perf_counter() - started) / 50 < 0.01
+
+
+@pytest.mark.unit
+class TestSimilarEventTools:
+    """Test query_database and suggestions grounded in similar events"""
+
+    @pytest.mark.asyncio
+    async def test_similar_events_query_uses_the_index(self, db, index):
+        tools = DynamicEventTools(db=db, user_id=1)
+        result = await tools.query_database("similar_events", {"title": "Kids clay pottery", "limit": 2})
+
+        assert [e["title"] for e in result["similar_events"]] == ["Pottery Workshop", "Clay Sculpture Class"]
+        assert result["similar_events"][0]["similarity"] > 0
+
+        # Without any text the structured filters still work
+        result = await tools.query_database("similar_events", {"event_type": "homeschool"})
+        assert len(result["similar_events"]) == len(EVENTS)
+
+    @pytest.mark.asyncio
+    async def test_price_and_capacity_come_from_similar_events(self, db, index):
+        tools = DynamicEventTools(db=db, user_id=1)
+        partial = {"title": "Clay pottery afternoon", "description": "Pottery and clay modelling"}
+
+        pricing = await tools.suggest_event_details("pricing", partial)
+        assert pricing["suggested_price"] == 27.5
+        assert pricing["similar_events"] == ["Pottery Workshop", "Clay Sculpture Class"]
+
+        capacity = await tools.suggest_event_details("capacity", partial)
+        assert capacity["suggested_capacity"] == 12
+        assert capacity["capacity_range"] == {"min": 10, "max": 12}
+
+    @pytest.mark.asyncio
+    async def test_user_history_only_lists_the_users_events(self, db, index):
+        db.add(Event(title="Someone Else's Event", created_by=2))
+        db.commit()
+
+        mine = await DynamicEventTools(db=db, user_id=1).query_database("user_history")
+        theirs = await DynamicEventTools(db=db, user_id=2).query_database("user_history")
+
+        assert len(mine["user_events"]) == len(EVENTS)
+        assert [e["title"] for e in theirs["user_events"]] == ["Someone Else's Event"]
@@ -0,0 +1,151 @@
+"""
+Unit tests for the inference scheduler
+"""
+
+import asyncio
+
+import pytest
+
+from app.inference_scheduler import (
+    ClientDisconnected,
+    InferenceCancelled,
+    InferencePriority,
+    InferenceQueueFull,
+    InferenceScheduler,
+    inference_context,
+    run_until_disconnected
+)
+
+
+async def _hold(scheduler, order, label, release, **kwargs):
+    async with scheduler.slot("llama", **kwargs):
+        order.append(label)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.unit
+class TestInferenceScheduler:
+    """Test slots, ordering, cancellation and metrics"""
+
+    @pytest.mark.asyncio
+    async def test_runs_up_to_capacity_in_parallel(self):
+        scheduler = InferenceScheduler(capacity=2)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(scheduler, order, i, release, user_id=i)) for i in range(3)]
+        await _settle()
+
+        assert order == [0, 1]
+        metrics = scheduler.get_metrics()
+        assert metrics["models"]["llama"]["active"] == 2
+        assert metrics["queued"] == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2]
+        assert scheduler.get_metrics()["granted"] == 3
+
+    @pytest.mark.asyncio
+    async def test_priority_then_round_robin_between_users(self):
+        scheduler = InferenceScheduler(capacity=1)
+        order, gate = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(scheduler, order, "blocker", gate))
+        await _settle()
+
+        done = asyncio.Event()
+        done.set()
+        waiters = [
+            ("admin", dict(user_id=9, priority=InferencePriority.ADMIN)),
+            ("a1", dict(user_id=1, priority=InferencePriority.INTERACTIVE)),
+            ("a2", dict(user_id=1, priority=InferencePriority.INTERACTIVE)),
+            ("a3", dict(user_id=1, priority=InferencePriority.INTERACTIVE)),
+            ("b1", dict(user_id=2, priority=InferencePriority.INTERACTIVE)),
+        ]
+        tasks = []
+        for label, kwargs in waiters:
+            tasks.append(asyncio.create_task(_hold(scheduler, order, label, done, **kwargs)))
+            await _settle()
+
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        assert order == ["blocker", "a1", "b1", "a2", "a3", "admin"]
+
+    @pytest.mark.asyncio
+    async def test_context_supplies_user_and_priority(self):
+        scheduler = InferenceScheduler(capacity=1)
+        order, gate, done = [], asyncio.Event(), asyncio.Event()
+        done.set()
+        blocker = asyncio.create_task(_hold(scheduler, order, "blocker", gate))
+        await _settle()
+
+        background = asyncio.create_task(_hold(scheduler, order, "background", done))
+        await _settle()
+        with inference_context(user_id=5):
+            interactive = asyncio.create_task(_hold(scheduler, order, "chat", done))
+        await _settle()
+
+        assert scheduler.get_metrics()["models"]["llama"]["queued_by_priority"] == {
+            "interactive": 1, "background": 1, "admin": 0
+        }
+        gate.set()
+        await asyncio.gather(blocker, background, interactive)
+        assert order == ["blocker", "chat", "background"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiters_leave_the_queue(self):
+        scheduler = InferenceScheduler(capacity=1, max_queue=1)
+        order, gate = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(scheduler, order, "blocker", gate))
+        await _settle()
+        waiter = asyncio.create_task(_hold(scheduler, order, "waiter", gate))
+        await _settle()
+
+        with pytest.raises(InferenceQueueFull):
+            await _hold(scheduler, order, "overflow", gate)
+
+        waiter.cancel()
+        await _settle()
+        assert scheduler.queue_depth() == 0
+
+        admin_cleared = asyncio.create_task(_hold(scheduler, order, "cleared", gate))
+        await _settle()
+        assert scheduler.cancel_queued() == 1
+        with pytest.raises(InferenceCancelled):
+            await admin_cleared
+
+        gate.set()
+        await blocker
+        assert order == ["blocker"]
+        metrics = scheduler.get_metrics()
+        assert metrics["models"]["llama"]["active"] == 0
+        assert metrics["rejected"] == 1
+        assert metrics["cancelled"] == 2
+        assert metrics["wait_ms"]["max"] is not None
+
+    @pytest.mark.asyncio
+    async def test_client_disconnect_cancels_request(self):
+        class FakeRequest:
+            def __init__(self):
+                self.polls = 0
+
+            async def is_disconnected(self):
+                self.polls += 1
+                return self.polls >= 2
+
+        cancelled = asyncio.Event()
+
+        async def slow_turn():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with pytest.raises(ClientDisconnected):
+            await run_until_disconnected(FakeRequest(), slow_turn(), poll_interval=0.01)
+        await _settle()
+        assert cancelled.is_set()
@@ -0,0 +1,79 @@
+"""
+Unit tests for background Ollama model discovery
+"""
+
+import asyncio
+
+import pytest
+
+from app.ai_providers import AIProviderManager
+
+
+def _manager(monkeypatch, fetch):
+    monkeypatch.setenv("CURRENT_AI_MODEL", "mock_assistant")
+    manager = AIProviderManager()
+    manager.fetches = 0
+
+    async def counted():
+        manager.fetches += 1
+        return await fetch()
+
+    monkeypatch.setattr(manager, "_fetch_ollama_tags", counted)
+    return manager
+
+
+@pytest.mark.unit
+class TestModelDiscovery:
+    """Test that request paths only read the snapshot and refreshes happen in the background"""
+
+    @pytest.mark.asyncio
+    async def test_stale_snapshot_is_served_while_one_refresh_runs(self, monkeypatch):
+        release = asyncio.Event()
+
+        async def slow_fetch():
+            await release.wait()
+            return [{"name": "llama3.2:3b"}]
+
+        manager = _manager(monkeypatch, slow_fetch)
+        for _ in range(5):
+            assert "ollama_llama3.2_3b" not in manager.get_available_models()
+            assert manager.get_current_provider().__class__.__name__ == "MockAIProvider"
+        await asyncio.sleep(0)
+        assert manager.fetches == 1
+
+        release.set()
+        await manager._refresh_task
+        assert manager.get_available_models()["ollama_llama3.2_3b"].model_name == "llama3.2:3b"
+        assert manager.fetches == 1  # fresh again, so no new refresh was scheduled
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_last_snapshot(self, monkeypatch):
+        responses = [[{"name": "qwen2.5:7b"}], ConnectionError("refused")]
+
+        async def fetch():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        manager = _manager(monkeypatch, fetch)
+        await manager.refresh_ollama_models()
+        await manager.refresh_ollama_models()
+
+        assert list(manager._get_ollama_models()) == ["ollama_qwen2.5_7b"]
+        assert manager.model_discovery_status()["error"] == "refused"
+
+    @pytest.mark.asyncio
+    async def test_discovery_loop_refreshes_on_interval(self, monkeypatch):
+        async def fetch():
+            return [{"name": f"model-{manager.fetches}"}]
+
+        manager = _manager(monkeypatch, fetch)
+        manager.discovery_interval = 0.01
+        await manager.start_model_discovery()
+        assert manager.model_discovery_status()["running"]
+        await asyncio.sleep(0.05)
+        await manager.stop_model_discovery()
+
+        assert manager.fetches >= 3
+        assert not manager.model_discovery_status()["running"]
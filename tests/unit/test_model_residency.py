@@ -0,0 +1,110 @@
+"""
+Unit tests for Ollama model warm-up and residency tracking
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app import ai_providers
+from app.ai_providers import AIProviderManager, ModelConfig, OllamaProvider
+from app.model_residency import ModelResidency
+
+BASE_URL = "http://ollama:11434"
+
+
+def _residency(monkeypatch, fail=False):
+    residency = ModelResidency(keep_alive="10m", check_interval=0.01)
+    residency.loads = []
+    residency.running = []
+
+    async def load(base_url, model):
+        residency.loads.append(model)
+        await asyncio.sleep(0.01)
+        if fail:
+            raise RuntimeError("out of memory")
+        residency.running.append({"name": model, "size_vram": 4096})
+
+    async def running(base_url):
+        return list(residency.running)
+
+    monkeypatch.setattr(residency, "_load", load)
+    monkeypatch.setattr(residency, "_running", running)
+    monkeypatch.setattr(ai_providers, "model_residency", residency)
+    return residency
+
+
+def _manager(monkeypatch):
+    monkeypatch.setenv("CURRENT_AI_MODEL", "ollama_llama3.2_3b")
+    manager = AIProviderManager()
+    manager._ollama_models = {
+        f"ollama_{name.replace(':', '_')}": ModelConfig(provider="ollama", model_name=name, endpoint_url=BASE_URL)
+        for name in ("llama3.2:3b", "qwen2.5:7b")
+    }
+    manager._ollama_refreshed_at = manager._ollama_attempted_at = time.time()
+    return manager
+
+
+@pytest.mark.unit
+class TestModelResidency:
+    """Test warm-up, /api/ps tracking and warming before a model switch"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_warms_share_one_load(self, monkeypatch):
+        residency = _residency(monkeypatch)
+        results = await asyncio.gather(*(residency.warm(BASE_URL, "llama3.2:3b") for _ in range(5)))
+
+        assert results == [True] * 5
+        assert residency.loads == ["llama3.2:3b"]
+        assert residency.is_loaded(BASE_URL, "llama3.2:3b")
+        assert await residency.warm(BASE_URL, "llama3.2:3b") and len(residency.loads) == 1
+
+    @pytest.mark.asyncio
+    async def test_monitor_rewarms_an_evicted_model(self, monkeypatch):
+        residency = _residency(monkeypatch)
+        await residency.start(lambda: (BASE_URL, "llama3.2:3b"))
+        await asyncio.sleep(0.05)
+        assert residency.status()["models"][0]["state"] == "loaded"
+
+        residency.running.clear()  # Ollama unloaded it
+        await residency.check(BASE_URL)
+        assert not residency.is_loaded(BASE_URL, "llama3.2:3b")
+        await asyncio.sleep(0.05)
+        await residency.stop()
+
+        assert residency.loads == ["llama3.2:3b", "llama3.2:3b"]
+        assert residency.status()["models"][0]["size_vram"] == 4096
+        assert not residency.status()["monitoring"]
+
+    @pytest.mark.asyncio
+    async def test_traffic_moves_only_after_the_new_model_is_warm(self, monkeypatch):
+        residency = _residency(monkeypatch)
+        manager = _manager(monkeypatch)
+
+        assert manager.set_current_model("ollama_qwen2.5_7b")
+        assert manager.pending_model == "ollama_qwen2.5_7b"
+        assert manager.get_current_provider().model == "llama3.2:3b"
+
+        await asyncio.sleep(0.05)
+        assert manager.pending_model is None
+        assert manager.get_current_provider().model == "qwen2.5:7b"
+        assert residency.loads == ["qwen2.5:7b"]
+
+    @pytest.mark.asyncio
+    async def test_failed_warm_keeps_the_old_model(self, monkeypatch):
+        residency = _residency(monkeypatch, fail=True)
+        manager = _manager(monkeypatch)
+
+        manager.set_current_model("ollama_qwen2.5_7b")
+        await asyncio.sleep(0.05)
+
+        assert manager.current_config == "ollama_llama3.2_3b"
+        assert residency.status()["models"][0]["error"] == "out of memory"
+        assert manager.set_current_model("ollama_qwen2.5_7b", warm_first=False)
+        assert manager.current_config == "ollama_qwen2.5_7b"
+
+    def test_requests_carry_keep_alive(self, monkeypatch):
+        _residency(monkeypatch)
+        provider = OllamaProvider(ModelConfig(provider="ollama", model_name="llama3.2:3b", endpoint_url=BASE_URL))
+        assert provider._chat_payload([{"role": "user", "content": "hi"}])["keep_alive"] == "10m"
@@ -0,0 +1,81 @@
+"""
+Unit tests for the shared Ollama HTTP client pool
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.ai_providers import ModelConfig, OllamaClientPool, OllamaProvider, ollama_clients
+from benchmarks.fake_ollama import FakeOllamaServer
+
+
+@pytest.fixture(scope="module")
+def fake_ollama():
+    with FakeOllamaServer() as server:
+        yield server
+
+
+@pytest.mark.unit
+class TestOllamaClientPool:
+    """Test client reuse, lifecycle and timeouts"""
+
+    @pytest.mark.asyncio
+    async def test_one_client_per_base_url(self):
+        pool = OllamaClientPool()
+
+        first = pool.get("http://ollama:11434/")
+        assert pool.get("http://ollama:11434") is first
+        assert pool.get("http://other:11434") is not first
+
+        await pool.aclose()
+        assert first.is_closed
+        assert pool.get("http://ollama:11434") is not first
+        await pool.aclose()
+
+    def test_clients_replaced_for_a_new_loop_are_closed(self):
+        pool = OllamaClientPool()
+
+        async def get():
+            return pool.get("http://ollama:11434")
+
+        # Owner loop still running in another thread: the old client is closed there
+        other_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+        thread.start()
+        running_loop_client = asyncio.run_coroutine_threadsafe(get(), other_loop).result()
+        first_run_client = asyncio.run(get())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), other_loop).result()  # let the close finish
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+        assert running_loop_client.is_closed
+
+        # Owner loop finished: the old client waits for aclose()
+        second_run_client = asyncio.run(get())
+        assert pool._retired == [first_run_client] and not first_run_client.is_closed
+        asyncio.run(pool.aclose())
+        assert first_run_client.is_closed and second_run_client.is_closed and pool._retired == []
+
+    def test_granular_timeouts(self, monkeypatch):
+        monkeypatch.setenv("OLLAMA_CONNECT_TIMEOUT", "2")
+        monkeypatch.setenv("OLLAMA_READ_TIMEOUT", "120")
+        pool = OllamaClientPool()
+
+        assert pool.timeout.connect == 2
+        assert pool.timeout.read == 120
+        assert pool.probe_timeout.read == 10
+
+    @pytest.mark.asyncio
+    async def test_chat_turns_reuse_one_connection(self, fake_ollama):
+        fake_ollama.reset_stats()
+        provider = OllamaProvider(ModelConfig(provider="ollama", model_name=fake_ollama.model, endpoint_url=fake_ollama.base_url))
+
+        for _ in range(5):
+            result = await provider._try_chat_endpoint([{"role": "user", "content": "hello"}])
+            assert result["success"]
+
+        assert fake_ollama.requests == 5
+        assert len(fake_ollama.connections) == 1
+        await ollama_clients.aclose()
@@ -0,0 +1,92 @@
+"""
+Unit tests for the async payment gateway
+Uses MockPaymentService with injected latency in place of Stripe
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.payment_service import AsyncPaymentGateway, MockPaymentService
+
+
+class RecordingService(MockPaymentService):
+    """Mock service that remembers the idempotency keys it was given"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.keys = []
+
+    def create_refund(self, payment_intent_id, amount_cents=None, reason=None, idempotency_key=None, metadata=None):
+        self.keys.append(idempotency_key)
+        return super().create_refund(payment_intent_id, amount_cents, reason, idempotency_key, metadata)
+
+
+@pytest.mark.unit
+class TestAsyncPaymentGateway:
+    """Test off-loop execution, timeouts, idempotency keys and metrics"""
+
+    @pytest.mark.asyncio
+    async def test_calls_do_not_block_event_loop(self):
+        gateway = AsyncPaymentGateway(service=MockPaymentService(latency_ms=200), max_workers=4, timeout=5)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        results = await asyncio.gather(*[gateway.confirm_payment("pi_test") for _ in range(4)])
+        elapsed = time.perf_counter() - started
+        task.cancel()
+
+        assert all(r['success'] for r in results)
+        # Four 200ms calls ran concurrently on the pool while the loop kept ticking
+        assert elapsed < 0.6
+        assert ticks >= 10
+        gateway.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_timeout_returns_error_result(self):
+        gateway = AsyncPaymentGateway(service=MockPaymentService(latency_ms=500), max_workers=1, timeout=0.05)
+
+        result = await gateway.create_checkout_session(
+            amount_cents=1000, booking_details={}, customer_email="a@example.com",
+            success_url="http://test/success", cancel_url="http://test/cancel"
+        )
+
+        assert result['success'] is False
+        assert result['error_type'] == 'Timeout'
+        assert gateway.get_metrics()['operations']['create_checkout_session']['timeouts'] == 1
+        gateway.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_idempotency_keys(self):
+        service = RecordingService(latency_ms=0)
+        gateway = AsyncPaymentGateway(service=service, max_workers=1, timeout=5)
+
+        await gateway.create_refund("pi_1", idempotency_key="refund-booking-7")
+        await gateway.create_refund("pi_1")
+        await gateway.create_refund("pi_1")
+
+        assert service.keys[0] == "refund-booking-7"
+        assert service.keys[1].startswith("refund-")
+        assert service.keys[1] != service.keys[2]
+        gateway.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_latency_metrics(self):
+        gateway = AsyncPaymentGateway(service=MockPaymentService(latency_ms=20), max_workers=2, timeout=5)
+
+        for _ in range(5):
+            await gateway.create_payment_intent(1000, {}, "a@example.com")
+
+        stats = gateway.get_metrics()['operations']['create_payment_intent']
+        assert stats['calls'] == 5
+        assert stats['errors'] == 0
+        assert 20 <= stats['p50_ms'] <= stats['p95_ms'] <= stats['max_ms']
+        gateway.shutdown()
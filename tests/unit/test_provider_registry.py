@@ -0,0 +1,62 @@
+"""
+Unit tests for the provider registry
+"""
+
+import pytest
+
+from app.ai_providers import AIProviderManager, ModelConfig, OpenAIProvider, ProviderRegistry
+
+
+class FakeSDKClient:
+    def __init__(self, config):
+        self.api_key = config.api_key
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def _openai(model_name, **overrides):
+    return ModelConfig(provider="openai", model_name=model_name, endpoint_url="https://api.openai.com/v1", api_key="sk-test", **overrides)
+
+
+@pytest.mark.unit
+class TestProviderRegistry:
+    """Test warm reuse, rebuilds on config change, shared clients and shutdown"""
+
+    def test_provider_reused_until_its_config_changes(self, monkeypatch):
+        monkeypatch.setattr(OpenAIProvider, "build_client", FakeSDKClient)
+        registry = ProviderRegistry()
+
+        first = registry.get(_openai("gpt-4o-mini"))
+        assert registry.get(_openai("gpt-4o-mini")) is first
+        changed = registry.get(_openai("gpt-4o-mini", temperature=0.2))
+
+        assert changed is not first and changed.config.temperature == 0.2
+        assert changed.client is first.client
+        assert registry.stats() == {"providers": 1, "clients": 1, "builds": 2, "hits": 1}
+
+    @pytest.mark.asyncio
+    async def test_models_share_clients_per_key_and_close_on_shutdown(self, monkeypatch):
+        monkeypatch.setattr(OpenAIProvider, "build_client", FakeSDKClient)
+        registry = ProviderRegistry()
+
+        mini = registry.get(_openai("gpt-4o-mini"))
+        large = registry.get(_openai("gpt-4"))
+        other_key = registry.get(ModelConfig(provider="openai", model_name="gpt-4", endpoint_url="https://api.openai.com/v1", api_key="sk-other"))
+
+        assert mini.client is large.client
+        assert other_key.client is not mini.client
+        await registry.aclose()
+        assert mini.client.closed and other_key.client.closed
+        assert registry.stats()["providers"] == 0
+
+    def test_manager_hands_out_the_warm_provider(self, monkeypatch):
+        monkeypatch.setenv("CURRENT_AI_MODEL", "mock_assistant")
+        manager = AIProviderManager()
+
+        provider = manager.get_current_provider()
+        assert manager.get_current_provider() is provider
+        assert provider.response_cache is manager.response_cache
+        with pytest.raises(ValueError):
+            manager._create_provider(ModelConfig(provider="unknown", model_name="x", endpoint_url=""))
@@ -0,0 +1,151 @@
+"""
+Unit tests for provider fallback, circuit breakers and hedged requests
+"""
+
+import asyncio
+
+import pytest
+
+from app.ai_providers import BaseAIProvider, ModelConfig
+from app.provider_router import ProviderRouter
+
+
+class FakeProvider(BaseAIProvider):
+    def __init__(self, name, delay=0.0, fail=False, stream_then_fail=False):
+        super().__init__(ModelConfig(provider="fake", model_name=name, endpoint_url=""))
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.stream_then_fail = stream_then_fail
+        self.calls = 0
+        self.cancelled = False
+
+    async def chat_completion(self, messages, tools=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            return {"content": "Sorry", "tool_calls": None, "provider": "fake", "error": f"{self.name} is down"}
+        return {"content": f"hello from {self.name}", "tool_calls": None, "provider": "fake", "model": self.name}
+
+    async def stream_chat_completion(self, messages, tools=None):
+        self.calls += 1
+        if self.stream_then_fail:
+            yield {"type": "token", "content": "hel"}
+        if self.fail or self.stream_then_fail:
+            raise ConnectionError(f"{self.name} dropped")
+        yield {"type": "token", "content": f"hello from {self.name}"}
+        yield {"type": "done", "content": f"hello from {self.name}", "tool_calls": None, "provider": "fake"}
+
+    def format_tools_for_provider(self, tools):
+        return tools
+
+
+class FakeManager:
+    def __init__(self, providers):
+        self.providers = providers
+
+    def get_available_models(self):
+        return {name: provider.config for name, provider in self.providers.items()}
+
+    def get_current_model_key(self):
+        return next(iter(self.providers))
+
+    def _create_provider(self, config):
+        return self.providers[config.model_name]
+
+
+def _router(*providers, **options):
+    manager = FakeManager({provider.name: provider for provider in providers})
+    options.setdefault("hedging", False)
+    return ProviderRouter(manager, chain="current," + ",".join(provider.name for provider in providers),
+                          slos="chat=0.05", failure_threshold=2, recovery_timeout=60, **options)
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.mark.unit
+class TestProviderRouter:
+    """Test the fallback chain, circuit breakers, hedging and streamed fallback"""
+
+    @pytest.mark.asyncio
+    async def test_falls_back_and_opens_the_failing_circuit(self):
+        local, cloud = FakeProvider("local", fail=True), FakeProvider("cloud")
+        router = _router(local, cloud)
+
+        for _ in range(3):
+            result = await router.complete(MESSAGES)
+            assert result["content"] == "hello from cloud" and result["model_key"] == "cloud"
+
+        assert local.calls == 2  # skipped once its circuit opened
+        assert router.status()["circuits"]["local"]["state"] == "OPEN"
+        assert router.metrics["fallbacks"] == 3
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_lets_a_trial_call_through_after_recovery(self):
+        local, cloud = FakeProvider("local", fail=True), FakeProvider("cloud")
+        router = _router(local, cloud)
+        await router.complete(MESSAGES)
+        await router.complete(MESSAGES)
+
+        local.fail = False
+        router.breaker("local").last_failure_time -= 61
+        assert (await router.complete(MESSAGES))["model_key"] == "local"
+        assert router.breaker("local").state == "CLOSED"
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_hedged_after_the_route_slo(self):
+        slow, fast = FakeProvider("slow", delay=1.0), FakeProvider("fast")
+        router = _router(slow, fast, hedging=True)
+
+        result = await router.complete(MESSAGES)
+        await asyncio.sleep(0)
+
+        assert result["model_key"] == "fast" and result["hedged"]
+        assert slow.cancelled
+        assert router.metrics["hedges"] == 1 and router.metrics["hedge_wins"] == 1
+        assert router.breaker("slow").state == "CLOSED"
+
+    @pytest.mark.asyncio
+    async def test_without_hedging_a_slow_call_is_waited_for(self):
+        slow, fast = FakeProvider("slow", delay=0.1), FakeProvider("fast")
+        router = _router(slow, fast)
+
+        assert (await router.complete(MESSAGES))["model_key"] == "slow"
+        assert fast.calls == 0
+        assert router.metrics["slo_breaches"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_falls_back_only_before_the_first_token(self):
+        events = []
+
+        async def emit(event):
+            events.append(event)
+
+        router = _router(FakeProvider("local", fail=True), FakeProvider("cloud"))
+        result = await router.complete(MESSAGES, emit=emit)
+        assert result["model_key"] == "cloud"
+        assert [event["content"] for event in events] == ["hello from cloud"]
+
+        events.clear()
+        router = _router(FakeProvider("local", stream_then_fail=True), FakeProvider("cloud"))
+        result = await router.complete(MESSAGES, emit=emit)
+        assert result["model_key"] == "local" and "dropped" in result["error"]
+        assert [event["content"] for event in events] == ["hel"]
+
+    @pytest.mark.asyncio
+    async def test_tool_follow_up_only_reaches_models_through_the_router(self, monkeypatch):
+        from app import ai_assistant
+
+        local, cloud = FakeProvider("local", fail=True), FakeProvider("cloud")
+        monkeypatch.setattr(ai_assistant, "provider_router", _router(local, cloud))
+        tool_results = [{"function": "create_event_draft", "result": {"event_data": {"title": "Picnic"}}}]
+
+        response = await ai_assistant.ThinkingEventAgent()._generate_follow_up_response({}, tool_results, local)
+
+        assert response["response"] == "hello from cloud"
+        assert local.calls == 1 and cloud.calls == 1
@@ -0,0 +1,214 @@
+"""
+Unit tests for Stripe payment reconciliation
+Runs against an in-memory stand-in for Stripe's list endpoints
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import stripe
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.config import config
+from app.models import Base, User, Event, Child, Adult, Booking, AdultBooking, TicketType, PaymentStatus
+from app.reconciliation_service import PaymentReconciler, StripeSource, _unix
+
+
+class FakeStripeList:
+    """Mimics PaymentIntent.list / Refund.list: newest first, cursor via starting_after"""
+
+    def __init__(self, objects):
+        self.objects = sorted(objects, key=lambda o: (-o["created"], o["id"]))
+        self.calls = []
+
+    def list(self, created, limit, starting_after=None, api_key=None):
+        self.calls.append(starting_after)
+        matching = [o for o in self.objects if created["gte"] <= o["created"] < created["lt"]]
+        if starting_after:
+            index = next(i for i, o in enumerate(matching) if o["id"] == starting_after)
+            matching = matching[index + 1:]
+        return SimpleNamespace(data=matching[:limit], has_more=len(matching) > limit)
+
+
+class RecordingStripeClient(stripe.HTTPClient):
+    """Answers every Stripe API call with an empty list page, recording the key it was sent with"""
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.authorizations = []
+
+    def request(self, method, url, headers, post_data=None):
+        self.authorizations.append(headers.get("Authorization"))
+        return '{"object": "list", "data": [], "has_more": false, "url": "/v1/list"}', 200, {}
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, Event.__table__, Child.__table__, Adult.__table__, TicketType.__table__,
+        Booking.__table__, AdultBooking.__table__
+    ])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+WINDOW_END = datetime(2026, 10, 18)
+WINDOW_START = WINDOW_END - timedelta(days=3)
+OLD = datetime(2026, 10, 16)
+
+
+def _setup(session_factory, statuses):
+    """Create one child booking per status, all made two days before the window end"""
+    db = session_factory()
+    user = User(email="family@example.com")
+    event = Event(title="Kayaking", cost=30)
+    db.add_all([user, event])
+    db.flush()
+    ids = []
+    for status in statuses:
+        child = Child(user_id=user.id, name="Tama", age=9)
+        db.add(child)
+        db.flush()
+        booking = Booking(event_id=event.id, child_id=child.id, payment_status=status, timestamp=OLD)
+        db.add(booking)
+        db.flush()
+        ids.append(booking.id)
+    db.commit()
+    db.close()
+    return ids
+
+
+def _intent(intent_id, status, booking_ids, created=OLD):
+    return {
+        "id": intent_id,
+        "status": status,
+        "created": _unix(created),
+        "metadata": {"booking_type": "event_booking", "booking_ids": ",".join(map(str, booking_ids))}
+    }
+
+
+def _reconciler(session_factory, intents=(), refunds=(), page_size=100):
+    source = StripeSource(payment_intents=FakeStripeList(intents), refunds=FakeStripeList(refunds), page_size=page_size)
+    return PaymentReconciler(session_factory=session_factory, source=source, stale_after_hours=1)
+
+
+@pytest.mark.unit
+class TestPaymentReconciler:
+    """Test pagination, discrepancy detection and auto-fixes"""
+
+    def test_pages_through_stripe_with_cursors(self, session_factory):
+        intents = [_intent(f"pi_{i:05d}", "succeeded", []) for i in range(2500)]
+        reconciler = _reconciler(session_factory, intents=intents, page_size=100)
+
+        report = reconciler.run(WINDOW_START, WINDOW_END)
+
+        assert report["checked"]["payment_intents"] == 2500
+        calls = reconciler.source.payment_intents.calls
+        assert len(calls) == 25
+        assert calls[0] is None and all(calls[1:])
+
+    def test_detects_paid_not_recorded_and_abandoned(self, session_factory):
+        paid_id, abandoned_id = _setup(session_factory, [PaymentStatus.pending, PaymentStatus.pending])
+        intents = [
+            _intent("pi_paid", "succeeded", [paid_id]),
+            _intent("pi_gone", "canceled", [abandoned_id]),
+            _intent("pi_orphan", "succeeded", [99999]),
+        ]
+
+        report = _reconciler(session_factory, intents=intents).run(WINDOW_START, WINDOW_END)
+
+        assert report["discrepancies"]["paid_not_recorded"] == 1
+        assert report["discrepancies"]["payment_abandoned"] == 1
+        assert report["discrepancies"]["orphan_payment"] == 1
+        assert report["discrepancies"]["stuck_pending"] == 2
+        assert report["fixed"] == {}
+
+    def test_auto_fix_updates_bookings(self, session_factory):
+        paid_id, abandoned_id = _setup(session_factory, [PaymentStatus.pending, PaymentStatus.pending])
+        intents = [_intent("pi_paid", "succeeded", [paid_id]), _intent("pi_gone", "canceled", [abandoned_id])]
+
+        report = _reconciler(session_factory, intents=intents).run(WINDOW_START, WINDOW_END, auto_fix=True)
+
+        assert report["fixed"] == {"paid_not_recorded": 1, "payment_abandoned": 1}
+        assert "stuck_pending" not in report["discrepancies"]
+        db = session_factory()
+        paid = db.query(Booking).get(paid_id)
+        assert paid.payment_status == PaymentStatus.paid
+        assert paid.stripe_payment_id == "pi_paid"
+        assert db.query(Booking).get(abandoned_id).payment_status == PaymentStatus.failed
+        db.close()
+
+    def test_refund_discrepancies(self, session_factory):
+        unrecorded_id, unsettled_id, missing_id = _setup(session_factory, [PaymentStatus.paid] * 3)
+        db = session_factory()
+        for booking_id, intent_id in ((unrecorded_id, "pi_1"), (unsettled_id, "pi_2"), (missing_id, "pi_3")):
+            booking = db.query(Booking).get(booking_id)
+            booking.stripe_payment_id = intent_id
+            if booking_id != unrecorded_id:
+                booking.refund_processed = True
+                booking.refund_processed_at = OLD
+        db.commit()
+        db.close()
+        refunds = [
+            {"id": "re_1", "payment_intent": "pi_1", "status": "succeeded", "amount": 3000, "created": _unix(OLD)},
+            {"id": "re_2", "payment_intent": "pi_2", "status": "failed", "amount": 3000, "created": _unix(OLD)},
+        ]
+
+        report = _reconciler(session_factory, refunds=refunds).run(WINDOW_START, WINDOW_END)
+
+        assert report["discrepancies"] == {
+            "refund_not_recorded": 1,
+            "refund_not_settled": 1,
+            "refund_missing_in_stripe": 1
+        }
+        assert report["samples"]["refund_missing_in_stripe"][0]["payment_intent"] == "pi_3"
+
+    def test_refunds_on_a_shared_intent_only_touch_their_booking(self, session_factory):
+        refunded_id, sibling_id, legacy_id, legacy_sibling_id = _setup(session_factory, [PaymentStatus.paid] * 4)
+        db = session_factory()
+        for booking_id, intent_id in ((refunded_id, "pi_shared"), (sibling_id, "pi_shared"),
+                                      (legacy_id, "pi_legacy"), (legacy_sibling_id, "pi_legacy")):
+            db.query(Booking).get(booking_id).stripe_payment_id = intent_id
+        db.commit()
+        db.close()
+        refunds = [
+            # Partial refund of one booking out of a checkout that paid for two
+            {"id": "re_1", "payment_intent": "pi_shared", "status": "succeeded", "amount": 1500, "created": _unix(OLD),
+             "metadata": {"booking_model": "booking", "booking_id": str(refunded_id)}},
+            # Made before refunds named their booking
+            {"id": "re_2", "payment_intent": "pi_legacy", "status": "succeeded", "amount": 3000, "created": _unix(OLD)},
+        ]
+
+        report = _reconciler(session_factory, refunds=refunds).run(WINDOW_START, WINDOW_END, auto_fix=True)
+
+        assert report["discrepancies"]["refund_not_recorded"] == 3
+        assert report["fixed"] == {"refund_not_recorded": 1}
+        db = session_factory()
+        refunded = db.query(Booking).get(refunded_id)
+        assert refunded.payment_status == PaymentStatus.refunded and refunded.refund_amount == 15
+        for booking_id in (sibling_id, legacy_id, legacy_sibling_id):
+            booking = db.query(Booking).get(booking_id)
+            assert booking.payment_status == PaymentStatus.paid and not booking.refund_processed
+        db.close()
+
+    def test_uses_the_configured_key_without_the_global_one(self, session_factory, monkeypatch):
+        # Straight after a restart no PaymentService has set stripe.api_key yet
+        client = RecordingStripeClient()
+        monkeypatch.setattr(stripe, "api_key", None)
+        monkeypatch.setattr(stripe, "default_http_client", client)
+        monkeypatch.setattr(config, "STRIPE_SECRET_KEY", "sk_test_reconcile")
+
+        reconciler = PaymentReconciler(session_factory=session_factory, stale_after_hours=1)
+        report = reconciler.run(WINDOW_START, WINDOW_END)
+
+        assert report["checked"]["payment_intents"] == 0
+        assert client.authorizations == ["Bearer sk_test_reconcile", "Bearer sk_test_reconcile"]
@@ -0,0 +1,75 @@
+"""
+Unit tests for the text tool-call parser, run against the corpus of model outputs
+"""
+
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from app.tool_call_parser import ToolCallParser, parse_tool_calls
+
+CORPUS = json.loads((Path(__file__).parents[2] / "benchmarks" / "tool_call_corpus.json").read_text())
+TOOLS = [{"name": name} for name in ("create_event_draft", "query_database", "suggest_event_details", "validate_event_data")]
+
+
+def _decoded(calls):
+    return [{"name": call["function"]["name"], "arguments": json.loads(call["function"]["arguments"])} for call in calls]
+
+
+def _feed_in_chunks(output, rng):
+    parser = ToolCallParser(TOOLS)
+    position = 0
+    while position < len(output):
+        size = rng.randint(1, 12)
+        parser.feed(output[position:position + size])
+        position += size
+    return parser.finish()
+
+
+@pytest.mark.unit
+class TestToolCallParser:
+    """Test the corpus whole, streamed in random chunks, and mutated"""
+
+    @pytest.mark.parametrize("sample", CORPUS, ids=[sample["case"] for sample in CORPUS])
+    def test_corpus(self, sample):
+        assert _decoded(parse_tool_calls(sample["output"], TOOLS)) == sample["expected"]
+
+    def test_streamed_chunks_match_whole_output(self):
+        rng = random.Random(39)
+        for sample in CORPUS:
+            for _ in range(20):
+                assert _decoded(_feed_in_chunks(sample["output"], rng)) == sample["expected"], sample["case"]
+
+    def test_calls_are_returned_as_soon_as_they_close(self):
+        parser = ToolCallParser(TOOLS)
+        assert parser.feed('TOOL_CALL: create_event_draft {"title": "Kite') == []
+        assert parser.feed(' Day", "tickets": {"adult": 5}') == []
+        completed = parser.feed('}\nThanks!')
+        assert _decoded(completed) == [{"name": "create_event_draft", "arguments": {"title": "Kite Day", "tickets": {"adult": 5}}}]
+        assert parser.finish() == completed
+
+    def test_loose_mode_pairs_mentioned_tool_with_later_object(self):
+        output = 'I will use create_event_draft with these details:\n\n{"title": "Park Day", "cost": 0}'
+        assert parse_tool_calls(output, TOOLS) == []
+        assert _decoded(parse_tool_calls(output, TOOLS, loose=True)) == [
+            {"name": "create_event_draft", "arguments": {"title": "Park Day", "cost": 0}}
+        ]
+
+    def test_fuzzed_outputs_never_raise(self):
+        rng = random.Random(2026)
+        alphabet = '{}[]"\\:,( )TOOL_CALL create_event_draft\n'
+        known = {tool["name"] for tool in TOOLS}
+        for _ in range(500):
+            text = list(rng.choice(CORPUS)["output"])
+            for _ in range(rng.randint(1, 6)):
+                position = rng.randrange(len(text) + 1)
+                if rng.random() < 0.5 and text:
+                    del text[min(position, len(text) - 1)]
+                else:
+                    text.insert(position, rng.choice(alphabet))
+            calls = parse_tool_calls("".join(text), TOOLS, loose=rng.random() < 0.5)
+            for call in calls:
+                assert call["function"]["name"] in known
+                assert isinstance(json.loads(call["function"]["arguments"]), dict)
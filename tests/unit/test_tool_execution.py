@@ -0,0 +1,114 @@
+"""
+Unit tests for concurrent tool execution and single-version draft writes
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.event_draft_manager import DynamicToolIntegration
+from app.models import Base, User, ChatConversation, AgentSession, EventDraft, EventDraftVersion
+from app.tool_execution import plan_waves
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, ChatConversation.__table__, AgentSession.__table__,
+        EventDraft.__table__, EventDraftVersion.__table__
+    ])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(ChatConversation(id="conv-1", user_id=1, title="Chat"))
+    session.add(AgentSession(id="agent-1", conversation_id="conv-1", memory={}))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def integration(db, monkeypatch):
+    """Integration whose read-only tools take 50ms of (awaited) I/O each"""
+    integration = DynamicToolIntegration(db, user_id=1)
+    execute = integration.tools.execute_tool
+
+    async def slow_execute(name, arguments):
+        if name in ("query_database", "suggest_event_details"):
+            await asyncio.sleep(0.05)
+        return await execute(name, arguments)
+
+    monkeypatch.setattr(integration.tools, "execute_tool", slow_execute)
+    commits = []
+    original_commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: (commits.append(1), original_commit())[1])
+    integration.commits = commits
+    return integration
+
+
+def _call(name, **arguments):
+    return {"function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+@pytest.mark.unit
+class TestToolExecution:
+    """Test wave planning, concurrency and the merged draft write"""
+
+    def test_only_conflicting_calls_are_serialized(self):
+        names = ["create_event_draft", "query_database", "validate_event_data", "create_event_draft",
+                 "suggest_event_details", "unknown_tool", "validate_event_data"]
+        assert plan_waves(names) == [[0, 1, 2, 4], [3], [5], [6]]
+
+    @pytest.mark.asyncio
+    async def test_independent_calls_run_concurrently(self, integration):
+        started = time.monotonic()
+        results = await integration.execute_tool_calls("conv-1", [
+            _call("query_database", query_type="date_conflicts", filters={}),
+            _call("suggest_event_details", suggestion_type="capacity"),
+            _call("suggest_event_details", suggestion_type="timing"),
+        ])
+        assert time.monotonic() - started < 0.12
+        assert [result["function"] for result in results] == ["query_database", "suggest_event_details", "suggest_event_details"]
+        assert results[1]["result"]["suggested_capacity"] == 20
+        assert integration.commits == []
+
+    @pytest.mark.asyncio
+    async def test_draft_mutations_become_one_version_in_one_commit(self, db, integration):
+        results = await integration.execute_tool_calls("conv-1", [
+            _call("create_event_draft", title="Zoo Visit", location="Auckland Zoo", date="2026-11-03T10:00:00"),
+            _call("suggest_event_details", suggestion_type="capacity"),
+            _call("create_event_draft", title="Zoo Visit", max_pupils=20, cost=15),
+        ])
+
+        head = db.get(EventDraft, "conv-1")
+        assert head.current_version == 1 and db.query(EventDraftVersion).count() == 1
+        # The second call's default date didn't replace the first call's date
+        assert head.event_data == {"title": "Zoo Visit", "location": "Auckland Zoo", "date": "2026-11-03T10:00:00",
+                                   "event_type": "homeschool", "max_pupils": 20, "cost": 15}
+        assert integration.commits == [1]
+        assert results[2]["result"]["draft_saved"] and results[0]["result"]["event_data"]["cost"] == 15
+
+    @pytest.mark.asyncio
+    async def test_bad_arguments_fail_alone(self, db, integration):
+        results = await integration.execute_tool_calls("conv-1", [
+            {"function": {"name": "create_event_draft", "arguments": "{not json"}},
+            _call("create_event_draft", title="Beach Clean-up"),
+        ])
+        assert "Invalid arguments" in results[0]["error"]
+        assert results[1]["result"]["draft_saved"]
+        assert db.get(EventDraft, "conv-1").event_data["title"] == "Beach Clean-up"
+
+    @pytest.mark.asyncio
+    async def test_without_a_session_nothing_is_saved(self, db, integration):
+        results = await integration.execute_tool_calls(None, [_call("create_event_draft", title="Park day")])
+        assert results[0]["result"]["success"] and "draft_saved" not in results[0]["result"]
+        assert db.query(EventDraftVersion).count() == 0
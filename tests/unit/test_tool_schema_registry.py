@@ -0,0 +1,78 @@
+"""
+Unit tests for the tool schema registry
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.main  # noqa: F401  (app.ai imports from app.main, so load it first)
+from app.ai.tools.dynamic_tools import DynamicToolGenerator
+from app.ai_providers import AnthropicProvider, ModelConfig, MockAIProvider
+from app.ai_tools import DynamicEventTools
+from app.models import Base, User, DynamicFieldDefinition
+from app.tool_schema_registry import ToolSchemaRegistry, tool_schema_registry
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, DynamicFieldDefinition.__table__])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    tool_schema_registry.clear()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _create_event_tool(tools):
+    return next(tool for tool in tools if tool["name"] == "create_event")
+
+
+@pytest.mark.unit
+class TestToolSchemaRegistry:
+    """Test build-once caching, provider formats and invalidation"""
+
+    def test_static_schemas_built_once(self, db):
+        first = DynamicEventTools(db, user_id=1)
+        second = DynamicEventTools(db, user_id=2)
+
+        assert second.event_schema is first.event_schema
+        assert second.get_tool_definitions() is first.get_tool_definitions()
+        assert "title" in first.get_tool_definitions()[0]["parameters"]["properties"]
+
+    def test_dynamic_tools_rebuilt_when_a_field_is_defined(self, db):
+        generator = DynamicToolGenerator(db, user_id=1)
+        before = generator.generate_dynamic_tools()
+        assert generator.generate_dynamic_tools() is before
+        assert "bring_a_plate" not in _create_event_tool(before)["parameters"]["properties"]
+
+        db.add(DynamicFieldDefinition(
+            target_model="Event", field_name="bring_a_plate", field_type="boolean", field_label="Bring a plate"
+        ))
+        db.commit()
+
+        after = generator.generate_dynamic_tools()
+        assert after is not before
+        assert _create_event_tool(after)["parameters"]["properties"]["bring_a_plate"]["type"] == "boolean"
+
+    def test_provider_formats_cached_per_provider(self):
+        registry = ToolSchemaRegistry()
+        tools = registry.get("tools", lambda: [{"name": "lookup", "description": "Find things", "parameters": {}}])
+        anthropic = AnthropicProvider.__new__(AnthropicProvider)
+        mock = MockAIProvider(ModelConfig(provider="mock", model_name="test", endpoint_url="local://mock"))
+
+        formatted = registry.formatted(anthropic, tools)
+        assert registry.formatted(anthropic, tools) is formatted
+        assert formatted[0]["input_schema"] == {}
+        assert registry.formatted(mock, tools) is tools
+        assert registry.formatted(mock, []) is None
+        assert registry.get_metrics()["format_hits"] == 1
+
+        registry.invalidate_dynamic()
+        assert registry.formatted(anthropic, tools) is not formatted
@@ -0,0 +1,133 @@
+"""
+Unit tests for Stripe webhook ingestion and processing
+"""
+
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import (
+    Base, User, Event, Child, Adult, Booking, AdultBooking, TicketType,
+    PaymentStatus, StripeWebhookEvent, WebhookEventStatus
+)
+from app.webhook_service import WebhookProcessor, ingest_webhook_event
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine, tables=[
+        User.__table__, Event.__table__, Child.__table__, Adult.__table__, TicketType.__table__,
+        Booking.__table__, AdultBooking.__table__, StripeWebhookEvent.__table__
+    ])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def bookings(session_factory):
+    """Two pending child bookings and one pending adult booking for one family"""
+    db = session_factory()
+    user = User(email="family@example.com")
+    event = Event(title="Pottery", cost=20)
+    db.add_all([user, event])
+    db.flush()
+    children = [Child(user_id=user.id, name=name, age=8) for name in ("Aroha", "Nikau")]
+    adult = Adult(user_id=user.id, name="Mere")
+    db.add_all(children + [adult])
+    db.flush()
+    child_bookings = [Booking(event_id=event.id, child_id=c.id, payment_status=PaymentStatus.pending) for c in children]
+    adult_booking = AdultBooking(event_id=event.id, adult_id=adult.id, payment_status=PaymentStatus.pending)
+    db.add_all(child_bookings + [adult_booking])
+    db.commit()
+    ids = ([b.id for b in child_bookings], [adult_booking.id])
+    db.close()
+    return ids
+
+
+def _payload(event_id: str, event_type: str, created: int, booking_ids, adult_booking_ids=()) -> bytes:
+    return json.dumps({
+        "id": event_id,
+        "type": event_type,
+        "created": created,
+        "data": {"object": {
+            "id": "pi_123",
+            "metadata": {
+                "booking_type": "event_booking",
+                "booking_ids": ",".join(str(i) for i in booking_ids),
+                "adult_booking_ids": ",".join(str(i) for i in adult_booking_ids),
+            }
+        }}
+    }).encode()
+
+
+def _ingest(db, event_id, event_type, created, booking_ids, adult_booking_ids=()):
+    payload = _payload(event_id, event_type, created, booking_ids, adult_booking_ids)
+    return ingest_webhook_event(db, event_id, event_type, created, payload)
+
+
+@pytest.mark.unit
+class TestWebhookProcessor:
+    """Test deduplication, ordering and booking updates"""
+
+    def test_duplicate_delivery_stored_once(self, session_factory, bookings):
+        booking_ids, _ = bookings
+        db = session_factory()
+
+        assert _ingest(db, "evt_1", "payment_intent.succeeded", 100, booking_ids) is True
+        assert _ingest(db, "evt_1", "payment_intent.succeeded", 100, booking_ids) is False
+
+        assert db.query(StripeWebhookEvent).count() == 1
+        db.close()
+
+    def test_success_marks_child_and_adult_bookings_paid(self, session_factory, bookings):
+        booking_ids, adult_booking_ids = bookings
+        db = session_factory()
+        _ingest(db, "evt_1", "payment_intent.succeeded", 100, booking_ids, adult_booking_ids)
+        db.close()
+
+        processor = WebhookProcessor(session_factory=session_factory)
+        assert processor.process_batch() == 1
+
+        db = session_factory()
+        assert all(b.payment_status == PaymentStatus.paid and b.stripe_payment_id == "pi_123" for b in db.query(Booking).all())
+        assert db.query(AdultBooking).one().payment_status == PaymentStatus.paid
+        assert db.query(StripeWebhookEvent).one().status == WebhookEventStatus.processed
+        assert processor.metrics["bookings_updated_total"] == 3
+        db.close()
+
+    def test_events_applied_in_stripe_order(self, session_factory, bookings):
+        booking_ids, _ = bookings
+        db = session_factory()
+        # The success arrives first but happened after the failed attempt
+        _ingest(db, "evt_success", "payment_intent.succeeded", 200, booking_ids)
+        _ingest(db, "evt_failed", "payment_intent.payment_failed", 100, booking_ids)
+        db.close()
+
+        WebhookProcessor(session_factory=session_factory).process_batch()
+
+        db = session_factory()
+        assert all(b.payment_status == PaymentStatus.paid for b in db.query(Booking).all())
+        db.close()
+
+    def test_unrelated_and_bad_events(self, session_factory, bookings):
+        db = session_factory()
+        ingest_webhook_event(db, "evt_other", "customer.created", 100, b'{"data": {"object": {}}}')
+        ingest_webhook_event(db, "evt_bad", "payment_intent.succeeded", 101, b'not json')
+        db.close()
+
+        processor = WebhookProcessor(session_factory=session_factory, max_attempts=1)
+        processor.process_batch()
+
+        db = session_factory()
+        statuses = {e.stripe_event_id: e.status for e in db.query(StripeWebhookEvent).all()}
+        assert statuses == {"evt_other": WebhookEventStatus.ignored, "evt_bad": WebhookEventStatus.failed}
+        assert processor.get_metrics(db)["events"]["failed"] == 1
+        db.close()